@@ -0,0 +1,367 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+from __future__ import print_function, division
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+try:
+    import tracemalloc
+except ImportError:
+    # tracemalloc is only available in python 3
+    tracemalloc = None
+
+from clinicalfilter.filter import Filter
+from clinicalfilter.ped import load_families
+from clinicalfilter.load_vcfs import set_variant_parameters, open_individual, \
+    load_trio, combine_trio_variants, filter_de_novos
+from clinicalfilter.multinucleotide_variants import get_mnv_candidates
+from clinicalfilter.post_inheritance_filter import PostInheritanceFilter
+from clinicalfilter.reporting import Report
+from clinicalfilter.metrics import get_peak_rss
+
+from benchmarks.synthetic import POPULATIONS, generate_trio
+from benchmarks.run_benchmarks import find_candidates
+
+# the LSF jobs for each proband request 150 MB (see submit_lsf_job_array.py)
+PROBAND_BUDGET = 150
+VARIANT_BUDGET = 4096
+
+def get_peak_rss_mb():
+    """ get the peak resident memory of this process in MB, or None
+    """
+    
+    peak = get_peak_rss()
+    if peak is None:
+        return None
+    
+    # ru_maxrss is in bytes on macOS, but kilobytes elsewhere
+    if sys.platform == "darwin":
+        peak /= 1024
+    
+    return peak / 1024
+
+class StageMemory(object):
+    """ record the memory used by each stage of the analysis
+    
+    Use as a context manager around each stage, e.g.
+        tracker = StageMemory(trace=True)
+        with tracker.stage("load_trio"):
+            variants = load_trio(family, sum_x_lr2)
+    """
+    
+    def __init__(self, trace=False, top=5):
+        """ start recording memory use
+        
+        Args:
+            trace: whether to trace python allocations with tracemalloc. This
+                slows the analysis, and inflates the resident memory.
+            top: number of top allocators to record for each stage.
+        """
+        
+        self.trace = trace and tracemalloc is not None
+        self.top = top
+        self.stages = []
+        self.name = None
+        
+        if self.trace:
+            tracemalloc.start()
+    
+    def stage(self, name):
+        self.name = name
+        return self
+    
+    def __enter__(self):
+        if self.trace:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            self.start = tracemalloc.get_traced_memory()[0]
+            self.before = self.snapshot()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        record = {"stage": self.name, "peak_rss_mb": get_peak_rss_mb()}
+        
+        if self.trace:
+            current, peak = tracemalloc.get_traced_memory()
+            after = self.snapshot()
+            stats = after.compare_to(self.before, "lineno")
+            stats = sorted(stats, key=lambda x: x.size_diff, reverse=True)
+            
+            record["traced_peak_bytes"] = peak
+            record["traced_increase_bytes"] = current - self.start
+            record["top"] = [ (str(x.traceback[0]), x.size_diff, x.count_diff)
+                for x in stats[:self.top] ]
+            self.before = None
+        
+        self.stages.append(record)
+        return False
+    
+    def snapshot(self):
+        """ take a snapshot of the traced allocations, without tracemalloc's own
+        """
+        
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        return tracemalloc.take_snapshot().filter_traces(ignore)
+    
+    def stop(self):
+        if self.trace:
+            tracemalloc.stop()
+
+def count_records(path):
+    """ count the variant records in a bgzipped VCF
+    """
+    
+    with gzip.open(path, "rt") as handle:
+        return sum( 1 for line in handle if not line.startswith("#") )
+
+def measure_trio(paths, workdir, trace=False, top=5):
+    """ record the memory used to load, combine and report a synthetic trio
+    
+    Args:
+        paths: dictionary of paths for the trio, as per generate_trio()
+        workdir: folder to write the outputs to.
+        trace: whether to trace python allocations with tracemalloc.
+        top: number of top allocators to record for each stage.
+    
+    Returns:
+        dictionary with the number of variants in the childs VCF, the peak
+        memory of the process before the analysis, and a list of records for
+        the "load_trio", "combine_trio_variants" and "reporting" stages.
+    """
+    
+    finder = Filter(POPULATIONS, 1, paths["known_genes"], None, None, None,
+        0.9, paths["sum_x_lr2"], None, None, None, None)
+    family = load_families(paths["ped"])[0]
+    family.set_child()
+    
+    set_variant_parameters(finder.known_genes, finder.last_base, POPULATIONS)
+    sum_x_lr2 = float(finder.sum_x_lr2.get(family.child.get_id(), 0))
+    
+    baseline = get_peak_rss_mb()
+    tracker = StageMemory(trace, top)
+    
+    with tracker.stage("load_trio"):
+        variants = load_trio(family, sum_x_lr2)
+    del variants
+    
+    mnvs = get_mnv_candidates(family.child.get_path())
+    child = open_individual(family.child, mnvs=mnvs, sum_x_lr2=sum_x_lr2)
+    keys = set([ x.get_key() for x in child ])
+    mother = open_individual(family.mother, child_variants=keys)
+    father = open_individual(family.father, child_variants=keys)
+    
+    with tracker.stage("combine_trio_variants"):
+        variants = combine_trio_variants(family, child, mother, father)
+    del child, mother, father
+    
+    variants = filter_de_novos(variants, finder.pp_filter)
+    candidates = find_candidates(finder, family, variants)
+    candidates = PostInheritanceFilter(family).filter_variants(candidates)
+    
+    with tracker.stage("reporting"):
+        with Report(os.path.join(workdir, "output.txt"),
+                os.path.join(workdir, "output.vcf")) as reporter:
+            reporter.export_data(candidates, family)
+    
+    tracker.stop()
+    
+    return {"variants": count_records(paths["child"]),
+        "baseline_rss_mb": baseline, "stages": tracker.stages}
+
+def run_isolated(paths, workdir, trace, top):
+    """ measure a trio in a fresh python process, so the peak RSS is its own
+    
+    Args:
+        paths: dictionary of paths for the trio, as per generate_trio()
+        workdir: folder to write the outputs to.
+        trace: whether to trace python allocations with tracemalloc.
+        top: number of top allocators to record for each stage.
+    
+    Returns:
+        dictionary of results, as per measure_trio()
+    """
+    
+    paths_file = os.path.join(workdir, "paths.json")
+    with open(paths_file, "w") as handle:
+        json.dump(paths, handle)
+    
+    command = [sys.executable, "-m", "benchmarks.memory", "--measure",
+        paths_file, "--top", str(top)]
+    if trace:
+        command.append("--trace")
+    
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output(command, cwd=root)
+    
+    # the analysis might print to stdout, so the results are the last line
+    return json.loads(output.decode("utf-8").strip().split("\n")[-1])
+
+def check_budgets(size, untraced, traced, proband_budget, variant_budget):
+    """ find the stages which exceed the memory budgets
+    
+    Args:
+        size: number of variants requested for the trio.
+        untraced: results from measure_trio() without tracemalloc, or None.
+        traced: results from measure_trio() with tracemalloc, or None.
+        proband_budget: maximum peak RSS for a proband, in MB.
+        variant_budget: maximum traced memory per child variant, in bytes.
+    
+    Returns:
+        list of strings describing each exceeded budget.
+    """
+    
+    failures = []
+    if untraced is not None:
+        for stage in untraced["stages"]:
+            rss = stage["peak_rss_mb"]
+            if rss is not None and rss > proband_budget:
+                failures.append("{} variants: {} peak RSS {:.1f} MB exceeds "
+                    "{} MB".format(size, stage["stage"], rss, proband_budget))
+    
+    if traced is not None:
+        for stage in traced["stages"]:
+            if "traced_peak_bytes" not in stage:
+                continue
+            per_variant = stage["traced_peak_bytes"] / traced["variants"]
+            if per_variant > variant_budget:
+                failures.append("{} variants: {} uses {:.0f} bytes per variant, "
+                    "exceeds {} bytes".format(size, stage["stage"], per_variant,
+                    variant_budget))
+    
+    return failures
+
+def format_results(size, untraced, traced):
+    """ format the memory use for each stage as tab-separated lines
+    """
+    
+    def fmt(value, spec="{:.1f}"):
+        return "NA" if value is None else spec.format(value)
+    
+    lines = []
+    for i, stage in enumerate(untraced["stages"]):
+        peak, per_variant = None, None
+        if traced is not None and "traced_peak_bytes" in traced["stages"][i]:
+            peak = traced["stages"][i]["traced_peak_bytes"] / 1024 ** 2
+            per_variant = traced["stages"][i]["traced_peak_bytes"] / traced["variants"]
+        
+        lines.append("\t".join([str(size), str(untraced["variants"]),
+            stage["stage"], fmt(stage["peak_rss_mb"]), fmt(peak),
+            fmt(per_variant, "{:.0f}")]))
+    
+    return lines
+
+def format_allocators(size, traced):
+    """ format the top allocators for each stage
+    """
+    
+    lines = []
+    for stage in traced["stages"]:
+        for location, size_diff, count_diff in stage.get("top", []):
+            lines.append("{}\t{}\t{}\t{}\t{}".format(size, stage["stage"],
+                location, size_diff, count_diff))
+    
+    return lines
+
+def get_options():
+    """ get the command line options for the memory tests
+    """
+    
+    parser = argparse.ArgumentParser(description="Check the memory used by "
+        "the analysis of synthetic trios of increasing size against budgets.")
+    parser.add_argument("--sizes", type=int, nargs="+",
+        default=[2000, 10000, 30000],
+        help="Number of variants in each synthetic childs VCF.")
+    parser.add_argument("--seed", type=int, default=0,
+        help="Seed for generating the synthetic trios (default=0).")
+    parser.add_argument("--cnv-fraction", type=float, default=0.001,
+        help="Proportion of the childs variants which are CNVs, increase "
+            "this to check CNV-heavy trios (default=0.001).")
+    parser.add_argument("--proband-budget", type=float, default=PROBAND_BUDGET,
+        help="Maximum peak RSS for a proband, in MB (default={}, as per the "
+            "LSF memory request).".format(PROBAND_BUDGET))
+    parser.add_argument("--variant-budget", type=float, default=VARIANT_BUDGET,
+        help="Maximum traced python memory per variant in the childs VCF, in "
+            "bytes (default={}).".format(VARIANT_BUDGET))
+    parser.add_argument("--top", type=int, default=5,
+        help="Number of top allocators to show for each stage (default=5).")
+    parser.add_argument("--no-trace", dest="trace", default=True,
+        action="store_false", help="Skip tracing allocations with tracemalloc.")
+    
+    # options for measuring a single trio within a subprocess
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--trace", dest="trace_measure", default=False,
+        action="store_true", help=argparse.SUPPRESS)
+    
+    return parser.parse_args()
+
+def main():
+    args = get_options()
+    
+    if args.measure is not None:
+        with open(args.measure) as handle:
+            paths = json.load(handle)
+        workdir = os.path.dirname(args.measure)
+        result = measure_trio(paths, workdir, args.trace_measure, args.top)
+        print(json.dumps(result))
+        return
+    
+    print("size\tvariants\tstage\tpeak_rss_mb\ttraced_peak_mb\tbytes_per_variant")
+    failures = []
+    allocators = []
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp()
+        try:
+            paths = generate_trio(workdir, size, seed=args.seed,
+                cnv_fraction=args.cnv_fraction)
+            untraced = run_isolated(paths, workdir, False, args.top)
+            traced = None
+            if args.trace and tracemalloc is not None:
+                traced = run_isolated(paths, workdir, True, args.top)
+        finally:
+            shutil.rmtree(workdir)
+        
+        print("\n".join(format_results(size, untraced, traced)))
+        if traced is not None:
+            allocators += format_allocators(size, traced)
+        failures += check_budgets(size, untraced, traced, args.proband_budget,
+            args.variant_budget)
+    
+    if len(allocators) > 0:
+        print("\nsize\tstage\tallocator\tsize_diff\tcount_diff")
+        print("\n".join(allocators))
+    
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    
+    if len(failures) > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
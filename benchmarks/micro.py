@@ -0,0 +1,260 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+from __future__ import print_function, division
+
+import argparse
+import random
+import re
+import timeit
+from collections import namedtuple
+
+try:
+    import tracemalloc
+except ImportError:
+    # tracemalloc is only available in python 3
+    tracemalloc = None
+
+from clinicalfilter.variant.info import Info
+from clinicalfilter.variant.symbols import Symbols
+from clinicalfilter.variant.snv import SNV
+from clinicalfilter.trio_genotypes import TrioGenotypes
+from clinicalfilter.multinucleotide_variants import parse_vcf_line, translate, \
+    check_mnv_consequence
+
+from benchmarks.synthetic import POPULATIONS, SiteFactory, make_genes, \
+    get_sample, format_line
+
+VCFRecord = namedtuple('VCFRecord', ['chrom', 'pos', 'id', 'ref', 'alts',
+    'qual', 'filter', 'info'])
+
+GENOTYPES = ["0/1", "0/1", "0/1", "1/1", "0/0", "0|1"]
+
+def get_records(n_records, seed=0):
+    """ make a representative mix of parsed VCF records
+    
+    Args:
+        n_records: number of SNV and indel records to make.
+        seed: seed for the random number generator.
+    
+    Returns:
+        tuple of (list of SNV objects, list of (VCFRecord, VCFRecord) MNV pairs)
+    """
+    
+    rng = random.Random(seed)
+    factory = SiteFactory(rng, make_genes(rng, 200))
+    Info.set_populations(POPULATIONS)
+    
+    variants = []
+    for x in range(n_records):
+        site = factory.get_site()
+        keys, sample = get_sample(rng, rng.choice(GENOTYPES[:-1]),
+            len(site["alt"].split(",")))
+        line = format_line(site, keys, sample).rstrip().split("\t")
+        variants.append(SNV(*line[:7], info=line[7], format=line[8],
+            sample=line[9], gender="F"))
+    
+    pairs = []
+    for x in range(max(n_records // 10, 1)):
+        first, second = factory.get_mnv_pair()
+        pairs.append(tuple( parse_vcf_line(format_line(x, "GT",
+            "0/1").split("\t"), VCFRecord) for x in (first, second) ))
+    
+    return variants, pairs
+
+def get_cases(variants, pairs):
+    """ get the functions to benchmark, and the arguments for each call
+    
+    The functions are called unbound, with the instance as the first argument,
+    so the timings only include the method itself.
+    
+    Args:
+        variants: list of SNV objects
+        pairs: list of (VCFRecord, VCFRecord) tuples for candidate MNVs
+    
+    Returns:
+        list of (name, function, list of argument tuples) tuples
+    """
+    
+    infos = [ x.info for x in variants ]
+    genic = [ x for x in infos if len(x.get_genes()[0]) > 0 ]
+    symbols = [ Symbols(x.info, 0) for x in genic ]
+    trios = sorted( TrioGenotypes(x.get_chrom(), x.get_position(), x)
+        for x in variants )
+    pattern = re.compile('[ACGT]')
+    codons = [ y.info['Codons'].split('/')[1] for x in pairs for y in x ]
+    
+    return [
+        ("Info.__init__", Info, [ (str(x), ) for x in infos ]),
+        ("Symbols.__init__", Symbols, [ (x.info, 0) for x in genic ]),
+        ("Symbols.get", Symbols.get,
+            [ (x, y.get_genes()[0][0], "HGNC") for x, y in zip(symbols, genic) ]),
+        ("Info.get_per_gene_consequence", Info.get_per_gene_consequence,
+            [ (x, x.get_genes()[0][0]) for x in genic ]),
+        ("Info.find_max_allele_frequency", Info.find_max_allele_frequency,
+            [ (x, ) for x in infos ]),
+        ("SNV.convert_genotype", SNV.convert_genotype,
+            [ (x, GENOTYPES[i % len(GENOTYPES)]) for i, x in enumerate(variants) ]),
+        ("Variant.__hash__", SNV.__hash__, [ (x, ) for x in variants ]),
+        ("TrioGenotypes.__lt__", TrioGenotypes.__lt__,
+            [ (x, y) for x, y in zip(trios[1:], trios[:-1]) ]),
+        ("translate", translate, [ (x, ) for x in codons ]),
+        ("check_mnv_consequence", check_mnv_consequence,
+            [ (x, y, pattern) for x, y in pairs ]),
+        ]
+
+def time_calls(func, args, repeats):
+    """ time calls to a function, keeping the fastest of several runs
+    
+    Args:
+        func: function to call
+        args: list of argument tuples, one per call
+        repeats: number of times to call the function on all the arguments
+    
+    Returns:
+        nanoseconds per call, for the fastest run
+    """
+    
+    times = []
+    for x in range(repeats):
+        start = timeit.default_timer()
+        for values in args:
+            func(*values)
+        times.append(timeit.default_timer() - start)
+    
+    return min(times) * 1e9 / len(args)
+
+def trace_allocations(func, args):
+    """ count the memory allocated by calls to a function
+    
+    The values returned by the function are kept until the end, so anything
+    the calls create (e.g. parsed objects) is counted. Temporary objects freed
+    within a call are only seen in the peak, which is the largest amount of
+    memory in use during any single call.
+    
+    Args:
+        func: function to call
+        args: list of argument tuples, one per call
+    
+    Returns:
+        tuple of (blocks allocated per call, bytes allocated per call, peak
+        bytes in a call), or None values if tracemalloc is unavailable. The
+        peak needs python 3.9 or later.
+    """
+    
+    if tracemalloc is None:
+        return None, None, None
+    
+    results = [None] * len(args)
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    reset_peak = getattr(tracemalloc, "reset_peak", None)
+    
+    peak = 0
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        for i, values in enumerate(args):
+            if reset_peak is not None:
+                current = tracemalloc.get_traced_memory()[0]
+                reset_peak()
+            results[i] = func(*values)
+            if reset_peak is not None:
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+    finally:
+        tracemalloc.stop()
+    
+    diff = after.compare_to(before, "filename")
+    blocks = sum( x.count_diff for x in diff )
+    size = sum( x.size_diff for x in diff )
+    if reset_peak is None:
+        peak = None
+    
+    return blocks / len(args), size / len(args), peak
+
+def run(cases, repeats=5, names=None):
+    """ benchmark each of the cases
+    
+    Args:
+        cases: list of (name, function, list of argument tuples) tuples
+        repeats: number of runs for timing each function.
+        names: list of benchmark names to run, or None to run all of them.
+    
+    Returns:
+        list of dictionaries, one per benchmark.
+    """
+    
+    results = []
+    for name, func, args in cases:
+        if names is not None and name not in names:
+            continue
+        
+        ns = time_calls(func, args, repeats)
+        blocks, size, peak = trace_allocations(func, args)
+        results.append({"benchmark": name, "calls": len(args),
+            "ns_per_call": ns, "blocks_per_call": blocks,
+            "bytes_per_call": size, "peak_bytes": peak})
+    
+    return results
+
+def format_results(results):
+    """ format the benchmark results as a tab-separated table
+    """
+    
+    def fmt(value):
+        return "NA" if value is None else "{:.1f}".format(value)
+    
+    lines = ["benchmark\tcalls\tns_per_call\tblocks_per_call\tbytes_per_call\tpeak_bytes"]
+    for x in results:
+        lines.append("\t".join([x["benchmark"], str(x["calls"]),
+            fmt(x["ns_per_call"]), fmt(x["blocks_per_call"]),
+            fmt(x["bytes_per_call"]), fmt(x["peak_bytes"])]))
+    
+    return "\n".join(lines)
+
+def get_options():
+    """ get the command line options for the micro-benchmarks
+    """
+    
+    parser = argparse.ArgumentParser(description="Time the variant record "
+        "methods on a representative mix of synthetic records.")
+    parser.add_argument("--records", type=int, default=5000,
+        help="Number of synthetic records to benchmark on (default=5000).")
+    parser.add_argument("--repeats", type=int, default=5,
+        help="Number of timing runs, the fastest run is kept (default=5).")
+    parser.add_argument("--seed", type=int, default=0,
+        help="Seed for generating the synthetic records (default=0).")
+    parser.add_argument("--benchmark", dest="names", action="append",
+        help="Name of a benchmark to run, e.g. 'Symbols.get'. Can be used "
+            "more than once. Defaults to running all the benchmarks.")
+    
+    return parser.parse_args()
+
+def main():
+    args = get_options()
+    
+    variants, pairs = get_records(args.records, args.seed)
+    results = run(get_cases(variants, pairs), args.repeats, args.names)
+    print(format_results(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import timeit
+
+from clinicalfilter.filter import Filter
+from clinicalfilter.ped import load_families
+from clinicalfilter.load_vcfs import set_variant_parameters, open_individual, \
+    combine_trio_variants, filter_de_novos
+from clinicalfilter.multinucleotide_variants import get_mnv_candidates
+from clinicalfilter.post_inheritance_filter import PostInheritanceFilter
+from clinicalfilter.reporting import Report
+
+from benchmarks.synthetic import SIZES, POPULATIONS, generate_trio
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "bin", "clinical_filter.py")
+
+def get_options():
+    """ get the command line options for the benchmarks
+    """
+    
+    parser = argparse.ArgumentParser(description="Time each stage of clinical "
+        "filtering on a synthetic trio, and compare to stored baselines.")
+    parser.add_argument("--size", default="small", choices=sorted(SIZES),
+        help="Size of the synthetic trio (default=small).")
+    parser.add_argument("--seed", type=int, default=0,
+        help="Seed for generating the synthetic trio (default=0).")
+    parser.add_argument("--repeats", type=int, default=3,
+        help="Number of times to run each stage, the fastest run is kept.")
+    parser.add_argument("--baselines", default=BASELINES,
+        help="Path to JSON file of baseline timings.")
+    parser.add_argument("--update-baselines", default=False, action="store_true",
+        help="Store the timings as the baselines for this size.")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+        help="Fraction slower than the baseline before a stage counts as a "
+            "regression (default=0.5).")
+    parser.add_argument("--output", help="Path to write the timings to, as JSON.")
+    
+    return parser.parse_args()
+
+def best_time(func, repeats):
+    """ time a function, keeping the fastest of several runs
+    
+    Args:
+        func: function without arguments.
+        repeats: number of times to run the function.
+    
+    Returns:
+        tuple of (fastest time in seconds, value returned by the last run)
+    """
+    
+    times = []
+    for x in range(repeats):
+        start = timeit.default_timer()
+        value = func()
+        times.append(timeit.default_timer() - start)
+    
+    return min(times), value
+
+def find_candidates(finder, family, variants):
+    """ find the variants with a plausible inheritance mode, across all genes
+    
+    Args:
+        finder: Filter object
+        family: Family object
+        variants: list of TrioGenotypes objects for the family
+    
+    Returns:
+        list of (variant, check_type, inheritance) tuples, without duplicates.
+    """
+    
+    genes = finder.create_gene_dict(variants)
+    cnv_cache = {}
+    found = [ finder.find_variants(genes[x], x, family, cnv_cache) for x in genes ]
+    
+    return finder.exclude_duplicates([ x for sublist in found for x in sublist ])
+
+def time_stages(paths, workdir, repeats):
+    """ time each stage of the analysis on a synthetic trio
+    
+    Args:
+        paths: dictionary of paths for the trio, as per generate_trio()
+        workdir: folder to write the outputs to.
+        repeats: number of times to run each stage.
+    
+    Returns:
+        dictionary of times in seconds, indexed by stage name.
+    """
+    
+    finder = Filter(POPULATIONS, 1, paths["known_genes"], None, None, None,
+        0.9, paths["sum_x_lr2"], None, None, None, None)
+    family = load_families(paths["ped"])[0]
+    family.set_child()
+    
+    set_variant_parameters(finder.known_genes, finder.last_base, POPULATIONS)
+    sum_x_lr2 = float(finder.sum_x_lr2.get(family.child.get_id(), 0))
+    
+    timings = {}
+    timings["get_mnv_candidates"], mnvs = best_time(
+        lambda: get_mnv_candidates(family.child.get_path()), repeats)
+    
+    timings["open_individual"], child = best_time(
+        lambda: open_individual(family.child, mnvs=mnvs, sum_x_lr2=sum_x_lr2),
+        repeats)
+    
+    keys = set([ x.get_key() for x in child ])
+    mother = open_individual(family.mother, child_variants=keys)
+    father = open_individual(family.father, child_variants=keys)
+    timings["combine_trio_variants"], variants = best_time(
+        lambda: combine_trio_variants(family, child, mother, father), repeats)
+    
+    variants = filter_de_novos(variants, finder.pp_filter)
+    timings["find_variants"], candidates = best_time(
+        lambda: find_candidates(finder, family, variants), repeats)
+    
+    post_filter = PostInheritanceFilter(family)
+    timings["filter_variants"], candidates = best_time(
+        lambda: post_filter.filter_variants(candidates), repeats)
+    
+    def export():
+        reporter.export_data(candidates, family)
+        reporter.flush()
+    
+    with Report(os.path.join(workdir, "output.txt"),
+            os.path.join(workdir, "output.vcf")) as reporter:
+        timings["export_data"], _ = best_time(export, repeats)
+    
+    def run_main():
+        argv = sys.argv
+        sys.argv = [SCRIPT, "--ped", paths["ped"], "--known-genes",
+            paths["known_genes"], "--sum_x_lr2_file", paths["sum_x_lr2"],
+            "--output", os.path.join(workdir, "main.txt")]
+        try:
+            runpy.run_path(SCRIPT, run_name="__main__")
+        finally:
+            sys.argv = argv
+    
+    timings["main"], _ = best_time(run_main, repeats)
+    
+    return timings
+
+def find_regressions(timings, baselines, tolerance):
+    """ find the stages which are slower than their baselines
+    
+    Args:
+        timings: dictionary of times in seconds, indexed by stage name.
+        baselines: dictionary of baseline times, indexed by stage name.
+        tolerance: fraction slower than the baseline that is allowed.
+    
+    Returns:
+        list of (stage, time, baseline) tuples for stages which regressed.
+    """
+    
+    regressions = []
+    for stage in sorted(timings):
+        if stage not in baselines:
+            continue
+        if timings[stage] > baselines[stage] * (1 + tolerance):
+            regressions.append((stage, timings[stage], baselines[stage]))
+    
+    return regressions
+
+def main():
+    args = get_options()
+    
+    workdir = tempfile.mkdtemp()
+    try:
+        paths = generate_trio(workdir, SIZES[args.size], seed=args.seed)
+        timings = time_stages(paths, workdir, args.repeats)
+    finally:
+        shutil.rmtree(workdir)
+    
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as handle:
+            baselines = json.load(handle)
+    
+    current = baselines.get(args.size, {})
+    print("stage\tseconds\tbaseline")
+    for stage in sorted(timings):
+        print("{}\t{:.4f}\t{}".format(stage, timings[stage],
+            current.get(stage, "NA")))
+    
+    if args.output is not None:
+        with open(args.output, "w") as handle:
+            json.dump({args.size: timings}, handle, indent=2, sort_keys=True)
+    
+    if args.update_baselines:
+        baselines[args.size] = dict( (x, round(y, 4)) for x, y in timings.items() )
+        with open(args.baselines, "w") as handle:
+            json.dump(baselines, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        return
+    
+    regressions = find_regressions(timings, current, args.tolerance)
+    for stage, seconds, baseline in regressions:
+        print("regression in {}: {:.4f}s vs baseline {:.4f}s".format(stage,
+            seconds, baseline), file=sys.stderr)
+    
+    if len(regressions) > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+from __future__ import division
+
+import os
+import random
+from collections import OrderedDict
+
+import pysam
+
+# GRCh37 chromosome lengths, for the chromosomes we simulate variants on
+CHROM_LENGTHS = OrderedDict([("1", 249250621), ("2", 243199373),
+    ("3", 198022430), ("4", 191154276), ("5", 180915260), ("6", 171115067),
+    ("7", 159138663), ("8", 146364022), ("9", 141213431), ("10", 135534747),
+    ("11", 135006516), ("12", 133851895), ("13", 115169878),
+    ("14", 107349540), ("15", 102531392), ("16", 90354753), ("17", 81195210),
+    ("18", 78077248), ("19", 59128983), ("20", 63025520), ("21", 48129895),
+    ("22", 51304566), ("X", 155270560)])
+
+# number of variants in the childs VCF for typical dataset sizes
+SIZES = {"small": 2000, "exome": 30000, "genome": 4000000}
+
+POPULATIONS = ["AFR_AF", "AMR_AF", "ASN_AF", "DDD_AF", "EAS_AF", "ESP_AF",
+    "EUR_AF", "MAX_AF", "SAS_AF", "UK10K_cohort_AF"]
+
+# VEP consequences for variants within genes, with relative frequencies
+GENIC_CONSEQUENCES = [("missense_variant", 25), ("synonymous_variant", 25),
+    ("intron_variant", 20), ("3_prime_UTR_variant", 8),
+    ("5_prime_UTR_variant", 5), ("splice_region_variant", 5),
+    ("stop_gained", 3), ("frameshift_variant", 3), ("inframe_deletion", 2),
+    ("splice_donor_variant", 2), ("stop_lost", 1), ("start_lost", 1)]
+
+# inheritance modes for the known genes, with relative frequencies
+GENE_MODES = [("Monoallelic", 45), ("Biallelic", 40), ("Both", 5),
+    ("Hemizygous", 5), ("X-linked dominant", 5)]
+
+BASES = "ACGT"
+
+def weighted_choice(rng, choices):
+    """ pick from a list of (value, weight) tuples
+    """
+    
+    total = sum([ x[1] for x in choices ])
+    value = rng.uniform(0, total)
+    for choice, weight in choices:
+        value -= weight
+        if value <= 0:
+            return choice
+    
+    return choices[-1][0]
+
+def make_genes(rng, n_genes):
+    """ place genes along the genome, in proportion to the chromosome lengths
+    
+    Args:
+        rng: random.Random object
+        n_genes: number of genes to create.
+    
+    Returns:
+        list of gene dictionaries, with symbol, hgnc_id, chrom, start and end
+        entries, sorted by chromosome and position.
+    """
+    
+    total = sum(CHROM_LENGTHS.values())
+    genes = []
+    for chrom, length in CHROM_LENGTHS.items():
+        count = max(1, int(round(n_genes * length / total)))
+        slot = length // count
+        for i in range(count):
+            gene_length = rng.randint(20000, min(100000, slot // 2))
+            start = i * slot + rng.randint(1, slot - gene_length)
+            hgnc_id = 1000 + len(genes)
+            genes.append({"symbol": "GENE{}".format(hgnc_id),
+                "hgnc_id": str(hgnc_id), "chrom": chrom, "start": start,
+                "end": start + gene_length})
+    
+    return genes
+
+def get_mafs(rng):
+    """ get INFO entries for population allele frequencies
+    
+    Most variants are rare, or absent from the populations, but some are
+    common.
+    """
+    
+    kind = rng.random()
+    if kind < 0.1:
+        return []
+    elif kind < 0.8:
+        top = 0.001
+    else:
+        top = 0.5
+    
+    pops = rng.sample(POPULATIONS, rng.randint(1, len(POPULATIONS)))
+    mafs = [ (x, rng.uniform(0, top)) for x in sorted(pops) ]
+    
+    return [ "{}={:.5f}".format(x, y) for x, y in mafs ]
+
+class SiteFactory(object):
+    """ creates the child variant sites for a synthetic trio
+    """
+    
+    def __init__(self, rng, genes):
+        self.rng = rng
+        self.genes = genes
+        self.used = set()
+    
+    def get_position(self, chrom, start, end):
+        """ pick an unused position within a region
+        """
+        
+        while True:
+            pos = self.rng.randint(start, end)
+            if (chrom, pos) not in self.used and (chrom, pos + 1) not in self.used:
+                self.used.add((chrom, pos))
+                return pos
+    
+    def get_site(self):
+        """ make a SNV or indel site, either within a gene, or intergenic
+        
+        Returns:
+            dictionary with chrom, pos, ref, alt and info entries.
+        """
+        
+        rng = self.rng
+        if rng.random() < 0.85:
+            gene = rng.choice(self.genes)
+            chrom = gene["chrom"]
+            pos = self.get_position(chrom, gene["start"], gene["end"])
+            cq = weighted_choice(rng, GENIC_CONSEQUENCES)
+            info = ["HGNC={}".format(gene["symbol"]),
+                "HGNC_ID={}".format(gene["hgnc_id"])]
+        else:
+            chrom = weighted_choice(rng, list(CHROM_LENGTHS.items()))
+            pos = self.get_position(chrom, 1, CHROM_LENGTHS[chrom] - 10)
+            cq = "intergenic_variant"
+            info = []
+        
+        ref = rng.choice(BASES)
+        alt = rng.choice([ x for x in BASES if x != ref ])
+        if cq in ["frameshift_variant", "inframe_deletion"]:
+            ref += rng.choice(BASES) * (1 if cq == "frameshift_variant" else 3)
+        
+        # some sites are multi-allelic, with a consequence per allele
+        if cq != "intergenic_variant" and len(ref) == 1 and rng.random() < 0.02:
+            alt += "," + rng.choice([ x for x in BASES if x not in (ref, alt) ])
+            cq += ",synonymous_variant"
+            info = [ "{0}={1},{1}".format(*x.split("=")) for x in info ]
+        
+        info = ["CQ={}".format(cq)] + info + get_mafs(rng)
+        
+        return {"chrom": chrom, "pos": pos, "ref": ref, "alt": alt, "info": info}
+    
+    def get_mnv_pair(self):
+        """ make a pair of adjacent missense SNVs within the same codon
+        
+        Returns:
+            list of two site dictionaries.
+        """
+        
+        gene = self.rng.choice(self.genes)
+        chrom = gene["chrom"]
+        pos = self.get_position(chrom, gene["start"], gene["end"])
+        self.used.add((chrom, pos + 1))
+        
+        shared = ["CQ=missense_variant", "HGNC={}".format(gene["symbol"]),
+            "HGNC_ID={}".format(gene["hgnc_id"]),
+            "Protein_position={}".format(self.rng.randint(1, 2000))]
+        
+        # the GCA codon (alanine) becomes ACA (threonine) and GTA (valine)
+        first = {"chrom": chrom, "pos": pos, "ref": "G", "alt": "A",
+            "info": shared + ["Codons=Gca/Aca"]}
+        second = {"chrom": chrom, "pos": pos + 1, "ref": "C", "alt": "T",
+            "info": shared + ["Codons=gCa/gTa"]}
+        
+        return [first, second]
+    
+    def get_cnv(self, callsource):
+        """ make a CNV from aCGH or exome data, spanning one or more genes
+        
+        Args:
+            callsource: "aCGH" or "EXOME"
+        
+        Returns:
+            site dictionary for the CNV
+        """
+        
+        rng = self.rng
+        idx = rng.randint(0, len(self.genes) - 1)
+        gene = self.genes[idx]
+        overlapped = [ x for x in self.genes[idx:idx + 3]
+            if x["chrom"] == gene["chrom"] ]
+        overlapped = overlapped[:rng.randint(1, len(overlapped))]
+        
+        chrom = gene["chrom"]
+        pos = self.get_position(chrom, gene["start"] - 5000, gene["start"])
+        end = overlapped[-1]["end"] + rng.randint(100, 5000)
+        alt = rng.choice(["<DEL>", "<DUP>"])
+        meanlr2 = rng.uniform(-2.5, -0.6) if alt == "<DEL>" else rng.uniform(0.45, 1.5)
+        
+        # the consequences are per gene, as for the gene symbols
+        cq = "copy_number_loss" if alt == "<DEL>" else "copy_number_gain"
+        info = ["CQ={}".format("|".join([cq] * len(overlapped))),
+            "HGNC={}".format("|".join([ x["symbol"] for x in overlapped ])),
+            "HGNC_ID={}".format("|".join([ x["hgnc_id"] for x in overlapped ])),
+            "END={}".format(end), "SVLEN={}".format(end - pos),
+            "CALLSOURCE={}".format(callsource), "MEANLR2={:.3f}".format(meanlr2),
+            "MADL2R={:.3f}".format(rng.uniform(0.01, 0.05)),
+            "COMMONFORWARDS={:.3f}".format(rng.uniform(0, 1))]
+        if callsource == "aCGH":
+            info += ["WSCORE={:.3f}".format(rng.uniform(0.3, 1)),
+                "CALLP={:.4f}".format(rng.uniform(0, 0.02)),
+                "NUMBEREXONS={}".format(rng.randint(0, 20)),
+                "ACGH_RC_FREQ50={:.3f}".format(rng.uniform(0, 0.02))]
+        else:
+            info += ["CONVEXSCORE={:.1f}".format(rng.uniform(5, 60)),
+                "RC50INTERNALFREQ={:.3f}".format(rng.uniform(0, 0.02))]
+        
+        return {"chrom": chrom, "pos": pos, "ref": "N", "alt": alt,
+            "info": info, "cnv": True}
+
+def get_sample(rng, genotype, alts, de_novo=False):
+    """ get the FORMAT keys and sample values for a SNV genotype
+    """
+    
+    depth = rng.randint(15, 80)
+    alt_depth = 0
+    if genotype == "0/1":
+        alt_depth = depth // 2
+    elif genotype == "1/1":
+        alt_depth = depth
+    ad = [str(depth - alt_depth), str(alt_depth)] + ["0"] * (alts - 1)
+    
+    keys = ["GT", "AD", "DP", "GQ"]
+    values = [genotype, ",".join(ad), str(depth), str(rng.randint(20, 99))]
+    if de_novo:
+        keys.append("PP_DNM")
+        values.append("{:.3f}".format(rng.choice([rng.uniform(0.9, 1), rng.uniform(0, 0.9)])))
+    
+    return ":".join(keys), ":".join(values)
+
+def get_cnv_sample(rng, inheritance):
+    """ get the FORMAT keys and sample values for a CNV
+    """
+    
+    cifer = rng.choice(["not_inherited", "maternally_inherited",
+        "paternally_inherited", "uncertain", "false_positive"])
+    
+    return "INHERITANCE:DP:CIFER_INHERITANCE", "{}:50:{}".format(inheritance, cifer)
+
+def format_line(site, keys, sample):
+    """ format a VCF line for a site
+    """
+    
+    info = list(site["info"])
+    if site.get("de_novo", False):
+        info.append("DENOVO-SNP")
+    
+    return "\t".join([site["chrom"], str(site["pos"]), ".", site["ref"],
+        site["alt"], "1000", site.get("filter", "PASS"), ";".join(info), keys,
+        sample]) + "\n"
+
+def get_header(sample_id):
+    """ get the VCF header lines, including the contig lengths
+    """
+    
+    lines = ["##fileformat=VCFv4.1\n", "##fileDate=2014-01-01\n"]
+    lines += [ "##contig=<ID={},length={}>\n".format(x, y)
+        for x, y in CHROM_LENGTHS.items() ]
+    lines += ['##INFO=<ID=CQ,Number=.,Type=String,Description="VEP consequence">\n',
+        '##INFO=<ID=HGNC,Number=.,Type=String,Description="HGNC symbol">\n',
+        '##INFO=<ID=HGNC_ID,Number=.,Type=String,Description="HGNC ID">\n',
+        '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n',
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{}\n".format(sample_id)]
+    
+    return lines
+
+def sort_key(line):
+    """ sort VCF lines by chromosome (in the header order), then position
+    """
+    
+    chrom, pos, _ = line.split("\t", 2)
+    return (list(CHROM_LENGTHS).index(chrom), int(pos))
+
+def write_vcf(path, sample_id, lines):
+    """ write a bgzipped and tabix-indexed VCF
+    
+    Args:
+        path: path for the VCF, ending in ".vcf.gz"
+        sample_id: ID for the sample column
+        lines: list of VCF lines (unsorted).
+    """
+    
+    temp = path[:-len(".gz")]
+    with open(temp, "w") as handle:
+        handle.writelines(get_header(sample_id))
+        handle.writelines(sorted(lines, key=sort_key))
+    
+    pysam.tabix_compress(temp, path, force=True)
+    pysam.tabix_index(path, preset="vcf", force=True)
+    os.remove(temp)
+
+def write_known_genes(path, rng, genes, fraction=0.2):
+    """ write a known genes file for a fraction of the genes
+    
+    Args:
+        path: path to write the known genes to.
+        rng: random.Random object
+        genes: list of gene dictionaries, as per make_genes()
+        fraction: proportion of the genes to include.
+    """
+    
+    with open(path, "w") as handle:
+        handle.write("\t".join(["gene", "type", "mode", "mech", "start",
+            "stop", "chr", "hgnc_id"]) + "\n")
+        for gene in genes:
+            if rng.random() > fraction:
+                continue
+            
+            mode = weighted_choice(rng, GENE_MODES)
+            if gene["chrom"] != "X" and mode in ["Hemizygous", "X-linked dominant"]:
+                mode = "Monoallelic"
+            
+            mech = rng.choice(["Loss of function", "Activating", "Dominant negative"])
+            handle.write("\t".join([gene["symbol"], "Confirmed DD Gene", mode,
+                mech, str(gene["start"]), str(gene["end"]), gene["chrom"],
+                gene["hgnc_id"]]) + "\n")
+
+def generate_trio(directory, n_variants, seed=0, family_id="DDDP0001", sex="F",
+        n_genes=2000, mnv_fraction=0.005, cnv_fraction=0.001):
+    """ generate a synthetic trio, with bgzipped and tabix-indexed VCFs
+    
+    The trio is deterministic for a given seed. The childs variants are mostly
+    inherited from one or both parents, with a few de novos, and each parent
+    has a similar number of variants not passed to the child.
+    
+    Args:
+        directory: folder to write the VCFs, PED and known genes files to.
+        n_variants: number of variants in the childs VCF.
+        seed: seed for the random number generator.
+        family_id: ID for the family (and prefix for the individual IDs).
+        sex: sex of the child ("F" or "M").
+        n_genes: number of genes to place across the genome.
+        mnv_fraction: proportion of the childs variants in MNV pairs.
+        cnv_fraction: proportion of the childs variants which are CNVs.
+    
+    Returns:
+        dictionary of paths for the "child", "mother" and "father" VCFs, the
+        "ped" file, the "known_genes" file, and the "sum_x_lr2" file (of the
+        summed log2 ratios on chrX for the child).
+    """
+    
+    rng = random.Random(seed)
+    genes = make_genes(rng, n_genes)
+    factory = SiteFactory(rng, genes)
+    
+    n_mnvs = int(n_variants * mnv_fraction) // 2
+    n_cnvs = int(n_variants * cnv_fraction)
+    n_snvs = n_variants - n_mnvs * 2 - n_cnvs
+    
+    sites = [ factory.get_site() for x in range(n_snvs) ]
+    sites += [ x for i in range(n_mnvs) for x in factory.get_mnv_pair() ]
+    
+    lines = {"child": [], "mother": [], "father": []}
+    for site in sites:
+        alts = len(site["alt"].split(","))
+        
+        # pick where the childs allele came from
+        origin = weighted_choice(rng, [("mother", 45), ("father", 45),
+            ("both", 6), ("de_novo", 4)])
+        child_geno = "1/1" if origin == "both" else "0/1"
+        if origin == "de_novo":
+            site["de_novo"] = rng.random() < 0.9
+            if site["chrom"] == "X" and sex == "M":
+                child_geno = "1/1"
+        elif site["chrom"] == "X" and sex == "M":
+            # males are hemizygous on X, and inherit X from their mother
+            origin, child_geno = "mother", "1/1"
+        
+        # a few variants fail the quality filters
+        if rng.random() < 0.03:
+            site["filter"] = "gatk_LowQual"
+        
+        keys, sample = get_sample(rng, child_geno, alts, origin == "de_novo")
+        lines["child"].append(format_line(site, keys, sample))
+        
+        inherited = {"de_novo": [], "mother": ["mother"], "father": ["father"],
+            "both": ["mother", "father"]}[origin]
+        for parent in inherited:
+            parent_geno = rng.choice(["0/1", "0/1", "1/1"])
+            if parent == "father" and site["chrom"] == "X":
+                parent_geno = "1/1"
+            keys, sample = get_sample(rng, parent_geno, alts)
+            parental = dict(site, de_novo=False)
+            lines[parent].append(format_line(parental, keys, sample))
+    
+    for x in range(n_cnvs):
+        site = factory.get_cnv(rng.choice(["aCGH", "EXOME"]))
+        inheritance = rng.choice(["deNovo", "maternal", "paternal", "uncertain"])
+        keys, sample = get_cnv_sample(rng, inheritance)
+        lines["child"].append(format_line(site, keys, sample))
+    
+    # and give the parents variants which weren't passed to the child
+    for parent in ["mother", "father"]:
+        for x in range(int(n_variants * 0.8)):
+            site = factory.get_site()
+            keys, sample = get_sample(rng, rng.choice(["0/1", "0/1", "1/1"]),
+                len(site["alt"].split(",")))
+            lines[parent].append(format_line(site, keys, sample))
+    
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    
+    paths = {}
+    for member in ["child", "mother", "father"]:
+        sample_id = "{}_{}".format(family_id, member)
+        paths[member] = os.path.join(directory, "{}.vcf.gz".format(sample_id))
+        write_vcf(paths[member], sample_id, lines[member])
+    
+    paths["ped"] = os.path.join(directory, "{}.ped".format(family_id))
+    with open(paths["ped"], "w") as handle:
+        child_sex = "1" if sex == "M" else "2"
+        handle.write("\t".join([family_id, family_id + "_child",
+            family_id + "_father", family_id + "_mother", child_sex, "2",
+            paths["child"]]) + "\n")
+        handle.write("\t".join([family_id, family_id + "_mother", "0", "0",
+            "2", "1", paths["mother"]]) + "\n")
+        handle.write("\t".join([family_id, family_id + "_father", "0", "0",
+            "1", "1", paths["father"]]) + "\n")
+    
+    paths["known_genes"] = os.path.join(directory, "known_genes.txt")
+    write_known_genes(paths["known_genes"], rng, genes)
+    
+    paths["sum_x_lr2"] = os.path.join(directory, "{}.sum_x_lr2.txt".format(family_id))
+    with open(paths["sum_x_lr2"], "w") as handle:
+        handle.write("{}\t{:.1f}\n".format(family_id + "_child",
+            rng.uniform(-2000, 2000)))
+    
+    return paths
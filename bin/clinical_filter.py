@@ -20,10 +20,22 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
 import logging
+import os
+import sys
+import time
+import shutil
 
-from clinicalfilter.load_options import get_options
+from clinicalfilter.load_options import get_options, get_submit_options, \
+    get_merge_options, get_sidecar_options
 from clinicalfilter.filter import Filter
 from clinicalfilter.ped import load_families, Family
+from clinicalfilter.load_vcfs import get_cnv_path, write_cnv_sidecar
+from clinicalfilter.executor import merge_tabular, merge_attrition, \
+    concatenate
+from clinicalfilter.schedulers import get_scheduler, submit_run
+
+# subcommands, the analysis runs locally if no subcommand is given
+COMMANDS = ["run", "submit", "merge", "build-cnv-sidecars"]
 
 def get_families(args):
     """ loads a list of Family objects for multiple families, or a single trio
@@ -44,11 +56,11 @@ def get_families(args):
     
     return families
 
-def main():
-    """ run the clinical filtering analyses
+def run(argv):
+    """ run the clinical filtering analyses on this machine
     """
     
-    args = get_options()
+    args = get_options(argv)
     
     # set the level of logging to generate
     numeric_level = getattr(logging, args.loglevel.upper(), None)
@@ -64,10 +76,89 @@ def main():
     
     finder = Filter(args.populations, count, args.known_genes, args.genes_date, 
                     args.regions, args.lof_sites, args.pp_filter, args.sum_x_lr2_file, args.output, 
-                    args.export_vcf, args.debug_chrom, args.debug_pos)
+                    args.export_vcf, args.debug_chrom, args.debug_pos, args.gene_jobs,
+                    args.shard_size, args.panel, args.target_regions,
+                    args.profile_dir, args.flush_interval, args.export_queue,
+                    args.vcf_threads, args.output_db, args.output_columns,
+                    args.retries, args.cnv_sidecar_dir)
+    
+    finder.filter_families(families, args.jobs)
+    
+    # summarise where the time went, per stage of the analysis
+    print(finder.metrics.summarise())
+
+def submit(argv):
+    """ submit the analyses to a cluster, split across a job array
+    """
+    
+    args, run_args = get_submit_options(argv)
+    
+    output = os.path.abspath(args.output)
+    tempdir = args.tempdir
+    if tempdir is None:
+        tempdir = "{}.{}.shards".format(output, time.strftime("%Y%m%d%H%M%S"))
+    
+    scheduler = get_scheduler(args.scheduler, args.queue, args.memory)
+    program = [sys.executable, os.path.abspath(__file__)]
+    job_id = submit_run(scheduler, program, load_families(args.ped), run_args,
+        output, os.path.abspath(tempdir), args.shards)
+    
+    print("submitted, the output is merged by job {}".format(job_id))
+
+def merge(argv):
+    """ merge the outputs from separate runs, in order
+    """
+    
+    args = get_merge_options(argv)
+    
+    merge_tabular(args.paths, args.output)
+    if len(args.logs) > 0:
+        concatenate(args.logs, args.output + ".log")
+    
+    # merge the attrition counts and stage timings written beside each output
+    attrition = [ x + ".attrition.json" for x in args.paths ]
+    if any([ os.path.exists(x) for x in attrition ]):
+        merge_attrition(attrition, args.output + ".attrition.json")
+    
+    metrics = [ x + ".metrics.jsonl" for x in args.paths ]
+    if any([ os.path.exists(x) for x in metrics ]):
+        concatenate(metrics, args.output + ".metrics.jsonl")
+    
+    if args.cleanup is not None:
+        shutil.rmtree(args.cleanup)
+
+def build_cnv_sidecars(argv):
+    """ build sidecar VCFs of the CNVs in each childs VCF, for --panel runs
+    """
+    
+    args = get_sidecar_options(argv)
+    
+    if args.cnv_sidecar_dir is not None and not os.path.exists(args.cnv_sidecar_dir):
+        os.makedirs(args.cnv_sidecar_dir)
+    
+    paths = []
+    for family in load_families(args.ped):
+        for child in family.children:
+            if child.is_affected() and child.get_path() not in paths:
+                paths.append(child.get_path())
+    
+    for path in paths:
+        # skip sidecars which are already up to date
+        if get_cnv_path(path, args.cnv_sidecar_dir) != path:
+            continue
+        print(write_cnv_sidecar(path, args.cnv_sidecar_dir))
+
+def main():
+    """ run a subcommand, or run the analyses if no subcommand is given
+    """
+    
+    argv = sys.argv[1:]
+    command = "run"
+    if len(argv) > 0 and argv[0] in COMMANDS:
+        command = argv.pop(0)
     
-    for family in families:
-        finder.filter_trio(family)
+    {"run": run, "submit": submit, "merge": merge,
+        "build-cnv-sidecars": build_cnv_sidecars}[command](argv)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,98 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+
+from clinicalfilter.filter import Filter
+from clinicalfilter.load_options import add_variant_options, \
+    check_variant_options
+from clinicalfilter.ped import load_families
+from clinicalfilter.explain import explain_cohort
+
+def get_options():
+    """ get the command line options for explaining variants
+    """
+    
+    parser = argparse.ArgumentParser(description="Explain why variants pass "
+        "or fail clinical filtering.")
+    parser.add_argument("--ped", required=True,
+        help="Path to ped file containing cohort details for multiple trios.")
+    parser.add_argument("--queries", required=True,
+        help="Path to tab-separated file of variants to explain, with proband "
+            "ID, chrom and position columns, and a header line.")
+    parser.add_argument("--syndrome-regions", dest="regions",
+        help="Path to file listing syndrome regions.")
+    parser.add_argument("--known-genes",
+        help="Path to file listing known disease genes.")
+    parser.add_argument("--lof-sites",
+        help="Path to file listing sites where the last base of an exon is "
+            "a lof variant.")
+    add_variant_options(parser)
+    parser.add_argument("--sum_x_lr2_file",
+        help="Path to file containing the sum of lr2 on x chromosome for each sample")
+    parser.add_argument("-o", "--output", default=sys.stdout,
+        type=argparse.FileType("w"),
+        help="Path to write the explanations to, defaults to standard out.")
+    
+    args = parser.parse_args()
+    check_variant_options(parser, args)
+    
+    return args
+
+def open_queries(path):
+    """ open the (proband, chrom, pos) variants to explain
+    """
+    
+    queries = []
+    with open(path) as handle:
+        handle.readline()
+        for line in handle:
+            if line.strip() == "":
+                continue
+            proband, chrom, pos = line.strip().split("\t")[:3]
+            queries.append((proband, chrom, int(pos)))
+    
+    return queries
+
+def main():
+    args = get_options()
+    
+    finder = Filter(args.populations, 1, known_genes=args.known_genes,
+        regions=args.regions, lof_sites=args.lof_sites, pp_filter=args.pp_filter,
+        sum_x_lr2_file=args.sum_x_lr2_file)
+    
+    families = load_families(args.ped)
+    records = explain_cohort(finder, families, open_queries(args.queries))
+    
+    columns = ["proband", "chrom", "pos", "stage", "reason", "value"]
+    args.output.write("\t".join(columns) + "\n")
+    for record in records:
+        record["value"] = json.dumps(record["value"])
+        line = [ str(record[x]) if record[x] is not None else "NA" for x in columns ]
+        args.output.write("\t".join(line) + "\n")
+
+if __name__ == "__main__":
+    main()
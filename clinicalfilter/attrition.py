@@ -0,0 +1,150 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import json
+from collections import Counter, OrderedDict
+
+# counts of variants at each filtering stage, indexed by (stage, reason) tuples,
+# for the proband being analysed in this process. Counting is a single dict
+# update, so this is cheap enough to run for every variant.
+_counts = Counter()
+
+def count_variants(stage, reason, n=1):
+    """ count variants at a filtering stage
+    
+    Args:
+        stage: filtering stage e.g. "variant", "de_novo", "post_inheritance"
+        reason: outcome at the stage, e.g. the name of the filter which failed,
+            or "passed all" for variants passing the stage.
+        n: number of variants to count.
+    """
+    
+    _counts[(stage, reason)] += n
+
+def pop_counts():
+    """ get the counts for this process, and reset the counts
+    
+    Returns:
+        Counter of counts, indexed by (stage, reason) tuples.
+    """
+    
+    counts = Counter(_counts)
+    _counts.clear()
+    
+    return counts
+
+def merge_counts(counts):
+    """ add counts (e.g. from a worker process) to the counts for this process
+    """
+    
+    _counts.update(counts)
+
+def nest_counts(counts):
+    """ convert counts to a dictionary of counts per reason, indexed by stage
+    
+    Args:
+        counts: Counter of counts, indexed by (stage, reason) tuples.
+    
+    Returns:
+        dictionary of {reason: count} dictionaries, indexed by stage.
+    """
+    
+    nested = {}
+    for stage, reason in sorted(counts):
+        if stage not in nested:
+            nested[stage] = {}
+        nested[stage][reason] = counts[(stage, reason)]
+    
+    return nested
+
+class Attrition(object):
+    """ tracks how many variants are lost at each filtering stage, per proband
+    and across the cohort.
+    """
+    
+    def __init__(self):
+        self.probands = OrderedDict()
+        self.cohort = Counter()
+    
+    def add(self, proband_id, counts):
+        """ add the counts for a proband
+        
+        Args:
+            proband_id: ID for the proband
+            counts: Counter of counts, indexed by (stage, reason) tuples.
+        """
+        
+        if proband_id not in self.probands:
+            self.probands[proband_id] = Counter()
+        
+        self.probands[proband_id].update(counts)
+        self.cohort.update(counts)
+    
+    def update(self, other):
+        """ add the counts from another Attrition object (e.g. from a worker)
+        """
+        
+        for proband_id in other.probands:
+            self.add(proband_id, other.probands[proband_id])
+    
+    def to_dict(self):
+        """ get the cohort-wide and per-proband counts, nested by stage
+        """
+        
+        probands = OrderedDict()
+        for proband_id in self.probands:
+            probands[proband_id] = nest_counts(self.probands[proband_id])
+        
+        return OrderedDict([("cohort", nest_counts(self.cohort)),
+            ("probands", probands)])
+    
+    @classmethod
+    def read(cls, path):
+        """ read the counts from a JSON file, as written by write()
+        
+        Args:
+            path: path to the JSON file
+        
+        Returns:
+            Attrition object, with the per-proband counts from the file.
+        """
+        
+        with open(path) as handle:
+            data = json.load(handle, object_pairs_hook=OrderedDict)
+        
+        attrition = cls()
+        for proband_id, nested in data["probands"].items():
+            counts = Counter()
+            for stage, reasons in nested.items():
+                for reason, count in reasons.items():
+                    counts[(stage, reason)] = count
+            attrition.add(proband_id, counts)
+        
+        return attrition
+    
+    def write(self, path):
+        """ write the counts to a JSON file
+        """
+        
+        with open(path, "w") as handle:
+            json.dump(self.to_dict(), handle, indent=2)
+            handle.write("\n")
@@ -0,0 +1,158 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import struct
+import zlib
+from multiprocessing.pool import ThreadPool
+
+import pysam
+
+# the size of the uncompressed data in each block. This matches htslib, and
+# leaves room for incompressible data to fit within the 64 kb block limit.
+BLOCK_SIZE = 0xff00
+
+# the empty block which marks the end of a BGZF file
+EOF_BLOCK = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02" \
+    b"\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+def compress_block(data, level=6):
+    """ compress data into a single BGZF block
+    
+    Args:
+        data: bytes to compress, at most BLOCK_SIZE long.
+        level: zlib compression level.
+    
+    Returns:
+        bytes for the BGZF block, which is a gzip member with the block size
+        in the extra field.
+    """
+    
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    
+    # the block size (minus 1) includes the 18 byte header and 8 byte footer
+    header = struct.pack("<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67,
+        2, len(compressed) + 25)
+    footer = struct.pack("<2I", zlib.crc32(data) & 0xffffffff, len(data))
+    
+    return header + compressed + footer
+
+class BgzfWriter(object):
+    """ writes BGZF files, compressing the blocks on a pool of threads
+    
+    zlib releases the interpreter lock while compressing, so the blocks are
+    compressed in parallel. The blocks are written in order, so the output
+    is the same for any number of threads. Use as a context manager, or call
+    close() to write the final blocks.
+    """
+    
+    def __init__(self, path, threads=1, level=6):
+        """ open the file for writing
+        
+        Args:
+            path: path to write the BGZF file to.
+            threads: number of threads to compress the blocks with.
+            level: zlib compression level.
+        """
+        
+        self.handle = open(path, "wb")
+        self.threads = threads
+        self.level = level
+        
+        self.pool = None
+        if self.threads > 1:
+            self.pool = ThreadPool(self.threads)
+        
+        self.buffer = []
+        self.buffered = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, type, value, traceback):
+        self.close()
+    
+    def write(self, data):
+        """ write text or bytes to the file
+        """
+        
+        if not isinstance(data, bytes):
+            data = data.encode("utf8")
+        
+        self.buffer.append(data)
+        self.buffered += len(data)
+        
+        # compress once there is enough data to give each thread a block
+        if self.buffered >= BLOCK_SIZE * max(1, self.threads):
+            self._compress(final=False)
+    
+    def _compress(self, final):
+        """ compress and write the buffered data in whole blocks
+        
+        Args:
+            final: whether to also write the remaining partial block.
+        """
+        
+        data = b"".join(self.buffer)
+        end = len(data)
+        if not final:
+            end -= end % BLOCK_SIZE
+        
+        blocks = [ data[i:i + BLOCK_SIZE] for i in range(0, end, BLOCK_SIZE) ]
+        remainder = data[end:]
+        self.buffer = [remainder]
+        self.buffered = len(remainder)
+        
+        compress = lambda x: compress_block(x, self.level)
+        if self.pool is not None:
+            compressed = self.pool.map(compress, blocks)
+        else:
+            compressed = map(compress, blocks)
+        
+        for block in compressed:
+            self.handle.write(block)
+    
+    def close(self):
+        """ write the remaining data and the end-of-file marker, then close
+        """
+        
+        if self.handle is None:
+            return
+        
+        try:
+            self._compress(final=True)
+            self.handle.write(EOF_BLOCK)
+        finally:
+            self.handle.close()
+            self.handle = None
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+
+def index_vcf(path):
+    """ tabix-index a sorted BGZF-compressed VCF
+    
+    Args:
+        path: path to the VCF. The index is written to path + ".tbi".
+    """
+    
+    pysam.tabix_index(path, preset="vcf", force=True)
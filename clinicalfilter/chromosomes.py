@@ -0,0 +1,125 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import heapq
+import binascii
+
+# the order of the standard chromosomes, as used when sorting variants. The
+# integer ranks are shared by everything that orders variants by position.
+CHROMOSOMES = [ str(x) for x in range(1, 23) ] + ["X", "Y", "MT"]
+
+# offset the chromosome rank by enough bits to hold any chromosome position
+POSITION_BITS = 32
+
+# other chromosomes (e.g. unplaced contigs) sort after the standard
+# chromosomes, ordered by name. Their ranks encode the first NAME_BYTES bytes of
+# the name, so the ranks are the same in every process, regardless of the order
+# the chromosomes are seen in.
+NAME_BYTES = 256
+
+_RANKS = dict([ (x, i + 1) for i, x in enumerate(CHROMOSOMES) ])
+
+def _normalise(chrom):
+    """ strip any "chr" prefix, and uppercase the chromosome name
+    
+    The mitochondrial chromosome is named "MT", so "chrM" and "MT" match.
+    """
+    
+    chrom = chrom.upper()
+    if chrom.startswith("CHR"):
+        chrom = chrom[3:]
+    
+    if chrom == "M":
+        chrom = "MT"
+    
+    return chrom
+
+def _encode_name(name):
+    """ convert a chromosome name to an integer, which sorts in name order
+    """
+    
+    data = name.encode("utf8")[:NAME_BYTES]
+    data += b"\0" * (NAME_BYTES - len(data))
+    
+    return int(binascii.hexlify(data), 16)
+
+def chrom_to_int(chrom):
+    """ converts a chromosome string to an int for sorting.
+    
+    Chromosomes are matched case-insensitively, and with or without a "chr"
+    prefix, so "chrX", "X" and "x" all share a rank. Chromosomes outside the
+    standard set sort after the standard chromosomes, in name order.
+    
+    Args:
+        chrom: string (eg "1", "2", "3" ... "22", "X", "Y")
+    
+    Returns:
+        int value of chrom e.g. 1 for "1", 23 for "X"
+    """
+    
+    try:
+        return _RANKS[chrom]
+    except KeyError:
+        name = _normalise(chrom)
+        if name not in _RANKS:
+            _RANKS[name] = len(CHROMOSOMES) + 1 + _encode_name(name)
+        
+        _RANKS[chrom] = _RANKS[name]
+        return _RANKS[chrom]
+
+def sort_key(chrom, pos):
+    """ get an integer key to sort sites by chromosome, then position
+    
+    Args:
+        chrom: chromosome string
+        pos: nucleotide position, as int or string
+    
+    Returns:
+        integer, which orders sites the same as (chrom rank, position) tuples.
+    """
+    
+    return (chrom_to_int(chrom) << POSITION_BITS) + int(pos)
+
+def merge_sorted(iterables, key):
+    """ merge iterables that are already sorted into a single sorted iterator
+    
+    This can be used to merge sorted outputs from separate runs e.g. for a
+    cohort, without loading everything into memory.
+    
+    Args:
+        iterables: list of iterables, each sorted by the key.
+        key: function to get the sort key for an item, e.g. sort_key() for
+            the chromosome and position of an item.
+    
+    Yields:
+        items in order. Items with equal keys come out in the order of the
+        iterables.
+    """
+    
+    def decorate(values, idx):
+        for n, value in enumerate(values):
+            yield (key(value), idx, n, value)
+    
+    decorated = [ decorate(x, i) for i, x in enumerate(iterables) ]
+    for _, _, _, value in heapq.merge(*decorated):
+        yield value
+
@@ -0,0 +1,483 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import os
+import json
+import mmap
+import struct
+from collections import OrderedDict
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+from clinicalfilter.database import CANDIDATE_COLUMNS
+
+# the type of each column of the candidates. Categorical columns are stored as
+# integer codes into a list of categories, so that repeated values such as the
+# inheritance mode do not need to be re-parsed. Columns without a type here are
+# stored as strings. The consequence column is a string, since the PolyPhen,
+# SIFT and MNV annotations appended to it would make the categories grow with
+# every row group.
+COLUMN_TYPES = {"sex": "category", "chrom": "category", "position": "int64",
+    "max_maf": "float64",
+    "inheritance": "category", "result": "category", "pp_dnm": "float64",
+    "has_parents": "category", "cnv_length": "int64"}
+
+# number of probands in each row group
+BATCH_SIZE = 100
+
+# values of the tabular output which are stored as missing values
+MISSING = set(["NA", ".", ""])
+
+# missing values for the integer columns, since these can't be NaN
+INT64_MISSING = -2 ** 63
+
+FORMAT = "clinicalfilter-columns"
+METADATA = "columns.json"
+
+# file extension for each column type, for the pure-python format. All the
+# numbers are little-endian.
+EXTENSIONS = {"int64": "i64", "float64": "f64", "category": "i32"}
+STRUCT_CODES = {"int64": "q", "float64": "d", "category": "i"}
+
+def get_schema():
+    """ get the name and type of each column, in the order of the tabular output
+    """
+    
+    return [ (x[0], COLUMN_TYPES.get(x[0], "string")) for x in CANDIDATE_COLUMNS ]
+
+def _convert(value, kind):
+    """ convert a field of the tabular output to the type for its column
+    
+    Args:
+        value: string for the field.
+        kind: type of the column e.g. "int64", "float64", "category", "string"
+    
+    Returns:
+        the converted value, or None for missing values.
+    """
+    
+    if value in MISSING:
+        return None
+    elif kind == "int64":
+        return int(value)
+    elif kind == "float64":
+        return float(value)
+    
+    return value
+
+class ColumnarWriter(object):
+    """ writes the candidate variants for a run in a typed, columnar format
+    
+    The candidates are written in row groups, one per batch of probands. If
+    pyarrow is installed, the output is an Arrow IPC file, with dictionary
+    encoded categorical columns, which can be memory-mapped by pyarrow (and
+    loaded with pandas.read_feather). Otherwise the output is a directory with
+    one binary file per column, which can be memory-mapped without parsing,
+    by read_columns(), map_column() or numpy.memmap. These files are:
+        int64 columns: NAME.i64, with -2**63 for missing values
+        float64 columns: NAME.f64, with NaN for missing values
+        categorical columns: NAME.i32 codes, with -1 for missing values. The
+            categories are listed in columns.json.
+        string columns: NAME.utf8 data, NAME.offsets.i64 with the end of each
+            value in the data, and NAME.valid.u8 with 0 for missing values.
+    The columns.json file also lists the number of rows in each row group.
+    """
+    
+    def __init__(self, path, batch_size=BATCH_SIZE, use_arrow=None):
+        """ start the output, replacing any existing output
+        
+        Args:
+            path: path to the Arrow file, or the directory for the pure-python
+                format.
+            batch_size: number of probands in each row group, or None to write
+                a single row group when closing.
+            use_arrow: whether to write an Arrow file, defaults to using Arrow
+                if pyarrow is installed.
+        """
+        
+        if use_arrow is None:
+            use_arrow = pyarrow is not None
+        
+        if use_arrow and pyarrow is None:
+            raise ValueError("pyarrow is needed to write Arrow files")
+        
+        self.path = path
+        self.batch_size = batch_size
+        self.use_arrow = use_arrow
+        self.schema = get_schema()
+        
+        # the categories are shared by all the row groups, so new categories
+        # are appended to the existing categories
+        self.categories = dict([ (x, []) for x, y in self.schema if y == "category" ])
+        self.codes = dict([ (x, {}) for x in self.categories ])
+        
+        self.rows = []
+        self.probands = 0
+        self.row_groups = []
+        self.string_ends = dict([ (x, 0) for x, y in self.schema if y == "string" ])
+        
+        self.writer = None
+        self.finished = False
+        if not self.use_arrow:
+            self._start_directory()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, type, value, traceback):
+        self.close()
+    
+    def __getstate__(self):
+        """ drop the open Arrow file when pickling e.g. for worker processes
+        """
+        
+        state = self.__dict__.copy()
+        state["writer"] = None
+        return state
+    
+    def _start_directory(self):
+        """ create the directory for the pure-python format, with empty columns
+        """
+        
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        
+        for name in self._get_files():
+            open(os.path.join(self.path, name), "wb").close()
+        
+        self._write_metadata()
+    
+    def _get_files(self):
+        """ get the names of the files for the columns, in the pure-python format
+        """
+        
+        names = []
+        for name, kind in self.schema:
+            if kind == "string":
+                names += [ "{}.{}".format(name, x) for x in ["utf8", "offsets.i64", "valid.u8"] ]
+            else:
+                names.append("{}.{}".format(name, EXTENSIONS[kind]))
+        
+        return names
+    
+    def add(self, rows):
+        """ add the candidates for a proband
+        
+        Args:
+            rows: list of candidates, each a list of fields in the same order
+                as the tabular output.
+        """
+        
+        self.rows += rows
+        self.probands += 1
+        if self.batch_size is not None and self.probands >= self.batch_size:
+            self.write_row_group()
+    
+    def _get_column(self, index, name, kind):
+        """ get the values for a column of the pending rows
+        
+        Returns:
+            list of values, with the codes for categorical columns.
+        """
+        
+        values = [ _convert(x[index], kind) for x in self.rows ]
+        if kind != "category":
+            return values
+        
+        categories, codes = self.categories[name], self.codes[name]
+        for value in values:
+            if value is not None and value not in codes:
+                codes[value] = len(categories)
+                categories.append(value)
+        
+        return [ -1 if x is None else codes[x] for x in values ]
+    
+    def write_row_group(self):
+        """ write the pending candidates as a row group
+        """
+        
+        if len(self.rows) > 0:
+            columns = OrderedDict()
+            for index, (name, kind) in enumerate(self.schema):
+                columns[name] = self._get_column(index, name, kind)
+            
+            if self.use_arrow:
+                self._write_arrow(columns)
+            else:
+                self._write_directory(columns)
+            
+            self.row_groups.append(len(self.rows))
+        
+        self.rows = []
+        self.probands = 0
+        
+        if not self.use_arrow:
+            self._write_metadata()
+    
+    def _write_arrow(self, columns):
+        """ write a row group as a record batch of an Arrow IPC file
+        """
+        
+        arrays = []
+        for name, kind in self.schema:
+            values = columns[name]
+            if kind == "category":
+                codes = pyarrow.array([ None if x == -1 else x for x in values ], pyarrow.int32())
+                arrays.append(pyarrow.DictionaryArray.from_arrays(codes,
+                    pyarrow.array(self.categories[name], pyarrow.string())))
+            else:
+                arrays.append(pyarrow.array(values, _get_arrow_type(kind)))
+        
+        batch = pyarrow.RecordBatch.from_arrays(arrays, schema=_get_arrow_schema(self.schema))
+        
+        if self.finished:
+            raise ValueError("can't append to a closed Arrow file: {}".format(self.path))
+        
+        if self.writer is None:
+            # the categories only grow, so later record batches include
+            # dictionary deltas, rather than replacing the dictionaries
+            options = pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self.writer = pyarrow.ipc.new_file(self.path, batch.schema, options=options)
+        
+        self.writer.write_batch(batch)
+    
+    def _write_directory(self, columns):
+        """ append a row group to the column files of the pure-python format
+        """
+        
+        for name, kind in self.schema:
+            values = columns[name]
+            if kind == "string":
+                self._append_strings(name, values)
+                continue
+            
+            if kind == "int64":
+                values = [ INT64_MISSING if x is None else x for x in values ]
+            elif kind == "float64":
+                values = [ float("nan") if x is None else x for x in values ]
+            
+            data = struct.pack("<{}{}".format(len(values), STRUCT_CODES[kind]), *values)
+            self._append(name + "." + EXTENSIONS[kind], data)
+    
+    def _append_strings(self, name, values):
+        """ append values to a string column of the pure-python format
+        """
+        
+        encoded = [ b"" if x is None else x.encode("utf8") for x in values ]
+        
+        ends = []
+        for value in encoded:
+            self.string_ends[name] += len(value)
+            ends.append(self.string_ends[name])
+        
+        self._append(name + ".utf8", b"".join(encoded))
+        self._append(name + ".offsets.i64", struct.pack("<{}q".format(len(ends)), *ends))
+        self._append(name + ".valid.u8", bytearray([ int(x is not None) for x in values ]))
+    
+    def _append(self, name, data):
+        with open(os.path.join(self.path, name), "ab") as handle:
+            handle.write(data)
+    
+    def _write_metadata(self):
+        """ write the schema, categories and row groups, for the pure-python format
+        
+        This is replaced after every row group, so the output can be read
+        during the run.
+        """
+        
+        columns = []
+        for name, kind in self.schema:
+            column = OrderedDict([("name", name), ("type", kind)])
+            if kind == "category":
+                column["categories"] = self.categories[name]
+            columns.append(column)
+        
+        metadata = OrderedDict([("format", FORMAT), ("version", 1),
+            ("rows", sum(self.row_groups)), ("row_groups", self.row_groups),
+            ("columns", columns)])
+        
+        path = os.path.join(self.path, METADATA)
+        with open(path + ".tmp", "w") as handle:
+            json.dump(metadata, handle, indent=2)
+        os.rename(path + ".tmp", path)
+    
+    def close(self):
+        """ write any pending candidates, and finish the output
+        
+        Adding more candidates after closing appends to the pure-python
+        format, but Arrow files can't be appended to.
+        """
+        
+        self.write_row_group()
+        
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.finished = True
+
+def _get_arrow_type(kind):
+    """ get the Arrow type for a column type
+    """
+    
+    if kind == "category":
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    
+    return {"int64": pyarrow.int64(), "float64": pyarrow.float64(),
+        "string": pyarrow.string()}[kind]
+
+def _get_arrow_schema(schema):
+    """ get the Arrow schema for a list of (name, type) tuples
+    """
+    
+    return pyarrow.schema([ (x, _get_arrow_type(y)) for x, y in schema ])
+
+def _read_metadata(path):
+    with open(os.path.join(path, METADATA)) as handle:
+        metadata = json.load(handle)
+    
+    if metadata.get("format") != FORMAT:
+        raise ValueError("not a clinicalfilter columnar output: {}".format(path))
+    
+    return metadata
+
+def _map_file(path, code, length):
+    """ memory-map a file of little-endian numbers, without parsing the values
+    
+    Args:
+        path: path to the file.
+        code: struct code for the type of the values e.g. "q" for int64
+        length: number of values to map, so values appended after reading the
+            metadata are excluded.
+    
+    Returns:
+        sequence of the numbers, as a memoryview of the mapped file, or a list
+        on platforms where the memoryview can't be used.
+    """
+    
+    size = length * struct.calcsize(code)
+    if size == 0:
+        return []
+    
+    with open(path, "rb") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    view = memoryview(mapped)[:size]
+    if hasattr(view, "cast") and struct.pack("=i", 1) == struct.pack("<i", 1):
+        return view.cast(code)
+    
+    # python 2, or big-endian platforms
+    return list(struct.unpack("<{}{}".format(length, code), view.tobytes()))
+
+def map_column(path, name):
+    """ memory-map a numeric or categorical column, without parsing the values
+    
+    Args:
+        path: path to the output from ColumnarWriter.
+        name: name of the column e.g. "position"
+    
+    Returns:
+        the column values. For Arrow files this is a pyarrow ChunkedArray, with
+        one chunk per row group. For the pure-python format this is a sequence
+        of numbers, with the codes for categorical columns, and the missing
+        values described in ColumnarWriter.
+    """
+    
+    if not os.path.isdir(path):
+        if pyarrow is None:
+            raise ValueError("pyarrow is needed to read Arrow files")
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+        return table.column(name)
+    
+    metadata = _read_metadata(path)
+    kind = dict([ (x["name"], x["type"]) for x in metadata["columns"] ])[name]
+    if kind == "string":
+        raise ValueError("string columns can't be mapped as numbers: {}".format(name))
+    
+    column = os.path.join(path, "{}.{}".format(name, EXTENSIONS[kind]))
+    return _map_file(column, STRUCT_CODES[kind], metadata["rows"])
+
+def read_columns(path, columns=None):
+    """ read the candidates from the output of ColumnarWriter
+    
+    Args:
+        path: path to the Arrow file, or the directory for the pure-python
+            format.
+        columns: list of column names to read, or None for all the columns.
+    
+    Returns:
+        dictionary of lists of values, keyed by column name, with None for
+        missing values.
+    """
+    
+    if not os.path.isdir(path):
+        if pyarrow is None:
+            raise ValueError("pyarrow is needed to read Arrow files")
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        values = table.to_pydict()
+        return OrderedDict([ (x, values[x]) for x in table.column_names ])
+    
+    metadata = _read_metadata(path)
+    rows = metadata["rows"]
+    
+    values = OrderedDict()
+    for column in metadata["columns"]:
+        name, kind = column["name"], column["type"]
+        if columns is not None and name not in columns:
+            continue
+        
+        if kind == "string":
+            values[name] = _read_strings(path, name, rows)
+            continue
+        
+        data = map_column(path, name)
+        if kind == "int64":
+            values[name] = [ None if x == INT64_MISSING else x for x in data ]
+        elif kind == "float64":
+            values[name] = [ None if x != x else x for x in data ]
+        else:
+            categories = column["categories"]
+            values[name] = [ None if x == -1 else categories[x] for x in data ]
+    
+    return values
+
+def _read_strings(path, name, rows):
+    """ read the values for a string column of the pure-python format
+    """
+    
+    ends = _map_file(os.path.join(path, name + ".offsets.i64"), "q", rows)
+    with open(os.path.join(path, name + ".valid.u8"), "rb") as handle:
+        valid = bytearray(handle.read(rows))
+    with open(os.path.join(path, name + ".utf8"), "rb") as handle:
+        data = handle.read(ends[-1] if rows > 0 else 0)
+    
+    values, start = [], 0
+    for end, is_valid in zip(ends, valid):
+        values.append(data[start:end].decode("utf8") if is_valid else None)
+        start = end
+    
+    return values
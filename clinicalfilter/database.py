@@ -0,0 +1,257 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import os
+import sys
+import sqlite3
+import datetime
+
+import clinicalfilter
+from clinicalfilter.utils import get_vcf_provenance, get_vcf_checksum
+
+# the columns of the candidates table, matching the tabular output, with the
+# SQLite type affinity for each column. Numeric text is stored as numbers.
+CANDIDATE_COLUMNS = [("proband", "TEXT"), ("sex", "TEXT"), ("chrom", "TEXT"),
+    ("position", "INTEGER"), ("gene", "TEXT"), ("mutation_id", "TEXT"),
+    ("transcript", "TEXT"), ("consequence", "TEXT"), ("alleles", "TEXT"),
+    ("max_maf", "REAL"), ("inheritance", "TEXT"), ("trio_genotype", "TEXT"),
+    ("mom_aff", "TEXT"), ("dad_aff", "TEXT"), ("result", "TEXT"),
+    ("pp_dnm", "REAL"), ("exac_allele_count", "TEXT"), ("gq", "INTEGER"),
+    ("has_parents", "TEXT"), ("cnv_length", "INTEGER")]
+
+SCHEMA = [
+    "CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE probands (proband TEXT, family_id TEXT, "
+        "sex TEXT, has_parents TEXT, candidates INTEGER)",
+    "CREATE TABLE provenance (proband TEXT, member TEXT, path TEXT, "
+        "basename TEXT, checksum TEXT, date TEXT)",
+    "CREATE TABLE candidates (id INTEGER PRIMARY KEY, {})".format(
+        ", ".join([ "{} {}".format(*x) for x in CANDIDATE_COLUMNS ])),
+    "CREATE TABLE candidate_genes (candidate INTEGER, gene TEXT)",
+    ]
+
+# the indexes are created when closing, which is quicker than updating them
+# for every insert
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS probands_proband ON probands (proband)",
+    "CREATE INDEX IF NOT EXISTS candidates_proband ON candidates (proband)",
+    "CREATE INDEX IF NOT EXISTS candidates_site ON candidates (chrom, position)",
+    "CREATE INDEX IF NOT EXISTS candidate_genes_gene ON candidate_genes (gene)",
+    "CREATE INDEX IF NOT EXISTS candidate_genes_candidate ON candidate_genes (candidate)",
+    "CREATE INDEX IF NOT EXISTS provenance_proband ON provenance (proband)",
+    ]
+
+# number of probands to add between committing the transaction
+BATCH_SIZE = 100
+
+def get_provenance(person):
+    """ get the provenance of a person's VCF, for the provenance table
+    
+    Args:
+        person: Person object, or None
+    
+    Returns:
+        tuple of (path, basename, checksum, date), with None for unknown
+        values, rather than raising an error for VCFs without a date.
+    """
+    
+    if person is None:
+        return (None, None, None, None)
+    
+    try:
+        checksum, basename, date = get_vcf_provenance(person)
+    except IndexError:
+        # VCFs without a fileDate, or a date within the filename
+        checksum, basename, date = get_vcf_checksum(person.get_path()), \
+            os.path.basename(person.get_path()), None
+    
+    return (person.get_path(), basename, checksum, date)
+
+class ResultStore(object):
+    """ stores the candidate variants for a run in an SQLite database
+    
+    The candidates, the provenance of each proband's VCFs, and details of the
+    run are stored, so the results for a cohort can be queried by proband,
+    gene or site, rather than parsing the tabular output. The inserts are
+    committed in batches of probands, and the indexes are built on closing.
+    """
+    
+    def __init__(self, path, known_genes_date=None, batch_size=BATCH_SIZE):
+        """ create the database, replacing any existing file
+        
+        Args:
+            path: path to the SQLite database.
+            known_genes_date: date the known gene list was generated, or None
+            batch_size: number of probands to add between commits, or None to
+                only commit when closing.
+        """
+        
+        self.path = path
+        self.batch_size = batch_size
+        self.uncommitted = 0
+        
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        
+        self.conn = None
+        for statement in SCHEMA:
+            self.get_connection().execute(statement)
+        
+        metadata = [("run_date", str(datetime.datetime.now())),
+            ("clinicalfilter_version", clinicalfilter.__version__),
+            ("python_version", sys.version.split()[0]),
+            ("known_genes_date", known_genes_date),
+            ("command", " ".join(sys.argv))]
+        self.conn.executemany("INSERT INTO metadata VALUES (?, ?)", metadata)
+        self.commit()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, type, value, traceback):
+        self.close()
+    
+    def __getstate__(self):
+        """ drop the database connection when pickling e.g. for worker processes
+        """
+        
+        state = self.__dict__.copy()
+        state["conn"] = None
+        return state
+    
+    def get_connection(self):
+        """ get the connection to the database, reconnecting if closed
+        """
+        
+        # results can be added from the export thread, but only one thread
+        # uses the connection at a time
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        
+        return self.conn
+    
+    def add(self, family, rows):
+        """ add the candidates for a proband
+        
+        Args:
+            family: Family object, with the child set to the proband.
+            rows: list of candidates, each a list of fields in the same order
+                as the tabular output.
+        """
+        
+        conn = self.get_connection()
+        proband = family.child
+        conn.execute("INSERT INTO probands VALUES (?, ?, ?, ?, ?)",
+            (proband.get_id(), proband.family_id, proband.get_gender(),
+            str(family.has_parents()), len(rows)))
+        
+        members = [("proband", proband), ("maternal", family.mother),
+            ("paternal", family.father)]
+        conn.executemany("INSERT INTO provenance VALUES (?, ?, ?, ?, ?, ?)",
+            [ (proband.get_id(), x) + get_provenance(y) for x, y in members ])
+        
+        placeholders = ", ".join(["?"] * len(CANDIDATE_COLUMNS))
+        for row in rows:
+            values = [ None if x == "NA" else x for x in row ]
+            cursor = conn.execute("INSERT INTO candidates ({}) VALUES "
+                "({})".format(", ".join([ x[0] for x in CANDIDATE_COLUMNS ]),
+                placeholders), values)
+            
+            genes = [ x for x in row[4].split(",") if x != "" ]
+            conn.executemany("INSERT INTO candidate_genes VALUES (?, ?)",
+                [ (cursor.lastrowid, x) for x in genes ])
+        
+        self.uncommitted += 1
+        if self.batch_size is not None and self.uncommitted >= self.batch_size:
+            self.commit()
+    
+    def commit(self):
+        """ commit the candidates added so far
+        """
+        
+        if self.conn is not None:
+            self.conn.commit()
+        
+        self.uncommitted = 0
+    
+    def close(self):
+        """ commit any remaining candidates, build the indexes, and close
+        
+        Adding more candidates after closing reconnects to the database.
+        """
+        
+        if self.conn is None:
+            return
+        
+        for statement in INDEXES:
+            self.conn.execute(statement)
+        
+        self.commit()
+        self.conn.close()
+        self.conn = None
+
+def query_candidates(path, proband=None, gene=None, region=None):
+    """ get candidate variants from a database written by ResultStore
+    
+    Args:
+        path: path to the SQLite database.
+        proband: proband ID to restrict to, or None.
+        gene: gene symbol to restrict to, or None.
+        region: (chrom, start, end) tuple to restrict to, with 1-based
+            inclusive coordinates, or None.
+    
+    Returns:
+        list of dictionaries, one per candidate, keyed by the column names.
+    """
+    
+    columns = [ "candidates." + x[0] for x in CANDIDATE_COLUMNS ]
+    query = "SELECT {} FROM candidates".format(", ".join(columns))
+    
+    # match genes by candidate ID, rather than joining, so that a candidate
+    # listing a gene twice is only returned once, but identical candidates
+    # (e.g. from repeated VCF lines) are all returned
+    conditions, values = [], []
+    if gene is not None:
+        conditions.append("candidates.id IN (SELECT candidate FROM "
+            "candidate_genes WHERE gene = ?)")
+        values.append(gene)
+    
+    if proband is not None:
+        conditions.append("candidates.proband = ?")
+        values.append(proband)
+    
+    if region is not None:
+        conditions.append("candidates.chrom = ? AND candidates.position BETWEEN ? AND ?")
+        values += list(region)
+    
+    if len(conditions) > 0:
+        query += " WHERE " + " AND ".join(conditions)
+    
+    query += " ORDER BY candidates.id"
+    
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(query, values).fetchall()
+    finally:
+        conn.close()
+    
+    return [ dict(zip([ x[0] for x in CANDIDATE_COLUMNS ], row)) for row in rows ]
@@ -0,0 +1,187 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import os
+import shutil
+
+from clinicalfilter.attrition import Attrition
+
+def get_family_cost(family):
+    """ estimate how long a family takes to analyse, from the size of its VCFs
+    
+    Args:
+        family: Family object
+    
+    Returns:
+        total size in bytes of the VCFs for the family members, counting any
+        missing VCFs as empty.
+    """
+    
+    cost = 0
+    for person in family:
+        if person is None:
+            continue
+        try:
+            cost += os.path.getsize(person.get_path())
+        except (OSError, TypeError):
+            pass
+    
+    return cost
+
+def order_by_cost(families, window=None):
+    """ get the order to start analysing families in, largest first
+    
+    Starting with the largest families stops a large family from starting
+    last, and holding up the end of the run while the other workers sit idle.
+    The families are only reordered within windows of consecutive families,
+    so that no family starts far ahead of the families before it.
+    
+    Args:
+        families: list of Family objects
+        window: number of consecutive families to reorder within, or None to
+            reorder all the families.
+    
+    Returns:
+        list of indices into the families list, for the largest families
+        first within each window. Families of the same size keep their order.
+    """
+    
+    if window is None:
+        window = max(len(families), 1)
+    
+    costs = [ get_family_cost(x) for x in families ]
+    return sorted(range(len(families)), key=lambda x: (x // window, -costs[x], x))
+
+def imap_ordered(pool, func, jobs, window):
+    """ run jobs on a pool, and yield the results in order of the jobs index
+    
+    The jobs start in the order given, but a job only starts once it is within
+    window jobs of the next result to yield. This bounds the results held
+    back while waiting for an earlier job to finish.
+    
+    Args:
+        pool: multiprocessing Pool
+        func: function to run on each job
+        jobs: list of jobs, in the order to start them, where the first item
+            of each job is its index, and the indices run from 0 without gaps.
+            The jobs should be ordered within windows of consecutive indices,
+            as per order_by_cost(), so the next job to yield has always
+            started.
+        window: maximum number of jobs to run or hold ahead of the next result
+            to yield.
+    
+    Yields:
+        results of func for each job, in order of the jobs index.
+    """
+    
+    pending = {}
+    position = 0
+    for current in range(len(jobs)):
+        while position < len(jobs) and jobs[position][0] < current + window:
+            job = jobs[position]
+            pending[job[0]] = pool.apply_async(func, (job, ))
+            position += 1
+        
+        yield pending.pop(current).get()
+
+def shard_families(families, shards):
+    """ split families into consecutive groups with a similar total size of VCFs
+    
+    The groups are consecutive runs of the families, so concatenating the
+    outputs for the groups keeps the order of the families.
+    
+    Args:
+        families: list of Family objects
+        shards: number of groups to split the families into.
+    
+    Returns:
+        list of lists of Family objects, with the families in the same order
+        as in the families list. There can be fewer groups than requested, if
+        there are fewer families, or if some families are much larger than
+        the others.
+    """
+    
+    costs = [ get_family_cost(x) for x in families ]
+    total = sum(costs)
+    if total == 0:
+        # without any VCFs to size the families by, split by family count
+        costs = [1] * len(families)
+        total = len(families)
+    
+    groups = [ [] for x in range(shards) ]
+    cumulative = 0
+    for family, cost in zip(families, costs):
+        # assign each family to a group by the middle of its share of the
+        # total, so the groups hold consecutive families of similar total size
+        index = int((cumulative + cost / 2.0) * shards / total)
+        groups[min(index, shards - 1)].append(family)
+        cumulative += cost
+    
+    return [ x for x in groups if len(x) > 0 ]
+
+def merge_tabular(paths, output_path):
+    """ merge the tabular output from separate runs, in order
+    
+    Args:
+        paths: list of paths to tabular outputs, each with a header line.
+        output_path: path to write the merged output to. This has the header
+            from the first output, followed by the candidates from each output.
+    """
+    
+    header = None
+    with open(output_path, 'w') as output:
+        for path in paths:
+            with open(path) as handle:
+                line = handle.readline()
+                if header is None:
+                    header = line
+                    output.write(header)
+                elif line != header:
+                    raise ValueError("output has a different header: {}".format(path))
+                
+                shutil.copyfileobj(handle, output)
+
+def merge_attrition(paths, output_path):
+    """ merge the attrition counts from separate runs, in order
+    
+    Args:
+        paths: list of paths to attrition JSON files, as per Attrition.write().
+            Missing files are skipped.
+        output_path: path to write the merged counts to.
+    """
+    
+    merged = Attrition()
+    for path in paths:
+        if os.path.exists(path):
+            merged.update(Attrition.read(path))
+    
+    merged.write(output_path)
+
+def concatenate(paths, output_path):
+    """ concatenate files e.g. the logs from separate runs, skipping missing files
+    """
+    
+    with open(output_path, 'w') as output:
+        for path in paths:
+            if os.path.exists(path):
+                with open(path) as handle:
+                    shutil.copyfileobj(handle, output)
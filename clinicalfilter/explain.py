@@ -0,0 +1,359 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+from clinicalfilter.load_vcfs import set_variant_parameters, load_trio, \
+    load_targets, is_trio_indexed, filter_de_novos
+from clinicalfilter.multinucleotide_variants import get_mnv_candidates
+from clinicalfilter.post_inheritance_filter import PostInheritanceFilter
+from clinicalfilter.regions import get_gene_regions, merge_regions
+from clinicalfilter.utils import open_vcf, exclude_header, construct_variant, \
+    is_indexed, query_vcf
+
+def make_record(key, stage, reason, value=None):
+    """ make a record explaining the outcome for a variant
+    
+    Args:
+        key: (chrom, pos) tuple for the variant
+        stage: stage of the filtering the variant failed at ("vcf", "variant",
+            "de_novo", "inheritance" or "post_inheritance"), or None if the
+            variant passed every stage.
+        reason: name of the filter that the variant failed, or "passed"
+        value: value that the filter checked, or None.
+    
+    Returns:
+        dictionary of the chrom, pos, stage, reason and value.
+    """
+    
+    return {"chrom": key[0], "pos": key[1], "stage": stage, "reason": reason,
+        "value": value}
+
+def get_variant_lines(path, positions):
+    """ get the VCF lines for a set of sites
+    
+    Args:
+        path: path to VCF file. If the VCF is tabix-indexed, only the sites are
+            read, otherwise the whole VCF is read once.
+        positions: set of (chrom, pos) tuples.
+    
+    Returns:
+        dictionary of VCF lines (split by tabs), indexed by (chrom, pos) tuple.
+        The first line at each site is used.
+    """
+    
+    lines = {}
+    if is_indexed(path):
+        for chrom, pos in positions:
+            for line in query_vcf(path, (chrom, pos, pos)):
+                if int(line[1]) == pos and (chrom, pos) not in lines:
+                    lines[(chrom, pos)] = line
+    else:
+        with open_vcf(path) as vcf:
+            exclude_header(vcf)
+            for line in vcf:
+                chrom, pos, _ = line.split("\t", 2)
+                key = (chrom, int(pos))
+                if key in positions and key not in lines:
+                    lines[key] = line.strip().split("\t")
+    
+    return lines
+
+def get_mnvs(path, positions):
+    """ get the MNV candidates around a set of sites
+    
+    Args:
+        path: path to VCF file.
+        positions: set of (chrom, pos) tuples.
+    
+    Returns:
+        dictionary of MNV codes, indexed by (chrom, pos) tuple.
+    """
+    
+    if not is_indexed(path):
+        return get_mnv_candidates(path)
+    
+    mnvs = {}
+    for chrom, pos in positions:
+        mnvs.update(get_mnv_candidates(path, (chrom, pos, pos)))
+    
+    return mnvs
+
+def check_variant(line, person, mnvs, sum_x_lr2):
+    """ check a childs variant against the per-variant filters
+    
+    Args:
+        line: VCF line for the variant (split by tabs).
+        person: Person object for the child.
+        mnvs: dictionary of MNV codes, indexed by (chrom, pos) tuple.
+        sum_x_lr2: sum of mean lr2 on the X chromosome for the child.
+    
+    Returns:
+        tuple of (variant, reason, value), where variant is the Variant object
+        (or None if the variant could not be constructed), reason is the
+        filter which failed (or None if the variant passed), and value is the
+        value checked by the failing filter.
+    """
+    
+    try:
+        var = construct_variant(line, person.get_gender(), mnvs, sum_x_lr2)
+    except ValueError:
+        # heterozygous genotypes on chrX in males are impossible
+        return None, "genotype", line[9]
+    
+    passes, key = var.check_filters()
+    if not passes:
+        return var, key, var.get_filter_value(key)
+    
+    return var, None, None
+
+def get_target_regions(known_genes, variants):
+    """ get the regions needed to explain a set of variants
+    
+    Variants are checked against the other variants in the same genes (e.g.
+    for compound hets), so we need the full extent of each known gene that
+    the variants lie within.
+    
+    Args:
+        known_genes: dictionary of known genes, indexed by HGNC ID.
+        variants: list of Variant objects for the child.
+    
+    Returns:
+        list of merged (chrom, start, end) tuples.
+    """
+    
+    regions = []
+    genes = {}
+    for var in variants:
+        start, end = var.get_range()
+        regions.append((var.get_chrom(), start, end))
+        for gene in [ x for sublist in var.info.get_genes() for x in sublist ]:
+            if gene in known_genes:
+                genes[gene] = known_genes[gene]
+    
+    return merge_regions(regions + get_gene_regions(genes))
+
+def get_position_key(variant):
+    """ get the (chrom, pos) tuple for a TrioGenotypes object
+    """
+    
+    return (variant.get_chrom(), variant.get_position())
+
+def explain_inheritance(finder, family, variants, keys):
+    """ explain which variants fail the inheritance checks
+    
+    Args:
+        finder: Filter object
+        family: Family object, with the child set to the proband.
+        variants: list of TrioGenotypes objects which passed the de novo checks
+        keys: set of (chrom, pos) tuples to explain.
+    
+    Returns:
+        tuple of (candidates, failures), where candidates are the variants
+        passing the inheritance checks (as per Filter.find_variants()), and
+        failures is a dictionary of reasons per gene, indexed by (chrom, pos)
+        for the queried variants which failed in every gene.
+    """
+    
+    genes = finder.create_gene_dict(variants)
+    
+    candidates = []
+    reasons = dict( (x, {}) for x in keys )
+    passed = set()
+    cnv_cache = {}
+    for gene in genes:
+        checker = finder.get_gene_finder(genes[gene], gene, family, cnv_cache)
+        found = []
+        if checker is not None:
+            found = checker.get_candidate_variants()
+        candidates += found
+        passed |= set([ get_position_key(x[0]) for x in found ])
+        
+        for var in genes[gene]:
+            key = get_position_key(var)
+            if key not in keys or key in passed:
+                continue
+            
+            if gene is None:
+                reason = "intergenic"
+            elif checker is None or var not in checker.variants:
+                reason = "not a known gene, or non-functional consequence"
+            elif not checker.check_inheritance_mode_matches_gene_mode():
+                reason = "gene inheritance does not fit the chromosome"
+            else:
+                reason = checker.log_strings.get(var.child.get_key())
+            
+            reasons[key][gene] = reason
+    
+    failures = dict( (x, reasons[x]) for x in keys if x not in passed )
+    
+    return candidates, failures
+
+def explain_post_inheritance(family, candidates, keys):
+    """ explain which variants fail the post-inheritance filters
+    
+    Args:
+        family: Family object, with the child set to the proband.
+        candidates: list of candidate variants, as per Filter.find_variants()
+        keys: set of (chrom, pos) tuples to explain.
+    
+    Returns:
+        dictionary of records for the queried variants, indexed by (chrom, pos)
+    """
+    
+    post_filter = PostInheritanceFilter(family)
+    
+    steps = [("MAF", post_filter.filter_by_maf),
+        ("polyphen", post_filter.filter_polyphen),
+        ("ExAC", post_filter.filter_exac)]
+    if post_filter.count_cnv_chroms(candidates) > 2:
+        steps.insert(0, ("excess_CNVs", post_filter.remove_cnvs))
+    
+    records = {}
+    for reason, step in steps:
+        before = set([ get_position_key(x[0]) for x in candidates ])
+        candidates = step(candidates)
+        after = set([ get_position_key(x[0]) for x in candidates ])
+        
+        for key in (before - after) & keys:
+            records[key] = make_record(key, "post_inheritance", reason)
+    
+    for var, check, inh, hgnc in candidates:
+        key = get_position_key(var)
+        if key in keys:
+            records[key] = make_record(key, None, "passed", {"check": check,
+                "inheritance": inh, "genes": hgnc})
+    
+    return records
+
+def explain(finder, family, queries):
+    """ explain why variants in a proband pass or fail the clinical filtering
+    
+    The childs VCF is only read at the queried sites, and if the trio VCFs are
+    tabix-indexed and known genes are in use, only the genes around the queried
+    variants are loaded for the later checks.
+    
+    Args:
+        finder: Filter object, with the reference datasets and thresholds.
+        family: Family object, with the child set to the proband.
+        queries: list of (chrom, pos) tuples for the proband.
+    
+    Returns:
+        list of records (as per make_record()), one per query, in the same
+        order as the queries. The record gives the first stage that the variant
+        failed at, and why.
+    """
+    
+    set_variant_parameters(finder.known_genes, finder.last_base,
+        finder.populations)
+    
+    sum_x_lr2 = 0
+    if family.child.person_id in finder.sum_x_lr2.keys():
+        sum_x_lr2 = finder.sum_x_lr2[family.child.person_id]
+    
+    path = family.child.get_path()
+    keys = set([ (str(chrom), int(pos)) for chrom, pos in queries ])
+    lines = get_variant_lines(path, keys)
+    mnvs = get_mnvs(path, set(lines))
+    
+    records = {}
+    passed = []
+    for key in keys:
+        if key not in lines:
+            records[key] = make_record(key, "vcf", "not in VCF")
+            continue
+        
+        var, reason, value = check_variant(lines[key], family.child, mnvs, sum_x_lr2)
+        if reason is not None:
+            records[key] = make_record(key, "variant", reason, value)
+        else:
+            passed.append(var)
+    
+    if len(passed) > 0:
+        if finder.known_genes is not None and is_trio_indexed(family):
+            regions = get_target_regions(finder.known_genes, passed)
+            variants = load_targets(family, sum_x_lr2, regions)
+        else:
+            variants = load_trio(family, sum_x_lr2)
+        
+        keys = set([ (x.get_chrom(), x.get_position()) for x in passed ])
+        for var in variants:
+            key = get_position_key(var)
+            if key not in keys:
+                continue
+            passes, reason = var.check_de_novo(finder.pp_filter)
+            if not passes:
+                records[key] = make_record(key, "de_novo", reason, str(var))
+                keys.remove(key)
+        
+        variants = filter_de_novos(variants, finder.pp_filter)
+        candidates, failures = explain_inheritance(finder, family, variants, keys)
+        for key in failures:
+            records[key] = make_record(key, "inheritance", "inheritance",
+                failures[key])
+        
+        candidates = finder.exclude_duplicates(candidates)
+        records.update(explain_post_inheritance(family, candidates,
+            keys - set(failures)))
+    
+    return [ records[(str(chrom), int(pos))] for chrom, pos in queries ]
+
+def explain_cohort(finder, families, queries):
+    """ explain why variants pass or fail, for variants across many probands
+    
+    Each proband's trio is only loaded once, regardless of how many variants
+    are queried in the proband.
+    
+    Args:
+        finder: Filter object, with the reference datasets and thresholds.
+        families: list of Family objects.
+        queries: list of (proband_id, chrom, pos) tuples.
+    
+    Returns:
+        list of records (as per make_record(), plus the proband ID), one per
+        query, in the same order as the queries.
+    """
+    
+    probands = {}
+    for family in families:
+        for child in family.children:
+            probands[child.get_id()] = (family, child)
+    
+    grouped = {}
+    for proband, chrom, pos in queries:
+        if proband not in grouped:
+            grouped[proband] = []
+        grouped[proband].append((str(chrom), int(pos)))
+    
+    records = {}
+    for proband in grouped:
+        if proband not in probands:
+            explained = [ make_record(x, "vcf", "proband not in pedigree")
+                for x in grouped[proband] ]
+        else:
+            family, child = probands[proband]
+            family.child = child
+            explained = explain(finder, family, grouped[proband])
+        
+        for record in explained:
+            record["proband"] = proband
+            records[(proband, record["chrom"], record["pos"])] = record
+    
+    return [ records[(x, str(y), int(z))] for x, y, z in queries ]
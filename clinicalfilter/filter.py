@@ -19,14 +19,122 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+import os
 import logging
+import copy
+import multiprocessing
+from collections import OrderedDict
 
-from clinicalfilter.load_vcfs import load_variants
+from clinicalfilter.load_vcfs import load_variants, load_variants_by_shard, \
+    is_trio_indexed, set_variant_parameters
 from clinicalfilter.inheritance import Allosomal, Autosomal
 from clinicalfilter.post_inheritance_filter import PostInheritanceFilter
-from clinicalfilter.reporting import Report
+from clinicalfilter.reporting import Report, ReportWriter, FLUSH_INTERVAL, \
+    EXPORT_QUEUE, VCF_THREADS
 from clinicalfilter.load_files import open_known_genes, open_cnv_regions, \
-    open_last_base_sites, open_x_lr2_file
+    open_last_base_sites, open_x_lr2_file, open_target_regions
+from clinicalfilter.regions import get_gene_regions, merge_regions
+from clinicalfilter.utils import use_worker_pool
+from clinicalfilter.attrition import Attrition, count_variants, pop_counts
+from clinicalfilter.metrics import Metrics, StageTimer, pop_stages
+from clinicalfilter.profiling import get_profile_prefix, profile_call, \
+    merge_profiles
+from clinicalfilter.executor import order_by_cost, imap_ordered
+
+# the Filter used within worker processes. This is set as the workers start, so
+# that (on forking platforms) the workers share the reference datasets loaded
+# by the parent process, rather than each loading their own copy.
+_worker_filter = None
+
+# the CNV checks for the proband analysed by a gene worker, as a (proband,
+# checks) tuple
+_worker_cnv_cache = None
+
+# number of times to retry analysing a family if the analysis fails, e.g. from
+# a transient error reading VCFs on a shared filesystem
+RETRIES = 1
+
+# number of families per job which can be analysed ahead of the next family
+# to export, when analysing families in parallel
+LOOKAHEAD = 4
+
+# default threshold for the PP_DNM of de novos, where 0.0 doesn't exclude any
+PP_DNM_THRESHOLD = 0.0
+
+def consume(values):
+    """ iterate through a list, removing the items as they are used
+    
+    Items can then be freed as soon as they have been processed, rather than
+    once the whole list is finished with.
+    
+    Args:
+        values: list of items. The list is emptied.
+    
+    Yields:
+        items from the list, in order
+    """
+    
+    values.reverse()
+    while len(values) > 0:
+        yield values.pop()
+
+def sort_by_position(variants):
+    """ sort variants in place by position, keeping the order of the chromosomes
+    
+    Args:
+        variants: list of TrioGenotypes objects, e.g. in the order of the VCF,
+            except for CNVs loaded separately.
+    """
+    
+    order = {}
+    variants.sort(key=lambda x: (order.setdefault(x.get_chrom(), len(order)),
+        x.get_position()))
+
+def _set_worker_filter(finder):
+    """ define the Filter for a worker process
+    """
+    
+    global _worker_filter
+    _worker_filter = finder
+
+def _analyse_family(job):
+    """ analyse the affected children in a family within a worker process
+    
+    Args:
+        job: (index, count, family) tuple, where index is the position of the
+            family in the list of families, and count is the number of
+            affected children in the families preceding this one.
+    
+    Returns:
+        tuple of (results, attrition, metrics), as per Filter.run_family().
+    """
+    
+    index, count, family = job
+    _worker_filter.count = count
+    
+    return _worker_filter.run_family(family)
+
+def _find_gene_variants(job):
+    """ find the candidate variants in a single gene within a worker process
+    
+    Args:
+        job: (gene, variants, family) tuple, for the group of variants in a
+            gene for the proband.
+    
+    Returns:
+        list of variants that pass inheritance checks, as per find_variants()
+    """
+    
+    global _worker_cnv_cache
+    gene, variants, family = job
+    
+    # CNVs are checked against every gene they span, so share the CNV checks
+    # between the genes that this worker checks for the proband
+    proband = (family.child.family_id, family.child.get_id())
+    if _worker_cnv_cache is None or _worker_cnv_cache[0] != proband:
+        _worker_cnv_cache = (proband, {})
+    
+    return _worker_filter.find_variants(variants, gene, family, _worker_cnv_cache[1])
 
 class Filter(object):
     """ filters trios for candidate variants that might contribute to a
@@ -34,8 +142,12 @@ class Filter(object):
     """
     
     def __init__(self, population_tags=None, count=0, known_genes=None, date=None,
-            regions=None, lof_sites=None, pp_filter=0.0, sum_x_lr2_file=None,
-            output_path=None, export_vcf=None, debug_chrom=None, debug_pos=None):
+            regions=None, lof_sites=None, pp_filter=PP_DNM_THRESHOLD, sum_x_lr2_file=None,
+            output_path=None, export_vcf=None, debug_chrom=None, debug_pos=None,
+            gene_jobs=1, shard_size=None, panel=False, target_regions=None,
+            profile_dir=None, flush_interval=FLUSH_INTERVAL,
+            export_queue=EXPORT_QUEUE, vcf_threads=VCF_THREADS, output_db=None,
+            output_columns=None, retries=RETRIES, cnv_sidecar_dir=None):
         """ initialise the class object
         
         Args:
@@ -54,13 +166,46 @@ class Filter(object):
                 candidiate DNMs which fall below this value
             sum_x_lr2_file: File containing sum of l2r values on x chromosome 
                 for each person
-            output_path: path to write output tab-separated file to
+            output_path: path to write output tab-separated file to. The
+                counts of variants at each filtering stage are written
+                alongside, to the same path with an ".attrition.json" suffix,
+                as are the timings for each stage, with a ".metrics.jsonl"
+                suffix.
             export_vcf: path to file or folder to write VCFs to.
             debug_chrom: chromosome for debugging purposes.
             debug_pos: position for debugging variant filtering at.
+            gene_jobs: number of processes to load and analyse the variants of
+                each proband with, split by chromosome and by gene.
+            shard_size: length in base-pairs of the regions to load
+                tabix-indexed VCFs in (0 for whole chromosomes), or None to
+                load the VCFs in one go.
+            panel: whether to only load the regions around the known genes
+                from tabix-indexed VCFs (plus all the CNVs), rather than the
+                whole VCFs.
+            target_regions: path to BED file of regions to restrict the
+                analysis to, or None. This requires tabix-indexed VCFs.
+            profile_dir: folder to write a cProfile profile of each proband's
+                analysis to, plus an aggregate profile, or None.
+            flush_interval: number of probands to export between flushing the
+                tabular output to disk.
+            export_queue: number of probands that can wait to be exported on
+                a background thread, or 0 to export on the main thread.
+            vcf_threads: number of threads to compress the exported VCFs with.
+            output_db: path to an SQLite database to store the candidates, the
+                provenance of each proband's VCFs, and details of the run in.
+            output_columns: path to write the candidates to in a typed,
+                columnar format, as an Arrow file if pyarrow is installed,
+                otherwise as a directory of memory-mappable columns.
+            retries: number of times to retry analysing a family if the
+                analysis fails, before giving up on the run.
+            cnv_sidecar_dir: folder of sidecar VCFs of the CNVs in the childs
+                VCFs, for use with panel, or None to look beside each VCF.
         """
         
         self.pp_filter = pp_filter
+        self.retries = retries
+        self.gene_jobs = gene_jobs
+        self.shard_size = shard_size
         self.total = count
         self.count = 0
         
@@ -72,29 +217,307 @@ class Filter(object):
         self.known_genes = open_known_genes(known_genes)
         self.cnv_regions = open_cnv_regions(regions)
         self.last_base = open_last_base_sites(lof_sites)
+        
+        # regions to load from tabix-indexed VCFs, rather than the whole VCFs.
+        # A panel of known genes only speeds up loading, but user-supplied
+        # regions restrict the analysis, so require indexed VCFs.
+        self.target_regions = None
+        self.scan_cnvs = True
+        self.regions_required = False
+        if target_regions is not None:
+            self.target_regions = merge_regions(open_target_regions(target_regions))
+            self.scan_cnvs = False
+            self.regions_required = True
+        elif panel and self.known_genes is not None:
+            self.target_regions = get_gene_regions(self.known_genes)
+        self.cnv_sidecar_dir = cnv_sidecar_dir
 
         #open file containing sum of mean log 2 ratios on X, returns an empty dict if path is None
         self.sum_x_lr2 = open_x_lr2_file(sum_x_lr2_file)
         
-        self.reporter = Report(output_path, export_vcf, date)
+        self.reporter = Report(output_path, export_vcf, date, flush_interval,
+            vcf_threads=vcf_threads, output_db=output_db,
+            output_columns=output_columns)
+        
+        # the background thread to export results on, while running
+        # filter_families()
+        self.export_queue = export_queue
+        self.writer = None
+        
+        # the processes to check the genes of each proband on, while running
+        # filter_families()
+        self.gene_pool = None
+        
+        # count the variants lost at each filtering stage, per proband
+        self.attrition = Attrition()
+        self.attrition_path = None
+        
+        # time each stage of the analysis, per proband
+        self.metrics = Metrics()
+        self.metrics_path = None
+        
+        if output_path is not None:
+            self.attrition_path = output_path + ".attrition.json"
+            self.metrics_path = output_path + ".metrics.jsonl"
+        
+        self.profile_dir = profile_dir
+        if self.profile_dir is not None and not os.path.exists(self.profile_dir):
+            os.makedirs(self.profile_dir)
+    
+    def __getstate__(self):
+        """ drop the export thread when pickling e.g. for worker processes
+        """
+        
+        state = self.__dict__.copy()
+        state['writer'] = None
+        state['gene_pool'] = None
+        return state
+    
+    def filter_families(self, families, jobs=1):
+        """ screens families for candidate variants, optionally in parallel
+        
+        Args:
+            families: list of Family objects
+            jobs: number of processes to analyse the families with. The
+                results are exported in the same order as the families list,
+                regardless of how many processes are used.
+        """
+        
+        # close the output after the last family, or if anything fails, so
+        # that the buffered output still gets written
+        try:
+            if jobs <= 1:
+                # tabix-indexed VCFs are loaded on processes forked for each
+                # proband, so only export on a thread if there are no gene
+                # workers
+                if use_worker_pool(self.gene_jobs):
+                    self.start_gene_pool()
+                else:
+                    self.start_writer()
+                for family in families:
+                    self.filter_trio(family)
+            else:
+                self.filter_families_parallel(families, jobs)
+        except:
+            self.close_gene_pool(failed=True)
+            raise
+        finally:
+            self.close_gene_pool()
+            writer, self.writer = self.writer, None
+            if writer is not None:
+                writer.close()
+                self.metrics.update(writer.metrics)
+            self.reporter.close()
+        
+        if self.attrition_path is not None:
+            self.attrition.write(self.attrition_path)
+        
+        if self.metrics_path is not None:
+            self.metrics.write(self.metrics_path)
+        
+        if self.profile_dir is not None:
+            probands = [ y.get_id() for x in families for y in x.children
+                if y.is_affected() ]
+            paths = [ get_profile_prefix(self.profile_dir, x) + ".pstats"
+                for x in probands ]
+            merge_profiles(paths, get_profile_prefix(self.profile_dir, "_aggregate"))
+    
+    def start_writer(self):
+        """ start exporting the results on a background thread, if requested
+        
+        Worker processes are forked from this process, and a fork copies any
+        locks held by the export thread (e.g. for logging) without the thread
+        to release them, which can deadlock the worker. So the thread is only
+        started once the workers exist.
+        """
+        
+        if self.export_queue > 0:
+            self.writer = ReportWriter(self.reporter, self.export_queue)
+    
+    def start_gene_pool(self):
+        """ start the processes to check the genes of each proband on
+        
+        The pool is shared by every proband in the run, and the variants for
+        each gene are sent to the workers as tasks, rather than forking new
+        workers for each proband.
+        """
+        
+        if use_worker_pool(self.gene_jobs):
+            self.gene_pool = multiprocessing.Pool(self.gene_jobs,
+                initializer=_set_worker_filter, initargs=(self, ))
+    
+    def close_gene_pool(self, failed=False):
+        """ stop the processes for checking genes, if they were started
+        
+        Args:
+            failed: whether to stop the workers without waiting for their tasks
+                to finish e.g. if the run failed.
+        """
+        
+        pool, self.gene_pool = self.gene_pool, None
+        if pool is None:
+            return
+        
+        if failed:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+    
+    def filter_families_parallel(self, families, jobs):
+        """ screens families for candidate variants on a pool of processes
+        
+        The families are queued largest first within windows of LOOKAHEAD
+        families per job, and each worker takes the next family as soon as it
+        finishes one, so that a large family doesn't start last and hold up
+        the end of the run. The results are exported in the order of the
+        families list, and families only start within the window of the next
+        family to export, so that the export (and flushing) keeps up with the
+        analysis, rather than waiting on results held for the whole run.
+        
+        Args:
+            families: list of Family objects
+            jobs: number of processes to analyse the families with.
+        """
+        
+        # count the affected children ahead of each family, so the progress
+        # logged by the workers matches the serial runs
+        counts = []
+        count = self.count
+        for family in families:
+            counts.append(count)
+            count += sum([ x.is_affected() for x in family.children ])
+        
+        window = LOOKAHEAD * jobs
+        queued = [ (x, counts[x], families[x])
+            for x in order_by_cost(families, window) ]
+        
+        # the variants are loaded in the workers, but exported here, so the
+        # variant classes need the same parameters here, e.g. for the MAX_MAF
+        set_variant_parameters(self.known_genes, self.last_base,
+            self.populations, self.debug_chrom, self.debug_pos)
+        
+        pool = multiprocessing.Pool(jobs, initializer=_set_worker_filter,
+            initargs=(self, ))
+        try:
+            self.start_writer()
+            finished = imap_ordered(pool, _analyse_family, queued, window)
+            for results, attrition, metrics in finished:
+                self.attrition.update(attrition)
+                self.metrics.update(metrics)
+                for family, found_vars in results:
+                    self.export_data(found_vars, family)
+        except:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+        
+        self.count = count
     
     def filter_trio(self, family):
         """ loads trio variants, and screens for candidate variants
         """
         
+        results, attrition, metrics = self.run_family(family)
+        self.attrition.update(attrition)
+        self.metrics.update(metrics)
+        
+        for family, found_vars in results:
+            self.export_data(found_vars, family)
+    
+    def run_family(self, family):
+        """ analyse a family, retrying if the analysis fails
+        
+        Each attempt analyses a fresh copy of the family, with fresh counts of
+        the filtering stages and timings, so a failed attempt doesn't affect
+        the results.
+        
+        Args:
+            family: Family object
+        
+        Returns:
+            tuple of (results, attrition, metrics), where results is a list of
+            (Family, variants) tuples, as per analyse_family(), attrition is an
+            Attrition object with the counts for the family, and metrics is a
+            Metrics object with the stage timings for the family.
+        """
+        
+        count, attrition, metrics = self.count, self.attrition, self.metrics
+        try:
+            attempt = 0
+            while True:
+                self.count = count
+                self.attrition, self.metrics = Attrition(), Metrics()
+                try:
+                    results = self.analyse_family(copy.deepcopy(family))
+                    return results, self.attrition, self.metrics
+                except Exception:
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise
+                    logging.exception("analysing family {} failed, retrying "
+                        "({} of {})".format(family.family_id, attempt, self.retries))
+        finally:
+            self.attrition, self.metrics = attrition, metrics
+    
+    def export_data(self, variants, family):
+        """ exports the candidate variants for a proband, timing the export
+        
+        Args:
+            variants: list of candidate variants, as per analyse_trio()
+            family: Family object, with the child set to the proband.
+        """
+        
+        # export on the background thread if running, which times the export
+        if self.writer is not None:
+            self.writer.export_data(variants, family)
+            return
+        
+        # export the results to either tab-separated table or VCF format
+        pop_stages()
+        self.reporter.export_data(variants, family)
+        self.metrics.add(family.child.get_id(), pop_stages())
+    
+    def analyse_family(self, family):
+        """ finds candidate variants for each affected child in a family
+        
+        Args:
+            family: Family object
+        
+        Returns:
+            list of (Family, variants) tuples, one per affected child, where
+            the child of each Family is set to the affected child, and the
+            variants are as per analyse_trio().
+        """
+        
         # some families have more than one child in the family, so run
         # through each child.
+        results = []
         family.set_child()
         while family.child is not None:
             if family.child.is_affected():
                 self.count += 1
                 logging.info("opening trio {} of {}".format(self.count, self.total))
                 
-                found_vars = self.analyse_trio(family)
-                # export the results to either tab-separated table or VCF format
-                self.reporter.export_data(found_vars, family)
+                # discard any counts from outside analysing the proband
+                pop_counts()
+                pop_stages()
+                if self.profile_dir is not None:
+                    prefix = get_profile_prefix(self.profile_dir,
+                        family.child.get_id())
+                    found_vars = profile_call(prefix, self.analyse_trio, family)
+                else:
+                    found_vars = self.analyse_trio(family)
+                self.attrition.add(family.child.get_id(), pop_counts())
+                self.metrics.add(family.child.get_id(), pop_stages())
+                results.append((copy.copy(family), found_vars))
             
             family.set_child_examined()
+        
+        return results
     
     def analyse_trio(self, family):
         """identify candidate variants in exome data for a single trio.
@@ -113,23 +536,247 @@ class Filter(object):
             variants that pass inheritance and post-inheritance checks.
         """
         
-        variants = load_variants(family, self.pp_filter, self.populations,
-            self.known_genes, self.last_base, self.sum_x_lr2, self.debug_chrom, self.debug_pos)
-        
-        # organise variants by gene, then find variants that fit different
-        # inheritance models. We have to flatten the list of variant lists
-        genes = self.create_gene_dict(variants)
-        variants = [ self.find_variants(genes[x], x, family) for x in genes ]
-        variants = [ x for sublist in variants for x in sublist ]
+        # only tabix-indexed VCFs can be loaded by region
+        regions = None
+        indexed = is_trio_indexed(family)
+        if indexed:
+            regions = self.target_regions
+        elif self.regions_required:
+            msg = "tabix-indexed VCFs are required to load regions for " \
+                "{}".format(family.child.get_id())
+            logging.error(msg)
+            raise OSError(msg)
+        
+        if self.shard_size is not None and indexed and regions is None:
+            variants = self.analyse_shards(family)
+        else:
+            variants = load_variants(family, self.pp_filter, self.populations,
+                self.known_genes, self.last_base, self.sum_x_lr2,
+                self.debug_chrom, self.debug_pos, self.gene_jobs, regions,
+                self.scan_cnvs, self.cnv_sidecar_dir)
+            
+            # organise variants by gene, then find variants that fit different
+            # inheritance models. We have to flatten the list of variant lists
+            count_variants("inheritance", "checked", len(variants))
+            with StageTimer("inheritance", len(variants)) as timer:
+                variants = self.find_candidates(variants, family)
+                timer.records_out = len(variants)
 
         # remove any duplicate variants (which might ocur due to CNVs being
         # checked against all the genes that they encompass)
         variants = self.exclude_duplicates(variants)
+        count_variants("inheritance", "passed all", len(variants))
         
         # apply some final filters to the flagged variants
         post_filter = PostInheritanceFilter(family, self.debug_chrom, self.debug_pos)
+        with StageTimer("post_inheritance", len(variants)) as timer:
+            variants = post_filter.filter_variants(variants)
+            timer.records_out = len(variants)
+        
+        return variants
+    
+    def analyse_shards(self, family):
+        """ finds variants that fit inheritance models, one chromosome at a time
         
-        return post_filter.filter_variants(variants)
+        The VCFs are loaded in shards, and the variants for each chromosome
+        are checked as soon as the chromosome has been loaded, so that only
+        the candidate variants are retained from earlier chromosomes.
+        
+        Args:
+            family: Family object, where the trio VCFs are tabix-indexed.
+        
+        Returns:
+            list of variants that pass inheritance checks
+        """
+        
+        candidates = []
+        for chrom, variants in load_variants_by_shard(family, self.pp_filter,
+                self.populations, self.known_genes, self.last_base,
+                self.sum_x_lr2, self.debug_chrom, self.debug_pos,
+                self.shard_size, self.gene_jobs):
+            logging.info("{}\tchrom {}\tvariants: {}".format(
+                family.child.get_id(), chrom, len(variants)))
+            # the genes are checked in this process, since the shards are
+            # still loading in the worker processes
+            count_variants("inheritance", "checked", len(variants))
+            with StageTimer("inheritance", len(variants)) as timer:
+                found = self.find_candidates(variants, family, jobs=1)
+                timer.records_out = len(found)
+            candidates += found
+        
+        return candidates
+    
+    def find_candidates(self, variants, family, jobs=None):
+        """ finds variants that fit inheritance models, gene by gene
+        
+        When the genes are checked in this process, the genes are streamed
+        from the variants, so the variants are freed as their genes are
+        checked. Genes are only complete at the end of each chromosome (see
+        group_by_gene()), so the grouped variants for every gene on the
+        current chromosome are held at once.
+        
+        Args:
+            variants: list of TrioGenotypes objects. When the genes are
+                checked in this process, the list is sorted by position in
+                place, and then emptied as the genes are grouped, so that the
+                variants can be freed as they are checked. Pass a copy if the
+                caller still needs the variants.
+            family: Family object
+            jobs: number of processes to use, or None to use the gene_jobs
+                for the Filter.
+        
+        Returns:
+            list of variants that pass inheritance checks, which can include
+            duplicates for variants in multiple genes.
+        """
+        
+        if jobs is None:
+            jobs = self.gene_jobs
+        
+        if use_worker_pool(jobs):
+            genes = self.create_gene_dict(variants)
+            found = self.find_gene_variants(genes, family, jobs)
+            return [ x for sublist in found for x in sublist ]
+        
+        sort_by_position(variants)
+        return list(self.stream_gene_variants(consume(variants), family))
+    
+    def stream_gene_variants(self, variants, family):
+        """ finds variants that fit inheritance models, as each gene is grouped
+        
+        Args:
+            variants: iterable of TrioGenotypes objects, sorted by position
+                within each chromosome.
+            family: Family object
+        
+        Yields:
+            variants that pass inheritance checks
+        """
+        
+        # CNVs are checked against every gene they span, so share the CNV
+        # checks which don't depend on the gene between the genes.
+        cnv_cache = {}
+        for gene, group in self.group_by_gene(variants):
+            for candidate in self.find_variants(group, gene, family, cnv_cache):
+                yield candidate
+    
+    def group_by_gene(self, variants):
+        """ groups variants by gene, yielding each gene once it is complete
+        
+        This is a streaming alternative to create_gene_dict(). A gene is
+        complete once the variants move to another chromosome. Genes aren't
+        closed at the coordinates in the known genes file, since variants can
+        be annotated to a gene well outside those coordinates (e.g. differing
+        transcripts), and compound hets would be lost if a gene's variants
+        were split across groups. Variants which can't be
+        candidates in a gene are dropped from that gene as they are grouped,
+        as per get_gene_finder(), so only variants that might be reported are
+        held until their gene is complete.
+        
+        Args:
+            variants: iterable of TrioGenotypes objects, sorted by position
+                within each chromosome.
+        
+        Yields:
+            (gene, variants) tuples, with the list of TrioGenotypes for the gene.
+        """
+        
+        genes = OrderedDict()
+        chrom = None
+        for var in variants:
+            if var.get_chrom() != chrom:
+                chrom = var.get_chrom()
+                for gene in genes:
+                    yield gene, genes[gene]
+                genes = OrderedDict()
+            
+            for gene_list in var.get_genes():
+                for gene in gene_list:
+                    # intergenic variants are only checked for debugging
+                    if gene is None:
+                        yield gene, [var]
+                        continue
+                    
+                    if not self.is_gene_candidate(var, gene):
+                        continue
+                    
+                    if gene not in genes:
+                        genes[gene] = []
+                    
+                    # variants can be listed under the same gene for multiple
+                    # alleles, but create_gene_dict() includes those too
+                    genes[gene].append(var)
+        
+        for gene in genes:
+            yield gene, genes[gene]
+    
+    def is_gene_candidate(self, var, gene):
+        """ checks if a variant needs checking for inheritance within a gene
+        
+        Args:
+            var: TrioGenotypes object
+            gene: gene ID as string
+        
+        Returns:
+            True/False for whether the variant has a functional consequence in
+            the gene, and is in a known gene (or is a CNV), if we have known
+            genes.
+        """
+        
+        # CNVs can be included purely from size thresholds, regardless of
+        # which gene they overlap, so aren't restricted to the known genes.
+        if self.known_genes is not None and gene not in self.known_genes \
+                and not var.is_cnv():
+            return False
+        
+        return var.child.is_lof(gene) or \
+            var.child.is_missense(var.child.is_cnv(), gene)
+    
+    def find_gene_variants(self, genes, family, jobs=None):
+        """ finds variants that fit inheritance models, for each gene in turn
+        
+        The genes are optionally split across a pool of processes, using the
+        pool for the run if it has been started. The results are returned in
+        the same order as the genes dictionary, regardless of how many
+        processes are used.
+        
+        Args:
+            genes: dictionary of variants indexed by gene, as per
+                create_gene_dict()
+            family: Family object
+            jobs: number of processes to use, or None to use the gene_jobs
+                for the Filter.
+        
+        Returns:
+            list of lists of variants that pass inheritance checks, one per gene
+        """
+        
+        if jobs is None:
+            jobs = self.gene_jobs
+        
+        if not use_worker_pool(jobs):
+            # CNVs are checked against every gene they span, so share the CNV
+            # checks which don't depend on the gene between the genes.
+            cnv_cache = {}
+            return [ self.find_variants(genes[x], x, family, cnv_cache) for x in genes ]
+        
+        jobs_list = [ (x, genes[x], family) for x in genes ]
+        if self.gene_pool is not None and jobs == self.gene_jobs:
+            return self.gene_pool.map(_find_gene_variants, jobs_list)
+        
+        pool = multiprocessing.Pool(jobs, initializer=_set_worker_filter,
+            initargs=(self, ))
+        try:
+            variants = pool.map(_find_gene_variants, jobs_list)
+        except:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+        
+        return variants
     
     def create_gene_dict(self, variants):
         """creates dictionary of variants indexed by gene
@@ -155,17 +802,39 @@ class Filter(object):
         
         return genes
         
-    def find_variants(self, variants, gene, family):
+    def find_variants(self, variants, gene, family, cnv_cache=None):
         """ finds variants that fit inheritance models
         
         Args:
             variants: list of TrioGenotype objects
             gene: gene ID as string
+            family: Family object
+            cnv_cache: dictionary of CNV checks shared between genes, or None
         
         Returns:
             list of variants that pass inheritance checks
         """
         
+        finder = self.get_gene_finder(variants, gene, family, cnv_cache)
+        if finder is None:
+            return []
+        
+        return finder.get_candidate_variants()
+    
+    def get_gene_finder(self, variants, gene, family, cnv_cache=None):
+        """ sets up the inheritance checks for the variants in a gene
+        
+        Args:
+            variants: list of TrioGenotype objects
+            gene: gene ID as string
+            family: Family object
+            cnv_cache: dictionary of CNV checks shared between genes, or None
+        
+        Returns:
+            Autosomal or Allosomal object for the gene, or None if none of the
+            variants need checking in the gene.
+        """
+        
         # get the inheritance for the gene (monoalleleic, biallelic, hemizygous
         # etc), but allow for times when we haven't specified a list of genes
         # to use
@@ -189,13 +858,13 @@ class Filter(object):
             for var in variants:
                 if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
                     print(var, "lacks HGNC/gene symbol")
-            return []
+            return None
         
         # Now that we are examining a single gene, check that the consequences
         # for the gene are in the required functional categories.
-        variants = [ var for var in variants if var.child.is_lof(gene) or var.child.is_missense(var.child.is_cnv(), gene) ]
+        variants = [ var for var in variants if self.is_gene_candidate(var, gene) ]
         if variants == []:
-            return []
+            return None
         
         for x in variants[0].child.info.symbols:
             try:
@@ -207,11 +876,13 @@ class Filter(object):
             family.child.get_id(), symbol, [str(x) for x in variants], gene_inh))
         
         if chrom_inheritance == "autosomal":
-            finder = Autosomal(variants, family, known_gene, gene, self.cnv_regions)
+            finder = Autosomal(variants, family, known_gene, gene,
+                self.cnv_regions, cnv_cache)
         elif chrom_inheritance in ["XChrMale", "XChrFemale", "YChrMale"]:
-            finder = Allosomal(variants, family, known_gene, gene, self.cnv_regions)
+            finder = Allosomal(variants, family, known_gene, gene,
+                self.cnv_regions, cnv_cache)
         
-        return finder.get_candidate_variants()
+        return finder
     
     def exclude_duplicates(self, variants):
         """ rejig variants included under multiple inheritance mechanisms
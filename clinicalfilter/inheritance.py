@@ -28,7 +28,8 @@ class Inheritance(object):
     chromosome that the variant/s are in.
     """
     
-    def __init__(self, variants, trio, known_gene, gene, cnv_regions=None):
+    def __init__(self, variants, trio, known_gene, gene, cnv_regions=None,
+            cnv_cache=None):
         """ intialise the class with the variants and trio information
         
         We have an affected child, with two parents who may or may not be
@@ -49,6 +50,8 @@ class Inheritance(object):
             gene: symbol for gene (e.g. "ARID1B")
             cnv_regions: a list of (chrom, start, end, copy_number) tuples of
                 genomic regions known to be involved in CNV syndromes.
+            cnv_cache: dictionary for reusing CNV checks across the genes
+                that a CNV spans, or None to only reuse checks within the gene.
         """
         
         self.variants = variants
@@ -57,6 +60,17 @@ class Inheritance(object):
         self.gene = gene
         self.cnv_regions = cnv_regions
         
+        if cnv_cache is None:
+            cnv_cache = {}
+        self.cnv_cache = cnv_cache
+        self.cnv_checker = CNVInheritance(self.trio, self.known_gene, self.gene,
+            self.cnv_regions, self.cnv_cache)
+        
+        # the outcome of the most recent check for each variant, indexed by
+        # variant key, so we can explain why variants failed
+        self.log_string = None
+        self.log_strings = {}
+        
         self.father_affected = None
         self.mother_affected = None
         if self.trio.has_parents():
@@ -110,6 +124,7 @@ class Inheritance(object):
             
             logging.info("{} {}:{} {}".format(self.trio.child.get_id(),
                 variant.get_chrom(), variant.get_position(), self.log_string))
+            self.log_strings[variant.child.get_key()] = self.log_string
         
         variants = candidates + self.check_compound_hets(compound_hets)
         
@@ -161,9 +176,14 @@ class Inheritance(object):
         """
         
         if variant.is_cnv():
-            cnv_checker = CNVInheritance(self.trio, self.known_gene, self.gene, self.cnv_regions)
-            check = cnv_checker.check_single_inheritance(variant)
-            self.log_string = cnv_checker.log_string
+            # the CNV check does not depend on the inheritance mode, so only
+            # check each CNV once per gene
+            key = ("verdict", self.gene, variant.child.get_key())
+            if key not in self.cnv_cache:
+                check = self.cnv_checker.check_single_inheritance(variant)
+                self.cnv_cache[key] = (check, self.cnv_checker.log_string)
+            
+            check, self.log_string = self.cnv_cache[key]
             return check
         
         if not self.trio.has_parents():
@@ -300,9 +320,11 @@ class Inheritance(object):
 
 class Autosomal(Inheritance):
     
-    def __init__(self, variants, trio, known_genes, gene, cnv_regions=None):
+    def __init__(self, variants, trio, known_genes, gene, cnv_regions=None,
+            cnv_cache=None):
         
-        super(Autosomal, self).__init__(variants, trio, known_genes, gene, cnv_regions)
+        super(Autosomal, self).__init__(variants, trio, known_genes, gene,
+            cnv_regions, cnv_cache)
         
         self.inheritance_modes = set(["Monoallelic", "Biallelic", "Both", 'Imprinted', 'Mosaic'])
     
@@ -401,9 +423,11 @@ class Autosomal(Inheritance):
 
 class Allosomal(Inheritance):
     
-    def __init__(self, variants, trio, known_genes, gene, cnv_regions=None):
+    def __init__(self, variants, trio, known_genes, gene, cnv_regions=None,
+            cnv_cache=None):
         
-        super(Allosomal, self).__init__(variants, trio, known_genes, gene, cnv_regions)
+        super(Allosomal, self).__init__(variants, trio, known_genes, gene,
+            cnv_regions, cnv_cache)
         
         self.inheritance_modes = set(["X-linked dominant", "Hemizygous", \
             "Monoallelic", "X-linked over-dominance"])
@@ -504,18 +528,52 @@ class Allosomal(Inheritance):
 
 class CNVInheritance(object):
     
-    def __init__(self, trio, known_gene, gene, cnv_regions):
+    def __init__(self, trio, known_gene, gene, cnv_regions, cache=None):
         """ intialise the class
         
         Args:
             trio: family trio object
             known_genes: dictionary of known genes, currently the DDG2P set
+            gene: gene ID for the known gene
+            cnv_regions: dictionary of DECIPHER syndrome regions, or None
+            cache: dictionary for storing the results of checks which do not
+                depend on the gene (CNV length, syndrome region overlap and
+                parental affected status), so these are only run once per CNV.
+                Use None to run the checks every time.
         """
         
         self.trio = trio
         self.known_gene = known_gene
         self.gene = gene
         self.cnv_regions = cnv_regions
+        self.cache = cache
+        self.log_string = None
+    
+    def cached_check(self, name, variant, check):
+        """ run a gene-independent check for a CNV, reusing earlier results
+        
+        Args:
+            name: name for the check
+            variant: TrioGenotypes object for the CNV.
+            check: function to run on the variant
+        
+        Returns:
+            the result of the check
+        """
+        
+        if self.cache is None:
+            return check(variant)
+        
+        key = (name, variant.child.get_key())
+        previous = self.log_string
+        if key not in self.cache:
+            self.log_string = None
+            self.cache[key] = (check(variant), self.log_string)
+        
+        value, log_string = self.cache[key]
+        self.log_string = log_string if log_string is not None else previous
+        
+        return value
     
     def check_single_inheritance(self, variant):
         """ checks if a CNV could be causal by itself
@@ -533,18 +591,20 @@ class CNVInheritance(object):
         
         # check that the inheritance status is consistent with the parental
         # affected status
-        if not self.inheritance_matches_parental_affected_status(variant):
+        if not self.cached_check('parental_status', variant,
+                self.inheritance_matches_parental_affected_status):
             if self.check_compound_inheritance(variant):
                 self.log_string = "possible compound het CNV"
                 return "compound_het"
             self.log_string = "not consistent with parental affected status"
             return "nothing"
         
-        if self.passes_nonddg2p_filter(variant):
+        if self.cached_check('nonddg2p', variant, self.passes_nonddg2p_filter):
             return "single_variant"
         elif self.known_gene is not None and self.passes_ddg2p_filter(variant):
             return "single_variant"
-        elif self.cnv_regions is not None and self.check_cnv_region_overlap(variant, self.cnv_regions):
+        elif self.cnv_regions is not None and self.cached_check('syndrome',
+                variant, self.check_syndrome_regions):
             return "single_variant"
         
         if self.check_compound_inheritance(variant):
@@ -597,7 +657,7 @@ class CNVInheritance(object):
         # for compound hets, we don't have to worry about checking whether the
         # inheritance ststaus is consistent with the parental affected status
         # and in fact, most compound hets would not have affected parents
-        if self.passes_nonddg2p_filter(variant):
+        if self.cached_check('nonddg2p', variant, self.passes_nonddg2p_filter):
             return True
         
         # now check the DDG2P genes. We only want CNVs in genes with Biallelic
@@ -622,7 +682,7 @@ class CNVInheritance(object):
             variant: TrioGenotypes object for the CNV.
         """
         
-        if self.passes_nonddg2p_filter(variant):
+        if self.cached_check('nonddg2p', variant, self.passes_nonddg2p_filter):
             return "single_variant"
         elif self.known_gene is not None and self.passes_ddg2p_filter(variant):
             return "single_variant"
@@ -726,6 +786,26 @@ class CNVInheritance(object):
         
         return False
     
+    def get_gene_range(self, variant):
+        """ get the start and end of the current gene
+        
+        CNVs loaded against the known genes carry the coordinates of the genes
+        they overlap, from the known genes interval index, so use those where
+        available.
+        
+        Args:
+            variant: TrioGenotypes object for the CNV.
+        
+        Returns:
+            (start, end) tuple for the gene
+        """
+        
+        ranges = variant.child.known_gene_ranges
+        if ranges is not None and self.gene in ranges:
+            return ranges[self.gene]
+        
+        return (self.known_gene["start"], self.known_gene["end"])
+    
     def passes_gene_inheritance(self, variant, inh):
         """ create CNV filter values dependent on DDG2P inheritance mode
         
@@ -765,10 +845,11 @@ class CNVInheritance(object):
         # mechanism is loss of function, since these whole-gene duplications
         # won't disrupt the gene.
         start, end = variant.get_range()
+        gene_start, gene_end = self.get_gene_range(variant)
         surrounding_disruptive_dup = variant.child.genotype == "DUP" and \
             "Loss of function" in self.known_gene["inh"][inh] and \
             inh in ["Monoallelic", "Hemizygous", "X-linked dominant"] and \
-            start < self.known_gene["start"] and end > self.known_gene["end"]
+            start < gene_start and end > gene_end
         
         return variant.get_chrom() in chroms and \
             variant.child.info["CNS"] in copies and \
@@ -797,13 +878,20 @@ class CNVInheritance(object):
         
         # find the CNV start and end, as well as the gene start and end
         cnv_start, cnv_end = variant.get_range()
-        
-        gene_start = self.known_gene["start"]
-        gene_end = self.known_gene["end"]
+        gene_start, gene_end = self.get_gene_range(variant)
         
         # check if any part of the gene is outside the CNV boundaries
         return gene_start < cnv_start or gene_end > cnv_end
     
+    def check_syndrome_regions(self, variant):
+        """ checks if a CNV overlaps any of the DECIPHER syndrome regions
+        
+        Args:
+            variant: TrioGenotypes object for the CNV.
+        """
+        
+        return self.check_cnv_region_overlap(variant, self.cnv_regions)
+    
     def check_cnv_region_overlap(self, variant, cnv_regions):
         """ finds CNVs that overlap DECIPHER syndrome regions
         
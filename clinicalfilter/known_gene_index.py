@@ -0,0 +1,97 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+from bisect import bisect_left, bisect_right
+
+class KnownGeneIndex(object):
+    """ per-chromosome interval index over the known genes, so we can find the
+    genes that a CNV overlaps without checking every gene.
+    """
+    
+    def __init__(self, known_genes):
+        """ build the index from the known genes dictionary
+        
+        Args:
+            known_genes: dictionary of known genes (from open_known_genes()),
+                indexed by HGNC ID, where each entry includes the chrom, start
+                and end for the gene.
+        """
+        
+        self.known_genes = known_genes
+        
+        intervals = {}
+        for hgnc_id, gene in known_genes.items():
+            # skip entries without coordinates, these cannot overlap anything
+            if "chrom" not in gene or "start" not in gene or "end" not in gene:
+                continue
+            
+            chrom = gene["chrom"]
+            if chrom not in intervals:
+                intervals[chrom] = []
+            intervals[chrom].append((gene["start"], gene["end"], hgnc_id))
+        
+        # genes are sorted by start position, so we can bisect to the genes
+        # that start before a region ends. The longest gene on each chromosome
+        # limits how far back we need to look for genes that started earlier.
+        self.intervals = {}
+        self.starts = {}
+        self.max_length = {}
+        for chrom in intervals:
+            genes = sorted(intervals[chrom])
+            self.intervals[chrom] = genes
+            self.starts[chrom] = [ x[0] for x in genes ]
+            self.max_length[chrom] = max([ end - start for start, end, _ in genes ])
+    
+    def indexes(self, known_genes):
+        """ check whether the index was built from a known genes dictionary
+        """
+        
+        return self.known_genes is known_genes
+    
+    def overlapping(self, chrom, start, end):
+        """ find the known genes that overlap a chromosome region
+        
+        Args:
+            chrom: chromosome string e.g. "1", or "X"
+            start: start position of the region
+            end: end position of the region
+        
+        Returns:
+            dictionary of (start, end) gene coordinates, indexed by HGNC ID, for
+            genes which overlap the region.
+        """
+        
+        if chrom not in self.intervals:
+            return {}
+        
+        genes = self.intervals[chrom]
+        starts = self.starts[chrom]
+        
+        first = bisect_left(starts, start - self.max_length[chrom])
+        last = bisect_right(starts, end)
+        
+        overlaps = {}
+        for gene_start, gene_end, hgnc_id in genes[first:last]:
+            if start <= gene_end and end >= gene_start:
+                overlaps[hgnc_id] = (gene_start, gene_end)
+        
+        return overlaps
@@ -159,6 +159,33 @@ def open_cnv_regions(path):
     
     return cnv_regions
 
+def open_target_regions(path):
+    """ opens a BED file of regions to restrict the analysis to
+    
+    Args:
+        path: path to BED file, or None
+    
+    Returns:
+        list of (chrom, start, end) tuples, converted from the 0-based
+        half-open BED coordinates to 1-based inclusive coordinates, or None if
+        the path is None.
+    """
+    
+    if path is None:
+        return None
+    
+    regions = []
+    with open(path) as handle:
+        for line in handle:
+            if line.startswith(("#", "track", "browser")) or line.strip() == "":
+                continue
+            
+            line = line.strip().split("\t")
+            chrom, start, end = line[0], int(line[1]), int(line[2])
+            regions.append((chrom, start + 1, end))
+    
+    return regions
+
 def open_last_base_sites(path):
     ''' open a set of sites at the last base of an exon which can potentially
     alter the consequence to a LoF consequence.
@@ -19,10 +19,51 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+import os
 import argparse
 
-def get_options():
+from clinicalfilter.reporting import FLUSH_INTERVAL, EXPORT_QUEUE, VCF_THREADS
+from clinicalfilter.filter import RETRIES, PP_DNM_THRESHOLD
+from clinicalfilter.schedulers import SCHEDULERS
+
+# population tags that can hold minor allele frequencies in the INFO field
+MAF_POPULATIONS = ["AFR_AF", "AMR_AF", "ASN_AF", "DDD_AF", "EAS_AF", "ESP_AF",
+    "EUR_AF", "MAX_AF", "SAS_AF", "UK10K_cohort_AF"]
+
+def add_variant_options(parser):
+    """ add the options for filtering variants, shared with explain_variants.py
+    
+    Args:
+        parser: ArgumentParser to add the options to. Check the parsed
+            arguments with check_variant_options().
+    """
+    
+    parser.add_argument("--pp-dnm-threshold", dest="pp_filter", type=float,
+        default=PP_DNM_THRESHOLD,
+        help="Set PP_DNM threshold for filtering de novos "
+            "(default={}).".format(PP_DNM_THRESHOLD))
+    parser.add_argument("--maf-populations", default=",".join(MAF_POPULATIONS),
+        help="Comma separated list of population tags that can exist in the "
+            "INFO field for population-specific minor allele frequencies")
+
+def check_variant_options(parser, args):
+    """ check the options for filtering variants, and split the populations
+    
+    Args:
+        parser: ArgumentParser with the options from add_variant_options().
+        args: parsed arguments, which get a populations list.
+    """
+    
+    if args.pp_filter < 0.0 or args.pp_filter > 1:
+        parser.error("--pp-dnm-threshold must be between 0 and 1")
+    
+    args.populations = args.maf_populations.split(',')
+
+def get_options(argv=None):
     """gets the options from the command line
+    
+    Args:
+        argv: list of command line arguments, or None to use sys.argv
     """
     
     parser = argparse.ArgumentParser(description="Filter VCFs for inherited"
@@ -52,8 +93,25 @@ def get_options():
             "analysis.")
     parser.add_argument("-o", "--output",
         help="Path for analysis output in tabular format.")
+    parser.add_argument("--output-db",
+        help="Path for an SQLite database of the candidates, the provenance "
+            "of each proband's VCFs, and details of the run.")
+    parser.add_argument("--output-columns",
+        help="Path to write the candidates to in a typed, columnar format. "
+            "This is an Arrow file if pyarrow is installed, otherwise a "
+            "directory of memory-mappable column files.")
+    parser.add_argument("--flush-interval", type=int, default=FLUSH_INTERVAL,
+        help="Number of probands to export between flushing the tabular "
+            "output to disk (default={}).".format(FLUSH_INTERVAL))
+    parser.add_argument("--export-queue", type=int, default=EXPORT_QUEUE,
+        help="Number of probands that can wait to be exported on a "
+            "background thread, or 0 to export on the main thread "
+            "(default={}).".format(EXPORT_QUEUE))
     parser.add_argument("--export-vcf",
         help="Directory or file path for analysis output in VCF format.")
+    parser.add_argument("--vcf-threads", type=int, default=VCF_THREADS,
+        help="Number of threads to compress the exported VCFs with "
+            "(default={}).".format(VCF_THREADS))
     parser.add_argument("--log", dest="loglevel", default="debug",
         help="Level of logging to use, choose from: debug, info, warning,"
             "error or critical.")
@@ -66,22 +124,57 @@ def get_options():
             "potentially LoF sites.")
     
     # New argument added by PJ to allow DNM_PP filtering to be disabled.
-    parser.add_argument("--pp-dnm-threshold", dest="pp_filter", type=float,
-        default=0.0,
-        help="Set PP_DNM threshold for filtering (defaults to >=0.9)")
-    parser.add_argument("--maf-populations",
-        default="AFR_AF,AMR_AF,ASN_AF,DDD_AF,EAS_AF,ESP_AF,EUR_AF,MAX_AF,"
-            "SAS_AF,UK10K_cohort_AF",
-        help="Comma separated list of population tags that can exist in the "
-            "INFO field for population-specific minor allele frequencies")
-
+    add_variant_options(parser)
+    
+    parser.add_argument("--jobs", "--workers", dest="jobs", type=int, default=1,
+        help="Number of processes to analyse families with (default=1).")
+    parser.add_argument("--retries", type=int, default=RETRIES,
+        help="Number of times to retry analysing a family if the analysis "
+            "fails (default={}).".format(RETRIES))
+    parser.add_argument("--gene-jobs", type=int, default=1,
+        help="Number of processes to load and analyse the variants of each "
+            "proband with, split by chromosome and by gene (default=1).")
+    parser.add_argument("--shard-size", type=int,
+        help="Load tabix-indexed VCFs in regions of this many base-pairs, or "
+            "0 for whole chromosomes, to limit the memory for large VCFs.")
+    parser.add_argument("--panel", default=False, action="store_true",
+        help="Only load the regions around the known genes from tabix-indexed "
+            "VCFs, along with every CNV. The CNVs are read from a sidecar VCF "
+            "of each childs CNVs (e.g. sample.cnv.vcf.gz), built beforehand "
+            "with the build-cnv-sidecars subcommand, otherwise the whole VCF "
+            "is scanned for CNVs. Requires --known-genes.")
+    parser.add_argument("--cnv-sidecar-dir",
+        help="Folder of the sidecar VCFs of CNVs for --panel (default=beside "
+            "each childs VCF).")
+    parser.add_argument("--regions", dest="target_regions",
+        help="Path to BED file of regions to restrict the analysis to. Only "
+            "these regions are loaded, so the VCFs must be tabix-indexed.")
+    parser.add_argument("--profile", dest="profile_dir",
+        help="Folder to write profiles of each proband's analysis to, as "
+            "pstats and collapsed stacks (for flame graphs), plus an "
+            "aggregate profile across the run.")
+    
     #new argument added by re3 to require a file of sums of log2 ratio on X chromosome for CNV filtering
     parser.add_argument("--sum_x_lr2_file", help="Path to file containing the sum of lr2 on x chromosome for each sample")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    if args.pp_filter < 0.0 or args.pp_filter > 1:
-        argparse.ArgumentParser.error("--pp-dnm-threshold must be between 0 and 1")
+    check_variant_options(parser, args)
+    
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    
+    if args.gene_jobs < 1:
+        parser.error("--gene-jobs must be at least 1")
+    
+    if args.retries < 0:
+        parser.error("--retries must not be negative")
+    
+    if args.shard_size is not None and args.shard_size < 0:
+        parser.error("--shard-size must not be negative")
+    
+    if args.panel and args.known_genes is None:
+        parser.error("--panel requires --known-genes")
     
     if args.child is not None:
         if args.father is not None and args.dad_aff is None:
@@ -91,7 +184,96 @@ def get_options():
 
     if args.sum_x_lr2_file is None:
         argparse.ArgumentParser.error("--sum_x_lr2_file must be used")
-
-    args.populations = args.maf_populations.split(',')
     
     return args
+
+def get_submit_options(argv=None):
+    """ gets the options for submitting a run to a cluster scheduler
+    
+    Args:
+        argv: list of command line arguments, or None to use sys.argv
+    
+    Returns:
+        tuple of (args, run_args), where run_args is a list of the remaining
+        arguments, which are passed on to the run for each shard.
+    """
+    
+    parser = argparse.ArgumentParser(description="Submit the analysis of the "
+        "families in a PED file to a cluster, split across a job array. Other "
+        "options are passed on to the analysis of each shard.")
+    parser.add_argument("--ped", required=True,
+        help="Path to ped file containing cohort details for multiple trios.")
+    parser.add_argument("-o", "--output", required=True,
+        help="Path for the merged output in tabular format.")
+    parser.add_argument("--scheduler", default="lsf",
+        help="Scheduler to submit to, one of {}, or the import path of a "
+            "plugin, as module:Class (default=lsf).".format(", ".join(sorted(SCHEDULERS))))
+    parser.add_argument("--shards", type=int, default=100,
+        help="Number of jobs to split the families across (default=100).")
+    parser.add_argument("--queue", help="Queue (or partition) to submit to.")
+    parser.add_argument("--memory", type=int,
+        help="Memory to request for each job, in megabytes.")
+    parser.add_argument("--tempdir",
+        help="Folder for the files for each shard, which is removed after "
+            "merging (default=a new folder next to the output).")
+    
+    args, run_args = parser.parse_known_args(argv)
+    
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    
+    # every shard would write to the same path for these outputs, and only the
+    # tabular output (plus the logs, attrition and metrics) is merged
+    shared = argparse.ArgumentParser(add_help=False)
+    for option in ["--output-db", "--output-columns", "--export-vcf"]:
+        shared.add_argument(option)
+    outputs, _ = shared.parse_known_args(run_args)
+    
+    if outputs.output_db is not None or outputs.output_columns is not None:
+        parser.error("--output-db and --output-columns can't be used with "
+            "submit, since the shards would overwrite each other")
+    
+    if outputs.export_vcf is not None and not os.path.isdir(outputs.export_vcf):
+        parser.error("--export-vcf must be an existing folder with submit, "
+            "since the shards would overwrite a single VCF")
+    
+    return args, run_args
+
+def get_sidecar_options(argv=None):
+    """ gets the options for building sidecar VCFs of the CNVs in VCFs
+    
+    Args:
+        argv: list of command line arguments, or None to use sys.argv
+    """
+    
+    parser = argparse.ArgumentParser(description="Build sidecar VCFs of the "
+        "CNVs in the childs VCFs, so that runs with --panel don't have to scan "
+        "the whole VCFs for CNVs.")
+    parser.add_argument("--ped", required=True,
+        help="Path to ped file containing cohort details for multiple trios.")
+    parser.add_argument("--cnv-sidecar-dir",
+        help="Folder to write the sidecar VCFs to (default=beside each childs "
+            "VCF). Pass the same folder to the runs.")
+    
+    return parser.parse_args(argv)
+
+def get_merge_options(argv=None):
+    """ gets the options for merging the outputs from separate runs
+    
+    Args:
+        argv: list of command line arguments, or None to use sys.argv
+    """
+    
+    parser = argparse.ArgumentParser(description="Merge the tabular outputs "
+        "from separate runs, in order.")
+    parser.add_argument("-o", "--output", required=True,
+        help="Path for the merged output in tabular format.")
+    parser.add_argument("--logs", nargs="*", default=[],
+        help="Paths to log files to concatenate into OUTPUT.log")
+    parser.add_argument("--cleanup",
+        help="Folder to remove after merging, e.g. the temporary folder for "
+            "the runs.")
+    parser.add_argument("paths", nargs="+",
+        help="Paths to the tabular outputs to merge.")
+    
+    return parser.parse_args(argv)
@@ -19,7 +19,11 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+import os
 import logging
+import multiprocessing
+import itertools
+import re
 
 from clinicalfilter.variant.info import Info
 from clinicalfilter.variant.variant import Variant
@@ -27,11 +31,49 @@ from clinicalfilter.variant.snv import SNV
 from clinicalfilter.variant.cnv import CNV
 from clinicalfilter.trio_genotypes import TrioGenotypes
 from clinicalfilter.utils import open_vcf, get_vcf_header, exclude_header, \
-    construct_variant
+    construct_variant, is_indexed, get_vcf_contigs, query_vcf, \
+    starts_in_region, use_worker_pool
 from clinicalfilter.multinucleotide_variants import get_mnv_candidates
+from clinicalfilter.bgzf import BgzfWriter
+from clinicalfilter.attrition import count_variants, pop_counts, merge_counts
+from clinicalfilter.metrics import StageTimer, pop_stages, merge_stages
+
+def set_variant_parameters(known_genes, last_base, pops, debug_chrom=None,
+        debug_pos=None):
+    """ define several parameters of the variant classes, before initialisation
+    
+    Args:
+        known_genes: genes known to be involved with genetic disorders.
+        last_base: set of sites in genome at conserved last base of exons.
+        pops: list of populations who have minor allele frequencies in INFO
+        debug_chrom: chromosome string, for debugging variant filtering.
+        debug_pos: chromosome position, for debugging variant filtering.
+    """
+    
+    for Var in [SNV, CNV]:
+        Var.set_known_genes(known_genes)
+        Var.set_debug(debug_chrom, debug_pos)
+    
+    Info.set_last_base_sites(last_base)
+    Info.set_populations(pops)
+
+def _load_region(job):
+    """ load the trio variants for a region within a worker process
+    
+    Args:
+        job: (family, sum_x_lr2_proband, region) tuple, as per load_region()
+    
+    Returns:
+        tuple of (variants, counts, stages), with the list of TrioGenotypes
+        objects for the region, and the filtering counts and stage timings
+        from the worker.
+    """
+    
+    return load_region(*job), pop_counts(), pop_stages()
 
 def load_variants(family, pp_filter, pops, known_genes, last_base, sum_x_lr2,
-        debug_chrom=None, debug_pos=None):
+        debug_chrom=None, debug_pos=None, jobs=1, regions=None, scan_cnvs=True,
+        cnv_dir=None):
     """ loads the variants for a trio or singleton
     
     Args:
@@ -46,25 +88,31 @@ def load_variants(family, pp_filter, pops, known_genes, last_base, sum_x_lr2,
         debug_pos: chromosome position, to give more information about why
             a variant fails to pass the filters.
         sum_x_lr2: Sum of mean l2r on x chromosomes for all probands
+        jobs: number of processes to load the chromosomes of tabix-indexed
+            VCFs with.
+        regions: list of (chrom, start, end) tuples, to only load variants
+            from these regions of tabix-indexed VCFs, or None.
+        scan_cnvs: whether to get CNVs from the whole VCF when loading from
+            regions, rather than only the CNVs which overlap the regions.
+        cnv_dir: folder for the sidecar VCFs of CNVs, or None to use the
+            folder of each VCF.
     
     Returns:
         list of filtered variants for a trio, as TrioGenotypes objects
     """
     
-    # define several parameters of the variant classes, before initialisation
-    for Var in [SNV, CNV]:
-        Var.set_known_genes(known_genes)
-        Var.set_debug(debug_chrom, debug_pos)
-    
-    Info.set_last_base_sites(last_base)
-    Info.set_populations(pops)
+    set_variant_parameters(known_genes, last_base, pops, debug_chrom, debug_pos)
 
 #get sum of mean l2r for proband
     sum_x_lr2_proband = 0
     if family.child.person_id in sum_x_lr2.keys():
         sum_x_lr2_proband = sum_x_lr2[family.child.person_id]
     
-    variants = load_trio(family, sum_x_lr2_proband)
+    if regions is not None:
+        variants = load_targets(family, sum_x_lr2_proband, regions, scan_cnvs,
+            cnv_dir)
+    else:
+        variants = load_trio(family, sum_x_lr2_proband, jobs)
     
     return filter_de_novos(variants, pp_filter)
     
@@ -92,7 +140,8 @@ def include_variant(line, child_variants, gender, mnvs, sum_x_lr2):
     var = construct_variant(line, gender, mnvs, sum_x_lr2)
     return var.passes_filters()
     
-def open_individual(individual, child_variants=None, mnvs=None, sum_x_lr2=None):
+def open_individual(individual, child_variants=None, mnvs=None, sum_x_lr2=None,
+        region=None, lines=None):
     """ Convert VCF to TSV format. Use for single sample VCF file.
     
     Obtains the VCF data for a single sample. This function optionally
@@ -106,6 +155,10 @@ def open_individual(individual, child_variants=None, mnvs=None, sum_x_lr2=None):
             variants for matches in the child's variants).
         mnvs: dictionary
         sum_x_lr2: SUm of mean lr2 for proband X chromosome for filtering CNVs
+        region: (chrom, start, end) tuple to only load variants from a region
+            of a tabix-indexed VCF, or None to load the whole VCF.
+        lines: iterable of VCF lines (already split by tabs) to use instead of
+            reading the VCF, or None.
     
     Returns:
         A list of variants for the individual.
@@ -120,13 +173,18 @@ def open_individual(individual, child_variants=None, mnvs=None, sum_x_lr2=None):
     
     # open the vcf, and adjust the position in the file to immediately after
     # the header, so we can run through the variants
-    vcf = open_vcf(path)
-    exclude_header(vcf)
+    vcf = None
+    if lines is None and region is None:
+        vcf = open_vcf(path)
+        exclude_header(vcf)
+        lines = ( line.strip().split("\t") for line in vcf )
+    elif lines is None:
+        # only include lines starting in the region, so lines which span
+        # adjacent regions are only loaded once
+        lines = ( x for x in query_vcf(path, region) if starts_in_region(x, region) )
     
     variants = []
-    for line in vcf:
-        line = line.strip().split("\t")
-        
+    for line in lines:
         try:
             # check if we want to include the variant or not
             if include_variant(line, child_variants, gender, mnvs, sum_x_lr2):
@@ -136,15 +194,18 @@ def open_individual(individual, child_variants=None, mnvs=None, sum_x_lr2=None):
         except ValueError:
             # we only get ValueError when the genotype cannot be set, which
             # occurs for x chrom male heterozygotes (an impossible genotype)
+            if child_variants is None:
+                count_variants("variant", "genotype")
             if line[0] == SNV.debug_chrom and int(line[1]) == SNV.debug_pos:
                 print("failed as heterozygous genotype in male on chrX")
             continue
     
-    vcf.close()
+    if vcf is not None:
+        vcf.close()
     
     return variants
 
-def load_trio(family, sum_x_lr2_proband):
+def load_trio(family, sum_x_lr2_proband, jobs=1):
     """ opens and parses the VCF files for members of the family trio.
     
     We need to load the VCF data for each of the members of the trio. As a
@@ -152,19 +213,431 @@ def load_trio(family, sum_x_lr2_proband):
     we lack parents for the child, so we create blank entries when that
     happens.
     We also need the sum of mean lr2 ratios on the X chromosome for the proband
+    
+    When every VCF in the trio is tabix-indexed, the chromosomes can be
+    loaded in parallel. The variants are merged back in the order of the
+    chromosomes in the childs VCF, so the results match loading serially.
+    
+    Args:
+        family: Family object
+        sum_x_lr2_proband: sum of mean lr2 on the X chromosome for the proband
+        jobs: number of processes to load the chromosomes with.
+    
+    Returns:
+        list of TrioGenotypes objects for the family
+    """
+    
+    if not use_worker_pool(jobs) or not is_trio_indexed(family):
+        return load_region(family, sum_x_lr2_proband)
+    
+    regions = [ (x, None, None) for x in get_vcf_contigs(family.child.get_path()) ]
+    jobs_list = [ (family, sum_x_lr2_proband, x) for x in regions ]
+    
+    # pass the variant class parameters to the workers, since the workers
+    # don't share class attributes on non-forking platforms
+    settings = (SNV.known_genes, Info.last_base, Info.populations,
+        SNV.debug_chrom, SNV.debug_pos)
+    pool = multiprocessing.Pool(jobs, initializer=set_variant_parameters,
+        initargs=settings)
+    try:
+        results = pool.map(_load_region, jobs_list, chunksize=1)
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+    
+    variants = []
+    for region_vars, counts, stages in results:
+        variants += region_vars
+        merge_counts(counts)
+        merge_stages(stages)
+    
+    return variants
+
+def is_trio_indexed(family):
+    """ check if the VCFs for all the members of a trio are tabix-indexed
+    
+    Args:
+        family: Family object
+    
+    Returns:
+        True/False for whether every VCF in the trio has a tabix index.
     """
     
-    mnvs = get_mnv_candidates(family.child.get_path())
+    members = [ x for x in [family.child, family.mother, family.father]
+        if x is not None ]
+    
+    return all([ is_indexed(x.get_path()) for x in members ])
+
+def load_region(family, sum_x_lr2_proband, region=None):
+    """ opens and parses the trio variants within a region of the VCFs
+    
+    Args:
+        family: Family object
+        sum_x_lr2_proband: sum of mean lr2 on the X chromosome for the proband
+        region: (chrom, start, end) tuple for a region of tabix-indexed VCFs,
+            or None to load the entire VCFs.
+    
+    Returns:
+        list of TrioGenotypes objects for the region
+    """
+    
+    with StageTimer("mnv") as timer:
+        mnvs = get_mnv_candidates(family.child.get_path(), region)
+        timer.records_out = len(mnvs)
     
     # open the childs VCF file, and get the variant keys, to check if they
     # are in the parents VCF
-    child = open_individual(family.child, mnvs=mnvs, sum_x_lr2=sum_x_lr2_proband)
+    with StageTimer("child_parse") as timer:
+        child = open_individual(family.child, mnvs=mnvs,
+            sum_x_lr2=sum_x_lr2_proband, region=region)
+        keys = set([var.get_key() for var in child])
+        timer.records_out = len(child)
+    
+    with StageTimer("parent_parse", len(keys)) as timer:
+        mother = open_individual(family.mother, child_variants=keys, region=region)
+        father = open_individual(family.father, child_variants=keys, region=region)
+        timer.records_out = len(mother) + len(father)
+    
+    with StageTimer("combine_trio", len(child)) as timer:
+        variants = combine_trio_variants(family, child, mother, father)
+        timer.records_out = len(variants)
+    
+    return variants
+
+def is_cnv_line(line):
+    """ check if a VCF line (already split by tabs) is for a CNV
+    """
+    
+    return line[4] in ["<DUP>", "<DEL>"]
+
+def get_region_lines(path, regions, cnvs=True):
+    """ get the lines within regions of a tabix-indexed VCF
+    
+    Args:
+        path: path to tabix-indexed VCF file.
+        regions: list of non-overlapping (chrom, start, end) tuples.
+        cnvs: whether to include the CNVs which overlap the regions. CNVs
+            overlapping several regions are only included once.
+    
+    Yields:
+        VCF lines (already split by tabs) for the regions.
+    """
+    
+    seen = set()
+    for region in regions:
+        for line in query_vcf(path, region):
+            if is_cnv_line(line):
+                key = (line[0], line[1])
+                if cnvs and key not in seen:
+                    seen.add(key)
+                    yield line
+            elif starts_in_region(line, region):
+                yield line
+
+def get_sidecar_path(path, cnv_dir=None):
+    """ get the path for a sidecar VCF of the CNVs in a VCF
+    
+    The sidecar has ".cnv" before the VCF extension, e.g. "sample.cnv.vcf.gz"
+    for "sample.vcf.gz", and sits beside the VCF, or in a separate folder.
+    
+    Args:
+        path: path to VCF file.
+        cnv_dir: folder for the sidecar VCFs, or None to use the VCF's folder.
+    
+    Returns:
+        path to the sidecar VCF, or None if the path isn't for a VCF.
+    """
+    
+    sidecar = re.sub(r'\.vcf(\.gz)?$', r'.cnv.vcf\1', path)
+    if sidecar == path:
+        return None
+    
+    if cnv_dir is not None:
+        sidecar = os.path.join(cnv_dir, os.path.basename(sidecar))
+    
+    return sidecar
+
+def get_cnv_path(path, cnv_dir=None):
+    """ get the path to a sidecar VCF of the CNVs in a VCF
+    
+    Sidecars older than their VCF are ignored, since the VCF may have changed.
+    
+    Args:
+        path: path to VCF file.
+        cnv_dir: folder for the sidecar VCFs, or None to use the VCF's folder.
+    
+    Returns:
+        path to the sidecar VCF, or the original path if no sidecar exists.
+    """
+    
+    sidecar = get_sidecar_path(path, cnv_dir)
+    if sidecar is not None and os.path.exists(sidecar) and \
+            os.path.getmtime(sidecar) >= os.path.getmtime(path):
+        return sidecar
+    
+    return path
+
+def scan_cnv_lines(path):
+    """ get the header and CNV lines from a VCF, by scanning the whole VCF
+    
+    Lines are checked for the CNV alleles before being split, since nearly all
+    the lines in a VCF are for SNVs and indels.
+    
+    Args:
+        path: path to VCF file.
+    
+    Yields:
+        header lines, then CNV lines from the VCF (not split by tabs).
+    """
+    
+    with open_vcf(path) as vcf:
+        for line in vcf:
+            if line.startswith("#") or "\t<DEL>\t" in line or "\t<DUP>\t" in line:
+                yield line
+
+def write_cnv_sidecar(path, cnv_dir=None):
+    """ write a sidecar VCF of the CNVs in a VCF, for later runs with --panel
+    
+    This is a separate step from the analysis (see the build-cnv-sidecars
+    subcommand), since the analysis doesn't write next to its inputs. The
+    sidecar is written to a temporary file first, so that an incomplete
+    sidecar is never used.
+    
+    Args:
+        path: path to VCF file.
+        cnv_dir: folder to write the sidecar VCF to, or None to write it
+            beside the VCF.
+    
+    Returns:
+        path to the sidecar VCF.
+    """
+    
+    sidecar = get_sidecar_path(path, cnv_dir)
+    if sidecar is None:
+        raise ValueError("not a VCF path: {}".format(path))
+    
+    temp = "{}.{}.tmp".format(sidecar, os.getpid())
+    try:
+        if sidecar.endswith(".gz"):
+            handle = BgzfWriter(temp)
+        else:
+            handle = open(temp, "w")
+        with handle:
+            for line in scan_cnv_lines(path):
+                handle.write(line)
+        os.rename(temp, sidecar)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    
+    return sidecar
+
+def get_cnv_lines(path, cnv_dir=None):
+    """ get the CNV lines from a VCF, or from its sidecar VCF of CNVs
+    
+    Without a sidecar, the whole VCF has to be scanned for CNVs.
+    
+    Args:
+        path: path to VCF file.
+        cnv_dir: folder for the sidecar VCFs, or None to use the VCF's folder.
+    
+    Yields:
+        CNV lines from the VCF (split by tabs).
+    """
+    
+    cnv_path = get_cnv_path(path, cnv_dir)
+    if cnv_path == path:
+        logging.warning("no CNV sidecar VCF for {}, so scanning the whole VCF "
+            "for CNVs. Build the sidecars beforehand with the "
+            "build-cnv-sidecars subcommand.".format(path))
+    
+    with open_vcf(cnv_path) as vcf:
+        exclude_header(vcf)
+        for line in vcf:
+            if "\t<DEL>\t" in line or "\t<DUP>\t" in line:
+                yield line.strip().split("\t")
+
+def load_targets(family, sum_x_lr2_proband, regions, scan_cnvs=True,
+        cnv_dir=None):
+    """ opens and parses the trio variants within a set of regions
+    
+    Only the regions are read from the tabix-indexed VCFs, which is far quicker
+    than reading the whole VCFs when the regions are small, such as for a
+    panel of known genes.
+    
+    Args:
+        family: Family object, where the trio VCFs are tabix-indexed.
+        sum_x_lr2_proband: sum of mean lr2 on the X chromosome for the proband
+        regions: list of non-overlapping (chrom, start, end) tuples.
+        scan_cnvs: whether to get all the childs CNVs (from a sidecar VCF if
+            available, otherwise by scanning the childs VCF), since CNVs can
+            pass the filters without overlapping a known gene. Otherwise only
+            the CNVs overlapping the regions are included.
+        cnv_dir: folder for the sidecar VCFs, or None to use the VCF's folder.
+    
+    Returns:
+        list of TrioGenotypes objects for the family, in the order of the
+        childs VCF.
+    """
+    
+    path = family.child.get_path()
+    
+    mnvs = {}
+    for region in regions:
+        mnvs.update(get_mnv_candidates(path, region))
+    
+    lines = get_region_lines(path, regions, cnvs=not scan_cnvs)
+    if scan_cnvs:
+        lines = itertools.chain(lines, get_cnv_lines(path, cnv_dir))
+    
+    child = open_individual(family.child, mnvs=mnvs,
+        sum_x_lr2=sum_x_lr2_proband, lines=lines)
+    
+    # restore the order of the variants in the VCF, since the regions and CNVs
+    # were loaded separately.
+    order = dict( (x, i) for i, x in enumerate(get_vcf_contigs(path)) )
+    child = sorted(child, key=lambda x: (order.get(x.get_chrom(), len(order)),
+        x.get_position()))
     keys = set([var.get_key() for var in child])
     
-    mother = open_individual(family.mother, child_variants=keys)
-    father = open_individual(family.father, child_variants=keys)
+    parents = []
+    for parent in [family.mother, family.father]:
+        lines = None
+        if parent is not None:
+            lines = get_region_lines(parent.get_path(), regions, cnvs=False)
+        parents.append(open_individual(parent, child_variants=keys, lines=lines))
+    
+    return combine_trio_variants(family, child, *parents)
+
+def get_contig_lengths(path):
+    """ get the chromosome lengths from the contig lines of a VCF header
+    
+    Args:
+        path: path to VCF file.
+    
+    Returns:
+        dictionary of chromosome lengths, indexed by chromosome.
+    """
+    
+    pattern = re.compile('^##contig=<.*ID=([^,>]+).*length=([0-9]+)')
     
-    return combine_trio_variants(family, child, mother, father)
+    lengths = {}
+    for line in get_vcf_header(path):
+        match = pattern.match(line)
+        if match is not None:
+            lengths[match.group(1)] = int(match.group(2))
+    
+    return lengths
+
+def get_shards(path, size=0):
+    """ split the chromosomes of a tabix-indexed VCF into regions
+    
+    Args:
+        path: path to tabix-indexed VCF file.
+        size: length of each region in base-pairs, or 0 for whole chromosomes.
+            Chromosomes without a length in the VCF header are not split.
+    
+    Returns:
+        list of (chrom, start, end) tuples, in the order of the VCF. The final
+        region for each chromosome is open-ended, in case the VCF has lines
+        beyond the chromosome length in the header.
+    """
+    
+    lengths = {}
+    if size > 0:
+        lengths = get_contig_lengths(path)
+    
+    shards = []
+    for chrom in get_vcf_contigs(path):
+        if chrom not in lengths:
+            shards.append((chrom, None, None))
+            continue
+        
+        starts = list(range(1, lengths[chrom] + 1, size))
+        ends = [ x - 1 for x in starts[1:] ] + [None]
+        shards += [ (chrom, x, y) for x, y in zip(starts, ends) ]
+    
+    return shards
+
+def _load_shard(job):
+    """ load and filter the trio variants for a single shard
+    
+    Args:
+        job: (family, sum_x_lr2_proband, region, pp_filter) tuple
+    
+    Returns:
+        (chrom, variants, counts, stages) tuple, with a list of TrioGenotypes
+        for the shard, and the filtering counts and stage timings for the shard.
+    """
+    
+    family, sum_x_lr2_proband, region, pp_filter = job
+    variants = load_region(family, sum_x_lr2_proband, region)
+    variants = filter_de_novos(variants, pp_filter)
+    
+    return region[0], variants, pop_counts(), pop_stages()
+
+def load_variants_by_shard(family, pp_filter, pops, known_genes, last_base,
+        sum_x_lr2, debug_chrom=None, debug_pos=None, shard_size=0, jobs=1):
+    """ loads the variants for a trio in shards of tabix-indexed VCFs
+    
+    Each shard is a chromosome, or a fixed-size region of a chromosome, which
+    is loaded and filtered independently, optionally on a pool of processes.
+    Lines belong to the shard containing their start position, so CNVs that
+    cross the edge of a shard are only loaded once, and MNV candidates are
+    found in a window that overlaps the neighbouring shards. The variants are
+    yielded one chromosome at a time, so the whole VCF is never held in memory.
+    
+    Args:
+        family: Family object containing an data for an affected proband
+        pp_filter: float between 0 and 1, being the threshold for the PP_DNM filter
+        pops: list of populations who have minor allele frequencies in INFO
+        known_genes: genes known to be involved with genetic disorders.
+        last_base: set of sites in genome at conserved last base of exons.
+        sum_x_lr2: Sum of mean l2r on x chromosomes for all probands
+        debug_chrom: chromosome string, for debugging variant filtering.
+        debug_pos: chromosome position, for debugging variant filtering.
+        shard_size: length of shards in base-pairs, or 0 for whole chromosomes.
+        jobs: number of processes to load the shards with.
+    
+    Yields:
+        (chrom, variants) tuples, with the list of filtered TrioGenotypes for
+        each chromosome, in the order of the childs VCF.
+    """
+    
+    set_variant_parameters(known_genes, last_base, pops, debug_chrom, debug_pos)
+    
+    sum_x_lr2_proband = 0
+    if family.child.person_id in sum_x_lr2.keys():
+        sum_x_lr2_proband = sum_x_lr2[family.child.person_id]
+    
+    shards = get_shards(family.child.get_path(), shard_size)
+    jobs_list = [ (family, sum_x_lr2_proband, x, pp_filter) for x in shards ]
+    
+    pool = None
+    if use_worker_pool(jobs):
+        settings = (known_genes, last_base, pops, debug_chrom, debug_pos)
+        pool = multiprocessing.Pool(jobs, initializer=set_variant_parameters,
+            initargs=settings)
+        results = pool.imap(_load_shard, jobs_list)
+    else:
+        results = ( _load_shard(x) for x in jobs_list )
+    
+    try:
+        for chrom, group in itertools.groupby(results, key=lambda x: x[0]):
+            variants = []
+            for _, shard_vars, counts, stages in group:
+                variants += shard_vars
+                merge_counts(counts)
+                merge_stages(stages)
+            yield chrom, variants
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
 
 def combine_trio_variants(family, child_vars, mother_vars, father_vars):
     """ for each variant, combine the trio's genotypes into TrioGenotypes
@@ -178,6 +651,9 @@ def combine_trio_variants(family, child_vars, mother_vars, father_vars):
         list of TrioGenotypes objects for the family
     """
     
+    mother_vars = index_parental_vars(mother_vars)
+    father_vars = index_parental_vars(father_vars)
+    
     variants = []
     for child in child_vars:
         
@@ -193,33 +669,50 @@ def combine_trio_variants(family, child_vars, mother_vars, father_vars):
     
     return variants
 
+def index_parental_vars(parental_vars):
+    """ index the variants for a parent by their keys
+    
+    Args:
+        parental_vars: list of parental variants
+    
+    Returns:
+        dictionary of parental variants indexed by key, keeping the first
+        variant for keys with multiple variants.
+    """
+    
+    index = {}
+    for parental in parental_vars:
+        key = parental.get_key()
+        if key not in index:
+            index[key] = parental
+    
+    return index
+
 def get_parental_var(var, parental_vars, parent):
     """ get the corresponding parental variant to a childs variant, or
     create a default variant with reference genotype.
     
     Args:
         var: childs var, as Variant object
-        parental_vars: list of parental variants
+        parental_vars: dictionary of parental variants indexed by key, as per
+            index_parental_vars()
         parent: Person object for the parent
     
     Returns:
         returns a Variant object, matched to the proband's variant
     """
     
-    key = var.get_key()
-    
-    for parental in parental_vars:
-        if not var.is_cnv() and key == parental.get_key():
-            return parental
+    # the parental genotypes for CNVs come from the childs inheritance call,
+    # so CNVs are never matched to the parents variants
+    if not var.is_cnv() and var.get_key() in parental_vars:
+        return parental_vars[var.get_key()]
     
     # if the childs variant does not exist in the parents VCF, then we
     # create a default variant for the parent
-    Var = SNV
     keys, sample = 'GT', '0/0'
     alts = ','.join(var.alt_alleles)
     
     if var.is_cnv():
-        Var = CNV
         inh = var.get_cnv_inheritance()
         alts = ("<REF>", )
         if parent.is_male() and inh in ['paternal', 'biparental']:
@@ -231,9 +724,7 @@ def get_parental_var(var, parental_vars, parent):
         # we need to set a format value, so CNV genotypes get set correctly
         keys, sample = 'INHERITANCE', 'uncertain'
     
-    return Var(var.chrom, var.position, var.variant_id, var.ref_allele,
-        alts, var.qual, var.filter, str(var.info), keys, sample,
-        parent.get_gender())
+    return var.copy_with_genotype(alts, keys, sample, parent.get_gender())
 
 def filter_de_novos(variants, pp_filter):
     """ filter the de novos variants in the VCF files
@@ -247,4 +738,8 @@ def filter_de_novos(variants, pp_filter):
         de novo filter.
     """
     
-    return [ x for x in variants if x.passes_de_novo_checks(pp_filter) ]
+    with StageTimer("de_novo", len(variants)) as timer:
+        variants = [ x for x in variants if x.passes_de_novo_checks(pp_filter) ]
+        timer.records_out = len(variants)
+    
+    return variants
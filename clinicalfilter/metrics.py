@@ -0,0 +1,271 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import os
+import time
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    # the resource module is only available on unix platforms
+    resource = None
+
+# timings for each stage of the analysis of the proband being analysed in this
+# process, indexed by stage name. These are kept per thread, so that results
+# exported on a background thread are timed separately from the analysis.
+_local = threading.local()
+
+def _get_stages():
+    """ get the stage timings for the current thread
+    """
+    
+    if not hasattr(_local, "stages"):
+        _local.stages = OrderedDict()
+    
+    return _local.stages
+
+def get_cpu_time():
+    """ get the user and system CPU time used by this process, in seconds
+    """
+    
+    times = os.times()
+    return times[0] + times[1]
+
+def get_peak_rss():
+    """ get the peak resident memory of this process, or None if unavailable
+    
+    This is the peak over the lifetime of the process, so it can't show the
+    memory used by a single stage, see get_current_rss() for that.
+    
+    Returns:
+        peak resident set size, in kilobytes on linux (but bytes on macOS).
+    """
+    
+    if resource is None:
+        return None
+    
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def get_current_rss():
+    """ get the current resident memory of this process, or None if unavailable
+    
+    Returns:
+        resident set size in kilobytes, from /proc/self/statm (so linux only).
+    """
+    
+    try:
+        with open("/proc/self/statm") as handle:
+            pages = int(handle.read().split()[1])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+    
+    return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+def _get_rss_delta(start, end):
+    """ get the change in resident memory over a stage, or None if unknown
+    """
+    
+    if start is None or end is None:
+        return None
+    
+    return end - start
+
+def _max_value(current, extra):
+    """ get the largest of two values, where values of None are unknown
+    """
+    
+    if current is None:
+        return extra
+    elif extra is None:
+        return current
+    
+    return max(current, extra)
+
+def _add_records(current, extra):
+    """ sum record counts, where counts of None are unknown
+    """
+    
+    if current is None:
+        return extra
+    elif extra is None:
+        return current
+    
+    return current + extra
+
+def _combine_metrics(current, extra):
+    """ combine the timings for two runs of a stage
+    
+    Stages can be run several times for a proband (e.g. once per chromosome),
+    so the times and record counts are summed, while the memory growth and the
+    process peak memory are the largest seen.
+    """
+    
+    if current is None:
+        return dict(extra)
+    
+    return {"calls": current["calls"] + extra["calls"],
+        "wall": current["wall"] + extra["wall"],
+        "cpu": current["cpu"] + extra["cpu"],
+        "records_in": _add_records(current["records_in"], extra["records_in"]),
+        "records_out": _add_records(current["records_out"], extra["records_out"]),
+        "rss_delta": _max_value(current["rss_delta"], extra["rss_delta"]),
+        "process_peak_rss": _max_value(current["process_peak_rss"],
+            extra["process_peak_rss"])}
+
+def add_stages(stages, extra):
+    """ add stage timings into a dictionary of stage timings
+    
+    Args:
+        stages: dictionary of timings indexed by stage, to add to.
+        extra: dictionary of timings indexed by stage.
+    """
+    
+    for stage, metrics in extra.items():
+        stages[stage] = _combine_metrics(stages.get(stage), metrics)
+
+def record_stage(stage, wall, cpu, records_in=None, records_out=None,
+        rss_delta=None, process_peak_rss=None):
+    """ add timings for a stage of the analysis
+    
+    Args:
+        stage: name of the stage, e.g. "child_parse"
+        wall: wall-clock time for the stage, in seconds.
+        cpu: CPU time for the stage, in seconds.
+        records_in: number of records going into the stage, or None.
+        records_out: number of records coming out of the stage, or None.
+        rss_delta: change in the current resident memory of the process from
+            the start to the end of the stage, in kilobytes.
+        process_peak_rss: peak resident memory of the process so far, at the
+            end of the stage. This isn't specific to the stage, since it
+            includes any earlier stages or probands.
+    """
+    
+    add_stages(_get_stages(), {stage: {"calls": 1, "wall": wall, "cpu": cpu,
+        "records_in": records_in, "records_out": records_out,
+        "rss_delta": rss_delta, "process_peak_rss": process_peak_rss}})
+
+def pop_stages():
+    """ get the stage timings for this thread, and reset the timings
+    
+    Returns:
+        dictionary of timings, indexed by stage name.
+    """
+    
+    stages = OrderedDict(_get_stages())
+    _get_stages().clear()
+    
+    return stages
+
+def merge_stages(stages):
+    """ add stage timings (e.g. from a worker process) to this process
+    """
+    
+    add_stages(_get_stages(), stages)
+
+class StageTimer(object):
+    """ times a stage of the analysis, for use as a context manager.
+    
+    The records going into and out of the stage can be set within the block,
+    e.g.
+        
+        with StageTimer("post_inheritance", len(variants)) as timer:
+            variants = post_filter.filter_variants(variants)
+            timer.records_out = len(variants)
+    """
+    
+    def __init__(self, stage, records_in=None):
+        self.stage = stage
+        self.records_in = records_in
+        self.records_out = None
+    
+    def __enter__(self):
+        self.wall = time.time()
+        self.cpu = get_cpu_time()
+        self.rss = get_current_rss()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        record_stage(self.stage, time.time() - self.wall,
+            get_cpu_time() - self.cpu, self.records_in, self.records_out,
+            _get_rss_delta(self.rss, get_current_rss()), get_peak_rss())
+
+class Metrics(object):
+    """ tracks the stage timings for each proband
+    """
+    
+    def __init__(self):
+        self.probands = OrderedDict()
+    
+    def add(self, proband_id, stages):
+        """ add stage timings for a proband
+        
+        Args:
+            proband_id: ID for the proband
+            stages: dictionary of timings indexed by stage, as per pop_stages()
+        """
+        
+        if proband_id not in self.probands:
+            self.probands[proband_id] = OrderedDict()
+        
+        add_stages(self.probands[proband_id], stages)
+    
+    def update(self, other):
+        """ add the timings from another Metrics object (e.g. from a worker)
+        """
+        
+        for proband_id in other.probands:
+            self.add(proband_id, other.probands[proband_id])
+    
+    def write(self, path):
+        """ write the timings as JSON lines, one line per stage per proband
+        """
+        
+        with open(path, "w") as handle:
+            for proband_id, stages in self.probands.items():
+                for stage, metrics in stages.items():
+                    line = OrderedDict([("proband", proband_id), ("stage", stage)])
+                    line.update(sorted(metrics.items()))
+                    handle.write(json.dumps(line) + "\n")
+    
+    def summarise(self):
+        """ summarise the timings for each stage across all the probands
+        
+        Returns:
+            string of a table of times and record counts per stage.
+        """
+        
+        totals = OrderedDict()
+        for stages in self.probands.values():
+            add_stages(totals, stages)
+        
+        lines = ["stage\tcalls\twall_s\tcpu_s\trecords_in\trecords_out\t"
+            "rss_delta\tprocess_peak_rss"]
+        for stage, metrics in totals.items():
+            lines.append("{}\t{}\t{:.3f}\t{:.3f}\t{}\t{}\t{}\t{}".format(stage,
+                metrics["calls"], metrics["wall"], metrics["cpu"],
+                metrics["records_in"], metrics["records_out"],
+                metrics["rss_delta"], metrics["process_peak_rss"]))
+        
+        return "\n".join(lines)
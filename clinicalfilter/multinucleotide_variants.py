@@ -24,7 +24,8 @@ from collections import namedtuple
 
 import tabix
 
-from clinicalfilter.utils import open_vcf, exclude_header, get_vcf_header
+from clinicalfilter.utils import open_vcf, exclude_header, get_vcf_header, \
+    query_vcf
 
 coding_cq = set(["transcript_ablation", "splice_donor_variant",
     "splice_acceptor_variant", "stop_gained", "frameshift_variant",
@@ -52,20 +53,36 @@ AA_CODE = {"AAA": "K", "AAC": "N", "AAG": "K", "AAT": "N",
     "TGA": "*", "TGC": "C", "TGG": "W", "TGT": "C",
     "TTA": "L", "TTC": "F", "TTG": "L", "TTT": "F"}
 
-def get_mnv_candidates(path):
+def get_mnv_candidates(path, region=None):
     ''' identify MNV candidates, and their MNV consequences within a VCF.
     
     Args:
         path: path to VCF
+        region: (chrom, start, end) tuple to restrict the search to a region
+            of a tabix-indexed VCF, or None to search the whole VCF.
     
     Returns:
         list of (variant, mnv_consequence) tuples, where variant is (chrom, pos)
     '''
     
-    with open_vcf(path) as vcf:
-        exclude_header(vcf)
-        header = get_vcf_header(vcf)
-        pairs = find_nearby_variants(vcf)
+    if region is None:
+        with open_vcf(path) as vcf:
+            exclude_header(vcf)
+            header = get_vcf_header(vcf)
+            pairs = find_nearby_variants(vcf)
+    else:
+        # extend the region by the MNV distance, so that pairs spanning the
+        # edge of the region are still found
+        threshold = 2
+        chrom, start, end = region
+        if start is not None:
+            start = max(1, start - threshold)
+        if end is not None:
+            end += threshold
+        
+        lines = query_vcf(path, (chrom, start, end))
+        pairs = find_nearby_variants(( '\t'.join(x[:3]) for x in lines ),
+            threshold)
     
     # ensure variants are not indels, are coding, and pairs alter the same amino
     # acid position
@@ -315,3 +315,21 @@ def load_families(path):
         families.append(family)
     
     return families
+
+def write_ped(path, families):
+    """ write families to a PED file, in the format read by load_families()
+    
+    Args:
+        path: path to write the ped file to
+        families: list of Family objects
+    """
+    
+    with open(path, 'w') as handle:
+        for family in families:
+            for person in family:
+                if person is None:
+                    continue
+                
+                handle.write('\t'.join([person.family_id, person.get_id(),
+                    person.dad_id, person.mom_id, person.get_gender(),
+                    person.get_affected_status(), person.get_path()]) + '\n')
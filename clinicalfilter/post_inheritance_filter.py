@@ -21,6 +21,8 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import logging
 
+from clinicalfilter.attrition import count_variants
+
 class PostInheritanceFilter(object):
     """ Post-inheritance variant filter for clinical filtering code.
 
@@ -47,21 +49,80 @@ class PostInheritanceFilter(object):
         self.family = family
     
     def filter_variants(self, variants):
-        """ loads trio variants, and screens for candidate variants
+        """ screens the candidate variants with the post-inheritance filters
+        
+        The filters are applied to each variant in turn, rather than each
+        filter making a new list of the variants. Only the polyphen filter
+        depends on other variants (compound het partners in the same gene), so
+        the variants passing the CNV and MAF filters are gathered first, and
+        their compound het partners are indexed by gene.
+        
+        Args:
+            variants: list of (variant, check, inheritance, hgnc) tuples
+        
+        Returns:
+            list of tuples passing the filters, the same as applying
+            remove_cnvs() (if required), filter_by_maf(), filter_polyphen() and
+            filter_exac() in turn.
         """
         
         # if we have flagged CNVs on three different chroms, drop all CNVs,
         # since the sample is sufficiently anomalous
-        if self.count_cnv_chroms(variants) > 2:
-            variants = self.remove_cnvs(variants)
+        excess_cnvs = self.count_cnv_chroms(variants) > 2
         
-        # and filter by a lower MAF threshold
-        variants = self.filter_by_maf(variants)
-        variants = self.filter_polyphen(variants)
-        variants = self.filter_exac(variants)
+        dropped = {"excess_CNVs": 0, "MAF": 0, "polyphen": 0, "ExAC": 0}
+        passed = []
+        for candidate in variants:
+            if excess_cnvs and self.check_cnv(candidate) is None:
+                dropped["excess_CNVs"] += 1
+                continue
+            
+            # and filter by a lower MAF threshold
+            candidate = self.check_maf(candidate)
+            if candidate is None:
+                dropped["MAF"] += 1
+            else:
+                passed.append(candidate)
+        
+        partners = self.index_compound_partners(passed)
+        variants = []
+        for candidate in passed:
+            candidate = self.check_polyphen(candidate, partners)
+            if candidate is None:
+                dropped["polyphen"] += 1
+                continue
+            
+            candidate = self.check_exac(candidate)
+            if candidate is None:
+                dropped["ExAC"] += 1
+            else:
+                variants.append(candidate)
+        
+        reasons = ["MAF", "polyphen", "ExAC"]
+        if excess_cnvs:
+            reasons.insert(0, "excess_CNVs")
+        for reason in reasons:
+            count_variants("post_inheritance", reason, dropped[reason])
+        count_variants("post_inheritance", "passed all", len(variants))
         
         return variants
     
+    def apply_check(self, check, variants):
+        """ apply a check for single variants to a list of variants
+        
+        Args:
+            check: method which returns the (possibly modified) tuple for a
+                variant, or None if the variant fails.
+            variants: list of (variant, check, inheritance, hgnc) tuples
+        
+        Returns:
+            list of tuples passing the check
+        """
+        
+        passed = ( check(x) for x in variants )
+        
+        return [ x for x in passed if x is not None ]
+    
     def count_cnv_chroms(self, variants):
         """ count the number of different chroms that CNVs are on
         
@@ -90,18 +151,28 @@ class PostInheritanceFilter(object):
             returns list of tuples without CNV variants
         """
         
-        # remove CNVs from the list of flagged variants
-        passed_vars = []
-        for (var, check, inh, hgnc) in variants:
-            if not var.is_cnv():
-                passed_vars.append((var, check, inh, hgnc))
-            else:
-                log_str = "{}\t{} dropped from excess CNVs in proband".format(self.family.child.get_id(), var)
-                logging.info(log_str)
-                if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
-                    print(log_str)
+        return self.apply_check(self.check_cnv, variants)
+    
+    def check_cnv(self, candidate):
+        """ drop a CNV, for individuals with too many flagged CNVs
+        
+        Args:
+            candidate: (variant, check, inheritance, hgnc) tuple
+        
+        Returns:
+            the tuple, or None if the variant is a CNV
+        """
         
-        return  passed_vars
+        var = candidate[0]
+        if not var.is_cnv():
+            return candidate
+        
+        log_str = "{}\t{} dropped from excess CNVs in proband".format(self.family.child.get_id(), var)
+        logging.info(log_str)
+        if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
+            print(log_str)
+        
+        return None
     
     def filter_by_maf(self, variants):
         """ filter for low MAF threshold, except for Biallelic variants
@@ -113,31 +184,42 @@ class PostInheritanceFilter(object):
             returns list of tuples without high maf variants
         """
         
-        passed_vars = []
-        for (var, check, inh, hgnc) in variants:
-            max_maf = var.child.info.find_max_allele_frequency()
-            if max_maf is None: # set maf=NA to 0 to reduce later checks
-                max_maf = 0
-            
-            if inh == ["Biallelic"]:
-                passed_vars.append((var, check, inh, hgnc))
-            # variants with multiple inheritance types should be left as
-            # Biallelic if the other inheritance type fails the MAF threshold
-            elif "Biallelic" in inh and max_maf >= 0.0005:
-                passed_vars.append((var, check, ["Biallelic"], hgnc))
-            else:
-                if max_maf <= 0.0005 and self.family.has_parents():
-                    passed_vars.append((var, check, inh, hgnc))
-                elif max_maf <= 0.0001 and not self.family.has_parents():
-                    passed_vars.append((var, check, inh, hgnc))
-                else:
-                    log_str = "{}\t{} dropped from low MAF in non-biallelic " \
-                        "variant".format(self.family.child.get_id(), var)
-                    logging.info(log_str)
-                    if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
-                        print(log_str)
-        
-        return passed_vars
+        return self.apply_check(self.check_maf, variants)
+    
+    def check_maf(self, candidate):
+        """ check a variant against the low MAF threshold, except for Biallelic
+        
+        Args:
+            candidate: (variant, check, inheritance, hgnc) tuple
+        
+        Returns:
+            the tuple (restricted to Biallelic inheritance if only that passes),
+            or None if the variant has too high a MAF.
+        """
+        
+        var, check, inh, hgnc = candidate
+        max_maf = var.child.info.find_max_allele_frequency()
+        if max_maf is None: # set maf=NA to 0 to reduce later checks
+            max_maf = 0
+        
+        if inh == ["Biallelic"]:
+            return (var, check, inh, hgnc)
+        # variants with multiple inheritance types should be left as
+        # Biallelic if the other inheritance type fails the MAF threshold
+        elif "Biallelic" in inh and max_maf >= 0.0005:
+            return (var, check, ["Biallelic"], hgnc)
+        elif max_maf <= 0.0005 and self.family.has_parents():
+            return (var, check, inh, hgnc)
+        elif max_maf <= 0.0001 and not self.family.has_parents():
+            return (var, check, inh, hgnc)
+        
+        log_str = "{}\t{} dropped from low MAF in non-biallelic " \
+            "variant".format(self.family.child.get_id(), var)
+        logging.info(log_str)
+        if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
+            print(log_str)
+        
+        return None
     
     def get_polyphen_for_genes(self, var, hgnc):
         """ get the polyphen predictions for a variant for specific gene symbols
@@ -192,39 +274,99 @@ class PostInheritanceFilter(object):
             returns list of tuples without polyphen benign variants
         """
         
-        passed_vars = []
+        partners = self.index_compound_partners(variants)
         
+        return self.apply_check(lambda x: self.check_polyphen(x, partners),
+            variants)
+    
+    def check_polyphen(self, candidate, partners):
+        """ check a variant based on its polyphen predictions
+        
+        Args:
+            candidate: (variant, check, inheritance, hgnc) tuple
+            partners: dictionary of compound het partners indexed by gene, as
+                per index_compound_partners()
+        
+        Returns:
+            the tuple (without genes where the compound het partners are
+            polyphen benign), or None if the variant fails.
+        """
+        
+        var, check, inh, hgnc = candidate
+        try:
+            polyphen = self.get_polyphen_for_genes(var, hgnc)
+        except IndexError:
+            return None
+        
+        # check if the variant on it's own would pass
+        passes = "benign" not in polyphen or \
+            var.get_trio_genotype() == var.get_de_novo_genotype()
+        
+        # check all of the other variants to see if any are in the same
+        # gene, compound_het, and polyphen benign
+        benign_matches = [ self.compound_match(var, x, partners) for x in hgnc ]
+        
+        # exclude HGNC ID where partner variants are polyphen benign
+        hgnc = [ hgnc[x] for x in range(len(hgnc)) if not(benign_matches[x]) ]
+        
+        # check if any of the genes for the partner variants have damaging
+        # consequences
+        benign_match = not(any([ not x for x in benign_matches ]))
+        
+        if passes and not benign_match:
+            return (var, check, inh, hgnc)
+        
+        log_str = "{}\t{} dropped from polyphen prediction".format(self.family.child.get_id(), var)
+        logging.info(log_str)
+        if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
+            print(log_str)
+        
+        return None
+    
+    def index_compound_partners(self, variants):
+        """ index the compound het variants by gene, with their polyphen status
+        
+        The partners for each gene are summarised, so that checking the
+        partners of a variant is a dictionary lookup, rather than a scan of the
+        variants.
+        
+        Args:
+            variants: list of (variant, check, inheritance, gene) tuples
+        
+        Returns:
+            dictionary of (partners, not_benign, distinct, error) tuples, indexed
+            by gene, where partners is the number of compound het variants in
+            the gene, not_benign is how many of those are de novo or not
+            polyphen benign, distinct is the number of different trio genotypes
+            for the not benign variants, and error is True if the polyphen
+            predictions for a partner couldn't be matched to the gene.
+        """
+        
+        genes = {}
         for (var, check, inh, hgnc) in variants:
-            
-            try:
-                polyphen = self.get_polyphen_for_genes(var, hgnc)
-            except IndexError:
+            if "compound_het" not in check:
                 continue
             
-            # check if the variant on it's own would pass
-            passes = "benign" not in polyphen or \
-                var.get_trio_genotype() == var.get_de_novo_genotype()
-            
-            # check all of the other variants to see if any are in the same
-            # gene, compound_het, and polyphen benign
-            benign_matches = [ self.has_compound_match(var, x, variants) for x in hgnc ]
-            
-            # exclude HGNC ID where partner variants are polyphen benign
-            hgnc = [ hgnc[x] for x in range(len(hgnc)) if not(benign_matches[x]) ]
-            
-            # check if any of the genes for the partner variants have damaging
-            # consequences
-            benign_match = not(any([ not x for x in benign_matches ]))
-            
-            if passes and not benign_match:
-                passed_vars.append((var, check, inh, hgnc))
-            else:
-                log_str = "{}\t{} dropped from polyphen prediction".format(self.family.child.get_id(), var)
-                logging.info(log_str)
-                if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
-                    print(log_str)
-        
-        return passed_vars
+            genotype = var.get_trio_genotype()
+            de_novo = genotype == var.get_de_novo_genotype()
+            for gene in set(hgnc):
+                if gene not in genes:
+                    genes[gene] = {"partners": 0, "genotypes": [], "error": False}
+                genes[gene]["partners"] += 1
+                
+                # find the variants that are not benign, or are benign but de novo.
+                if de_novo:
+                    genes[gene]["genotypes"].append(genotype)
+                    continue
+                
+                try:
+                    if "benign" not in self.get_polyphen_for_genes(var, gene):
+                        genes[gene]["genotypes"].append(genotype)
+                except IndexError:
+                    genes[gene]["error"] = True
+        
+        return dict( (x, (y["partners"], len(y["genotypes"]),
+            len(set(y["genotypes"])), y["error"])) for x, y in genes.items() )
     
     def has_compound_match(self, var, hgnc, variants):
         """ for a compound var, find if its partner is also polyphen benign
@@ -241,30 +383,37 @@ class PostInheritanceFilter(object):
             True/false for whether there is a compound het match
         """
         
-        # get a list of the variants in the gene
-        compound_vars = [ x[0] for x in variants if hgnc in x[3] and "compound_het" in x[1] ]
+        return self.compound_match(var, hgnc, self.index_compound_partners(variants))
+    
+    def compound_match(self, var, hgnc, partners):
+        """ find if the compound het partners in a gene are polyphen benign
+        
+        Args:
+            var: TrioGenotypes object
+            hgnc: HGNC ID that we need to match for the partner variant
+            partners: dictionary of compound het partners indexed by gene, as
+                per index_compound_partners()
+        
+        Returns:
+            True/false for whether there is a compound het match
+        """
         
-        if len(compound_vars) < 2:
+        count, not_benign, distinct, error = partners.get(hgnc, (0, 0, 0, False))
+        if count < 2:
             return False
         
-        # run through the variants, find all the variants that are not benign,
-        # or are benign but de novo.
-        not_benign = []
-        for alt_var in compound_vars:
-            if alt_var.get_trio_genotype() == alt_var.get_de_novo_genotype():
-                not_benign.append(alt_var)
-            elif "benign" not in self.get_polyphen_for_genes(alt_var, hgnc):
-                not_benign.append(alt_var)
+        if error:
+            raise IndexError("polyphen predictions don't match the genes for "
+                "a compound het in {}".format(hgnc))
         
         # if we have more than two non-benign variants with different genotypes,
         # then we don't want to exclude these variants. Unless we lack parents
         # since those will have the same trio genotypes by virtue of having
         # "NA" values for the parental genotypes.
-        genotypes = set([ x.get_trio_genotype() for x in not_benign ])
         if None in var.get_trio_genotype():
-            genotypes = [ x.get_trio_genotype() for x in not_benign ]
+            return not_benign <= 1
         
-        return len(genotypes) <= 1
+        return distinct <= 1
     
     def filter_exac(self, variants):
         """ drop variants based on ExAC frequencies
@@ -279,39 +428,48 @@ class PostInheritanceFilter(object):
             has too high a frequency in ExAC.
         """
         
-        passed_vars = []
+        return self.apply_check(self.check_exac, variants)
+    
+    def check_exac(self, candidate):
+        """ check a variant based on ExAC frequencies
         
-        for (var, check, inh, hgnc) in variants:
-            
-            # figure out what the het and hemi counts are in ExAC (if available)
-            hemi, het = 0, 0
-            if "AC_Hemi" in var.child.info and var.get_chrom() == "X":
-                hemi = sum([int(x.replace('.', '0')) for x in var.child.info["AC_Hemi"].split(",")])
-            if "AC_Het" in var.child.info:
-                het = sum([int(x.replace('.', '0')) for x in var.child.info["AC_Het"].split(",")])
-            
-            geno = var.get_trio_genotype()
-            # filter out hemizygous variants on chrX in males. Autosomal
-            # and female chrX variants should pass through unfiltered.
-            # We don't filter out de novo variants based on the ExAC hemizygous
-            # count. We only apply this filter to inherited variants.
-            if "Hemizygous" in inh and self.family.child.is_male() and hemi > 0 and \
-                  geno != var.get_de_novo_genotype() and geno[1:] != ("NA", "NA"):
-                inh.remove("Hemizygous")
-            
-            # filter out monoallelic variants with high ExAC het counts.
-            if var.get_chrom() != "X" and het > 4 and "Monoallelic" in inh:
-                inh.remove("Monoallelic")
-            elif var.get_chrom() == "X" and (het + hemi) > 4 and "X-linked dominant" in inh:
-                inh.remove("X-linked dominant")
-            
-            if inh == []:
-                log_str = "{}\t{} dropped from ExAC frequency count".format(self.family.child.get_id(), var)
-                logging.info(log_str)
-                if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
-                    print(log_str)
-            
-            if inh != []:
-                passed_vars.append((var, check, inh, hgnc))
+        Args:
+            candidate: (variant, check, inheritance, gene) tuple
+        
+        Returns:
+            the tuple, without the inheritance modes where the variant is too
+            frequent in ExAC, or None if no inheritance modes remain.
+        """
         
-        return passed_vars
+        var, check, inh, hgnc = candidate
+        
+        # figure out what the het and hemi counts are in ExAC (if available)
+        hemi, het = 0, 0
+        if "AC_Hemi" in var.child.info and var.get_chrom() == "X":
+            hemi = sum([int(x.replace('.', '0')) for x in var.child.info["AC_Hemi"].split(",")])
+        if "AC_Het" in var.child.info:
+            het = sum([int(x.replace('.', '0')) for x in var.child.info["AC_Het"].split(",")])
+        
+        geno = var.get_trio_genotype()
+        # filter out hemizygous variants on chrX in males. Autosomal
+        # and female chrX variants should pass through unfiltered.
+        # We don't filter out de novo variants based on the ExAC hemizygous
+        # count. We only apply this filter to inherited variants.
+        if "Hemizygous" in inh and self.family.child.is_male() and hemi > 0 and \
+              geno != var.get_de_novo_genotype() and geno[1:] != ("NA", "NA"):
+            inh.remove("Hemizygous")
+        
+        # filter out monoallelic variants with high ExAC het counts.
+        if var.get_chrom() != "X" and het > 4 and "Monoallelic" in inh:
+            inh.remove("Monoallelic")
+        elif var.get_chrom() == "X" and (het + hemi) > 4 and "X-linked dominant" in inh:
+            inh.remove("X-linked dominant")
+        
+        if inh == []:
+            log_str = "{}\t{} dropped from ExAC frequency count".format(self.family.child.get_id(), var)
+            logging.info(log_str)
+            if var.get_chrom() == self.debug_chrom and var.get_position() == self.debug_pos:
+                print(log_str)
+            return None
+        
+        return candidate
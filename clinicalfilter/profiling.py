@@ -0,0 +1,161 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import os
+import cProfile
+import pstats
+from collections import Counter
+
+# the minimum time (in seconds) for a call path to be included in the
+# collapsed stacks, so that deep call graphs don't explode the output
+MIN_STACK_TIME = 1e-6
+
+def get_profile_prefix(directory, name):
+    """ get the path prefix for the profile files of a proband
+    
+    Args:
+        directory: folder to write profiles to.
+        name: name for the profile, e.g. the proband ID.
+    
+    Returns:
+        path prefix, without the file extension.
+    """
+    
+    name = str(name).replace(os.sep, "_")
+    
+    return os.path.join(directory, name)
+
+def profile_call(prefix, func, *args, **kwargs):
+    """ run a function under cProfile, and write the profile to disk
+    
+    The pstats are written to PREFIX.pstats, and the collapsed stacks (for
+    flame graphs) to PREFIX.collapsed.
+    
+    Args:
+        prefix: path prefix for the profile files.
+        func: function to profile.
+        args: positional arguments for the function.
+        kwargs: keyword arguments for the function.
+    
+    Returns:
+        the value returned by the function.
+    """
+    
+    profiler = cProfile.Profile()
+    try:
+        value = profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(prefix + ".pstats")
+        write_collapsed(pstats.Stats(profiler), prefix + ".collapsed")
+    
+    return value
+
+def get_label(func):
+    """ get a short label for a function in a profile
+    
+    Args:
+        func: (filename, line number, function name) tuple, as used by pstats
+    
+    Returns:
+        string label for the function, e.g. "load_vcfs.py:120(open_individual)"
+    """
+    
+    path, line, name = func
+    if path == "~":
+        # builtin functions lack a path
+        return name
+    
+    return "{}:{}({})".format(os.path.basename(path), line, name)
+
+def get_collapsed_stacks(stats):
+    """ convert profile stats to collapsed stacks, for drawing flame graphs
+    
+    cProfile only records the calls between pairs of functions, rather than
+    full stacks, so the time for each function is split between the paths
+    which reach it, in proportion to the time spent in each caller.
+    
+    Args:
+        stats: pstats.Stats object
+    
+    Returns:
+        Counter of microseconds spent in each stack, indexed by
+        semicolon-separated stack string (outermost call first).
+    """
+    
+    timings = stats.stats
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in timings.items():
+        for caller, edge in callers.items():
+            if caller not in callees:
+                callees[caller] = []
+            callees[caller].append((func, edge[3]))
+    
+    stacks = Counter()
+    
+    def walk(func, path, seen, scale):
+        cc, nc, tt, ct, callers = timings[func]
+        path = path + [get_label(func)]
+        seen = seen | set([func])
+        
+        stacks[";".join(path)] += tt * scale
+        for callee, edge_time in callees.get(func, []):
+            total = timings[callee][3]
+            # skip recursive calls, and paths without appreciable time
+            if callee in seen or total <= 0 or edge_time * scale < MIN_STACK_TIME:
+                continue
+            walk(callee, path, seen, scale * edge_time / total)
+    
+    for func in timings:
+        if len(timings[func][4]) == 0:
+            walk(func, [], set(), 1.0)
+    
+    return Counter(dict( (x, int(round(y * 1e6))) for x, y in stacks.items()
+        if round(y * 1e6) > 0 ))
+
+def write_collapsed(stats, path):
+    """ write collapsed stacks, for flame graph tools (e.g. flamegraph.pl)
+    
+    Args:
+        stats: pstats.Stats object
+        path: path to write the collapsed stacks to.
+    """
+    
+    stacks = get_collapsed_stacks(stats)
+    with open(path, "w") as handle:
+        for stack in sorted(stacks):
+            handle.write("{} {}\n".format(stack, stacks[stack]))
+
+def merge_profiles(paths, prefix):
+    """ combine profiles (e.g. one per proband) into an aggregate profile
+    
+    Args:
+        paths: list of paths to pstats files.
+        prefix: path prefix for the aggregate pstats and collapsed stacks.
+    """
+    
+    paths = [ x for x in paths if os.path.exists(x) ]
+    if len(paths) == 0:
+        return
+    
+    stats = pstats.Stats(*paths)
+    stats.dump_stats(prefix + ".pstats")
+    write_collapsed(stats, prefix + ".collapsed")
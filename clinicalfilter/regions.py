@@ -0,0 +1,71 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+def merge_regions(regions, padding=0):
+    """ merge overlapping or adjacent chromosome regions
+    
+    Args:
+        regions: list of (chrom, start, end) tuples, with 1-based inclusive
+            coordinates.
+        padding: number of base-pairs to extend each region by on either side.
+    
+    Returns:
+        list of (chrom, start, end) tuples, sorted by chromosome and position,
+        where no two regions overlap.
+    """
+    
+    merged = []
+    for chrom, start, end in sorted(regions):
+        start = max(1, start - padding)
+        end = end + padding
+        
+        if merged and merged[-1][0] == chrom and start <= merged[-1][2] + 1:
+            previous = merged.pop()
+            start = previous[1]
+            end = max(end, previous[2])
+        
+        merged.append((chrom, start, end))
+    
+    return merged
+
+def get_gene_regions(known_genes, padding=100):
+    """ get the regions spanned by the known genes
+    
+    Args:
+        known_genes: dictionary of known genes (from open_known_genes()),
+            indexed by HGNC ID.
+        padding: number of base-pairs to extend each gene by on either side,
+            so that variants at the edges of genes are still included.
+    
+    Returns:
+        list of merged (chrom, start, end) tuples for the known genes.
+    """
+    
+    regions = []
+    for gene in known_genes.values():
+        # skip entries without coordinates, since we can't find their variants
+        if "chrom" not in gene or "start" not in gene or "end" not in gene:
+            continue
+        
+        regions.append((gene["chrom"], gene["start"], gene["end"]))
+    
+    return merge_regions(regions, padding)
@@ -21,42 +21,221 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import logging
 import datetime
-import gzip
 import sys
 import os
+import threading
+import tempfile
+import shutil
+
+try:
+    import queue
+except ImportError:
+    # python 2 names the module differently
+    import Queue as queue
 
 import clinicalfilter
-from clinicalfilter.utils import get_vcf_header
+from clinicalfilter.utils import get_vcf_header, open_vcf
 from clinicalfilter.utils import get_vcf_provenance
+from clinicalfilter.metrics import StageTimer, Metrics, pop_stages
+from clinicalfilter.bgzf import BgzfWriter, index_vcf
+from clinicalfilter.database import ResultStore
+from clinicalfilter.columnar import ColumnarWriter
+from clinicalfilter.chromosomes import sort_key, merge_sorted
+
+# size of the buffer for the tabular output, and the number of probands to
+# export between flushing the buffer to disk
+BUFFER_SIZE = 1024 * 1024
+FLUSH_INTERVAL = 100
+
+# number of probands that can wait to be exported on the background thread
+EXPORT_QUEUE = 8
+
+# number of threads to compress the exported VCFs with
+VCF_THREADS = 2
+
+# maximum number of VCFs to open at once, when merging the probands exported to
+# a single VCF
+MERGE_FILES = 256
 
 class Report(object):
     ''' A class to report candidate variants.
+    
+    The tabular output is kept open for the run, with a large buffer, since
+    reopening the file for every proband is slow on shared filesystems. Close
+    the Report (or use it as a context manager) to make sure everything is
+    written.
     '''
     
-    def __init__(self, output_path=None, export_vcf=None, known_genes_date=None):
+    def __init__(self, output_path=None, export_vcf=None, known_genes_date=None,
+            flush_interval=FLUSH_INTERVAL, buffer_size=BUFFER_SIZE,
+            vcf_threads=VCF_THREADS, output_db=None, output_columns=None):
         ''' initialise the class
         
         Args:
             output_path: path string to list filtered variants in, or None
             export vcf: path string to export VCF files(s), or None
             known_genes_date: date the known gene list was generated, or None
+            flush_interval: number of probands to export between flushing the
+                tabular output to disk, or None to only flush when the buffer
+                is full, or on closing.
+            buffer_size: size in bytes of the buffer for the tabular output.
+            vcf_threads: number of threads to compress the exported VCFs with.
+            output_db: path to an SQLite database to store the candidates in,
+                or None.
+            output_columns: path to write the candidates to in a columnar
+                format, or None. This is an Arrow file if pyarrow is
+                installed, otherwise a directory of memory-mappable columns.
+                The row groups have flush_interval probands.
         '''
         
         self.output_path = output_path
         self.export_vcf = export_vcf
         self.known_genes_date = known_genes_date
         
+        # (samples, path) tuples for temporary VCFs for each proband, when
+        # exporting all the probands to a single VCF, which are merged on
+        # closing. vcf_merged is whether the single VCF already holds probands
+        # (named in vcf_samples) from when the report was last closed.
+        self.vcf_threads = vcf_threads
+        self.vcf_dir = None
+        self.vcf_parts = []
+        self.vcf_count = 0
+        self.vcf_samples = []
+        self.vcf_merged = False
+        
+        self.store = None
+        if output_db is not None:
+            self.store = ResultStore(output_db, known_genes_date, flush_interval)
+        
+        self.columns = None
+        if output_columns is not None:
+            self.columns = ColumnarWriter(output_columns, flush_interval)
+        
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.handle = None
+        self.unflushed = 0
+        
         # clear the tabular output file if it exists
         if self.output_path is not None:
-            with open(self.output_path, 'w') as handle:
-                handle.write('\t'.join(['proband', 'sex', 'chrom', 'position',
-                    'gene', 'mutation_ID', 'transcript', 'consequence',
-                    'ref/alt_alleles', 'MAX_MAF', 'inheritance',
-                    'trio_genotype', 'mom_aff', 'dad_aff', 'result', 'pp_dnm',
-                    'exac_allele_count', 'GQ', 'has_parents', 'cnv_length']) + '\n')
+            self.handle = open(self.output_path, 'w', self.buffer_size)
+            self.handle.write('\t'.join(['proband', 'sex', 'chrom', 'position',
+                'gene', 'mutation_ID', 'transcript', 'consequence',
+                'ref/alt_alleles', 'MAX_MAF', 'inheritance',
+                'trio_genotype', 'mom_aff', 'dad_aff', 'result', 'pp_dnm',
+                'exac_allele_count', 'GQ', 'has_parents', 'cnv_length']) + '\n')
+            self.handle.flush()
         
         _log_run_details()
     
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, type, value, traceback):
+        self.close()
+    
+    def __getstate__(self):
+        ''' drop the open output file when pickling e.g. for worker processes
+        '''
+        
+        state = self.__dict__.copy()
+        state['handle'] = None
+        state['unflushed'] = 0
+        return state
+    
+    def get_handle(self):
+        ''' get the handle for the tabular output, reopening if closed
+        '''
+        
+        if self.handle is None:
+            self.handle = open(self.output_path, 'a', self.buffer_size)
+        
+        return self.handle
+    
+    def flush(self):
+        ''' write any buffered tabular output to disk
+        '''
+        
+        if self.handle is not None:
+            self.handle.flush()
+        
+        self.unflushed = 0
+    
+    def close(self):
+        ''' close the tabular, database and columnar outputs, and write any
+        merged VCF
+        
+        Exporting more data after closing reopens the tabular output for
+        appending and the database, and rewrites the merged VCF with the extra
+        probands.
+        '''
+        
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        
+        self.unflushed = 0
+        
+        if self.store is not None:
+            self.store.close()
+        
+        if self.columns is not None:
+            self.columns.close()
+        
+        if len(self.vcf_parts) > 0:
+            self.merge_vcf_parts()
+    
+    def get_vcf_part_path(self):
+        ''' get a path for a temporary VCF, to merge into the single VCF
+        
+        The temporary VCFs are kept in a folder beside the single VCF, so the
+        probands exported before any failure can be recovered.
+        '''
+        
+        if self.vcf_dir is None:
+            path = os.path.abspath(self.export_vcf)
+            self.vcf_dir = tempfile.mkdtemp(prefix=os.path.basename(path) + '.',
+                suffix='.parts', dir=os.path.dirname(path))
+        
+        self.vcf_count += 1
+        return os.path.join(self.vcf_dir, '{}.vcf.gz'.format(self.vcf_count))
+    
+    def merge_vcf_parts(self):
+        ''' merge the temporary VCFs for each proband into the single VCF
+        
+        The VCFs are streamed through a sorted merge, at most MERGE_FILES at a
+        time, so the candidates for the cohort are never all held in memory.
+        '''
+        
+        parts = list(self.vcf_parts)
+        if self.vcf_merged:
+            parts.insert(0, (self.vcf_samples, self.export_vcf))
+        
+        # merge in rounds if there are too many files to open at once
+        while len(parts) > MERGE_FILES:
+            merged = []
+            for i in range(0, len(parts), MERGE_FILES):
+                batch = parts[i:i + MERGE_FILES]
+                if len(batch) > 1:
+                    path = self.get_vcf_part_path()
+                    _merge_vcf_files(batch, path, self.vcf_threads)
+                    batch = [([ y for x in batch for y in x[0] ], path)]
+                merged += batch
+            parts = merged
+        
+        # write to a temporary file, since the single VCF can be one of the
+        # files being merged
+        path = self.get_vcf_part_path()
+        _merge_vcf_files(parts, path, self.vcf_threads)
+        os.rename(path, self.export_vcf)
+        index_vcf(self.export_vcf)
+        
+        shutil.rmtree(self.vcf_dir)
+        self.vcf_samples = [ y for x in parts for y in x[0] ]
+        self.vcf_dir = None
+        self.vcf_parts = []
+        self.vcf_merged = True
+    
     def export_data(self, variants, family):
         ''' export the variants to files (if we have specified paths)
         
@@ -67,13 +246,129 @@ class Report(object):
         
         # export the results in tabular format
         if self.output_path is not None:
-            _save_tabular(self.output_path, variants, family)
+            with StageTimer("export_tabular", len(variants)):
+                _write_tabular(self.get_handle(), variants, family)
+                self.unflushed += 1
+                if self.flush_interval is not None and \
+                        self.unflushed >= self.flush_interval:
+                    self.flush()
+        
+        rows = None
+        if self.store is not None or self.columns is not None:
+            rows = [ _get_output_fields(x, family)
+                for x in sorted(variants, key=_candidate_key) ]
+        
+        # store the results in a database, with the provenance of the VCFs
+        if self.store is not None:
+            with StageTimer("export_db", len(variants)):
+                self.store.add(family, rows)
         
-        # export the results in vcf format
+        # and in a typed, columnar format for loading into dataframes
+        if self.columns is not None:
+            with StageTimer("export_columns", len(variants)):
+                self.columns.add(rows)
+        
+        # export the results in vcf format. This includes hashing the VCFs
+        # for the provenance in the header.
         if self.export_vcf is not None:
-            lines = _get_vcf_lines(variants, family)
-            path = _get_vcf_export_path(self.export_vcf, family)
-            _write_vcf(path, lines)
+            with StageTimer("export_vcf", len(variants)):
+                lines = _get_vcf_lines(variants, family)
+                path = _get_vcf_export_path(self.export_vcf, family)
+                if path == self.export_vcf:
+                    part = self.get_vcf_part_path()
+                    _write_vcf(part, lines, self.vcf_threads, index=False)
+                    self.vcf_parts.append(([family.child.get_id()], part))
+                else:
+                    _write_vcf(path, lines, self.vcf_threads)
+
+class ReportWriter(object):
+    ''' exports candidate variants from a Report on a background thread
+    
+    Formatting, compressing and writing the output (and hashing the VCFs for
+    the provenance) then happens while the next proband is analysed. The
+    probands are exported in the order they are given, on a single thread, so
+    the output is the same as exporting directly. The stage timings for the
+    exports are collected in the metrics attribute, by proband.
+    '''
+    
+    def __init__(self, reporter, max_queued=EXPORT_QUEUE):
+        ''' start the writer thread
+        
+        Args:
+            reporter: Report object to export the variants with
+            max_queued: maximum number of probands waiting to be exported,
+                before export_data() blocks, to limit the memory used.
+        '''
+        
+        self.reporter = reporter
+        self.metrics = Metrics()
+        self.error = None
+        
+        self.queue = queue.Queue(max_queued)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, type, value, traceback):
+        self.close()
+    
+    def _run(self):
+        ''' export the queued probands, until the queue gets a None
+        '''
+        
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            
+            # skip exporting after an error, but keep emptying the queue so
+            # that export_data() doesn't block
+            if self.error is not None:
+                continue
+            
+            variants, family = item
+            try:
+                pop_stages()
+                self.reporter.export_data(variants, family)
+                self.metrics.add(family.child.get_id(), pop_stages())
+            except Exception as error:
+                logging.exception("failed to export {}".format(family.child.get_id()))
+                self.error = error
+    
+    def export_data(self, variants, family):
+        ''' queue the variants for a proband to be exported
+        
+        Args:
+            variants: list of (variant, check, inheritance) tuples
+            family: Family object, which shouldn't be modified afterwards.
+        
+        Raises:
+            the exception from an earlier failed export.
+        '''
+        
+        if self.error is not None:
+            raise self.error
+        
+        self.queue.put((variants, family))
+    
+    def close(self):
+        ''' wait for the queued probands to be exported, then close the Report
+        
+        Raises:
+            the exception from an earlier failed export.
+        '''
+        
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        
+        self.reporter.close()
+        
+        if self.error is not None:
+            raise self.error
 
 def _log_run_details():
     ''' log the python version and run date
@@ -95,6 +390,19 @@ def _get_output_line(candidate, family):
         tab-separated line in output format
     '''
     
+    return '\t'.join(_get_output_fields(candidate, family)) + '\n'
+
+def _get_output_fields(candidate, family):
+    ''' gets the fields for the output of a candidate variant
+    
+    Args:
+        candidate: (variant, check, inheritance) tuple
+        family: Family object for the trio.
+    
+    Returns:
+        list of strings, one per column of the tabular output
+    '''
+    
     # get the affected status of the parents
     dad_aff, mom_aff = 'NA', 'NA'
     if family.has_parents():
@@ -161,19 +469,39 @@ def _get_output_line(candidate, family):
         max_af, inh, trio_genotype, mom_aff, dad_aff, result, pp_dnm,
         exac_ac, gq, str(family.has_parents()), cnv_length]
     
-    return '\t'.join(output_line) + '\n'
+    return output_line
+
+def _candidate_key(candidate):
+    ''' get the sort key for a (variant, check, inheritance, genes) tuple
+    
+    Sorting on the precomputed key of the variant avoids comparing the
+    candidate tuples, which compares the variants by their repr.
+    '''
+    
+    return candidate[0].sort_key
 
 def _save_tabular(output_path, variants, family):
     ''' exports candidate variants and their details
     
     Args:
+        output_path: path to append the variants to
         variants: list of (variant, check, inheritance) tuples
     '''
     
     with open(output_path, 'a') as handle:
-        for var in sorted(variants):
-            line = _get_output_line(var, family)
-            handle.write(line)
+        _write_tabular(handle, variants, family)
+
+def _write_tabular(handle, variants, family):
+    ''' writes candidate variants and their details to an open file
+    
+    Args:
+        handle: file handle to write the variants to
+        variants: list of (variant, check, inheritance) tuples
+        family: Family object
+    '''
+    
+    handle.writelines( _get_output_line(x, family)
+        for x in sorted(variants, key=_candidate_key) )
     
 def _get_provenance(provenance, member):
     ''' gets the VCF filename, checksum and VCF date for family members
@@ -325,7 +653,7 @@ def _get_vcf_lines(variants, family):
     for line in _make_vcf_header(header, provenance):
         yield line
     
-    for candidate in sorted(variants):
+    for candidate in sorted(variants, key=_candidate_key):
         var = candidate[0]
         
         prefs = ['HGNC', 'SYMBOL']
@@ -369,15 +697,115 @@ def _get_vcf_lines(variants, family):
         
         yield '\t'.join(vcf_line) + '\n'
 
-def _write_vcf(path, lines):
-    ''' writes a set of lines to a gzip file
+def _split_vcf_header(lines):
+    ''' split the lines of a VCF into the header and the records
+    
+    Args:
+        lines: iterable of lines for a VCF file.
+    
+    Returns:
+        tuple of (header, records), where header is a list of the header lines
+        (ending with the #CHROM line), and records is an iterator of the
+        remaining lines.
+    '''
+    
+    lines = iter(lines)
+    header = []
+    for line in lines:
+        header.append(line)
+        if line.startswith('#CHROM'):
+            break
+    
+    return header, lines
+
+def _merge_vcf_lines(vcfs):
+    ''' merge the VCF lines for probands into a multi-sample VCF
+    
+    Each candidate keeps its own line, since the INFO annotations are specific
+    to the proband, with the proband's sample in its own column, and missing
+    values for the other probands. The provenance lines for each proband are
+    kept in the header.
+    
+    Args:
+        vcfs: list of (samples, lines) tuples, in the order to place the
+            samples. samples is a list of names for the leading sample columns
+            to keep, e.g. the proband ID, and lines is an iterable of lines for
+            a VCF sorted by position, e.g. from _get_vcf_lines() or an open
+            VCF file.
+    
+    Yields:
+        lines for a VCF file. A single VCF's lines are unchanged.
+    '''
+    
+    if len(vcfs) == 1:
+        for line in vcfs[0][1]:
+            yield line
+        return
+    
+    samples = [ x[0] for x in vcfs ]
+    headers, records = zip(*[ _split_vcf_header(x[1]) for x in vcfs ])
+    
+    for line in headers[0][:-1]:
+        if not line.startswith('##UberVCF_'):
+            yield line
+    
+    for header in headers:
+        for line in header:
+            if line.startswith('##UberVCF_'):
+                yield line
+    
+    columns = headers[0][-1].rstrip('\n').split('\t')[:9]
+    yield '\t'.join(columns + [ y for x in samples for y in x ]) + '\n'
+    
+    width = sum(len(x) for x in samples)
+    def get_lines(offset, count, lines):
+        missing = ['.'] * width
+        for line in lines:
+            line = line.rstrip('\n').split('\t')
+            values = list(missing)
+            values[offset:offset + count] = line[9:9 + count]
+            yield line[:9] + values
+    
+    iterables = []
+    for i, lines in enumerate(records):
+        offset = sum(len(x) for x in samples[:i])
+        iterables.append(get_lines(offset, len(samples[i]), lines))
+    
+    for line in merge_sorted(iterables, key=lambda x: sort_key(x[0], x[1])):
+        yield '\t'.join(line) + '\n'
+
+def _merge_vcf_files(vcfs, output_path, threads=1):
+    ''' merge VCF files into a multi-sample BGZF VCF, as per _merge_vcf_lines()
+    
+    Args:
+        vcfs: list of (samples, path) tuples, in the order to place the samples.
+        output_path: path to write the merged VCF to, which isn't indexed.
+        threads: number of threads to compress the VCF with.
+    '''
+    
+    handles = []
+    try:
+        for samples, path in vcfs:
+            handles.append((samples, open_vcf(path)))
+        lines = _merge_vcf_lines(handles)
+        _write_vcf(output_path, lines, threads, index=False)
+    finally:
+        for _, handle in handles:
+            handle.close()
+
+def _write_vcf(path, lines, threads=1, index=True):
+    ''' writes a set of lines to a BGZF-compressed, tabix-indexed VCF
     
     Args:
         path: path to write a file to
-        lines: iterator of lines for a VCF file
+        lines: iterator of lines for a VCF file, sorted by position.
+        threads: number of threads to compress the VCF with.
+        index: whether to tabix-index the VCF.
     '''
     
-    with gzip.open(path, 'w') as handle:
+    with BgzfWriter(path, threads) as handle:
         for x in lines:
-            handle.write(x.encode('utf8'))
-        
+            handle.write(x)
+    
+    if index:
+        index_vcf(path)
@@ -0,0 +1,274 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import os
+import re
+import subprocess
+import importlib
+
+try:
+    from shlex import quote
+except ImportError:
+    # python 2 has quote in the pipes module
+    from pipes import quote
+
+from clinicalfilter.ped import write_ped
+from clinicalfilter.executor import shard_families
+
+# placeholder in commands for the index of the task within a job array, which
+# runs from 1
+INDEX = "{index}"
+
+def format_command(command, index_variable=None):
+    """ format a command as a shell string, quoting each argument
+    
+    Args:
+        command: list of arguments, which can include the INDEX placeholder.
+        index_variable: name of the environment variable holding the index of
+            the task within a job array, to replace the INDEX placeholder with.
+    
+    Returns:
+        command string, for running in a shell.
+    """
+    
+    args = []
+    for arg in command:
+        if index_variable is None or INDEX not in arg:
+            args.append(quote(arg))
+            continue
+        
+        parts = [ quote(x) if x != "" else "" for x in arg.split(INDEX) ]
+        args.append('"${}"'.format(index_variable).join(parts))
+    
+    return " ".join(args)
+
+class Scheduler(object):
+    """ submits jobs to a cluster scheduler
+    
+    Subclasses define the commands to submit with, so other schedulers can be
+    added as plugins, and named by their import path e.g.
+    "mypackage.schedulers:PbsScheduler".
+    """
+    
+    # environment variable with the index of a task within a job array
+    index_variable = None
+    
+    def __init__(self, queue=None, memory=None):
+        """ set the options for submitting jobs
+        
+        Args:
+            queue: name of the queue/partition to submit to, or None
+            memory: memory to request for each job in megabytes, or None
+        """
+        
+        self.queue = queue
+        self.memory = memory
+    
+    def get_array_args(self, name, command, count, log_path):
+        """ get the arguments to submit a job array
+        
+        Args:
+            name: name for the job array
+            command: list of arguments for each task, where the INDEX
+                placeholder is replaced with the index of the task, from 1.
+            count: number of tasks in the array
+            log_path: path for the output of each task, which can include the
+                INDEX placeholder.
+        
+        Returns:
+            list of arguments to run.
+        """
+        
+        raise NotImplementedError
+    
+    def get_dependent_args(self, name, command, dependency, log_path):
+        """ get the arguments to submit a job which waits for another job
+        
+        Args:
+            name: name for the job
+            command: list of arguments for the job
+            dependency: job ID, as returned by submit(), to wait for.
+            log_path: path for the output of the job.
+        
+        Returns:
+            list of arguments to run.
+        """
+        
+        raise NotImplementedError
+    
+    def get_job_id(self, output, name):
+        """ get the ID of a submitted job, from the output when submitting
+        """
+        
+        return name
+    
+    def submit(self, args, name):
+        """ submit a job, as per get_array_args() or get_dependent_args()
+        
+        Returns:
+            ID for the job, which later jobs can depend on.
+        """
+        
+        output = subprocess.check_output(args)
+        return self.get_job_id(output.decode("utf8"), name)
+
+class LsfScheduler(Scheduler):
+    """ submits jobs to an LSF cluster with bsub
+    """
+    
+    index_variable = "LSB_JOBINDEX"
+    
+    def get_options(self, name, log_path):
+        args = ["bsub", "-J", name, "-o", log_path.replace(INDEX, "%I")]
+        if self.queue is not None:
+            args += ["-q", self.queue]
+        
+        if self.memory is not None:
+            args += ["-R", "select[mem>{0}] rusage[mem={0}]".format(self.memory),
+                "-M", str(self.memory)]
+        
+        return args
+    
+    def get_array_args(self, name, command, count, log_path):
+        array = "{}[1-{}]".format(name, count)
+        return self.get_options(array, log_path) + \
+            [format_command(command, self.index_variable)]
+    
+    def get_dependent_args(self, name, command, dependency, log_path):
+        return self.get_options(name, log_path) + \
+            ["-w", "done({})".format(dependency), format_command(command)]
+    
+    def get_job_id(self, output, name):
+        # bsub prints e.g. "Job <1234> is submitted to queue <normal>."
+        match = re.search("Job <([0-9]+)>", output)
+        if match is None:
+            return name
+        
+        return match.group(1)
+
+class SlurmScheduler(Scheduler):
+    """ submits jobs to a Slurm cluster with sbatch
+    """
+    
+    index_variable = "SLURM_ARRAY_TASK_ID"
+    
+    def get_options(self, name, log_path):
+        args = ["sbatch", "--parsable", "--job-name", name,
+            "--output", log_path.replace(INDEX, "%a")]
+        if self.queue is not None:
+            args += ["--partition", self.queue]
+        
+        if self.memory is not None:
+            args += ["--mem", "{}M".format(self.memory)]
+        
+        return args
+    
+    def get_array_args(self, name, command, count, log_path):
+        return self.get_options(name, log_path) + ["--array", "1-{}".format(count),
+            "--wrap", format_command(command, self.index_variable)]
+    
+    def get_dependent_args(self, name, command, dependency, log_path):
+        return self.get_options(name, log_path) + \
+            ["--dependency", "afterok:{}".format(dependency),
+            "--wrap", format_command(command)]
+    
+    def get_job_id(self, output, name):
+        # sbatch --parsable prints the job ID, and the cluster name if set
+        return output.strip().split(";")[0]
+
+SCHEDULERS = {"lsf": LsfScheduler, "slurm": SlurmScheduler}
+
+def get_scheduler(name, queue=None, memory=None):
+    """ get a Scheduler, by name or by import path for plugins
+    
+    Args:
+        name: name of a built-in scheduler e.g. "lsf", or the import path of a
+            Scheduler subclass e.g. "mypackage.schedulers:PbsScheduler".
+        queue: name of the queue/partition to submit to, or None
+        memory: memory to request for each job in megabytes, or None
+    
+    Returns:
+        Scheduler object
+    """
+    
+    if name in SCHEDULERS:
+        return SCHEDULERS[name](queue, memory)
+    
+    if ":" not in name:
+        raise ValueError("unknown scheduler: {}, use one of {}, or give "
+            "module:Class".format(name, ", ".join(sorted(SCHEDULERS))))
+    
+    module, cls = name.split(":", 1)
+    return getattr(importlib.import_module(module), cls)(queue, memory)
+
+def submit_run(scheduler, program, families, run_args, output_path, tempdir,
+        shards, name=None):
+    """ submit a run across a job array, with a job to merge the outputs
+    
+    The families are split into shards with a similar total size of VCFs, and
+    each shard is analysed by a task of the job array. Once every task has
+    finished, the outputs are merged in order, and the temporary folder is
+    removed.
+    
+    Args:
+        scheduler: Scheduler object
+        program: list of arguments to run the clinical-filter command, e.g.
+            [sys.executable, "bin/clinical_filter.py"]
+        families: list of Family objects
+        run_args: list of extra arguments for each run, e.g. ["--known-genes",
+            path, "--workers", "4"]
+        output_path: path for the merged tabular output.
+        tempdir: folder for the PED files, outputs and logs of each shard.
+            This is created, and removed after merging.
+        shards: number of tasks to split the families over.
+        name: name for the jobs, defaults to the name of the temporary folder.
+    
+    Returns:
+        ID of the job which merges the outputs.
+    """
+    
+    if name is None:
+        name = re.sub("[^A-Za-z0-9_.-]", "_", os.path.basename(tempdir.rstrip(os.sep)))
+    
+    os.makedirs(tempdir)
+    
+    groups = shard_families(families, shards)
+    for i, group in enumerate(groups):
+        write_ped(os.path.join(tempdir, "{}.ped".format(i + 1)), group)
+    
+    ped = os.path.join(tempdir, INDEX + ".ped")
+    command = program + ["run", "--ped", ped, "--output",
+        os.path.join(tempdir, INDEX + ".output.txt")] + run_args
+    args = scheduler.get_array_args(name, command, len(groups),
+        os.path.join(tempdir, INDEX + ".job"))
+    array_id = scheduler.submit(args, name)
+    
+    # merge the outputs and logs, in the order of the shards
+    indices = range(1, len(groups) + 1)
+    command = program + ["merge", "--output", output_path,
+        "--cleanup", tempdir, "--logs"] + \
+        [ os.path.join(tempdir, "{}.ped.log".format(x)) for x in indices ] + \
+        ["--"] + [ os.path.join(tempdir, "{}.output.txt".format(x)) for x in indices ]
+    args = scheduler.get_dependent_args("merge_" + name, command, array_id,
+        output_path + ".merge.job")
+    
+    return scheduler.submit(args, "merge_" + name)
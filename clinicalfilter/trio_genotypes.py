@@ -19,6 +19,9 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+from clinicalfilter.attrition import count_variants
+from clinicalfilter import chromosomes
+
 class TrioGenotypes(object):
     """ loads variant data from individuals into a single object, so we can easily
     get genotype data for a single variant from all the family members.
@@ -41,6 +44,13 @@ class TrioGenotypes(object):
         
         self.debug_chrom = debug_chrom
         self.debug_pos = debug_pos
+        
+        # precompute the key for sorting, since candidates get sorted before
+        # being exported
+        self.sort_key = None
+        if self.get_chrom() is not None:
+            self.sort_key = chromosomes.sort_key(self.get_chrom(),
+                self.get_position())
     
     def get_chrom(self):
         if self.child is not None:
@@ -82,23 +92,13 @@ class TrioGenotypes(object):
             int value of chrom
         """
         
-        # set the integer values of the sex chromosomes
-        chrom_dict = {"X": 23, "CHRX": 23, "Y": 24, "CHRY": 24, "MT": 25, \
-            "CHRMT": 25}
-            
-        try:
-            chrom = int(chrom)
-        except ValueError:
-            chrom = chrom_dict[chrom.upper()]
-        
-        return chrom
+        return chromosomes.chrom_to_int(chrom)
     
     def __eq__(self, other):
         return self.__hash__() == other.__hash__()
     
     def __lt__(self, other):
-        return (self.chrom_to_int(self.get_chrom()), int(self.get_position())) < \
-              (self.chrom_to_int(other.get_chrom()), int(other.get_position()))
+        return self.sort_key < other.sort_key
     
     def __repr__(self):
         return 'TrioGenotypes(chrom="{}", pos={}, child={}, mother={},' \
@@ -160,34 +160,47 @@ class TrioGenotypes(object):
             boolean value for whether the variant should be included
         """
         
+        passes, key = self.check_de_novo(pp_filter)
+        count_variants("de_novo", key)
+        
+        if not passes and self.get_chrom() == self.debug_chrom and \
+                self.get_position() == self.debug_pos:
+            print(self, "failed {} check".format(key))
+        
+        return passes
+    
+    def check_de_novo(self, pp_filter):
+        """ checks the child's de novo variant against each filter in turn
+        
+        Args:
+            pp_filter: float between 0 and 1, being the threshold for the PP_DNM filter
+        
+        Returns:
+            tuple of (True/False for whether the variant should be included,
+                and string for the last checked filter)
+        """
+        
         # currently hard code the filtering fields. The de novo field indicates
         # whether the variant is de novo, I don't know how this is assigned. The
         # project filter field indicates an internal filter, curently whether
         # the variant passed MAF, alternate frequency, and segmental duplication
         # criteria.
-        de_novo_field = set(["DENOVO-SNP", "DENOVO-INDEL"])
         
         # if the variant is not de novo, don't worry about de novo filtering
         if self.get_trio_genotype() != self.get_de_novo_genotype():
-            return True
+            return (True, "not de novo")
         
         # check the VCF record to see whether the variant has been screened out.
         # Either DENOVO-SNP or DENOVO-INDEL should be in the info.
         if 'DENOVO-SNP' not in self.child.info and 'DENOVO-INDEL' not in self.child.info:
-            if self.get_chrom() == self.debug_chrom and self.get_position() == self.debug_pos:
-                print(self, "failed DENOVO-SNP/INDEL check")
-            return False
+            return (False, "DENOVO")
         
         if "PP_DNM" in self.child.format and \
                 float(self.child.format["PP_DNM"]) < pp_filter:
-            if self.get_chrom() == self.debug_chrom and self.get_position() == self.debug_pos:
-                print(self, "failed PP_DNM threshold")
-            return False
+            return (False, "PP_DNM")
         
         if "TEAM29_FILTER" in self.child.format:
             if self.child.format["TEAM29_FILTER"] != "PASS":
-                if self.get_chrom() == self.debug_chrom and self.get_position() == self.debug_pos:
-                    print(self, "failed TEAM29_FILTER")
-                return False
+                return (False, "TEAM29_FILTER")
         
-        return True
+        return (True, "passed all")
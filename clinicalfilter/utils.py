@@ -25,6 +25,10 @@ import io
 import sys
 import gzip
 import hashlib
+import multiprocessing
+
+import pysam
+import tabix
 
 from clinicalfilter.variant.snv import SNV
 from clinicalfilter.variant.cnv import CNV
@@ -61,6 +65,93 @@ def open_vcf(path):
     
     return handle
 
+def is_indexed(path):
+    """ check if a VCF file has been tabix-indexed
+    
+    Args:
+        path: path to VCF file.
+    
+    Returns:
+        True/False for whether an index exists alongside the VCF.
+    """
+    
+    return os.path.exists(path + ".tbi")
+
+def get_vcf_contigs(path):
+    """ get the chromosomes with variants in a tabix-indexed VCF
+    
+    Args:
+        path: path to tabix-indexed VCF file.
+    
+    Returns:
+        list of chromosome strings, in the order they occur in the VCF.
+    """
+    
+    with pysam.TabixFile(path) as handle:
+        return list(handle.contigs)
+
+def query_vcf(path, region):
+    """ get the lines from a region of a tabix-indexed VCF
+    
+    Args:
+        path: path to tabix-indexed VCF file.
+        region: (chrom, start, end) tuple, with 1-based inclusive coordinates.
+            The start and end can be None, to get the entire chromosome, or
+            the end can be None to get everything after the start.
+    
+    Returns:
+        iterator of VCF lines (already split by tabs) overlapping the region.
+    """
+    
+    chrom, start, end = region
+    vcf = tabix.open(path)
+    
+    try:
+        if start is None:
+            return vcf.querys(chrom)
+        elif end is None:
+            return vcf.querys("{}:{}".format(chrom, start))
+        return vcf.query(chrom, start - 1, end)
+    except tabix.TabixError:
+        # tabix raises an error if the VCF lacks the chromosome, which
+        # occurs for parents without variants on a chromosome.
+        return iter([])
+
+def starts_in_region(line, region):
+    """ check if a VCF line starts within a region
+    
+    Tabix returns every line which overlaps a region, including deletions and
+    CNVs that start before the region. Checking the start position allows
+    splitting a VCF into regions without loading any line twice.
+    
+    Args:
+        line: list of elements from the VCF line for the variant.
+        region: (chrom, start, end) tuple, as per query_vcf().
+    
+    Returns:
+        True/False for whether the variant position lies inside the region.
+    """
+    
+    chrom, start, end = region
+    pos = int(line[1])
+    
+    return (start is None or pos >= start) and (end is None or pos <= end)
+
+def use_worker_pool(jobs):
+    """ check whether to run work on a pool of worker processes
+    
+    Worker processes are daemonic, and daemonic processes are not allowed to
+    start their own processes, so work nested inside a worker runs serially.
+    
+    Args:
+        jobs: number of processes requested.
+    
+    Returns:
+        True/False for whether to start a pool of processes.
+    """
+    
+    return jobs > 1 and not multiprocessing.current_process().daemon
+
 def get_vcf_header(path):
     """ Get the header lines from a VCF file.
     
@@ -153,23 +244,34 @@ def construct_variant(line, gender, mnvs=None, sum_x_lr2=None):
     
     return var
 
-def get_vcf_provenance(person):
-    """ get provenance information for a VCF
+# SHA1 hashes of VCF files, keyed by path, modification time and size, so that
+# VCFs shared between probands (e.g. the parents of siblings), or used for
+# several outputs, are only read once per run
+CHECKSUMS = {}
+
+def get_vcf_checksum(path):
+    """ get the SHA1 hash of a VCF file (in a memory efficient manner)
+    
+    The hash is cached until the file is modified.
     
     Args:
-        person: Person object for an individual, or None if the person doesn't exist
+        path: path to the VCF file.
     
     Returns:
-        returns a tuple of sha1 VCF file hash, name of VCF file (without
-        directory), and date the VCF file was generated
+        hex string of the SHA1 hash of the file.
     """
     
-    if person is None:
-        return ('NA', 'NA', 'NA')
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    if key not in CHECKSUMS:
+        CHECKSUMS[key] = _hash_file(path)
     
-    path = person.get_path()
+    return CHECKSUMS[key]
+
+def _hash_file(path):
+    """ get the SHA1 hash of a file, reading it in blocks
+    """
     
-    # get the SHA1 hash of the VCF file (in a memory efficient manner)
     BLOCKSIZE = 65536
     checksum = hashlib.sha1()
     with open(path, "rb") as handle:
@@ -178,7 +280,24 @@ def get_vcf_provenance(person):
             checksum.update(buf)
             buf = handle.read(BLOCKSIZE)
     
-    checksum = checksum.hexdigest()
+    return checksum.hexdigest()
+
+def get_vcf_provenance(person):
+    """ get provenance information for a VCF
+    
+    Args:
+        person: Person object for an individual, or None if the person doesn't exist
+    
+    Returns:
+        returns a tuple of sha1 VCF file hash, name of VCF file (without
+        directory), and date the VCF file was generated
+    """
+    
+    if person is None:
+        return ('NA', 'NA', 'NA')
+    
+    path = person.get_path()
+    checksum = get_vcf_checksum(path)
     basename = os.path.basename(path)
     
     date = None
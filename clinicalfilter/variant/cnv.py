@@ -19,9 +19,11 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+from clinicalfilter.attrition import count_variants
 from clinicalfilter.variant.variant import Variant
 from clinicalfilter.variant.cnv_acgh_filter import ACGH_CNV
 from clinicalfilter.variant.cnv_exome_filter import ExomeCNV
+from clinicalfilter.known_gene_index import KnownGeneIndex
 
 class CNV(Variant):
     """  class for holding copy number information for a single individual
@@ -33,11 +35,32 @@ class CNV(Variant):
     debug_chrom = None
     debug_pos = None
     
+    # interval index over the known genes, built when first needed
+    known_genes_index = None
+    
+    # (start, end) coordinates of the known genes that the CNV overlaps,
+    # indexed by HGNC ID. This is set when the gene IDs are fixed.
+    known_gene_ranges = None
+    
     @classmethod
     def set_debug(cls, chrom, pos):
         cls.debug_chrom = chrom
         cls.debug_pos = pos
     
+    def get_known_genes_index(self):
+        """ get the interval index for the known genes
+        
+        The index is shared between CNVs, and only rebuilt if the known genes
+        have changed.
+        """
+        
+        index = CNV.known_genes_index
+        if index is None or not index.indexes(self.known_genes):
+            index = KnownGeneIndex(self.known_genes)
+            CNV.known_genes_index = index
+        
+        return index
+    
     def is_cnv(self):
         """ checks whether the variant is for a CNV
         """
@@ -102,26 +125,38 @@ class CNV(Variant):
         """ find the genes that the CNV overlaps from a dict of known genes
         
         Sometimes the gene annotation for a CNV is incorrect - VEP annotated
-        that the CNV overlaps a gene when other tools show there is not overlap.
-        We correct for these by checking against a set of known genes
-        (currently the DDG2P set).
+        that the CNV overlaps a gene when other tools show there is not overlap,
+        or VEP missed a gene that the CNV does overlap. We correct for these by
+        checking against an interval index of known genes (currently the DDG2P
+        set).
         """
         
         if self.known_genes is None:
             return
         
         (start, end) = self.get_range()
+        overlaps = self.get_known_genes_index().overlapping(self.get_chrom(),
+            start, end)
+        self.known_gene_ranges = overlaps
+        
+        # known genes which are missed by VEP get a consequence matching the
+        # copy number change
+        cq = "transcript_amplification"
+        if "<DEL>" in self.alt_alleles:
+            cq = "transcript_ablation"
+        
         for i, allele_genes in enumerate(self.info.get_genes()):
             
             known = [ x for x in allele_genes if x in self.known_genes ]
             for x in known:
-                gene_start = self.known_genes[x]["start"]
-                gene_end = self.known_genes[x]["end"]
-                
                 # if the gene does not correctly overlap the known gene range,
                 # drop the gene symbol, so we do not pick the variant up
-                if not (start <= gene_end and end >= gene_start):
+                if x not in overlaps:
                     self.info.symbols[i].set(x, None, 'HGNC_ID')
+            
+            for x in sorted(set(overlaps) - set(allele_genes)):
+                symbols = {'HGNC_ID': x, 'HGNC': self.known_genes[x].get("symbol")}
+                self.info.add_gene(i, symbols, cq)
     
     def passes_filters(self):
         """Checks whether a VCF variant passes user defined criteria.
@@ -130,34 +165,60 @@ class CNV(Variant):
             boolean value for whether the variant passes the filters
         """
         
+        passes, key = self.check_filters()
+        count_variants("cnv", key)
+        
+        if not passes and self.get_chrom() == self.debug_chrom and \
+                self.get_position() == self.debug_pos:
+            print("failed {}: {}".format(key, self.get_filter_value(key)))
+        
+        return passes
+    
+    def check_filters(self):
+        """Checks whether a VCF variant passes user defined criteria.
+        
+        Returns:
+            tuple of (True/False for whether the variant passes the filters, and
+                string for the last checked filter)
+        """
+        
         # some CNVs are on female Y chrom, which give errors, fail those CNVs
         try:
             self.set_genotype()
         except ValueError:
-            return False
+            return (False, "genotype")
         
         # we rely on the CALLSOURCE field to inform us what the CNV has been
         # called by. Raise an error if this is not present.
         assert "CALLSOURCE" in self.info
         
-        track_variant = False
-        if self.get_chrom() == self.debug_chrom and self.get_position() == self.debug_pos:
-            track_variant = True
-        
-        passes = True
         if "aCGH" in self.info["CALLSOURCE"]:
-            filt = ACGH_CNV(self)
-            passes = filt.filter_cnv(track_variant)
+            return ACGH_CNV(self).check_cnv()
         elif "EXOME" in self.info["CALLSOURCE"]:
-            # currently return false for all exome-only CNVs, undergoing testing
-            filt = ExomeCNV(self)
-            passes = filt.filter_cnv(track_variant)
-        else:
-            if track_variant:
-                print("CNV is not an aCGH or exome CNV")
-            passes = False
+            return ExomeCNV(self).check_cnv()
         
-        return passes
+        # the CNV is not an aCGH or exome CNV
+        return (False, "CALLSOURCE")
+    
+    def get_filter_value(self, key):
+        """ get the value for the field that a CNV filter checks
+        
+        Args:
+            key: name of the filter, as per check_filters()
+        
+        Returns:
+            value from the INFO or FORMAT fields, or None if neither has the
+            field.
+        """
+        
+        if key == "SUM_X_LR2":
+            return self.get_sum_x_lr2()
+        elif key in self.info:
+            return self.info[key]
+        elif self.format is not None and key in self.format:
+            return self.format[key]
+        
+        return None
     
     def get_cnv_inheritance(self):
         ''' identify the CNV inheritance state
@@ -33,41 +33,38 @@ class ACGH_CNV(object):
         """ filters the CNV
         """
         
-        passes = True
+        passes, key = self.check_cnv()
+        if not passes and track_variant:
+            print("failed {}: {}".format(key, self.cnv.get_filter_value(key)))
+        
+        return passes
+    
+    def check_cnv(self):
+        """ checks the CNV against each of the filters in turn
+        
+        Returns:
+            tuple of (True/False for whether the CNV passes the filters, and
+                string for the last checked filter)
+        """
+        
         if self.fails_mad_ratio():
-            passes = False
-            if track_variant:
-                print("failed mad ratio", self.cnv.info["MEANLR2"], self.cnv.info["MADL2R"])
+            return (False, "MADL2R")
         elif self.fails_wscore():
-            passes = False
-            if track_variant:
-                print("failed wscore", self.cnv.info["WSCORE"])
+            return (False, "WSCORE")
         elif self.fails_callp():
-            passes = False
-            if track_variant:
-                print("failed callp", self.cnv.info["CALLP"])
+            return (False, "CALLP")
         elif self.fails_commmon_forwards():
-            passes = False
-            if track_variant:
-                print("failed commonforwards", self.cnv.info["COMMONFORWARDS"])
+            return (False, "COMMONFORWARDS")
         elif self.fails_meanlr2():
-            passes = False
-            if track_variant:
-                print("failed meanlr2", self.cnv.info["MEANLR2"])
+            return (False, "MEANLR2")
         elif self.fails_no_exons():
-            passes = False
-            if track_variant:
-                print("failed no exons", self.cnv.info["NUMBEREXONS"])
+            return (False, "NUMBEREXONS")
         elif self.fails_frequency():
-            passes = False
-            if track_variant:
-                print("failed frequency", self.cnv.info["ACGH_RC_FREQ50"])
+            return (False, "ACGH_RC_FREQ50")
         elif self.fails_cifer_inh():
-            passes = False
-            if track_variant:
-                print("failed CIFER inheritance", self.cnv.format["CIFER_INHERITANCE"])
+            return (False, "CIFER_INHERITANCE")
         
-        return passes
+        return (True, "passed all")
     
     def fails_mad_ratio(self):
         """ checks if the MAD ratio is too low.
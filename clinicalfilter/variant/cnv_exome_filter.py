@@ -31,53 +31,47 @@ class ExomeCNV(object):
     def filter_cnv(self, track_variant):
         """ filters the CNV
         """
-        passes = True
+        
+        passes, key = self.check_cnv()
+        if not passes and track_variant:
+            print("failed {}: {}".format(key, self.cnv.get_filter_value(key)))
+        
+        return passes
+    
+    def check_cnv(self):
+        """ checks the CNV against each of the filters in turn
+        
+        Returns:
+            tuple of (True/False for whether the CNV passes the filters, and
+                string for the last checked filter)
+        """
+        
         if self.fails_convex_score():
-            passes = False
-            if track_variant:
-                print("failed CONVEX score", self.cnv.info["CONVEX"])
+            return (False, "CONVEXSCORE")
         elif self.fails_population_frequency():
-            passes = False
-            if track_variant:
-                print("failed pop freq", self.cnv.info["RC50INTERNALFREQ"])
+            return (False, "RC50INTERNALFREQ")
         elif self.fails_mad_ratio():
-            passes = False
-            if track_variant:
-                print("failed mad ratio", self.cnv.info["MEANLR2"], self.cnv.info["MADL2R"])
+            return (False, "MADL2R")
         elif self.fails_meanlr2():
-            passes = False
-            if track_variant:
-                print("failed meanlr2", self.cnv.info["MEANLR2"])
+            return (False, "MEANLR2")
         elif self.fails_commmon_forwards():
-            passes = False
-            if track_variant:
-                print("failed commonforwards", self.cnv.info["COMMONFORWARDS"])
+            return (False, "COMMONFORWARDS")
         elif self.fails_cifer_inh():
-            passes = False
-            if track_variant:
-                print("failed CIFER inheritance", self.cnv.format["CIFER_INHERITANCE"])
-                # elif self.fails_no_exons():
-        #     passes = False
-        #     if track_variant:
-        #         print("failed no exons", self.info["NUMBEREXONS"])
-#additional filters
-#FAIL not_inherited or uncertain deletion calls if they meet at least 2 out of the 3 criteria:
-#- convex_meanl2r > -1.5  
-#- convex_score < 15
-#- convex_mad_l2r > 0.15
-#Apply total l2r on X chromosome filter of <-5000 and >7000 
-
+            return (False, "CIFER_INHERITANCE")
+        # elif self.fails_no_exons():
+        #     return (False, "NUMBEREXONS")
+        # Apply total l2r on X chromosome filter of <-5000 and >7000
         elif self.fails_x_lr2():
-            passes = False
-            if track_variant:
-                print("fails sum mean l2r on X chromosome")
-
+            return (False, "SUM_X_LR2")
+        # FAIL not_inherited or uncertain deletion calls if they meet at least
+        # 2 out of the 3 criteria:
+        # - convex_meanl2r > -1.5
+        # - convex_score < 15
+        # - convex_mad_l2r > 0.15
         elif self.fails_additional_filters():
-            passes = False
-            if track_variant:
-                print("DEL fails at least 2 of 3 additional CNV filters (mean l2r < -2, score < 20, mad > 0.2)")
-       
-        return passes
+            return (False, "ADDITIONAL_FILTERS")
+        
+        return (True, "passed all")
     
     def fails_convex_score(self):
         """ checks if the convex score is out of bounds
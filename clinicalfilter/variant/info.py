@@ -19,6 +19,8 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+import copy
+
 from clinicalfilter.variant.symbols import Symbols
 
 class Info(object):
@@ -78,6 +80,20 @@ class Info(object):
                 key, value = item, True
             self.info[key] = value
     
+    def copy(self):
+        """ get a copy of the parsed INFO, which can be changed independently
+        
+        This is quicker than parsing the INFO text again.
+        """
+        
+        info = copy.copy(self)
+        info.info = dict(self.info)
+        info.symbols = [ x.copy() for x in self.symbols ]
+        if self.consequence is not None:
+            info.consequence = [ list(x) for x in self.consequence ]
+        
+        return info
+    
     def set_genes_and_consequence(self, chrom, pos, alts, masked):
         ''' find the gene symbols and consequences for good alleles
         '''
@@ -148,6 +164,29 @@ class Info(object):
         
         return [ x.prioritise() for x in self.symbols ]
     
+    def add_gene(self, idx, symbols, consequence):
+        """ add a gene (and its consequence) to the genes for an alt allele
+        
+        Args:
+            idx: index position for the alt allele (after removing the masked
+                alt alleles).
+            symbols: dictionary of symbols for the gene, indexed by symbol type
+                e.g. {'HGNC_ID': '1001', 'HGNC': 'ARID1B'}.
+            consequence: VEP consequence for the gene e.g. 'transcript_ablation'
+        """
+        
+        self.symbols[idx].add(symbols)
+        
+        if self.consequence is None:
+            return
+        
+        # keep the consequences in step with the gene symbols, so that the
+        # consequence lookup by gene position picks up the new consequence
+        cq = self.consequence[idx]
+        k = len(self.symbols[idx].symbols) - 1
+        cq += [None] * (k - len(cq))
+        cq.insert(k, consequence)
+    
     def get_consequences(self, chrom, pos, alts, masked):
         """ get a list of consequences for the different alt alleles
         
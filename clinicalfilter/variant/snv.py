@@ -19,6 +19,7 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+from clinicalfilter.attrition import count_variants
 from clinicalfilter.variant.variant import Variant
 
 class SNV(Variant):
@@ -199,6 +200,7 @@ class SNV(Variant):
         """
         
         pass_value, key = self.check_filters()
+        count_variants("variant", key)
         
         return pass_value
     
@@ -213,22 +215,34 @@ class SNV(Variant):
         """
         
         pass_value, key = self.check_filters()
+        count_variants("variant", key)
         
         if pass_value == False and self.get_position() == self.debug_pos:
-            
-            if key == "MAF":
-                value = self.info.find_max_allele_frequency()
-            elif key == "consequence":
-                value = self.info.consequence
-            elif key == "FILTER":
-                value = self.filter
-            elif key == "HGNC":
-                value = "not in a known gene"
-            
-            print("failed {0}: {1}".format(key, value))
+            print("failed {0}: {1}".format(key, self.get_filter_value(key)))
         
         return pass_value
     
+    def get_filter_value(self, key):
+        """ get the value that a filter checks, to explain why a variant failed
+        
+        Args:
+            key: name of the filter, as per check_filters()
+        
+        Returns:
+            value checked by the filter, or None for unknown filters.
+        """
+        
+        if key == "MAF":
+            return self.info.find_max_allele_frequency()
+        elif key == "consequence":
+            return self.info.consequence
+        elif key == "FILTER":
+            return self.filter
+        elif key == "HGNC":
+            return "not in a known gene"
+        
+        return None
+    
     def check_filters(self):
         """Checks whether a VCF record passes user defined criteria.
         
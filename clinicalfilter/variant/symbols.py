@@ -19,6 +19,8 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+import copy
+
 class Symbols(object):
     ''' represent gene symbols for an alt allele
     '''
@@ -65,6 +67,15 @@ class Symbols(object):
             data = dict(zip(self.fields, ( temp[x][i] for x in range(len(self.fields)) )))
             self.symbols.append(data)
     
+    def copy(self):
+        ''' get a copy of the symbols, which can be changed independently
+        '''
+        
+        symbols = copy.copy(self)
+        symbols.symbols = [ dict(x) for x in self.symbols ]
+        
+        return symbols
+    
     def __repr__(self):
         info = {}
         for field in self.fields:
@@ -142,6 +153,20 @@ class Symbols(object):
         
         raise KeyError('{} not found in symbols'.format(symbol))
     
+    def add(self, symbols):
+        ''' add the symbols for another gene
+        
+        Currently, this is only used to add known DD genes which a CNV overlaps,
+        but which were not annotated for the CNV.
+        
+        Args:
+            symbols: dictionary of symbols for the gene, indexed by symbol type
+                e.g. {'HGNC_ID': '1001', 'HGNC': 'ARID1B'}. Missing symbol
+                types are set to None.
+        '''
+        
+        self.symbols.append(dict(( (x, symbols.get(x)) for x in self.fields )))
+    
     def set(self, symbol, alternate, field):
         ''' update a symbol.
         
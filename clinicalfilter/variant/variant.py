@@ -19,6 +19,8 @@ IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
+import copy
+
 from clinicalfilter.variant.info import Info
 
 class Variant(object):
@@ -115,6 +117,57 @@ class Variant(object):
             ','.join(self.alt_alleles), self.qual, self.filter, info, keys, sample,
             gender, mnv_code)
     
+    def copy_with_genotype(self, alts, keys, sample, gender):
+        """ copy the variant for another individual, with a different genotype
+        
+        The copy gets a copy of this variant's parsed INFO where the INFO would
+        be parsed identically, rather than reparsing the INFO text. This makes
+        it cheap to create default variants for parents who lack the childs
+        variant.
+        
+        Args:
+            alts: comma-separated alternate alleles for the copy
+            keys: FORMAT keys for the copy e.g. "GT"
+            sample: FORMAT values for the copy e.g. "0/0"
+            gender: gender code for the individual
+        
+        Returns:
+            Variant object of the same type, as if it had been constructed
+            with the same definition, but the new alleles and genotype.
+        """
+        
+        alt_alleles = tuple(alts.split(','))
+        
+        # the gene symbols and consequences depend on the alt alleles, the MNV
+        # code, and the alleles masked for low depth in this individual (which
+        # the default genotypes lack), so the INFO has to be reparsed if any of
+        # these differ. CNVs also have their genes fixed after construction.
+        if alt_alleles != self.alt_alleles or self.mnv_code is not None or \
+                self.is_cnv() or \
+                len(self.get_low_depth_alleles(self.ref_allele, self.alt_alleles)) > 0:
+            return type(self)(self.chrom, self.position, self.variant_id,
+                self.ref_allele, alts, self.qual, self.filter, str(self.info),
+                keys, sample, gender)
+        
+        var = copy.copy(self)
+        var.info = self.info.copy()
+        var.mnv_code = None
+        var.sum_x_lr2 = None
+        var.vcf_line = None
+        var.inheritance_type = None
+        var.genotype = None
+        
+        var.gender = None
+        if gender is not None:
+            var._set_gender(gender)
+        
+        var.format = None
+        var.add_format(keys, sample)
+        if var._get_gender() is not None:
+            var.set_genotype()
+        
+        return var
+    
     def __hash__(self):
         return hash(str(self))
     
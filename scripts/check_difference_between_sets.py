@@ -1,12 +1,17 @@
 # code to check overlap or not between different sets of filtered variants
 
 import os
-import subprocess
-import tempfile
 
 import pandas
 
+from clinicalfilter.filter import Filter, PP_DNM_THRESHOLD
+from clinicalfilter.load_options import MAF_POPULATIONS
+from clinicalfilter.ped import load_families
+from clinicalfilter.explain import explain_cohort
+
 HOME = "/nfs/users/nfs_j/jm33/clinical_reporting_output"
+SYNDROME_REGIONS = "/lustre/scratch113/projects/ddd/resources/decipher_syndrome_list_20140428.txt"
+KNOWN_GENES = "/lustre/scratch113/projects/ddd/resources/ddd_data_releases/2014-11-04/DDG2P/dd_genes_for_clinical_filter"
 
 def get_vcf_path(sample_id, ped_path):
     ''' identifies the VCF path for a person from within a PED file
@@ -16,71 +21,43 @@ def get_vcf_path(sample_id, ped_path):
     
     return sample['vcf']
 
-def construct_pedigree_file(proband_id, original_path, new_path):
-    ''' constructs a pedigree file for a single proband (and their parents)
-    '''
-    
-    ped = read.table(original_path)
-    
-    proband_line = ped[ped['individual_id'] == proband_id]
-    father_line = ped[ped['individual_id'] == proband_line['father_id']]
-    mother_line = ped[ped['individual_id'] == proband_line['mother_id']]
-    
-    family = rbind(proband_line, father_line, mother_line)
+def check_variant_fail(variants, ped_path):
+    ''' identify the reason why each variant failed the clinical filtering
     
-    family.to_csv(new_path, sep="\t", index=False)
-
-def check_variant_fail(variant, ped_path):
-    ''' run clinical filtering on a set of variants, debugging each time, so that can
-    identify the reason why each individual variant failed the clinical filtering
+    Each proband's trio is loaded once, and the variants are checked in-process,
+    rather than running clinical filtering once per variant.
     
     Args:
-     variant: data frame or list for single variant, providing proband,
-         chrom and position info
+     variants: data frame of variants, providing proband, chrom and position
+         info
      ped_path: path to a pedigree file that contains family information for
-         the proband and the probands parents. Note that the ped file can contain
-         info for other families, since we construct a ped file specifically for
-         the proband of interest within this function, using the info from the
-         ped_path argument.
+         the probands and the probands parents.
+    
+    Returns:
+        list of reasons, one per variant, in the same order as the variants.
     
     Examples:
-        check_variant_fail(list(proband="DDDP100099", chrom=6, position=152712420),
-            "~/samples.ped")
+        check_variant_fail(pandas.DataFrame({"proband": ["DDDP100099"],
+            "chrom": ["6"], "position": [152712420]}), "~/samples.ped")
     '''
     
-    proband_id = variant["proband"]
-    temp_ped = tempfile.NamedTemporaryFile(suffix=".ped")
-    construct_pedigree_file(proband_id, ped_path, temp_ped.name)
-    
-    pos = variant["position"]
-    chrom = variant["chrom"]
-    
-    command = ['python3', "/nfs/users/nfs_j/jm33/apps/clinical-filter/bin/clinical_filter.py",
-        "--ped",  temp_ped.name,
-        "--output", "test.txt",
-        "--syndrome-regions", "/lustre/scratch113/projects/ddd/resources/decipher_syndrome_list_20140428.txt",
-        "--known-genes", "/lustre/scratch113/projects/ddd/resources/ddd_data_releases/2014-11-04/DDG2P/dd_genes_for_clinical_filter",
-        "--debug-chrom", chrom,
-        "--debug-pos", pos]
-    
-    reason = subprocess.check_output(command)
-    # allow for character(0) standard out
-    # if (is.character(reason) & length(reason) == 0L) { reason = NA}
-    # # trim multi-line output
-    reason = reason.split('\n')[0]
-    if len(reason) > 100:
-        reason = reason[0:100]
-    
-    # if reason == '':
-    #     path = get_vcf_path(proband_id, ped_path)
-    #     string = paste("^", chrom, "\t", pos, sep="")
-    #     grep_check = grep(string, readLines(path))
-    #     if (is.integer(grep_check) & length(grep_check) == 0L) { reason = "variant not in VCF"}
-    
-    print(proband_id, chrom, pos, reason)
-    temp_ped.close()
-    
-    return reason
+    # match the defaults for clinical_filter.py, which made the baseline
+    finder = Filter(MAF_POPULATIONS, 1, known_genes=KNOWN_GENES,
+        regions=SYNDROME_REGIONS, pp_filter=PP_DNM_THRESHOLD)
+    families = load_families(ped_path)
+    
+    queries = zip(variants["proband"], variants["chrom"], variants["position"])
+    records = explain_cohort(finder, families, list(queries))
+    
+    reasons = []
+    for record in records:
+        reason = record["reason"]
+        if record["stage"] == "vcf" and reason == "not in VCF":
+            reason = "variant not in VCF"
+        print(record["proband"], record["chrom"], record["pos"], reason)
+        reasons.append(reason)
+    
+    return reasons
 
 def combine_fail_categories(variants):
     ''' aggregate the fail categories, so we can easily make tables
@@ -102,6 +79,12 @@ def combine_fail_categories(variants):
     category[variants['reason'].contains("PP_DNM")] = "failed PP_DNM"
     category[variants['reason'].contains("failed CQ")] = "consequence changed"
     category[variants['reason'].contains("failed HGNC")] = "gene symbol not picked up"
+    category[variants['reason'] == "MAF"] = "failed MAF"
+    category[variants['reason'] == "polyphen"] = "polyphen changed"
+    category[variants['reason'] == "DENOVO"] = "not called by denovogear"
+    category[variants['reason'] == "FILTER"] = "failed gatk filter"
+    category[variants['reason'] == "consequence"] = "consequence changed"
+    category[variants['reason'] == "HGNC"] = "gene symbol not picked up"
     category[variants['reason'].isnull()] = "likely missing compound pair"
     
     return category
@@ -150,8 +133,8 @@ def main():
     current_only.to_csv(basename + '.added.txt', sep='\t', index=False)
     
     # # check the reasons why each variant failed
-    # initial_only$reason = apply(initial_only, 1, check_variant_fail, CURRENT_PED)
-    # current_only$reason = apply(current_only, 1, check_variant_fail, ORIGINAL_PED)
+    # initial_only['reason'] = check_variant_fail(initial_only, CURRENT_PED)
+    # current_only['reason'] = check_variant_fail(current_only, ORIGINAL_PED)
     #
     # # categorize the fail reasons
     # initial_only$category = combine_fail_categories(initial_only)
@@ -3,7 +3,9 @@ array. Splits trios in a PED file across multiple ped files in order to run
 them in parallel.
 
 Not recommended for use, as this is very scrappy code, and highly user-specific,
-but it works if all the files are in the expected locations.
+but it works if all the files are in the expected locations. Use
+`clinical-filter submit --scheduler lsf` (or `clinical-filter run --workers N`
+on a single machine) instead.
 """
 
 import subprocess
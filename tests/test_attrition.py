@@ -0,0 +1,103 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+import tempfile
+import json
+from collections import Counter
+
+from clinicalfilter.attrition import Attrition, count_variants, pop_counts, \
+    merge_counts, nest_counts
+
+class TestAttritionPy(unittest.TestCase):
+    """ test the filtering attrition counts
+    """
+    
+    def setUp(self):
+        pop_counts()
+    
+    def test_count_variants(self):
+        """ check that count_variants() and pop_counts() work correctly
+        """
+        
+        count_variants("variant", "MAF")
+        count_variants("variant", "MAF")
+        count_variants("post_inheritance", "ExAC", 3)
+        
+        self.assertEqual(pop_counts(), Counter({("variant", "MAF"): 2,
+            ("post_inheritance", "ExAC"): 3}))
+        
+        # popping the counts resets them
+        self.assertEqual(pop_counts(), Counter())
+    
+    def test_merge_counts(self):
+        """ check that merge_counts() adds to the counts for the process
+        """
+        
+        count_variants("variant", "MAF")
+        merge_counts(Counter({("variant", "MAF"): 2, ("de_novo", "PP_DNM"): 1}))
+        
+        self.assertEqual(pop_counts(), Counter({("variant", "MAF"): 3,
+            ("de_novo", "PP_DNM"): 1}))
+    
+    def test_nest_counts(self):
+        """ check that nest_counts() groups the counts by stage
+        """
+        
+        counts = Counter({("variant", "MAF"): 2, ("variant", "passed all"): 1,
+            ("de_novo", "PP_DNM"): 1})
+        
+        self.assertEqual(nest_counts(counts), {
+            "variant": {"MAF": 2, "passed all": 1},
+            "de_novo": {"PP_DNM": 1}})
+    
+    def test_attrition(self):
+        """ check that Attrition tracks counts per proband and for the cohort
+        """
+        
+        attrition = Attrition()
+        attrition.add("child_1", Counter({("variant", "MAF"): 2}))
+        attrition.add("child_2", Counter({("variant", "MAF"): 1,
+            ("de_novo", "DENOVO"): 1}))
+        
+        # and merge the counts from another Attrition, as from a worker process
+        other = Attrition()
+        other.add("child_3", Counter({("variant", "HGNC"): 4}))
+        attrition.update(other)
+        
+        self.assertEqual(attrition.to_dict(), {
+            "cohort": {"variant": {"MAF": 3, "HGNC": 4}, "de_novo": {"DENOVO": 1}},
+            "probands": {"child_1": {"variant": {"MAF": 2}},
+                "child_2": {"variant": {"MAF": 1}, "de_novo": {"DENOVO": 1}},
+                "child_3": {"variant": {"HGNC": 4}}}})
+        self.assertEqual(list(attrition.to_dict()["probands"]),
+            ["child_1", "child_2", "child_3"])
+        
+        # check the counts are written to JSON
+        with tempfile.NamedTemporaryFile(mode="w+") as handle:
+            attrition.write(handle.name)
+            self.assertEqual(json.load(handle), attrition.to_dict())
+            
+            # and read back, keeping the order of the probands
+            loaded = Attrition.read(handle.name)
+            self.assertEqual(loaded.to_dict(), attrition.to_dict())
+            self.assertEqual(list(loaded.probands), ["child_1", "child_2", "child_3"])
@@ -0,0 +1,151 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+import tempfile
+import shutil
+import gzip
+import os
+import struct
+import random
+
+import pysam
+
+from clinicalfilter.bgzf import BgzfWriter, compress_block, index_vcf, \
+    BLOCK_SIZE, EOF_BLOCK
+
+class TestBgzfPy(unittest.TestCase):
+    """ test writing BGZF files
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+    
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+    
+    def get_blocks(self, path):
+        """ get the (block size, uncompressed size) for each block in a file
+        """
+        
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        
+        blocks = []
+        offset = 0
+        while offset < len(data):
+            self.assertEqual(data[offset:offset + 4], b'\x1f\x8b\x08\x04')
+            size = struct.unpack('<H', data[offset + 16:offset + 18])[0] + 1
+            isize = struct.unpack('<I', data[offset + size - 4:offset + size])[0]
+            blocks.append((size, isize))
+            offset += size
+        
+        return blocks
+    
+    def test_compress_block(self):
+        """ check that compress_block() gives a valid gzip member
+        """
+        
+        self.assertEqual(compress_block(b''), EOF_BLOCK)
+        
+        path = os.path.join(self.temp_dir, 'block.gz')
+        with open(path, 'wb') as handle:
+            handle.write(compress_block(b'some text\n'))
+        
+        with gzip.open(path, 'rb') as handle:
+            self.assertEqual(handle.read(), b'some text\n')
+        
+        self.assertEqual(self.get_blocks(path)[0][1], 10)
+    
+    def test_bgzf_writer(self):
+        """ check that BgzfWriter splits the data into blocks
+        """
+        
+        rng = random.Random(1)
+        lines = [ '1\t{}\t.\tA\tG\t.\tPASS\tX={}\n'.format(i, rng.random())
+            for i in range(1, 10000) ]
+        
+        outputs = []
+        for threads in [1, 3]:
+            path = os.path.join(self.temp_dir, 'bgzf_{}.gz'.format(threads))
+            with BgzfWriter(path, threads) as handle:
+                for line in lines:
+                    handle.write(line)
+            
+            with gzip.open(path, 'rb') as handle:
+                self.assertEqual(handle.read().decode('utf8'), ''.join(lines))
+            
+            blocks = self.get_blocks(path)
+            self.assertEqual([ x[1] for x in blocks[:-2] ],
+                [BLOCK_SIZE] * (len(blocks) - 2))
+            self.assertEqual(blocks[-1], (len(EOF_BLOCK), 0))
+            self.assertTrue(all( x[0] <= 65536 for x in blocks ))
+            
+            with open(path, 'rb') as handle:
+                outputs.append(handle.read())
+        
+        # the output is the same regardless of the number of threads
+        self.assertEqual(outputs[0], outputs[1])
+    
+    def test_bgzf_writer_incompressible(self):
+        """ check that incompressible blocks still fit within the block limit
+        """
+        
+        path = os.path.join(self.temp_dir, 'random.gz')
+        data = os.urandom(BLOCK_SIZE * 2 + 10)
+        with BgzfWriter(path) as handle:
+            handle.write(data)
+        
+        blocks = self.get_blocks(path)
+        self.assertEqual([ x[1] for x in blocks ], [BLOCK_SIZE, BLOCK_SIZE, 10, 0])
+        self.assertTrue(all( x[0] <= 65536 for x in blocks ))
+        
+        with gzip.open(path, 'rb') as handle:
+            self.assertEqual(handle.read(), data)
+    
+    def test_index_vcf(self):
+        """ check that index_vcf() indexes a BGZF VCF
+        """
+        
+        path = os.path.join(self.temp_dir, 'indexed.vcf.gz')
+        header = ['##fileformat=VCFv4.1\n',
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n']
+        lines = [ '{}\t{}\t.\tA\tG\t.\tPASS\t.\n'.format(chrom, pos)
+            for chrom in ['1', '2'] for pos in range(100, 100000, 100) ]
+        
+        with BgzfWriter(path, 2) as handle:
+            handle.write(''.join(header + lines))
+        
+        index_vcf(path)
+        self.assertTrue(os.path.exists(path + '.tbi'))
+        
+        with pysam.TabixFile(path) as handle:
+            self.assertEqual(list(handle.contigs), ['1', '2'])
+            self.assertEqual(list(handle.fetch('2', 499, 700)),
+                ['2\t500\t.\tA\tG\t.\tPASS\t.', '2\t600\t.\tA\tG\t.\tPASS\t.',
+                '2\t700\t.\tA\tG\t.\tPASS\t.'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+
+from clinicalfilter.chromosomes import chrom_to_int, sort_key, merge_sorted, \
+    POSITION_BITS
+
+class TestChromosomesPy(unittest.TestCase):
+    """ test the chromosome ordering functions
+    """
+    
+    def test_chrom_to_int(self):
+        """ check that chrom_to_int() ranks the standard chromosomes
+        """
+        
+        self.assertEqual(chrom_to_int("1"), 1)
+        self.assertEqual(chrom_to_int("22"), 22)
+        self.assertEqual(chrom_to_int("X"), 23)
+        self.assertEqual(chrom_to_int("chrX"), 23)
+        self.assertEqual(chrom_to_int("x"), 23)
+        self.assertEqual(chrom_to_int("Y"), 24)
+        self.assertEqual(chrom_to_int("MT"), 25)
+        self.assertEqual(chrom_to_int("chrMT"), 25)
+    
+    def test_chrom_to_int_unknown(self):
+        """ check that unknown chromosomes sort after the standard chromosomes
+        """
+        
+        self.assertEqual(chrom_to_int("chrM"), chrom_to_int("MT"))
+        self.assertEqual(chrom_to_int("M"), 25)
+        
+        # unknown chromosomes are ordered by name, whichever is seen first
+        later = chrom_to_int("GL000193.1")
+        rank = chrom_to_int("GL000192.1")
+        self.assertGreater(rank, chrom_to_int("MT"))
+        self.assertGreater(later, rank)
+        self.assertGreater(chrom_to_int("HLA-A*01:01:01:01"), later)
+        self.assertLess(chrom_to_int("GL"), rank)
+        
+        self.assertEqual(chrom_to_int("GL000192.1"), rank)
+        self.assertEqual(chrom_to_int("chrGL000192.1"), rank)
+        
+        # positions on unknown chromosomes sort within the chromosome
+        self.assertLess(sort_key("GL000192.1", 2 ** 31), sort_key("GL000193.1", 1))
+    
+    def test_sort_key(self):
+        """ check that sort_key() orders by chromosome, then position
+        """
+        
+        self.assertEqual(sort_key("1", 100), (1 << POSITION_BITS) + 100)
+        self.assertEqual(sort_key("1", "100"), sort_key("1", 100))
+        self.assertLess(sort_key("1", 100), sort_key("1", 101))
+        self.assertLess(sort_key("2", 1), sort_key("10", 1))
+        self.assertLess(sort_key("1", 249250621), sort_key("2", 1))
+        self.assertLess(sort_key("22", 1), sort_key("X", 1))
+    
+    def test_merge_sorted(self):
+        """ check that merge_sorted() merges sorted iterables
+        """
+        
+        first = [("1", 100), ("2", 5), ("X", 1)]
+        second = [("1", 50), ("1", 100), ("10", 1)]
+        key = lambda x: sort_key(*x)
+        
+        merged = list(merge_sorted([iter(first), iter(second)], key))
+        self.assertEqual(merged, [("1", 50), ("1", 100), ("1", 100), ("2", 5),
+            ("10", 1), ("X", 1)])
+        
+        # items with equal keys keep the order of the iterables, and don't need
+        # to be comparable themselves
+        first = [{"name": "a"}]
+        second = [{"name": "b"}, {"name": "c"}]
+        merged = list(merge_sorted([second, first], key=lambda x: 1))
+        self.assertEqual([ x["name"] for x in merged ], ["b", "c", "a"])
+        
+        self.assertEqual(list(merge_sorted([], key)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
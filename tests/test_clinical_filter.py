@@ -22,14 +22,21 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import unittest
 import tempfile
 import shutil
+import os
+import json
+import multiprocessing
 
 from clinicalfilter.filter import Filter
+from clinicalfilter.reporting import Report
+from clinicalfilter.attrition import Attrition
+from clinicalfilter.metrics import Metrics
 from clinicalfilter.ped import Family, Person
 from clinicalfilter.variant.snv import SNV
+from clinicalfilter.variant.info import Info
 from clinicalfilter.trio_genotypes import TrioGenotypes
 
-from tests.utils import create_variant
-from tests.utils import make_vcf_header, make_vcf_line
+from tests.utils import create_variant, create_snv
+from tests.utils import make_vcf_header, make_vcf_line, write_gzipped_vcf
 
 
 class TestFilterPy(unittest.TestCase):
@@ -108,6 +115,329 @@ class TestFilterPy(unittest.TestCase):
                     format="DP:GT", sample="50:0/0", gender="male", mnv_code=None)),
             ['single_variant'], ['Monoallelic', 'Mosaic'], ['ARID1B'])])
     
+    def make_family(self, fam_id, gene, extra=''):
+        ''' make a trio, with VCFs containing a de novo in the given gene
+        
+        Args:
+            fam_id: family ID
+            gene: gene symbol for the de novo
+            extra: extra INFO fields for the de novo e.g. ';AFR_AF=0.0001'
+        '''
+        
+        paths = {}
+        for member in ['child', 'mom', 'dad']:
+            vcf = make_vcf_header()
+            
+            geno, pp_dnm = '0/0', ''
+            if member == 'child':
+                geno, pp_dnm = '0/1', ';DENOVO-SNP;PP_DNM=1'
+            
+            vcf.append(make_vcf_line(genotype=geno, extra='HGNC=' + gene + pp_dnm + extra))
+            
+            handle = tempfile.NamedTemporaryFile(dir=self.temp_dir, delete=False,
+                suffix='.vcf')
+            for x in vcf:
+                handle.write(x.encode('utf8'))
+            handle.flush()
+            
+            paths[member] = handle.name
+        
+        child = Person(fam_id, fam_id + '_child', 'dad', 'mom', 'female', '2', paths['child'])
+        mom = Person(fam_id, fam_id + '_mom', '0', '0', 'female', '1', paths['mom'])
+        dad = Person(fam_id, fam_id + '_dad', '0', '0', 'male', '1', paths['dad'])
+        
+        return Family(fam_id, [child], mom, dad)
+    
+    def test_filter_families(self):
+        ''' test that filter_families() gives the same output with multiple jobs
+        '''
+        
+        genes = ['ARID1B', 'KMT2A', 'SETD5', 'DYRK1A', 'ANKRD11']
+        
+        outputs = []
+        for jobs in [1, 3]:
+            # the variants are loaded in the workers but exported here, so
+            # clear the populations set by earlier tests, to check the
+            # population frequencies are exported without them
+            Info.set_populations([])
+            families = [ self.make_family('fam{}'.format(i), x, ';AFR_AF=0.0001')
+                for i, x in enumerate(genes) ]
+            path = tempfile.NamedTemporaryFile(dir=self.temp_dir, delete=False).name
+            self.finder.reporter = Report(path)
+            self.finder.count = 0
+            self.finder.filter_families(families, jobs)
+            
+            with open(path) as handle:
+                outputs.append(handle.readlines())
+            
+            self.assertEqual(self.finder.count, len(genes))
+        
+        # the output is in the same order as the families, and matches the
+        # output from a single process, including the MAX_MAF
+        self.assertEqual(len(outputs[0]), len(genes) + 1)
+        self.assertEqual([ x.split('\t')[4] for x in outputs[1][1:] ], genes)
+        self.assertEqual([ x.split('\t')[9] for x in outputs[1][1:] ],
+            ['0.0001'] * len(genes))
+        self.assertEqual(outputs[0], outputs[1])
+    
+    def test_filter_families_export_queue(self):
+        ''' test that filter_families() output is the same with a writer thread
+        '''
+        
+        genes = ['ARID1B', 'KMT2A', 'SETD5']
+        
+        outputs = []
+        for export_queue in [0, 1]:
+            families = [ self.make_family('fam{}'.format(i), x) for i, x in enumerate(genes) ]
+            path = tempfile.NamedTemporaryFile(dir=self.temp_dir, delete=False).name
+            self.finder.reporter = Report(path)
+            self.finder.export_queue = export_queue
+            self.finder.metrics = Metrics()
+            self.finder.filter_families(families)
+            
+            with open(path) as handle:
+                outputs.append(handle.readlines())
+            
+            # the export is timed for every proband, after the analysis stages
+            for proband, stages in self.finder.metrics.probands.items():
+                self.assertEqual(list(stages)[-1], 'export_tabular')
+            
+            self.assertIsNone(self.finder.writer)
+        
+        self.assertEqual(len(outputs[0]), len(genes) + 1)
+        self.assertEqual(outputs[0], outputs[1])
+    
+    def test_filter_families_writer_after_pool(self):
+        ''' test that the writer thread isn't running when workers are forked
+        '''
+        
+        families = [ self.make_family('fam{}'.format(i), x) for i, x in enumerate(['ARID1B', 'KMT2A']) ]
+        path = tempfile.NamedTemporaryFile(dir=self.temp_dir, delete=False).name
+        self.finder.reporter = Report(path)
+        self.finder.export_queue = 1
+        
+        writers = []
+        pool = multiprocessing.Pool
+        def make_pool(*args, **kwargs):
+            writers.append(self.finder.writer)
+            return pool(*args, **kwargs)
+        
+        multiprocessing.Pool = make_pool
+        try:
+            self.finder.filter_families(families, 2)
+            
+            # nor when gene workers are forked for each proband
+            families = [ self.make_family('fam{}'.format(i), x) for i, x in enumerate(['ARID1B', 'KMT2A']) ]
+            self.finder.reporter = Report(path)
+            self.finder.gene_jobs = 2
+            self.finder.filter_families(families)
+        finally:
+            multiprocessing.Pool = pool
+        
+        self.assertTrue(len(writers) > 1)
+        self.assertEqual(writers, [None] * len(writers))
+        
+        with open(path) as handle:
+            self.assertEqual(len(handle.readlines()), 3)
+    
+    def test_filter_families_attrition(self):
+        ''' test that filter_families() counts variants at each filtering stage
+        '''
+        
+        genes = ['ARID1B', 'KMT2A', 'SETD5']
+        
+        outputs = []
+        for jobs in [1, 3]:
+            families = [ self.make_family('fam{}'.format(i), x) for i, x in enumerate(genes) ]
+            path = tempfile.NamedTemporaryFile(dir=self.temp_dir, delete=False).name
+            self.finder.attrition = Attrition()
+            self.finder.attrition_path = path
+            self.finder.filter_families(families, jobs)
+            
+            with open(path) as handle:
+                outputs.append(json.load(handle))
+        
+        # the counts are the same regardless of the number of processes
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(list(outputs[0]['probands']),
+            ['fam0_child', 'fam1_child', 'fam2_child'])
+        
+        cohort = outputs[0]['cohort']
+        self.assertEqual(cohort['variant'], {'passed all': 3})
+        self.assertEqual(cohort['de_novo'], {'passed all': 3})
+        self.assertEqual(cohort['inheritance'], {'checked': 3, 'passed all': 3})
+        self.assertEqual(cohort['post_inheritance'], {'MAF': 0, 'polyphen': 0,
+            'ExAC': 0, 'passed all': 3})
+    
+    def test_filter_families_metrics(self):
+        ''' test that filter_families() times each stage for each proband
+        '''
+        
+        families = [ self.make_family('fam{}'.format(i), x) for i, x in enumerate(['ARID1B', 'KMT2A']) ]
+        path = tempfile.NamedTemporaryFile(dir=self.temp_dir, delete=False).name
+        self.finder.reporter = Report(path)
+        self.finder.metrics = Metrics()
+        self.finder.metrics_path = path + '.metrics.jsonl'
+        self.finder.filter_families(families, 2)
+        
+        with open(self.finder.metrics_path) as handle:
+            lines = [ json.loads(x) for x in handle ]
+        
+        stages = [ x['stage'] for x in lines if x['proband'] == 'fam0_child' ]
+        self.assertEqual(stages, ['mnv', 'child_parse', 'parent_parse',
+            'combine_trio', 'de_novo', 'inheritance', 'post_inheritance',
+            'export_tabular'])
+        
+        post_filter = [ x for x in lines if x['stage'] == 'post_inheritance' ][0]
+        self.assertEqual(post_filter['records_in'], 1)
+        self.assertEqual(post_filter['records_out'], 1)
+    
+    def test_filter_families_profile(self):
+        ''' test that filter_families() profiles each proband
+        '''
+        
+        families = [ self.make_family('fam{}'.format(i), x) for i, x in enumerate(['ARID1B', 'KMT2A']) ]
+        self.finder.profile_dir = os.path.join(self.temp_dir, 'profiles')
+        os.mkdir(self.finder.profile_dir)
+        self.finder.filter_families(families, 2)
+        
+        self.assertEqual(sorted(os.listdir(self.finder.profile_dir)),
+            ['_aggregate.collapsed', '_aggregate.pstats',
+            'fam0_child.collapsed', 'fam0_child.pstats',
+            'fam1_child.collapsed', 'fam1_child.pstats'])
+    
+    def test_filter_families_largest_first(self):
+        ''' test that the output order is kept when large families start first
+        '''
+        
+        genes = ['ARID1B', 'KMT2A', 'SETD5', 'DYRK1A']
+        families = [ self.make_family('fam{}'.format(i), x) for i, x in enumerate(genes) ]
+        
+        # make the last family the largest, so it is analysed first
+        path = families[-1].child.get_path()
+        with open(path) as handle:
+            lines = handle.readlines()
+        with open(path, 'w') as handle:
+            handle.writelines(lines[:1] + ['##padding\n'] * 1000 + lines[1:])
+        
+        path = tempfile.NamedTemporaryFile(dir=self.temp_dir, delete=False).name
+        self.finder.reporter = Report(path)
+        self.finder.filter_families(families, 2)
+        
+        with open(path) as handle:
+            lines = handle.readlines()[1:]
+        
+        self.assertEqual([ x.split('\t')[4] for x in lines ], genes)
+    
+    def test_run_family(self):
+        ''' test that run_family() retries families which fail
+        '''
+        
+        family = self.make_family('fam0', 'ARID1B')
+        analyse_family = self.finder.analyse_family
+        
+        failures = []
+        def flaky(family):
+            # count the proband, and fail the first attempt
+            results = analyse_family(family)
+            if len(failures) == 0:
+                failures.append(family)
+                raise IOError('transient error')
+            return results
+        
+        self.finder.analyse_family = flaky
+        self.finder.count = 0
+        results, attrition, metrics = self.finder.run_family(family)
+        
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][0].child.get_id(), 'fam0_child')
+        
+        # the counts are only from the successful attempt, and the original
+        # family isn't modified by the analysis
+        self.assertEqual(self.finder.count, 1)
+        self.assertEqual(list(attrition.probands), ['fam0_child'])
+        self.assertEqual(list(metrics.probands), ['fam0_child'])
+        self.assertEqual(self.finder.attrition.probands, {})
+        self.assertFalse(family.child.is_analysed())
+        
+        # families which fail every attempt raise the error
+        failures[:] = []
+        self.finder.retries = 0
+        with self.assertRaises(IOError):
+            self.finder.run_family(family)
+    
+    def test_analyse_shards(self):
+        ''' test that analyse_trio() gives the same results with sharded VCFs
+        '''
+        
+        paths = {}
+        for member in ['child', 'mom', 'dad']:
+            vcf = make_vcf_header()
+            vcf.insert(2, '##contig=<ID=1,length=100>\n')
+            
+            geno, pp_dnm = '0/0', ''
+            if member == 'child':
+                geno, pp_dnm = '0/1', ';DENOVO-SNP;PP_DNM=1'
+            
+            vcf.append(make_vcf_line(pos=5, genotype=geno, extra='HGNC=ARID1B' + pp_dnm))
+            vcf.append(make_vcf_line(pos=50, genotype=geno, extra='HGNC=KMT2A' + pp_dnm))
+            vcf.append(make_vcf_line(chrom='2', pos=5, genotype=geno, extra='HGNC=SETD5' + pp_dnm))
+            
+            paths[member] = os.path.join(self.temp_dir, 'shards.{}.vcf.gz'.format(member))
+            write_gzipped_vcf(paths[member], vcf)
+        
+        fam_id = 'fam01'
+        child = Person(fam_id, 'child', 'dad', 'mom', 'female', '2', paths['child'])
+        mom = Person(fam_id, 'mom', '0', '0', 'female', '1', paths['mom'])
+        dad = Person(fam_id, 'dad', '0', '0', 'male', '1', paths['dad'])
+        family = Family(fam_id, [child], mom, dad)
+        family.set_child()
+        
+        expected = self.finder.analyse_trio(family)
+        self.assertEqual([ x[3] for x in expected ], [['ARID1B'], ['KMT2A'], ['SETD5']])
+        
+        for shard_size in [0, 20]:
+            self.finder.shard_size = shard_size
+            self.assertEqual(self.finder.analyse_trio(family), expected)
+    
+    def test_analyse_trio_target_regions(self):
+        ''' test that analyse_trio() only checks variants in the target regions
+        '''
+        
+        paths = {}
+        for member in ['child', 'mom', 'dad']:
+            vcf = make_vcf_header()
+            
+            geno, pp_dnm = '0/0', ''
+            if member == 'child':
+                geno, pp_dnm = '0/1', ';DENOVO-SNP;PP_DNM=1'
+            
+            vcf.append(make_vcf_line(pos=5, genotype=geno, extra='HGNC=ARID1B' + pp_dnm))
+            vcf.append(make_vcf_line(pos=50, genotype=geno, extra='HGNC=KMT2A' + pp_dnm))
+            
+            paths[member] = os.path.join(self.temp_dir, 'targets.{}.vcf.gz'.format(member))
+            write_gzipped_vcf(paths[member], vcf)
+        
+        fam_id = 'fam01'
+        child = Person(fam_id, 'child', 'dad', 'mom', 'female', '2', paths['child'])
+        mom = Person(fam_id, 'mom', '0', '0', 'female', '1', paths['mom'])
+        dad = Person(fam_id, 'dad', '0', '0', 'male', '1', paths['dad'])
+        family = Family(fam_id, [child], mom, dad)
+        family.set_child()
+        
+        expected = self.finder.analyse_trio(family)
+        
+        self.finder.target_regions = [('1', 40, 60)]
+        self.finder.scan_cnvs = False
+        self.finder.regions_required = True
+        self.assertEqual(self.finder.analyse_trio(family), expected[1:])
+        
+        # unindexed VCFs cannot be restricted to the target regions
+        os.remove(paths['child'] + '.tbi')
+        with self.assertRaises(OSError):
+            self.finder.analyse_trio(family)
+    
     def test_create_gene_dict(self):
         """ test that create_gene_dict works correctly
         """
@@ -122,6 +452,107 @@ class TestFilterPy(unittest.TestCase):
         self.assertEqual(self.finder.create_gene_dict([snv1, snv2, snv3]),
             {"TEST1": [snv1, snv2], "TEST2": [snv1], "OTHER1": [snv3]})
     
+    def test_group_by_gene(self):
+        """ test that group_by_gene() groups variants as each gene completes
+        """
+        
+        def trio(cq, hgnc, chrom, pos):
+            child = create_snv('F', '0/1', cq, hgnc, chrom, pos)
+            mom = create_snv('F', '0/0', cq, hgnc, chrom, pos)
+            dad = create_snv('M', '0/0', cq, hgnc, chrom, pos)
+            return TrioGenotypes(chrom, pos, child, mom, dad)
+        
+        snv1 = trio("missense_variant|missense_variant", "TEST1|TEST2", "1", "100")
+        snv2 = trio("missense_variant", "TEST1", "1", "200")
+        snv3 = trio("synonymous_variant", "TEST3", "1", "300")
+        snv4 = trio("missense_variant", "", "1", "400")
+        snv5 = trio("missense_variant", "OTHER1", "2", "100")
+        
+        # genes are complete at the end of each chromosome, variants without
+        # functional consequences are dropped, and intergenic variants are
+        # passed on immediately
+        self.assertEqual(list(self.finder.group_by_gene([snv1, snv2, snv3, snv4, snv5])),
+            [(None, [snv4]), ("TEST1", [snv1, snv2]), ("TEST2", [snv1]),
+            ("OTHER1", [snv5])])
+        
+        # known genes are only complete at the end of the chromosome, since
+        # variants can be annotated to a gene outside its listed coordinates,
+        # and variants in unknown genes are dropped unless they are CNVs
+        self.finder.known_genes = {
+            "TEST1": {"inh": ["Monoallelic"], "chrom": "1", "start": 50, "end": 250},
+            "OTHER1": {"inh": ["Monoallelic"], "chrom": "2", "start": 50, "end": 250}}
+        far = trio("missense_variant", "TEST1", "1", "1000250")
+        
+        consumed = []
+        def variants():
+            for var in [snv1, snv2, far, snv5]:
+                consumed.append(var)
+                yield var
+        
+        groups = self.finder.group_by_gene(variants())
+        self.assertEqual(next(groups), ("TEST1", [snv1, snv2, far]))
+        self.assertEqual(consumed, [snv1, snv2, far, snv5])
+        self.assertEqual(list(groups), [("OTHER1", [snv5])])
+    
+    def test_find_candidates_outside_gene(self):
+        """ test that compound hets are found when variants lie outside the gene
+        """
+        
+        family = Family("famID")
+        family.add_child("child", "mother", "father", "F", "2", "/vcf/path")
+        family.add_mother("mother", "0", "0", "F", "1", "/vcf/path")
+        family.add_father("father", "0", "0", "M", "1", "/vcf/path")
+        family.set_child()
+        
+        def trio(chrom, pos, geno):
+            child = create_snv('F', geno[0], "missense_variant", "TEST1", chrom, pos)
+            mom = create_snv('F', geno[1], "missense_variant", "TEST1", chrom, pos)
+            dad = create_snv('M', geno[2], "missense_variant", "TEST1", chrom, pos)
+            return TrioGenotypes(chrom, pos, child, mom, dad)
+        
+        # the variants lie far beyond the listed end of the gene, with an
+        # unrelated variant between them
+        self.finder.known_genes = {"TEST1": {"inh": {"Biallelic": {"Loss of function"}},
+            "chrom": "1", "start": 50, "end": 250}}
+        first = trio("1", "1000000", ["0/1", "0/1", "0/0"])
+        second = trio("1", "1000500", ["0/1", "0/0", "0/1"])
+        
+        found = self.finder.find_candidates([first, second], family)
+        self.assertEqual(sorted([ x[1] for x in found ]),
+            [["compound_het"], ["compound_het"]])
+    
+    def test_find_candidates(self):
+        """ test that streaming the genes gives the same results as a pool
+        """
+        
+        family = Family("famID")
+        family.add_child("child_id", 'dad_id', 'mom_id', 'f', '2', "/vcf/path")
+        family.add_father("dad_id", '0', '0', 'm', '1', "/vcf/path")
+        family.add_mother("mom_id", '0', '0', 'f', '1', "/vcf/path")
+        family.set_child()
+        
+        snv1 = create_variant("F", "missense_variant|missense_variant", "TEST1|TEST2")
+        snv2 = create_variant("F", "missense_variant", "OTHER1", chrom="2")
+        snv3 = create_variant("F", "missense_variant", "")
+        snv4 = create_variant("F", "missense_variant", "TESTX", chrom="X")
+        
+        self.finder.known_genes = {"TEST1": {"inh": ["Monoallelic"], "chrom": "1", "end": 200},
+            "OTHER1": {"inh": ["Monoallelic"], "chrom": "2", "end": 200},
+            "TESTX": {"inh": ["X-linked dominant"], "chrom": "X", "end": 200}}
+        
+        # the variants are emptied from the list as they are streamed
+        variants = [snv4, snv1, snv2, snv3]
+        streamed = self.finder.find_candidates(variants, family)
+        self.assertEqual(variants, [])
+        
+        variants = [snv4, snv1, snv2, snv3]
+        pooled = self.finder.find_candidates(variants, family, jobs=2)
+        self.assertEqual(len(variants), 4)
+        
+        key = lambda x: (str(x[0]), x[3])
+        self.assertEqual(sorted(streamed, key=key), sorted(pooled, key=key))
+        self.assertEqual(len(streamed), 3)
+    
     def test_find_variants(self):
         """ test that find_variants() works correctly
         """
@@ -173,6 +604,50 @@ class TestFilterPy(unittest.TestCase):
         # but variants without gene symbols still are excluded
         self.assertEqual(self.finder.find_variants([snv3], None, family), [])
     
+    def test_find_gene_variants(self):
+        """ test that find_gene_variants() gives the same results in parallel
+        """
+        
+        family = Family("famID")
+        family.add_child("child_id", 'dad_id', 'mom_id', 'f', '2', "/vcf/path")
+        family.add_father("dad_id", '0', '0', 'm', '1', "/vcf/path")
+        family.add_mother("mom_id", '0', '0', 'f', '1', "/vcf/path")
+        family.set_child()
+        
+        snv1 = create_variant("F", "missense_variant|missense_variant", "TEST1|TEST2")
+        snv2 = create_variant("F", "missense_variant", "OTHER1", chrom="2")
+        snv3 = create_variant("F", "missense_variant", "")
+        snv4 = create_variant("F", "missense_variant", "TESTX", chrom="X")
+        
+        self.finder.known_genes = {"TEST1": {"inh": ["Monoallelic"]},
+            "OTHER1": {"inh": ["Monoallelic"]},
+            "TESTX": {"inh": ["X-linked dominant"]}}
+        
+        genes = self.finder.create_gene_dict([snv1, snv2, snv3, snv4])
+        serial = self.finder.find_gene_variants(genes, family)
+        
+        self.finder.gene_jobs = 3
+        parallel = self.finder.find_gene_variants(genes, family)
+        
+        # the results are ordered by the genes dictionary, regardless of
+        # which process examined each gene
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel, [ self.finder.find_variants(genes[x], x, family)
+            for x in genes ])
+        self.assertEqual(len([ x for x in parallel if x != [] ]), 3)
+        
+        # the pool for a run is shared by the probands
+        self.finder.start_gene_pool()
+        pool = self.finder.gene_pool
+        try:
+            self.assertEqual(self.finder.find_gene_variants(genes, family), serial)
+            self.assertEqual(self.finder.find_gene_variants(genes, family), serial)
+            self.assertIs(self.finder.gene_pool, pool)
+        finally:
+            self.finder.close_gene_pool()
+        
+        self.assertIsNone(self.finder.gene_pool)
+    
     def test_exclude_duplicates(self):
         """ test that exclude duplicates works correctly
         """
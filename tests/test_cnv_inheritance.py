@@ -576,3 +576,34 @@ class TestCNVInheritancePy(unittest.TestCase):
         self.inh.trio.child.sex = "F"
         cnv.child.info["CNS"] = "3"
         self.assertFalse(self.inh.check_compound_inheritance(cnv))
+    
+    def test_cached_check(self):
+        """ test that cached_check() only runs a check once per CNV
+        """
+        
+        cnv = self.create_variant("female")
+        cnv.child.genotype = "DUP"
+        cnv.child.format["INHERITANCE"] = "deNovo"
+        cnv.child.info["SVLEN"] = "1000001"
+        
+        # without a cache, the check is run every time
+        self.assertTrue(self.inh.cached_check('nonddg2p', cnv, self.inh.passes_nonddg2p_filter))
+        cnv.child.info["SVLEN"] = "999999"
+        self.assertFalse(self.inh.cached_check('nonddg2p', cnv, self.inh.passes_nonddg2p_filter))
+        
+        # with a cache, the first result (and log string) is reused for the CNV
+        cache = {}
+        inh = CNVInheritance(self.trio, self.known_gene, "TEST", None, cache)
+        self.assertFalse(inh.cached_check('nonddg2p', cnv, inh.passes_nonddg2p_filter))
+        cnv.child.info["SVLEN"] = "1000001"
+        inh.log_string = "other"
+        self.assertFalse(inh.cached_check('nonddg2p', cnv, inh.passes_nonddg2p_filter))
+        self.assertEqual(inh.log_string, "short non-DDG2P DUP CNV, inh:de_novo")
+        
+        # the cache is shared with checkers for other genes
+        other = CNVInheritance(self.trio, self.known_gene, "OTHER", None, cache)
+        self.assertFalse(other.cached_check('nonddg2p', cnv, other.passes_nonddg2p_filter))
+        
+        # but a different CNV is checked afresh
+        cnv.child.position = 200
+        self.assertTrue(other.cached_check('nonddg2p', cnv, other.passes_nonddg2p_filter))
@@ -0,0 +1,210 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+import tempfile
+import shutil
+import struct
+import json
+import os
+import pickle
+
+from clinicalfilter.columnar import ColumnarWriter, read_columns, map_column, \
+    get_schema, pyarrow
+
+class TestColumnarPy(unittest.TestCase):
+    """ test writing candidates in a columnar format
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'results.columns')
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def get_row(self, proband, pos, inheritance='Monoallelic', pp_dnm='0.99',
+            cnv_length='NA'):
+        """ get the fields for a candidate, as per the tabular output
+        """
+        
+        return [proband, 'F', '1', str(pos), 'ARID1B', 'NA', 'NA',
+            'missense_variant', 'A/G', '0.0005', inheritance, '1/0/0', '1',
+            '1', 'single_variant', pp_dnm, 'NA', '40', 'True', cnv_length]
+    
+    def test_get_schema(self):
+        """ check the types of the columns
+        """
+        
+        schema = dict(get_schema())
+        self.assertEqual(len(get_schema()), 20)
+        self.assertEqual(schema['position'], 'int64')
+        self.assertEqual(schema['cnv_length'], 'int64')
+        self.assertEqual(schema['max_maf'], 'float64')
+        self.assertEqual(schema['pp_dnm'], 'float64')
+        for name in ['sex', 'result', 'inheritance']:
+            self.assertEqual(schema[name], 'category')
+        self.assertEqual(schema['trio_genotype'], 'string')
+        self.assertEqual(schema['consequence'], 'string')
+    
+    def test_columnar_writer(self):
+        """ check that the pure-python format round trips the candidates
+        """
+        
+        rows = [self.get_row('child1', 100),
+            self.get_row('child1', 200, 'Biallelic', 'NA', '5000')]
+        with ColumnarWriter(self.path, use_arrow=False) as writer:
+            writer.add(rows)
+            writer.add([self.get_row('child2', 300, 'Mosaic')])
+        
+        columns = read_columns(self.path)
+        self.assertEqual(list(columns), [ x for x, y in get_schema() ])
+        self.assertEqual(columns['proband'], ['child1', 'child1', 'child2'])
+        self.assertEqual(columns['position'], [100, 200, 300])
+        self.assertEqual(columns['inheritance'], ['Monoallelic', 'Biallelic', 'Mosaic'])
+        self.assertEqual(columns['pp_dnm'], [0.99, None, 0.99])
+        self.assertEqual(columns['cnv_length'], [None, 5000, None])
+        self.assertEqual(columns['mutation_id'], [None, None, None])
+        self.assertEqual(columns['trio_genotype'], ['1/0/0'] * 3)
+        
+        # a subset of the columns can be read
+        columns = read_columns(self.path, ['position', 'sex'])
+        self.assertEqual(list(columns), ['sex', 'position'])
+        self.assertEqual(columns['sex'], ['F', 'F', 'F'])
+    
+    def test_columnar_writer_row_groups(self):
+        """ check that the candidates are written in row groups of probands
+        """
+        
+        writer = ColumnarWriter(self.path, batch_size=2, use_arrow=False)
+        writer.add([self.get_row('child1', 100), self.get_row('child1', 200)])
+        writer.add([])
+        
+        # the first row group can be read before closing
+        self.assertEqual(read_columns(self.path, ['position'])['position'], [100, 200])
+        
+        writer.add([self.get_row('child3', 300, 'Biallelic')])
+        self.assertEqual(read_columns(self.path, ['position'])['position'], [100, 200])
+        writer.close()
+        
+        with open(os.path.join(self.path, 'columns.json')) as handle:
+            metadata = json.load(handle)
+        
+        self.assertEqual(metadata['row_groups'], [2, 1])
+        self.assertEqual(metadata['rows'], 3)
+        
+        # the categories are shared by the row groups
+        inheritance = [ x for x in metadata['columns'] if x['name'] == 'inheritance' ][0]
+        self.assertEqual(inheritance['categories'], ['Monoallelic', 'Biallelic'])
+        self.assertEqual(list(map_column(self.path, 'inheritance')), [0, 0, 1])
+    
+    def test_map_column(self):
+        """ check that columns are mapped as little-endian numbers
+        """
+        
+        with ColumnarWriter(self.path, use_arrow=False) as writer:
+            writer.add([self.get_row('child1', 100), self.get_row('child1', 2 ** 40)])
+        
+        self.assertEqual(list(map_column(self.path, 'position')), [100, 2 ** 40])
+        
+        with open(os.path.join(self.path, 'position.i64'), 'rb') as handle:
+            self.assertEqual(struct.unpack('<2q', handle.read()), (100, 2 ** 40))
+        
+        with self.assertRaises(ValueError):
+            map_column(self.path, 'proband')
+    
+    def test_columnar_writer_empty(self):
+        """ check the output without any candidates
+        """
+        
+        with ColumnarWriter(self.path, use_arrow=False) as writer:
+            writer.add([])
+        
+        columns = read_columns(self.path)
+        self.assertEqual(columns['position'], [])
+        self.assertEqual(columns['proband'], [])
+        self.assertEqual(list(map_column(self.path, 'position')), [])
+    
+    def test_columnar_writer_replaces(self):
+        """ check that existing output is replaced
+        """
+        
+        with ColumnarWriter(self.path, use_arrow=False) as writer:
+            writer.add([self.get_row('child1', 100)])
+        
+        with ColumnarWriter(self.path, use_arrow=False) as writer:
+            writer.add([self.get_row('child2', 200)])
+        
+        self.assertEqual(read_columns(self.path)['proband'], ['child2'])
+    
+    def test_columnar_writer_pickle(self):
+        """ check that the writer can be pickled, e.g. for worker processes
+        """
+        
+        writer = ColumnarWriter(self.path, use_arrow=False)
+        writer.add([self.get_row('child1', 100)])
+        writer = pickle.loads(pickle.dumps(writer))
+        writer.close()
+        
+        self.assertEqual(read_columns(self.path)['position'], [100])
+    
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_columnar_writer_arrow(self):
+        """ check writing an Arrow file, with a record batch per row group
+        """
+        
+        path = os.path.join(self.temp_dir, 'results.arrow')
+        annotated = self.get_row('child2', 200, 'Biallelic', 'NA')
+        annotated[7] = 'missense_variant,PolyPhen=benign(0.01),SIFT=tolerated(0.5)'
+        with ColumnarWriter(path, batch_size=1, use_arrow=True) as writer:
+            writer.add([self.get_row('child1', 100)])
+            writer.add([annotated])
+            writer.add([self.get_row('child3', 300, 'Mosaic')])
+        
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column('position').num_chunks, 3)
+        self.assertEqual(table.schema.field('consequence').type, pyarrow.string())
+        
+        # the later record batches add to the dictionaries of the earlier
+        # batches, so each chunk decodes to its own values
+        columns = read_columns(path)
+        self.assertEqual(columns['inheritance'], ['Monoallelic', 'Biallelic', 'Mosaic'])
+        self.assertEqual(columns['consequence'], ['missense_variant',
+            'missense_variant,PolyPhen=benign(0.01),SIFT=tolerated(0.5)',
+            'missense_variant'])
+        self.assertEqual(columns['pp_dnm'], [0.99, None, 0.99])
+        
+        inheritance = map_column(path, 'inheritance')
+        self.assertEqual(inheritance.num_chunks, 3)
+        self.assertEqual(inheritance.to_pylist(), ['Monoallelic', 'Biallelic', 'Mosaic'])
+        self.assertEqual(read_columns(path, ['position'])['position'], [100, 200, 300])
+    
+    def test_columnar_writer_without_arrow(self):
+        """ check that Arrow output requires pyarrow
+        """
+        
+        if pyarrow is not None:
+            return
+        
+        with self.assertRaises(ValueError):
+            ColumnarWriter(self.path, use_arrow=True)
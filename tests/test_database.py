@@ -0,0 +1,213 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+import tempfile
+import shutil
+import sqlite3
+import os
+import pickle
+
+import clinicalfilter
+from clinicalfilter.ped import Family
+from clinicalfilter.database import ResultStore, query_candidates, \
+    get_provenance
+
+from tests.utils import make_vcf_header
+
+class TestDatabasePy(unittest.TestCase):
+    """ test storing results in SQLite
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'results.db')
+        
+        self.family = Family('fam')
+        self.family.add_child('child', 'mother', 'father', 'F', '2',
+            os.path.join(self.temp_dir, 'child.vcf'))
+        self.family.add_mother('mother', '0', '0', 'female', '1',
+            os.path.join(self.temp_dir, 'mother.vcf'))
+        self.family.add_father('father', '0', '0', 'male', '1',
+            os.path.join(self.temp_dir, 'father.vcf'))
+        self.family.set_child()
+        
+        for member in [self.family.child, self.family.mother, self.family.father]:
+            with open(member.get_path(), 'w') as handle:
+                handle.writelines(make_vcf_header())
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def get_row(self, chrom, pos, gene, proband='child'):
+        """ get the fields for a candidate, as per the tabular output
+        """
+        
+        return [proband, 'F', chrom, str(pos), gene, 'NA', 'NA',
+            'missense_variant', 'A/G', '0.0005', 'Monoallelic', '1/0/0', '1',
+            '1', 'single_variant', '0.99', 'NA', '40', 'True', 'NA']
+    
+    def test_result_store(self):
+        """ check that ResultStore stores the candidates and provenance
+        """
+        
+        rows = [self.get_row('1', 100, 'ARID1B'), self.get_row('X', 5, 'A,B')]
+        with ResultStore(self.path, '2016-01-01') as store:
+            store.add(self.family, rows)
+        
+        conn = sqlite3.connect(self.path)
+        metadata = dict(conn.execute('SELECT * FROM metadata'))
+        self.assertEqual(metadata['known_genes_date'], '2016-01-01')
+        self.assertEqual(metadata['clinicalfilter_version'],
+            clinicalfilter.__version__)
+        
+        self.assertEqual(conn.execute('SELECT * FROM probands').fetchall(),
+            [('child', 'fam', 'F', 'True', 2)])
+        
+        provenance = conn.execute('SELECT member, basename, date FROM '
+            'provenance').fetchall()
+        self.assertEqual(provenance, [('proband', 'child.vcf', '2014-01-01'),
+            ('maternal', 'mother.vcf', '2014-01-01'),
+            ('paternal', 'father.vcf', '2014-01-01')])
+        
+        # the candidates are typed, with NA values as NULL
+        row = conn.execute('SELECT proband, chrom, position, max_maf, '
+            'mutation_id, gq FROM candidates WHERE id = 1').fetchone()
+        self.assertEqual(row, ('child', '1', 100, 0.0005, None, 40))
+        
+        genes = conn.execute('SELECT candidate, gene FROM candidate_genes').fetchall()
+        self.assertEqual(genes, [(1, 'ARID1B'), (2, 'A'), (2, 'B')])
+        
+        # the tables are indexed for querying
+        indexes = [ x[0] for x in conn.execute("SELECT name FROM sqlite_master "
+            "WHERE type = 'index'") ]
+        self.assertIn('candidates_proband', indexes)
+        self.assertIn('candidates_site', indexes)
+        self.assertIn('candidate_genes_gene', indexes)
+        conn.close()
+    
+    def test_result_store_batches(self):
+        """ check that ResultStore commits in batches of probands
+        """
+        
+        store = ResultStore(self.path, batch_size=2)
+        
+        def count():
+            conn = sqlite3.connect(self.path)
+            try:
+                return conn.execute('SELECT COUNT(*) FROM probands').fetchone()[0]
+            finally:
+                conn.close()
+        
+        store.add(self.family, [])
+        self.assertEqual(count(), 0)
+        store.add(self.family, [self.get_row('1', 100, 'ARID1B')])
+        self.assertEqual(count(), 2)
+        store.add(self.family, [])
+        store.close()
+        self.assertEqual(count(), 3)
+        
+        # adding after closing reconnects to the database
+        store.add(self.family, [])
+        store.close()
+        self.assertEqual(count(), 4)
+    
+    def test_result_store_replaces(self):
+        """ check that ResultStore replaces an existing database
+        """
+        
+        with ResultStore(self.path) as store:
+            store.add(self.family, [self.get_row('1', 100, 'ARID1B')])
+        
+        with ResultStore(self.path) as store:
+            pass
+        
+        self.assertEqual(query_candidates(self.path), [])
+    
+    def test_result_store_pickle(self):
+        """ check that a ResultStore can be pickled, without the connection
+        """
+        
+        with ResultStore(self.path) as store:
+            unpickled = pickle.loads(pickle.dumps(store))
+            self.assertIsNone(unpickled.conn)
+            self.assertEqual(unpickled.path, self.path)
+    
+    def test_query_candidates(self):
+        """ check that query_candidates() filters the candidates
+        """
+        
+        rows = [self.get_row('1', 100, 'ARID1B'), self.get_row('1', 500, 'A,B'),
+            self.get_row('2', 100, 'B', proband='other')]
+        with ResultStore(self.path) as store:
+            store.add(self.family, rows)
+        
+        get_sites = lambda x: [ (y['proband'], y['chrom'], y['position']) for y in x ]
+        
+        self.assertEqual(get_sites(query_candidates(self.path)),
+            [('child', '1', 100), ('child', '1', 500), ('other', '2', 100)])
+        self.assertEqual(get_sites(query_candidates(self.path, gene='B')),
+            [('child', '1', 500), ('other', '2', 100)])
+        self.assertEqual(get_sites(query_candidates(self.path, proband='other')),
+            [('other', '2', 100)])
+        self.assertEqual(get_sites(query_candidates(self.path, gene='B',
+            proband='child')), [('child', '1', 500)])
+        self.assertEqual(get_sites(query_candidates(self.path,
+            region=('1', 200, 600))), [('child', '1', 500)])
+        
+        candidate = query_candidates(self.path, gene='ARID1B')[0]
+        self.assertEqual(candidate['gene'], 'ARID1B')
+        self.assertEqual(candidate['consequence'], 'missense_variant')
+        self.assertIsNone(candidate['transcript'])
+    
+    def test_query_candidates_duplicates(self):
+        """ check that identical candidates are all returned, once each
+        """
+        
+        rows = [self.get_row('1', 100, 'A,A'), self.get_row('1', 100, 'A,A')]
+        with ResultStore(self.path) as store:
+            store.add(self.family, rows)
+        
+        self.assertEqual(len(query_candidates(self.path)), 2)
+        self.assertEqual(len(query_candidates(self.path, gene='A')), 2)
+    
+    def test_get_provenance(self):
+        """ check that get_provenance() handles VCFs without dates
+        """
+        
+        self.assertEqual(get_provenance(None), (None, None, None, None))
+        
+        path, basename, checksum, date = get_provenance(self.family.child)
+        self.assertEqual(basename, 'child.vcf')
+        self.assertEqual(date, '2014-01-01')
+        
+        with open(self.family.child.get_path(), 'w') as handle:
+            handle.writelines(make_vcf_header()[:1] + make_vcf_header()[2:])
+        
+        path, basename, checksum, date = get_provenance(self.family.child)
+        self.assertEqual(path, self.family.child.get_path())
+        self.assertEqual(len(checksum), 40)
+        self.assertIsNone(date)
+
+
+if __name__ == '__main__':
+    unittest.main()
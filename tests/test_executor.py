@@ -0,0 +1,188 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+import unittest
+import tempfile
+import shutil
+import os
+from collections import Counter
+from multiprocessing.pool import ThreadPool
+
+from clinicalfilter.ped import Family
+from clinicalfilter.attrition import Attrition
+from clinicalfilter.executor import get_family_cost, order_by_cost, imap_ordered, \
+    shard_families, merge_tabular, merge_attrition, concatenate
+
+class TestExecutorPy(unittest.TestCase):
+    """ test the helpers for running families in parallel
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def write(self, name, text):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as handle:
+            handle.write(text)
+        
+        return path
+    
+    def make_family(self, fam_id, size):
+        """ make a trio, where the child's VCF is the given size in bytes
+        """
+        
+        family = Family(fam_id)
+        family.add_child(fam_id + '_child', fam_id + '_mom', fam_id + '_dad',
+            'F', '2', self.write(fam_id + '.vcf', 'x' * size))
+        family.add_mother(fam_id + '_mom', '0', '0', 'F', '1',
+            os.path.join(self.temp_dir, 'missing.vcf'))
+        
+        return family
+    
+    def test_get_family_cost(self):
+        """ check the cost of a family, from the size of its VCFs
+        """
+        
+        family = self.make_family('fam', 100)
+        self.assertEqual(get_family_cost(family), 100)
+        
+        # include the parents VCFs, which exist
+        family.add_father('fam_dad', '0', '0', 'M', '1', self.write('dad.vcf', 'x' * 50))
+        self.assertEqual(get_family_cost(family), 150)
+    
+    def test_order_by_cost(self):
+        """ check that the largest families are ordered first
+        """
+        
+        families = [ self.make_family('fam{}'.format(i), x)
+            for i, x in enumerate([10, 30, 20, 30]) ]
+        
+        self.assertEqual(order_by_cost(families), [1, 3, 2, 0])
+        self.assertEqual(order_by_cost([]), [])
+    
+    def test_order_by_cost_window(self):
+        """ check that families are only reordered within windows
+        """
+        
+        families = [ self.make_family('fam{}'.format(i), x)
+            for i, x in enumerate([10, 30, 20, 30, 5]) ]
+        
+        self.assertEqual(order_by_cost(families, 2), [1, 0, 3, 2, 4])
+        self.assertEqual(order_by_cost(families, 5), [1, 3, 2, 0, 4])
+    
+    def test_imap_ordered(self):
+        """ check that jobs which finish out of order are yielded in order
+        """
+        
+        started = []
+        def run(job):
+            started.append(job[0])
+            return job[1]
+        
+        jobs = [(1, 'b'), (0, 'a'), (3, 'd'), (2, 'c'), (4, 'e')]
+        pool = ThreadPool(2)
+        try:
+            values = imap_ordered(pool, run, jobs, 2)
+            self.assertEqual(next(values), 'a')
+            
+            # jobs only start within the window of the next value to yield
+            self.assertEqual(sorted(started), [0, 1])
+            self.assertEqual(list(values), ['b', 'c', 'd', 'e'])
+        finally:
+            pool.close()
+            pool.join()
+        
+        self.assertEqual(sorted(started), [0, 1, 2, 3, 4])
+    
+    def test_shard_families(self):
+        """ check that families are split into consecutive groups of similar sizes
+        """
+        
+        families = [ self.make_family('fam{}'.format(i), x)
+            for i, x in enumerate([50, 10, 40, 20, 30]) ]
+        
+        # the groups keep the order of the families, so concatenating the
+        # outputs for the groups gives the same order as a single run
+        groups = shard_families(families, 2)
+        self.assertEqual([ [ x.family_id for x in y ] for y in groups ],
+            [['fam0', 'fam1'], ['fam2', 'fam3', 'fam4']])
+        self.assertEqual([ x for y in shard_families(families, 3) for x in y ],
+            families)
+        
+        # a large family gets a group of its own
+        families.insert(2, self.make_family('big', 500))
+        groups = shard_families(families, 3)
+        self.assertEqual([ [ x.family_id for x in y ] for y in groups ],
+            [['fam0', 'fam1'], ['big'], ['fam2', 'fam3', 'fam4']])
+        
+        # there are fewer groups than requested when there are fewer families
+        self.assertEqual(len(shard_families(families[:2], 10)), 2)
+        self.assertEqual(shard_families([], 2), [])
+    
+    def test_merge_tabular(self):
+        """ check that tabular outputs are merged in order, with one header
+        """
+        
+        paths = [self.write('1.txt', 'header\na\nb\n'),
+            self.write('2.txt', 'header\n'), self.write('3.txt', 'header\nc\n')]
+        output = os.path.join(self.temp_dir, 'merged.txt')
+        merge_tabular(paths, output)
+        
+        with open(output) as handle:
+            self.assertEqual(handle.read(), 'header\na\nb\nc\n')
+        
+        # outputs with different columns can't be merged
+        paths.append(self.write('4.txt', 'other\nd\n'))
+        with self.assertRaises(ValueError):
+            merge_tabular(paths, output)
+    
+    def test_merge_attrition(self):
+        """ check that attrition counts are merged in order
+        """
+        
+        paths = []
+        for i, proband in enumerate(['child_2', 'child_1']):
+            attrition = Attrition()
+            attrition.add(proband, Counter({('variant', 'MAF'): i + 1}))
+            paths.append(os.path.join(self.temp_dir, '{}.json'.format(i)))
+            attrition.write(paths[-1])
+        
+        output = os.path.join(self.temp_dir, 'merged.json')
+        merge_attrition(paths + [os.path.join(self.temp_dir, 'x')], output)
+        
+        merged = Attrition.read(output)
+        self.assertEqual(list(merged.probands), ['child_2', 'child_1'])
+        self.assertEqual(merged.to_dict()['cohort'], {'variant': {'MAF': 3}})
+    
+    def test_concatenate(self):
+        """ check that files are concatenated, skipping missing files
+        """
+        
+        paths = [self.write('1.log', 'a\n'), os.path.join(self.temp_dir, 'x'),
+            self.write('2.log', 'b\n')]
+        output = os.path.join(self.temp_dir, 'merged.log')
+        concatenate(paths, output)
+        
+        with open(output) as handle:
+            self.assertEqual(handle.read(), 'a\nb\n')
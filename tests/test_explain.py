@@ -0,0 +1,131 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+import tempfile
+import shutil
+import os
+
+from clinicalfilter.filter import Filter
+from clinicalfilter.ped import Family, Person
+from clinicalfilter.explain import explain, explain_cohort, get_variant_lines
+
+from tests.utils import make_vcf_header, make_vcf_line, write_gzipped_vcf
+
+class TestExplainPy(unittest.TestCase):
+    """ test the functions explaining why variants pass or fail
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+    
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+    
+    def setUp(self):
+        """ create a default Filter object and trio to test
+        """
+        
+        population_tags = ["AFR_AF", "AMR_AF", "ASN_AF", "DDD_AF", "EAS_AF",
+            "ESP_AF", "EUR_AF", "MAX_AF", "SAS_AF", "UK10K_cohort_AF"]
+        self.finder = Filter(population_tags, 1, None, None, None, None, 0.9,
+            None, None, None, None, None)
+        
+        # construct the trio VCFs, with variants failing at different stages
+        paths = {}
+        for member in ['child', 'mom', 'dad']:
+            vcf = make_vcf_header()
+            
+            geno, mom_geno, flag = '0/0', '0/0', ''
+            if member == 'child':
+                geno, flag = '0/1', ';DENOVO-SNP'
+            if member == 'mom':
+                mom_geno = '0/1'
+            
+            # a de novo that passes, a synonymous variant, a de novo lacking
+            # the DENOVO flag, and an inherited variant in a monoallelic gene
+            vcf.append(make_vcf_line(pos=5, genotype=geno, extra='HGNC=ARID1B' + flag))
+            vcf.append(make_vcf_line(pos=10, genotype=geno, cq='synonymous_variant', extra='HGNC=ARID1B' + flag))
+            vcf.append(make_vcf_line(pos=20, genotype=geno, extra='HGNC=KMT2A'))
+            vcf.append(make_vcf_line(pos=30, genotype=mom_geno if member == 'mom' else geno, extra='HGNC=KMT2A'))
+            
+            paths[member] = os.path.join(self.temp_dir, 'explain.{}.vcf.gz'.format(member))
+            write_gzipped_vcf(paths[member], vcf)
+        
+        self.paths = paths
+        
+        fam_id = 'fam01'
+        child = Person(fam_id, 'child', 'dad', 'mom', 'female', '2', paths['child'])
+        mom = Person(fam_id, 'mom', '0', '0', 'female', '1', paths['mom'])
+        dad = Person(fam_id, 'dad', '0', '0', 'male', '1', paths['dad'])
+        self.family = Family(fam_id, [child], mom, dad)
+        self.family.set_child()
+    
+    def test_get_variant_lines(self):
+        """ check that get_variant_lines() only gets lines at the given sites
+        """
+        
+        lines = get_variant_lines(self.paths['child'], set([('1', 5), ('1', 99)]))
+        self.assertEqual(list(lines), [('1', 5)])
+        self.assertEqual(lines[('1', 5)][:2], ['1', '5'])
+        
+        # and check we get the same lines from an unindexed VCF
+        path = self.paths['child'] + '.tbi'
+        os.rename(path, path + '.bak')
+        try:
+            self.assertEqual(get_variant_lines(self.paths['child'],
+                set([('1', 5), ('1', 99)])), lines)
+        finally:
+            os.rename(path + '.bak', path)
+    
+    def test_explain(self):
+        """ check that explain() gives the stage each variant fails at
+        """
+        
+        queries = [('1', 99), ('1', 10), ('1', 20), ('1', 30), ('1', 5)]
+        records = explain(self.finder, self.family, queries)
+        
+        self.assertEqual([ (x['pos'], x['stage'], x['reason']) for x in records ],
+            [(99, 'vcf', 'not in VCF'),
+            (10, 'variant', 'consequence'),
+            (20, 'de_novo', 'DENOVO'),
+            (30, 'inheritance', 'inheritance'),
+            (5, None, 'passed')])
+        
+        self.assertEqual(records[1]['value'], [['synonymous_variant']])
+        self.assertEqual(list(records[3]['value']), ['KMT2A'])
+        self.assertEqual(records[4]['value'], {'check': ['single_variant'],
+            'inheritance': ['Monoallelic', 'Mosaic'], 'genes': ['ARID1B']})
+    
+    def test_explain_cohort(self):
+        """ check that explain_cohort() matches queries to probands
+        """
+        
+        queries = [('child', '1', '5'), ('unknown', '1', '5'), ('child', '1', '10')]
+        records = explain_cohort(self.finder, [self.family], queries)
+        
+        self.assertEqual([ (x['proband'], x['pos'], x['reason']) for x in records ],
+            [('child', 5, 'passed'),
+            ('unknown', 5, 'proband not in pedigree'),
+            ('child', 10, 'consequence')])
@@ -0,0 +1,76 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+
+from clinicalfilter.known_gene_index import KnownGeneIndex
+
+class TestKnownGeneIndexPy(unittest.TestCase):
+    ''' test the interval index of known genes
+    '''
+    
+    def setUp(self):
+        ''' define a small set of known genes
+        '''
+        
+        self.known_genes = {
+            "1001": {"chrom": "1", "start": 1000, "end": 2000},
+            "1002": {"chrom": "1", "start": 1500, "end": 1600},
+            "1003": {"chrom": "1", "start": 100, "end": 50000},
+            "1004": {"chrom": "2", "start": 1000, "end": 2000},
+            "1005": {"inh": {"Monoallelic": set(["Loss of function"])}},
+            }
+        
+        self.index = KnownGeneIndex(self.known_genes)
+    
+    def test_overlapping(self):
+        ''' test that overlapping() finds the genes which overlap a region
+        '''
+        
+        self.assertEqual(self.index.overlapping("1", 1550, 1560),
+            {"1001": (1000, 2000), "1002": (1500, 1600), "1003": (100, 50000)})
+        
+        # check that a long gene which starts well before a region is found
+        self.assertEqual(self.index.overlapping("1", 40000, 60000),
+            {"1003": (100, 50000)})
+        
+        # check that the region boundaries are inclusive
+        self.assertEqual(self.index.overlapping("2", 2000, 3000),
+            {"1004": (1000, 2000)})
+        self.assertEqual(self.index.overlapping("2", 500, 1000),
+            {"1004": (1000, 2000)})
+        
+        # check regions that do not overlap any genes
+        self.assertEqual(self.index.overlapping("2", 2001, 3000), {})
+        self.assertEqual(self.index.overlapping("1", 60000, 70000), {})
+        self.assertEqual(self.index.overlapping("X", 1000, 2000), {})
+    
+    def test_indexes(self):
+        ''' test that indexes() checks the known genes the index was built from
+        '''
+        
+        self.assertTrue(self.index.indexes(self.known_genes))
+        self.assertFalse(self.index.indexes(dict(self.known_genes)))
+        self.assertFalse(self.index.indexes(None))
+
+if __name__ == '__main__':
+    unittest.main()
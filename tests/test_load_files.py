@@ -24,7 +24,8 @@ import shutil
 
 import unittest
 from clinicalfilter.load_files import get_header_positions, \
-    parse_gene_line,  open_known_genes, open_cnv_regions, open_x_lr2_file
+    parse_gene_line,  open_known_genes, open_cnv_regions, open_x_lr2_file, \
+    open_target_regions
 
 class TestLoadFilesPy(unittest.TestCase):
     ''' test the file loading functions
@@ -227,6 +228,23 @@ class TestLoadFilesPy(unittest.TestCase):
         self.assertEqual(open_cnv_regions(self.temp.name),
             {('4', '1569197', '2110236'): '1'})
 
+    def test_open_target_regions(self):
+        ''' test that open_target_regions() converts BED coordinates
+        '''
+        
+        lines = ['track name=test\n',
+            '1\t999\t2000\n',
+            '\n',
+            'X\t0\t100\tname\n']
+        lines = [ x.encode('utf8') for x in lines ]
+        
+        self.temp.writelines(lines)
+        self.temp.flush()
+        
+        self.assertEqual(open_target_regions(self.temp.name),
+            [('1', 1000, 2000), ('X', 1, 100)])
+        self.assertIsNone(open_target_regions(None))
+    
     def test_open_x_lr2_file(self):
         '''test that open_x_lr2_file() works correct
         '''
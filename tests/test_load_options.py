@@ -0,0 +1,74 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+import tempfile
+import shutil
+
+from clinicalfilter.load_options import get_options, get_submit_options, \
+    MAF_POPULATIONS
+from clinicalfilter.filter import PP_DNM_THRESHOLD
+
+class TestLoadOptionsPy(unittest.TestCase):
+    """ test parsing the command line options
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def test_get_options_pp_dnm_default(self):
+        """ check the shared defaults for the PP_DNM threshold and populations
+        """
+        
+        args = get_options(['--ped', 'cohort.ped', '--output', 'out.txt',
+            '--sum_x_lr2_file', 'sum_x_lr2.txt'])
+        self.assertEqual(args.pp_filter, PP_DNM_THRESHOLD)
+        self.assertEqual(args.populations, MAF_POPULATIONS)
+        
+        args = get_options(['--ped', 'cohort.ped', '--output', 'out.txt',
+            '--sum_x_lr2_file', 'sum_x_lr2.txt', '--maf-populations', 'AFR_AF,EUR_AF'])
+        self.assertEqual(args.populations, ['AFR_AF', 'EUR_AF'])
+    
+    def test_get_submit_options(self):
+        """ check that extra options are passed on to the runs for the shards
+        """
+        
+        args, run_args = get_submit_options(['--ped', 'cohort.ped', '--output',
+            'out.txt', '--shards', '10', '--workers', '4', '--export-vcf',
+            self.temp_dir])
+        
+        self.assertEqual(args.ped, 'cohort.ped')
+        self.assertEqual(args.shards, 10)
+        self.assertEqual(run_args, ['--workers', '4', '--export-vcf', self.temp_dir])
+    
+    def test_get_submit_options_shared_outputs(self):
+        """ check that outputs which every shard would overwrite are rejected
+        """
+        
+        base = ['--ped', 'cohort.ped', '--output', 'out.txt']
+        for extra in [['--output-db', 'out.db'], ['--output-columns', 'out.cols'],
+                ['--export-vcf', 'out.vcf.gz']]:
+            with self.assertRaises(SystemExit):
+                get_submit_options(base + extra)
@@ -22,7 +22,7 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import unittest
 import tempfile
 
-from clinicalfilter.ped import open_ped, load_families, Person, Family
+from clinicalfilter.ped import open_ped, load_families, write_ped, Person, Family
 
 class TestLoadPed(unittest.TestCase):
     """ unit testing of loading ped files
@@ -137,3 +137,15 @@ class TestLoadPed(unittest.TestCase):
         # the expected Families objects
         self.assertEqual(sorted(load_families(self.path)), sorted([family, fam2]))
     
+    
+    def test_write_ped(self):
+        """ check that write_ped() writes families which load the same
+        """
+        
+        families = load_families(self.path)
+        
+        output = tempfile.NamedTemporaryFile(mode="w")
+        write_ped(output.name, families)
+        
+        self.assertEqual(load_families(output.name), families)
+        output.close()
@@ -36,7 +36,8 @@ from clinicalfilter.variant.info import Info
 from clinicalfilter.trio_genotypes import TrioGenotypes
 from clinicalfilter.load_vcfs import load_variants, include_variant, \
     open_individual, load_trio, combine_trio_variants, get_parental_var, \
-    filter_de_novos
+    index_parental_vars, filter_de_novos, get_shards, load_variants_by_shard, get_region_lines, \
+    get_cnv_lines, get_cnv_path, write_cnv_sidecar, load_targets
 from clinicalfilter.ped import Family, Person
 
 IS_PYTHON3 = sys.version_info.major == 3
@@ -264,6 +265,206 @@ class TestLoadVCFsPy(unittest.TestCase):
             [TrioGenotypes(chrom="1", pos=2, child=SNV(**args),
                 mother=SNV(**args), father=SNV(**dad_args)) ])
     
+    def test_load_trio_by_chromosome(self):
+        ''' test that load_trio() gives the same variants in parallel
+        '''
+        
+        def make_vcf(person):
+            vcf = make_vcf_header()
+            vcf.append(make_vcf_line(pos=1, extra='HGNC=TEST;MAX_AF=0.0001'))
+            vcf.append(make_vcf_line(pos=2, extra='HGNC=ATRX;MAX_AF=0.0001'))
+            if person != 'father':
+                vcf.append(make_vcf_line(chrom='2', pos=5, extra='HGNC=ATRX;MAX_AF=0.0001'))
+            vcf.append(make_vcf_line(chrom='3', pos=5, extra='HGNC=ATRX;MAX_AF=0.0001'))
+            
+            path = os.path.join(self.temp_dir, "{}.chroms.vcf.gz".format(person))
+            write_gzipped_vcf(path, vcf)
+            return path
+        
+        family = Family('fam_id')
+        family.add_child('sample', 'mother_id', 'father_id', 'female', '2', make_vcf('child'))
+        family.add_mother('mother_id', '0', '0', 'female', '1', make_vcf('mother'))
+        family.add_father('father_id', '0', '0', 'male', '1', make_vcf('father'))
+        family.set_child()
+        
+        serial = load_trio(family, 0)
+        self.assertEqual([ x.get_chrom() for x in serial ], ['1', '2', '3'])
+        
+        # the father lacks variants on chr2, so his genotype is set to reference
+        self.assertEqual(serial[1].father.get_genotype(), 0)
+        
+        # the variants from each chromosome are merged in the original order
+        self.assertEqual(load_trio(family, 0, jobs=2), serial)
+    
+    def test_get_shards(self):
+        ''' test that get_shards() splits chromosomes with known lengths
+        '''
+        
+        vcf = make_vcf_header()
+        vcf.insert(2, '##contig=<ID=1,length=25>\n')
+        vcf.append(make_vcf_line(chrom='1', pos=5))
+        vcf.append(make_vcf_line(chrom='2', pos=5))
+        path = os.path.join(self.temp_dir, "shards.vcf.gz")
+        write_gzipped_vcf(path, vcf)
+        
+        self.assertEqual(get_shards(path), [('1', None, None), ('2', None, None)])
+        self.assertEqual(get_shards(path, 10), [('1', 1, 10), ('1', 11, 20),
+            ('1', 21, None), ('2', None, None)])
+    
+    def test_load_variants_by_shard(self):
+        ''' test that load_variants_by_shard() handles lines spanning shards
+        '''
+        
+        def make_vcf(person, genotype):
+            vcf = make_vcf_header()
+            vcf.insert(2, '##contig=<ID=1,length=100>\n')
+            vcf.append(make_vcf_line(pos=5, genotype=genotype,
+                extra='HGNC=ATRX;MAX_AF=0.0001'))
+            # a deletion which overlaps the next shard
+            vcf.append(make_vcf_line(pos=18, ref='GAAAA', alts='G',
+                cq='frameshift_variant', genotype=genotype,
+                extra='HGNC=ATRX;MAX_AF=0.0001'))
+            # a pair of MNV candidates either side of a shard boundary
+            vcf.append(make_vcf_line(pos=30, genotype=genotype,
+                extra='HGNC=ATRX;MAX_AF=0.0001;Protein_position=1;Codons=aaT/aaG'))
+            vcf.append(make_vcf_line(pos=31, genotype=genotype,
+                extra='HGNC=ATRX;MAX_AF=0.0001;Protein_position=1;Codons=Aat/Cat'))
+            vcf.append(make_vcf_line(chrom='2', pos=5, genotype=genotype,
+                extra='HGNC=ATRX;MAX_AF=0.0001'))
+            
+            path = os.path.join(self.temp_dir, "{}.shards.vcf.gz".format(person))
+            write_gzipped_vcf(path, vcf)
+            return path
+        
+        family = Family('fam_id')
+        family.add_child('sample', 'mother_id', 'father_id', 'female', '2', make_vcf('child', '0/1'))
+        family.add_mother('mother_id', '0', '0', 'female', '1', make_vcf('mother', '0/1'))
+        family.add_father('father_id', '0', '0', 'male', '1', make_vcf('father', '0/0'))
+        family.set_child()
+        
+        serial = load_variants(family, 0.0, [], self.known_genes, set(), {})
+        
+        for shard_size, jobs in [(0, 1), (10, 1), (10, 2)]:
+            chroms = list(load_variants_by_shard(family, 0.0, [],
+                self.known_genes, set(), {}, shard_size=shard_size, jobs=jobs))
+            
+            # the variants are grouped by chromosome, and each line is only
+            # loaded once, and with the MNV codes, as if loaded in one go
+            self.assertEqual([ x[0] for x in chroms ], ['1', '2'])
+            self.assertEqual([ x for chrom in chroms for x in chrom[1] ], serial)
+        
+        self.assertEqual([ x.get_position() for x in serial ], [5, 18, 30, 31, 5])
+        self.assertEqual(serial[2].child.info.mnv_code, 'alternate_residue_mnv')
+    
+    def test_get_region_lines(self):
+        ''' test that get_region_lines() only gets lines within the regions
+        '''
+        
+        vcf = make_vcf_header()
+        vcf.append(make_vcf_line(pos=5))
+        vcf.append(make_vcf_line(pos=8, ref='GAAAAA', alts='G'))
+        vcf.append(make_vcf_line(pos=12, alts='<DEL>', extra='END=100'))
+        vcf.append(make_vcf_line(pos=50))
+        vcf.append(make_vcf_line(chrom='2', pos=5))
+        path = os.path.join(self.temp_dir, "regions.vcf.gz")
+        write_gzipped_vcf(path, vcf)
+        
+        regions = [('1', 10, 20), ('1', 40, 60), ('2', 1, 10), ('3', 1, 10)]
+        lines = list(get_region_lines(path, regions))
+        
+        # the deletion starting before the regions is excluded, and the CNV is
+        # only included once, despite overlapping two regions
+        self.assertEqual([ (x[0], x[1]) for x in lines ],
+            [('1', '12'), ('1', '50'), ('2', '5')])
+        
+        lines = list(get_region_lines(path, regions, cnvs=False))
+        self.assertEqual([ (x[0], x[1]) for x in lines ], [('1', '50'), ('2', '5')])
+    
+    def test_get_cnv_lines(self):
+        ''' test that get_cnv_lines() uses a sidecar VCF if available
+        '''
+        
+        vcf = make_vcf_header()
+        vcf.append(make_vcf_line(pos=5))
+        vcf.append(make_vcf_line(pos=12, alts='<DEL>', extra='END=100'))
+        vcf.append(make_vcf_line(pos=500, alts='<DUP>', extra='END=1000'))
+        path = os.path.join(self.temp_dir, "scan.vcf.gz")
+        write_gzipped_vcf(path, vcf)
+        
+        self.assertEqual([ x[1] for x in get_cnv_lines(path) ], ['12', '500'])
+        
+        # a sidecar VCF is used in preference to the original VCF
+        sidecar = make_vcf_header()
+        sidecar.append(make_vcf_line(pos=12, alts='<DEL>', extra='END=100'))
+        write_gzipped_vcf(os.path.join(self.temp_dir, "scan.cnv.vcf.gz"), sidecar)
+        
+        self.assertEqual([ x[1] for x in get_cnv_lines(path) ], ['12'])
+    
+    def test_write_cnv_sidecar(self):
+        ''' test that sidecar VCFs are only written by write_cnv_sidecar()
+        '''
+        
+        vcf = make_vcf_header()
+        vcf.append(make_vcf_line(pos=5))
+        vcf.append(make_vcf_line(pos=12, alts='<DEL>', extra='END=100'))
+        path = os.path.join(self.temp_dir, "build.vcf.gz")
+        write_gzipped_vcf(path, vcf)
+        sidecar = os.path.join(self.temp_dir, "build.cnv.vcf.gz")
+        
+        # reading the CNVs without a sidecar scans the VCF, without writing
+        self.assertEqual([ x[1] for x in get_cnv_lines(path) ], ['12'])
+        self.assertFalse(os.path.exists(sidecar))
+        
+        # the sidecar has the header and the CNVs, and is used afterwards
+        self.assertEqual(write_cnv_sidecar(path), sidecar)
+        self.assertEqual(get_cnv_path(path), sidecar)
+        with gzip.open(sidecar, 'rt') as handle:
+            lines = handle.readlines()
+        self.assertEqual(lines, vcf[:-2] + vcf[-1:])
+        self.assertEqual([ x[1] for x in get_cnv_lines(path) ], ['12'])
+        
+        # a sidecar older than its VCF is ignored
+        mtime = os.path.getmtime(path)
+        os.utime(sidecar, (mtime - 10, mtime - 10))
+        self.assertEqual(get_cnv_path(path), path)
+        
+        # sidecars can be kept in a separate folder
+        cnv_dir = os.path.join(self.temp_dir, 'sidecars')
+        os.mkdir(cnv_dir)
+        sidecar = os.path.join(cnv_dir, "build.cnv.vcf.gz")
+        self.assertEqual(write_cnv_sidecar(path, cnv_dir), sidecar)
+        self.assertEqual(get_cnv_path(path, cnv_dir), sidecar)
+        self.assertEqual([ x[1] for x in get_cnv_lines(path, cnv_dir) ], ['12'])
+    
+    def test_load_targets(self):
+        ''' test that load_targets() only loads variants within the regions
+        '''
+        
+        def make_vcf(person):
+            vcf = make_vcf_header()
+            for chrom, pos in [('1', 5), ('1', 2000), ('1', 3000), ('2', 10)]:
+                vcf.append(make_vcf_line(chrom=chrom, pos=pos,
+                    extra='HGNC=ATRX;MAX_AF=0.0001'))
+            
+            path = os.path.join(self.temp_dir, "{}.targets.vcf.gz".format(person))
+            write_gzipped_vcf(path, vcf)
+            return path
+        
+        family = Family('fam_id')
+        family.add_child('sample', 'mother_id', 'father_id', 'female', '2', make_vcf('child'))
+        family.add_mother('mother_id', '0', '0', 'female', '1', make_vcf('mother'))
+        family.add_father('father_id', '0', '0', 'male', '1', make_vcf('father'))
+        family.set_child()
+        
+        # the variants are in the order of the VCF, and match the variants
+        # from loading the full VCF
+        regions = [('1', 1, 10), ('1', 2500, 3500), ('2', 1, 100)]
+        variants = load_trio(family, 0)
+        self.assertEqual(load_targets(family, 0, regions),
+            [variants[0], variants[2], variants[3]])
+        self.assertEqual(load_targets(family, 0, regions, scan_cnvs=False),
+            [variants[0], variants[2], variants[3]])
+    
     def test_get_parental_var_snv(self):
         ''' check that get_parental_var() works correctly for SNVs
         '''
@@ -271,7 +472,7 @@ class TestLoadVCFsPy(unittest.TestCase):
         sex = 'F'
         var = create_snv(sex, '0/1')
         mom = Person('fam_id', 'mom', '0', '0', 'F', '1', '/PATH')
-        parental = []
+        parental = index_parental_vars([])
         
         # try to get a matching variant for a mother. This will create a default
         # variant for a missing parental genotype
@@ -282,8 +483,8 @@ class TestLoadVCFsPy(unittest.TestCase):
         
         # now see if we can pick up a  variant where it does exist
         mother_var = create_snv(sex, '0/0')
-        self.assertEqual(get_parental_var(var, [mother_var],
-            mom), mother_var)
+        self.assertEqual(get_parental_var(var,
+            index_parental_vars([mother_var]), mom), mother_var)
     
     def test_get_parental_var_cnv(self):
         ''' check that get_parental_var() works correctly for CNVs
@@ -292,7 +493,7 @@ class TestLoadVCFsPy(unittest.TestCase):
         sex = 'F'
         var = create_cnv(sex, 'deNovo')
         mom = Person('fam_id', 'mom', '0', '0', 'F', '1', '/PATH')
-        parental_vars = []
+        parental_vars = index_parental_vars([])
         
         self.assertEqual(get_parental_var(var, parental_vars,
             mom), CNV(chrom="1", position=150, id=".", ref="A",
@@ -303,8 +504,8 @@ class TestLoadVCFsPy(unittest.TestCase):
         # check that even if a CNV exist in the parent at a matching site, we
         # still create a new CNV objectr for the parent
         mother_var = create_cnv(sex, 'uncertain')
-        self.assertEqual(get_parental_var(var, [mother_var],
-            mom), CNV(chrom="1", position=150, id=".", ref="A",
+        self.assertEqual(get_parental_var(var,
+            index_parental_vars([mother_var]), mom), CNV(chrom="1", position=150, id=".", ref="A",
                 alts="<REF>", qual='1000', filter="PASS", info=str(var.info),
                 format='INHERITANCE', sample='uncertain', gender="female",
                 mnv_code=None))
@@ -319,12 +520,68 @@ class TestLoadVCFsPy(unittest.TestCase):
         # check that even if a CNV exist in the parent at a matching site, we
         # still create a new CNV object for the parent
         var = create_cnv(sex, 'maternal')
-        self.assertEqual(get_parental_var(var, [], mom),
+        self.assertEqual(get_parental_var(var, index_parental_vars([]), mom),
             CNV(chrom="1", position=150, id=".", ref="A",
                 alts="<DUP>", qual='1000',filter="PASS", info=str(var.info),
                 format='INHERITANCE', sample='uncertain', gender="female",
                 mnv_code=None))
     
+    def test_get_parental_var_shares_info(self):
+        ''' check that default parental SNVs reuse the childs parsed INFO
+        '''
+        
+        var = create_snv('F', '0/1')
+        mom = Person('fam_id', 'mom', '0', '0', 'F', '1', '/PATH')
+        
+        parent = get_parental_var(var, index_parental_vars([]), mom)
+        self.assertEqual(str(parent.info), str(var.info))
+        self.assertEqual(parent.get_genotype(), 0)
+        self.assertEqual(var.get_genotype(), 1)
+        
+        # the parent gets its own copy of the INFO, so changing the childs INFO
+        # doesn't change the parents
+        self.assertIsNot(parent.info, var.info)
+        var.info['ClinicalFilterType'] = 'single_variant'
+        var.info.symbols[0].set('1001', None, 'HGNC_ID')
+        self.assertNotIn('ClinicalFilterType', parent.info)
+        self.assertEqual(parent.info.get_genes(), [['1001']])
+        
+        # alleles masked for low depth in the child aren't masked for the
+        # parent, so the INFO is reparsed, as if the parent was constructed
+        var = SNV('1', '150', '.', 'A', 'AG,T', '50', 'PASS',
+            info='HGNC=A,B;CQ=missense_variant,stop_gained', format='GT:AD',
+            sample='0/1:10,1,5', gender='F')
+        self.assertEqual(var.info.get_genes(), [['B']])
+        parent = get_parental_var(var, index_parental_vars([]), mom)
+        expected = SNV('1', '150', '.', 'A', 'AG,T', '50', 'PASS',
+            info='HGNC=A,B;CQ=missense_variant,stop_gained', format='GT',
+            sample='0/0', gender='F')
+        self.assertEqual(parent.info.get_genes(), [['A'], ['B']])
+        self.assertEqual(parent.info.consequence, expected.info.consequence)
+        self.assertEqual(parent.info.get_genes(), expected.info.get_genes())
+        
+        # variants with MNV codes reparse the INFO, since the consequences
+        # depend upon the MNV code
+        var = create_snv('F', '0/1')
+        var.mnv_code = 'modified_synonymous_mnv'
+        parent = get_parental_var(var, index_parental_vars([]), mom)
+        self.assertIsNot(parent.info, var.info)
+        self.assertEqual(str(parent.info), str(var.info))
+        self.assertIsNone(parent.mnv_code)
+    
+    def test_index_parental_vars(self):
+        ''' check that index_parental_vars() keeps the first variant per key
+        '''
+        
+        first = create_snv('F', '0/1')
+        second = create_snv('F', '1/1')
+        other = create_snv('F', '0/1')
+        other.position = 200
+        
+        index = index_parental_vars([first, second, other])
+        self.assertEqual(index, {('1', 150): first, ('1', 200): other})
+        self.assertIs(index[('1', 150)], first)
+    
     def test_filter_de_novos(self):
         """ check that filter_de_novos() works correctly
         """
@@ -0,0 +1,88 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+
+import unittest
+import tempfile
+import shutil
+
+from benchmarks.synthetic import generate_trio
+from benchmarks.memory import StageMemory, measure_trio, check_budgets, \
+    tracemalloc
+
+class TestMemoryPy(unittest.TestCase):
+    """ test the memory regression checks
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def test_stage_memory(self):
+        ''' check that each stage gets a record
+        '''
+        
+        tracker = StageMemory(trace=True, top=2)
+        with tracker.stage("first"):
+            values = [ str(x) for x in range(1000) ]
+        with tracker.stage("second"):
+            pass
+        tracker.stop()
+        
+        self.assertEqual([ x["stage"] for x in tracker.stages ],
+            ["first", "second"])
+        
+        if tracemalloc is not None:
+            first = tracker.stages[0]
+            self.assertTrue(first["traced_increase_bytes"] > 0)
+            self.assertEqual(len(first["top"]), 2)
+    
+    def test_measure_trio(self):
+        ''' check that the memory is recorded for each stage of a trio
+        '''
+        
+        paths = generate_trio(self.temp_dir, 300)
+        result = measure_trio(paths, self.temp_dir, trace=True, top=3)
+        
+        self.assertEqual(result["variants"], 300)
+        self.assertEqual([ x["stage"] for x in result["stages"] ],
+            ["load_trio", "combine_trio_variants", "reporting"])
+    
+    def test_check_budgets(self):
+        ''' check that stages over the budgets are reported
+        '''
+        
+        untraced = {"variants": 100, "stages": [
+            {"stage": "load_trio", "peak_rss_mb": 100.0},
+            {"stage": "reporting", "peak_rss_mb": 160.0}]}
+        traced = {"variants": 100, "stages": [
+            {"stage": "load_trio", "traced_peak_bytes": 500000},
+            {"stage": "reporting", "traced_peak_bytes": 100000}]}
+        
+        self.assertEqual(check_budgets(100, untraced, traced, 200, 10000), [])
+        
+        failures = check_budgets(100, untraced, traced, 150, 2000)
+        self.assertEqual(len(failures), 2)
+        self.assertIn("reporting peak RSS 160.0 MB", failures[0])
+        self.assertIn("load_trio uses 5000 bytes per variant", failures[1])
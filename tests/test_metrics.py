@@ -0,0 +1,150 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+import tempfile
+import json
+import threading
+
+from clinicalfilter.metrics import Metrics, StageTimer, record_stage, \
+    pop_stages, merge_stages, add_stages, get_current_rss
+
+class TestMetricsPy(unittest.TestCase):
+    """ test the stage timings
+    """
+    
+    def setUp(self):
+        pop_stages()
+    
+    def test_stage_timer(self):
+        """ check that StageTimer records the timings for a stage
+        """
+        
+        with StageTimer("parse", 10) as timer:
+            timer.records_out = 5
+        
+        stages = pop_stages()
+        self.assertEqual(list(stages), ["parse"])
+        
+        metrics = stages["parse"]
+        self.assertEqual(metrics["calls"], 1)
+        self.assertEqual(metrics["records_in"], 10)
+        self.assertEqual(metrics["records_out"], 5)
+        self.assertTrue(metrics["wall"] >= 0)
+        self.assertTrue(metrics["cpu"] >= 0)
+        
+        # popping the timings resets them
+        self.assertEqual(pop_stages(), {})
+    
+    @unittest.skipUnless(get_current_rss() is not None, "needs /proc/self/statm")
+    def test_stage_timer_rss(self):
+        """ check that StageTimer records the memory growth within the stage
+        """
+        
+        # allocate memory in an earlier stage, so the process peak is raised,
+        # then release it before a later stage that allocates nothing
+        with StageTimer("allocate"):
+            data = bytearray(50 * 1024 * 1024)
+        del data
+        
+        with StageTimer("idle"):
+            pass
+        
+        stages = pop_stages()
+        self.assertTrue(stages["allocate"]["rss_delta"] >= 40 * 1024)
+        self.assertTrue(stages["idle"]["rss_delta"] < 10 * 1024)
+        self.assertTrue(stages["idle"]["process_peak_rss"] >= 40 * 1024)
+    
+    def test_record_stage(self):
+        """ check that repeated stages are summed
+        """
+        
+        record_stage("parse", 1.0, 0.5, 10, 5, rss_delta=20, process_peak_rss=100)
+        record_stage("parse", 2.0, 1.0, None, 3, rss_delta=-5, process_peak_rss=50)
+        
+        self.assertEqual(pop_stages(), {"parse": {"calls": 2, "wall": 3.0,
+            "cpu": 1.5, "records_in": 10, "records_out": 8, "rss_delta": 20,
+            "process_peak_rss": 100}})
+    
+    def test_merge_stages(self):
+        """ check that merge_stages() adds timings from another process
+        """
+        
+        record_stage("parse", 1.0, 0.5, 10, 5, rss_delta=None, process_peak_rss=100)
+        merge_stages({"parse": {"calls": 3, "wall": 2.0, "cpu": 1.0,
+            "records_in": 5, "records_out": None, "rss_delta": 30,
+            "process_peak_rss": 200}})
+        
+        self.assertEqual(pop_stages(), {"parse": {"calls": 4, "wall": 3.0,
+            "cpu": 1.5, "records_in": 15, "records_out": 5, "rss_delta": 30,
+            "process_peak_rss": 200}})
+    
+    def test_stages_per_thread(self):
+        """ check that the timings are kept separately for each thread
+        """
+        
+        record_stage("parse", 1.0, 0.5)
+        
+        stages = []
+        def export():
+            record_stage("export", 2.0, 1.0)
+            stages.append(pop_stages())
+        
+        thread = threading.Thread(target=export)
+        thread.start()
+        thread.join()
+        
+        self.assertEqual(list(stages[0]), ["export"])
+        self.assertEqual(list(pop_stages()), ["parse"])
+    
+    def test_metrics(self):
+        """ check that Metrics tracks the timings per proband
+        """
+        
+        stages = {"parse": {"calls": 1, "wall": 1.0, "cpu": 0.5,
+            "records_in": 10, "records_out": 5, "rss_delta": 10,
+            "process_peak_rss": 100}}
+        
+        metrics = Metrics()
+        metrics.add("child_1", stages)
+        metrics.add("child_1", stages)
+        
+        other = Metrics()
+        other.add("child_2", stages)
+        metrics.update(other)
+        
+        self.assertEqual(metrics.probands["child_1"]["parse"]["calls"], 2)
+        self.assertEqual(metrics.probands["child_2"], stages)
+        
+        # check the timings are written as one line per stage per proband
+        with tempfile.NamedTemporaryFile(mode="w+") as handle:
+            metrics.write(handle.name)
+            lines = [ json.loads(x) for x in handle ]
+        
+        self.assertEqual([ (x["proband"], x["stage"]) for x in lines ],
+            [("child_1", "parse"), ("child_2", "parse")])
+        self.assertEqual(lines[0]["wall"], 2.0)
+        
+        # and the summary totals the stages across the probands
+        summary = metrics.summarise().split("\n")
+        self.assertEqual(summary[0].split("\t")[:2], ["stage", "calls"])
+        self.assertEqual(summary[1].split("\t")[:3], ["parse", "3", "3.000"])
@@ -0,0 +1,79 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+
+import unittest
+
+from benchmarks.micro import get_records, get_cases, run, format_results
+
+class TestMicroPy(unittest.TestCase):
+    """ test the micro-benchmark harness
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.variants, cls.pairs = get_records(100, seed=1)
+    
+    def test_get_records(self):
+        ''' check that the records and MNV pairs are made
+        '''
+        
+        self.assertEqual(len(self.variants), 100)
+        self.assertEqual(len(self.pairs), 10)
+        
+        for first, second in self.pairs:
+            self.assertEqual(first.pos + 1, second.pos)
+    
+    def test_get_cases(self):
+        ''' check that each case can be called with its arguments
+        '''
+        
+        cases = get_cases(self.variants, self.pairs)
+        names = [ x[0] for x in cases ]
+        
+        self.assertEqual(names, ["Info.__init__", "Symbols.__init__",
+            "Symbols.get", "Info.get_per_gene_consequence",
+            "Info.find_max_allele_frequency", "SNV.convert_genotype",
+            "Variant.__hash__", "TrioGenotypes.__lt__", "translate",
+            "check_mnv_consequence"])
+        
+        for name, func, args in cases:
+            self.assertTrue(len(args) > 0)
+            for values in args:
+                func(*values)
+    
+    def test_run(self):
+        ''' check that the benchmarks report timings and allocations
+        '''
+        
+        cases = get_cases(self.variants, self.pairs)
+        results = run(cases, repeats=1, names=["Info.__init__", "translate"])
+        
+        self.assertEqual([ x["benchmark"] for x in results ],
+            ["Info.__init__", "translate"])
+        self.assertEqual(results[0]["calls"], 100)
+        self.assertTrue(results[0]["ns_per_call"] > 0)
+        
+        table = format_results(results).split("\n")
+        self.assertEqual(table[0].split("\t")[:3],
+            ["benchmark", "calls", "ns_per_call"])
+        self.assertEqual(len(table), 3)
@@ -124,6 +124,25 @@ class TestMNVChecksPy(unittest.TestCase):
         self.assertEqual(get_mnv_candidates(self.path), {
             ('1', 1): 'alternate_residue_mnv', ('1', 2): 'alternate_residue_mnv'})
     
+    def test_get_mnv_candidates_region(self):
+        ''' check that get_mnv_candidates() finds pairs spanning a region edge
+        '''
+        
+        lines = make_vcf_header()
+        lines.append(make_vcf_line(chrom='1', pos=10, extra='Protein_position=1;Codons=aaT/aaG'))
+        lines.append(make_vcf_line(chrom='1', pos=11, extra='Protein_position=1;Codons=Aat/Cat'))
+        self.write_vcf(lines)
+        
+        expected = {('1', 10): 'alternate_residue_mnv',
+            ('1', 11): 'alternate_residue_mnv'}
+        self.assertEqual(get_mnv_candidates(self.path, ('1', 11, 20)), expected)
+        self.assertEqual(get_mnv_candidates(self.path, ('1', 1, 10)), expected)
+        self.assertEqual(get_mnv_candidates(self.path, ('1', None, None)), expected)
+        
+        # regions too far from the pair don't find the pair
+        self.assertEqual(get_mnv_candidates(self.path, ('1', 14, 20)), {})
+        self.assertEqual(get_mnv_candidates(self.path, ('2', None, None)), {})
+    
     def test_get_mnv_candidates_catch_assertion_error(self):
         ''' check that get_mnv_candidates works correctly
         '''
@@ -122,6 +122,39 @@ class TestPostInheritanceFilterPy(unittest.TestCase):
             ["Biallelic"], ["ATRX"]))
         self.assertEqual(self.post_filter.filter_variants(variants), [])
     
+    def test_filter_variants_matches_filters(self):
+        """ check that filter_variants() matches applying each filter in turn
+        """
+        
+        def make_candidates():
+            damaging = "HGNC=ATRX;CQ=missense_variant;AFR_AF=0.0001;PolyPhen=probably_damaging(0.99)"
+            benign = "HGNC=ATRX;CQ=missense_variant;AFR_AF=0.0001;PolyPhen=benign(0.01)"
+            common = "HGNC=ATRX;CQ=missense_variant;AFR_AF=0.01"
+            exac = "HGNC=ATRX;CQ=missense_variant;AFR_AF=0.0001;AC_Het=10"
+            
+            return [(self.create_var("1", snv=False), ["single_variant"], ["Monoallelic"], ["TEST"]),
+                (self.create_var("2", snv=False), ["single_variant"], ["Biallelic"], ["TEST"]),
+                (self.create_var("3", snv=False), ["single_variant"], ["Monoallelic"], ["TEST"]),
+                (self.create_var("1", info=damaging, geno=["0/1", "0/1", "0/0"], pos='100'), ["compound_het"], ["Biallelic"], ["ATRX"]),
+                (self.create_var("1", info=benign, geno=["0/1", "0/0", "0/1"], pos='200'), ["compound_het"], ["Biallelic"], ["ATRX"]),
+                (self.create_var("1", info=benign, pos='300'), ["single_variant"], ["Monoallelic"], ["ATRX"]),
+                (self.create_var("1", info=common, pos='400'), ["single_variant"], ["Monoallelic"], ["ATRX"]),
+                (self.create_var("1", info=common, pos='500'), ["single_variant", "compound_het"], ["Monoallelic", "Biallelic"], ["ATRX"]),
+                (self.create_var("1", info=exac, pos='600'), ["single_variant"], ["Monoallelic", "Biallelic"], ["ATRX"]),
+                (self.create_var("1", info=exac, pos='700'), ["single_variant"], ["Monoallelic"], ["ATRX"]),
+                (self.create_var("1", info=damaging, pos='800'), ["single_variant"], ["Monoallelic"], ["ATRX"])]
+        
+        # some filters modify the inheritance lists, so use separate copies
+        expected = make_candidates()
+        expected = self.post_filter.remove_cnvs(expected)
+        expected = self.post_filter.filter_by_maf(expected)
+        expected = self.post_filter.filter_polyphen(expected)
+        expected = self.post_filter.filter_exac(expected)
+        
+        fused = self.post_filter.filter_variants(make_candidates())
+        self.assertEqual(fused, expected)
+        self.assertEqual(len(fused), 4)
+    
     def test_count_cnv_chroms(self):
         """ test that count_cnv_chroms() works correctly
         """
@@ -407,6 +440,36 @@ class TestPostInheritanceFilterPy(unittest.TestCase):
             (snv_2, ["single_variant"], ["Biallelic"], ["ATRX"])]
         self.assertFalse(self.post_filter.has_compound_match(snv_1, "ATRX", variants))
     
+    def test_index_compound_partners(self):
+        """ check that index_compound_partners() summarises partners by gene
+        """
+        
+        snv_1 = self.create_var("1", snv=True, geno=["0/1", "0/0", "0/1"], pos=1000)
+        snv_2 = self.create_var("1", snv=True, geno=["0/1", "1/0", "0/1"], pos=2000)
+        snv_3 = self.create_var("1", snv=True, geno=["0/1", "0/0", "0/0"], pos=3000)
+        snv_4 = self.create_var("1", snv=True, geno=["0/1", "0/0", "0/1"], pos=4000)
+        
+        snv_1.child.info["PolyPhen"] = "benign(0.01)"
+        snv_2.child.info["PolyPhen"] = "probably_damaging(0.99)"
+        snv_4.child.info["PolyPhen"] = "probably_damaging(0.99)"
+        
+        variants = [(snv_1, ["compound_het"], ["Biallelic"], ["ATRX"]),
+            (snv_2, ["compound_het"], ["Biallelic"], ["ATRX", "ATRX"]),
+            (snv_3, ["compound_het"], ["Biallelic"], ["ATRX"]),
+            (snv_4, ["single_variant"], ["Monoallelic"], ["ATRX"])]
+        
+        # the single variant is excluded, snv_2 is only counted once, and the
+        # de novo snv_3 counts as not benign
+        index = self.post_filter.index_compound_partners(variants)
+        self.assertEqual(index, {"ATRX": (3, 2, 2, False)})
+        
+        # the compound het checks match has_compound_match()
+        for var in [snv_1, snv_2, snv_3]:
+            self.assertEqual(self.post_filter.compound_match(var, "ATRX", index),
+                self.post_filter.has_compound_match(var, "ATRX", variants))
+        
+        self.assertFalse(self.post_filter.compound_match(snv_1, "OTHER", index))
+    
     def test_has_compound_match_proband_only(self):
         """ check that has_compound_match() works correctly without parents
         """
@@ -0,0 +1,117 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+import unittest
+import tempfile
+import shutil
+import os
+import pstats
+
+from clinicalfilter.profiling import get_profile_prefix, profile_call, \
+    get_label, get_collapsed_stacks, merge_profiles
+
+def inner(n):
+    return sum([ x * x for x in range(n) ])
+
+def outer(n):
+    return inner(n) + inner(n)
+
+class TestProfilingPy(unittest.TestCase):
+    """ test the profiling functions
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def test_get_profile_prefix(self):
+        """ check that get_profile_prefix() gives a path in the folder
+        """
+        
+        self.assertEqual(get_profile_prefix('/tmp', 'child'), '/tmp/child')
+        
+        # IDs with path separators don't escape the folder
+        self.assertEqual(get_profile_prefix('/tmp', 'fam/child'), '/tmp/fam_child')
+    
+    def test_get_label(self):
+        """ check that get_label() gives short function labels
+        """
+        
+        self.assertEqual(get_label(('/a/b/load_vcfs.py', 10, 'open_individual')),
+            'load_vcfs.py:10(open_individual)')
+        self.assertEqual(get_label(('~', 0, '<built-in method len>')),
+            '<built-in method len>')
+    
+    def test_profile_call(self):
+        """ check that profile_call() writes the profiles, and returns the value
+        """
+        
+        prefix = os.path.join(self.temp_dir, 'child')
+        self.assertEqual(profile_call(prefix, outer, 10000), outer(10000))
+        
+        stats = pstats.Stats(prefix + '.pstats')
+        names = [ x[2] for x in stats.stats ]
+        self.assertIn('outer', names)
+        self.assertIn('inner', names)
+        
+        with open(prefix + '.collapsed') as handle:
+            lines = handle.readlines()
+        
+        # each line has a stack, and a count of microseconds
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(int(count) > 0)
+    
+    def test_get_collapsed_stacks(self):
+        """ check that get_collapsed_stacks() nests callees within callers
+        """
+        
+        prefix = os.path.join(self.temp_dir, 'child')
+        profile_call(prefix, outer, 100000)
+        
+        stacks = get_collapsed_stacks(pstats.Stats(prefix + '.pstats'))
+        nested = [ x for x in stacks if 'outer' in x and 'inner' in x ]
+        self.assertTrue(len(nested) > 0)
+        for stack in nested:
+            self.assertTrue(stack.index('outer') < stack.index('inner'))
+    
+    def test_merge_profiles(self):
+        """ check that merge_profiles() combines the profiles
+        """
+        
+        paths = []
+        for name in ['child_1', 'child_2']:
+            prefix = os.path.join(self.temp_dir, name)
+            profile_call(prefix, outer, 1000)
+            paths.append(prefix + '.pstats')
+        
+        # missing profiles are skipped
+        paths.append(os.path.join(self.temp_dir, 'missing.pstats'))
+        
+        prefix = os.path.join(self.temp_dir, '_aggregate')
+        merge_profiles(paths, prefix)
+        
+        stats = pstats.Stats(prefix + '.pstats')
+        calls = [ y[1] for x, y in stats.stats.items() if x[2] == 'outer' ]
+        self.assertEqual(calls, [2])
+        self.assertTrue(os.path.exists(prefix + '.collapsed'))
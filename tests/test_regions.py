@@ -0,0 +1,65 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+
+import unittest
+
+from clinicalfilter.regions import merge_regions, get_gene_regions
+
+class TestRegionsPy(unittest.TestCase):
+    ''' test the functions for merging chromosome regions
+    '''
+    
+    def test_merge_regions(self):
+        ''' test that merge_regions() merges overlapping and adjacent regions
+        '''
+        
+        regions = [('1', 500, 600), ('2', 100, 200), ('1', 100, 200),
+            ('1', 150, 300), ('1', 301, 400)]
+        
+        self.assertEqual(merge_regions(regions),
+            [('1', 100, 400), ('1', 500, 600), ('2', 100, 200)])
+        
+        # padding the regions can merge nearby regions, and doesn't extend
+        # regions before the start of the chromosome
+        self.assertEqual(merge_regions(regions, padding=50),
+            [('1', 50, 650), ('2', 50, 250)])
+        self.assertEqual(merge_regions([('1', 10, 20)], padding=50),
+            [('1', 1, 70)])
+        
+        self.assertEqual(merge_regions([]), [])
+    
+    def test_get_gene_regions(self):
+        ''' test that get_gene_regions() gets regions for the known genes
+        '''
+        
+        known_genes = {
+            "1001": {"chrom": "1", "start": 1000, "end": 2000},
+            "1002": {"chrom": "1", "start": 1500, "end": 2500},
+            "1003": {"chrom": "X", "start": 1000, "end": 2000},
+            "1004": {"inh": {"Monoallelic": set(["Loss of function"])}},
+            }
+        
+        self.assertEqual(get_gene_regions(known_genes),
+            [('1', 900, 2600), ('X', 900, 2100)])
+        self.assertEqual(get_gene_regions(known_genes, padding=0),
+            [('1', 1000, 2500), ('X', 1000, 2000)])
@@ -27,16 +27,22 @@ import datetime
 import tempfile
 import shutil
 import gzip
+import pickle
+
+import pysam
 
 import clinicalfilter
+from clinicalfilter import reporting
 from clinicalfilter.ped import Family
 from clinicalfilter.variant.info import Info
 from clinicalfilter.variant.cnv import CNV
 from clinicalfilter.variant.snv import SNV
 from clinicalfilter.trio_genotypes import TrioGenotypes
-from clinicalfilter.reporting import Report, _log_run_details, _get_output_line, \
+from clinicalfilter.database import query_candidates
+from clinicalfilter.columnar import read_columns
+from clinicalfilter.reporting import Report, ReportWriter, _log_run_details, _get_output_line, \
     _save_tabular, _get_provenance, _get_vcf_export_path, _make_vcf_header, \
-    _get_parental_inheritance, _get_vcf_lines, _write_vcf
+    _get_parental_inheritance, _get_vcf_lines, _write_vcf, _merge_vcf_lines
 
 logging.disable(logging.CRITICAL)
 
@@ -100,6 +106,7 @@ class TestReportPy(unittest.TestCase):
         var = (self.variants[0], ["single_variant"], ["Monoallelic"], ["TEST"])
         var[0].child.format['GQ'] = 40
         _save_tabular(temp.name, [var], self.trio)
+        report.close()
         
         with open(temp.name, 'r') as handle:
             lines = handle.readlines()
@@ -114,6 +121,170 @@ class TestReportPy(unittest.TestCase):
         
         self.assertEqual(lines, expected)
     
+    def test_export_data_buffered(self):
+        ''' check that Report buffers the tabular output until flushed
+        '''
+        
+        path = os.path.join(self.temp_dir, 'buffered.txt')
+        var = (self.variants[0], ["single_variant"], ["Monoallelic"], ["TEST"])
+        
+        def read_lines():
+            with open(path) as handle:
+                return handle.readlines()
+        
+        with Report(path, None, None, flush_interval=2) as report:
+            # the header is written straight away
+            self.assertEqual(len(read_lines()), 1)
+            
+            # the first proband is buffered, and the second triggers a flush
+            report.export_data([var], self.trio)
+            self.assertEqual(len(read_lines()), 1)
+            report.export_data([var], self.trio)
+            self.assertEqual(len(read_lines()), 3)
+            
+            report.export_data([var], self.trio)
+            self.assertEqual(len(read_lines()), 3)
+        
+        # closing the report writes the remaining lines
+        lines = read_lines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[1], _get_output_line(var, self.trio))
+        self.assertEqual(len(set(lines[1:])), 1)
+        
+        # exporting after closing appends to the output
+        report.export_data([var], self.trio)
+        report.close()
+        self.assertEqual(len(read_lines()), 5)
+    
+    def test_export_data_closes_on_error(self):
+        ''' check that buffered output is written if the analysis fails
+        '''
+        
+        path = os.path.join(self.temp_dir, 'failed.txt')
+        var = (self.variants[0], ["single_variant"], ["Monoallelic"], ["TEST"])
+        
+        with self.assertRaises(ValueError):
+            with Report(path, None, None, flush_interval=None) as report:
+                report.export_data([var], self.trio)
+                raise ValueError
+        
+        with open(path) as handle:
+            self.assertEqual(len(handle.readlines()), 2)
+    
+    def test_report_pickle(self):
+        ''' check that a Report can be pickled, without the open output
+        '''
+        
+        path = os.path.join(self.temp_dir, 'pickled.txt')
+        with Report(path, None, None) as report:
+            self.assertIsNotNone(report.handle)
+            unpickled = pickle.loads(pickle.dumps(report))
+            self.assertIsNone(unpickled.handle)
+            self.assertEqual(unpickled.output_path, path)
+    
+    def test_report_writer(self):
+        ''' check that ReportWriter exports in order on a background thread
+        '''
+        
+        var = (self.variants[0], ["single_variant"], ["Monoallelic"], ["TEST"])
+        
+        # export the same probands directly, and via the writer
+        outputs = []
+        for threaded in [False, True]:
+            path = os.path.join(self.temp_dir, 'writer_{}.txt'.format(threaded))
+            report = Report(path, None, None)
+            if threaded:
+                report = ReportWriter(report, max_queued=2)
+            
+            with report:
+                for i in range(5):
+                    family = self.create_family('F', '1', '1')
+                    family.child.person_id = 'child{}'.format(i)
+                    report.export_data([var], family)
+            
+            with open(path) as handle:
+                outputs.append(handle.readlines())
+        
+        self.assertEqual(len(outputs[0]), 6)
+        self.assertEqual(outputs[0], outputs[1])
+        
+        # the export timings are collected per proband
+        self.assertEqual(list(report.metrics.probands),
+            [ 'child{}'.format(i) for i in range(5) ])
+        stages = report.metrics.probands['child0']
+        self.assertEqual(list(stages), ['export_tabular'])
+        self.assertEqual(stages['export_tabular']['records_in'], 1)
+    
+    def test_report_writer_error(self):
+        ''' check that ReportWriter raises errors from the background thread
+        '''
+        
+        path = os.path.join(self.temp_dir, 'writer_error.txt')
+        writer = ReportWriter(Report(path, None, None), max_queued=1)
+        
+        # a candidate without the genes to report fails to export
+        var = (self.variants[0], ["single_variant"], ["Monoallelic"], None)
+        writer.export_data([var], self.trio)
+        writer.export_data([var], self.trio)
+        
+        with self.assertRaises(TypeError):
+            writer.close()
+        
+        # the report is closed, even though the export failed
+        self.assertIsNone(writer.reporter.handle)
+        self.assertFalse(writer.thread.is_alive())
+        
+        # later exports raise the error, rather than being silently dropped
+        with self.assertRaises(TypeError):
+            writer.export_data([var], self.trio)
+    
+    def test_export_data_database(self):
+        ''' check that Report stores the candidates in a database
+        '''
+        
+        family = self.trio
+        for member in [family.child, family.mother, family.father]:
+            with open(member.get_path(), 'w') as handle:
+                handle.writelines(make_vcf_header())
+        
+        var = (self.variants[0], ["single_variant"], ["Monoallelic"], ["TEST"])
+        path = os.path.join(self.temp_dir, 'export.txt')
+        db_path = os.path.join(self.temp_dir, 'export.db')
+        with Report(path, None, None, output_db=db_path) as report:
+            report.export_data([var], family)
+        
+        # the database matches the tabular output
+        with open(path) as handle:
+            lines = handle.readlines()
+        
+        candidates = query_candidates(db_path)
+        self.assertEqual(len(candidates), 1)
+        fields = lines[1].rstrip('\n').split('\t')
+        self.assertEqual(candidates[0]['proband'], fields[0])
+        self.assertEqual(candidates[0]['position'], int(fields[3]))
+        self.assertEqual(candidates[0]['gene'], fields[4])
+        self.assertEqual(candidates[0]['result'], fields[14])
+    
+    def test_export_data_columns(self):
+        ''' check that Report writes the candidates in a columnar format
+        '''
+        
+        var = (self.variants[0], ["single_variant"], ["Monoallelic"], ["TEST"])
+        path = os.path.join(self.temp_dir, 'export.txt')
+        columns_path = os.path.join(self.temp_dir, 'export.columns')
+        with Report(path, None, None, output_columns=columns_path) as report:
+            report.export_data([var], self.trio)
+        
+        # the columns match the tabular output
+        with open(path) as handle:
+            lines = handle.readlines()
+        
+        columns = read_columns(columns_path)
+        fields = lines[1].rstrip('\n').split('\t')
+        self.assertEqual(columns['proband'], [fields[0]])
+        self.assertEqual(columns['position'], [int(fields[3])])
+        self.assertEqual(columns['result'], [fields[14]])
+    
     def test__get_provenance(self):
         """ check that _get_provenance() works correctly
         """
@@ -333,6 +504,112 @@ class TestReportPy(unittest.TestCase):
             "single_variant\t0.99\tNA\tNA\tTrue\tNA\n"
         self.assertEqual(_get_output_line(var, self.trio), expected)
     
+    def test__merge_vcf_lines(self):
+        ''' check that _merge_vcf_lines() merges probands into one VCF
+        '''
+        
+        def get_lines(sample, sites):
+            header = ['##fileformat=VCFv4.1\n',
+                '##UberVCF_proband_Id={}\n'.format(sample),
+                '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{}\n'.format(sample)]
+            return header + [ '{}\t{}\t.\tA\tG\t50\tPASS\tHGNC={}\tGT\t0/1\n'.format(
+                chrom, pos, sample) for chrom, pos in sites ]
+        
+        first = get_lines('a', [('1', 100), ('X', 5)])
+        second = get_lines('b', [('1', 100), ('2', 10)])
+        
+        # a single proband is unchanged
+        self.assertEqual(list(_merge_vcf_lines([(['a'], first)])), first)
+        
+        self.assertEqual(list(_merge_vcf_lines([('a', first), (['b'], second)])),
+            ['##fileformat=VCFv4.1\n',
+            '##UberVCF_proband_Id=a\n',
+            '##UberVCF_proband_Id=b\n',
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ta\tb\n',
+            '1\t100\t.\tA\tG\t50\tPASS\tHGNC=a\tGT\t0/1\t.\n',
+            '1\t100\t.\tA\tG\t50\tPASS\tHGNC=b\tGT\t.\t0/1\n',
+            '2\t10\t.\tA\tG\t50\tPASS\tHGNC=b\tGT\t.\t0/1\n',
+            'X\t5\t.\tA\tG\t50\tPASS\tHGNC=a\tGT\t0/1\t.\n'])
+        
+        # probands without candidates still get a sample column
+        empty = get_lines('c', [])
+        merged = list(_merge_vcf_lines([('a', first), (['c'], empty)]))
+        self.assertEqual(merged[3],
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ta\tc\n')
+        self.assertEqual(len(merged), 6)
+    
+    def test_export_data_merged_vcf(self):
+        ''' check that Report merges probands exported to a single VCF
+        '''
+        
+        family = self.trio
+        for member in [family.child, family.mother, family.father]:
+            with open(member.get_path(), 'w') as handle:
+                handle.writelines(make_vcf_header())
+        
+        var = (self.variants[0], ["single_variant"], ["Monoallelic"], ["TEST"])
+        
+        path = os.path.join(self.temp_dir, 'merged.vcf.gz')
+        with Report(None, path, None) as report:
+            for sample in ['child1', 'child2']:
+                var[0].child.add_vcf_line(['X', '150', '.', 'A', 'G', '50',
+                    'PASS', 'HGNC=TEST;CQ=missense_variant', 'GT:DP', '0/1:50'])
+                family = self.create_family('F', '1', '1')
+                family.child.person_id = sample
+                report.export_data([var], family)
+            
+            # the probands are written to temporary VCFs as they are exported,
+            # and the single VCF is only written when the report is closed
+            self.assertFalse(os.path.exists(path))
+            parts = [ x[1] for x in report.vcf_parts ]
+            self.assertEqual([ x[0] for x in report.vcf_parts ], [['child1'], ['child2']])
+            self.assertTrue(all(os.path.exists(x) for x in parts))
+        
+        self.assertFalse(any(os.path.exists(x) for x in parts))
+        self.assertEqual([ x for x in os.listdir(self.temp_dir) if x.endswith('.parts') ], [])
+        self.assertTrue(os.path.exists(path + '.tbi'))
+        with pysam.TabixFile(path) as handle:
+            self.assertEqual(handle.header[-1].split('\t')[9:], ['child1', 'child2'])
+            lines = [ x.split('\t') for x in handle.fetch('X') ]
+        
+        self.assertEqual([ x[9:] for x in lines ], [['0/1:50:deNovo:1,0,0', '.'],
+            ['.', '0/1:50:deNovo:1,0,0']])
+    
+    def test_export_data_merged_vcf_batches(self):
+        ''' check that Report merges more probands than it can open at once
+        '''
+        
+        family = self.trio
+        for member in [family.child, family.mother, family.father]:
+            with open(member.get_path(), 'w') as handle:
+                handle.writelines(make_vcf_header())
+        
+        var = (self.variants[0], ["single_variant"], ["Monoallelic"], ["TEST"])
+        samples = [ 'child{}'.format(x) for x in range(5) ]
+        
+        path = os.path.join(self.temp_dir, 'merged.vcf.gz')
+        default = reporting.MERGE_FILES
+        reporting.MERGE_FILES = 2
+        try:
+            with Report(None, path, None) as report:
+                for sample in samples:
+                    var[0].child.add_vcf_line(['X', '150', '.', 'A', 'G', '50',
+                        'PASS', 'HGNC=TEST;CQ=missense_variant', 'GT:DP', '0/1:50'])
+                    family = self.create_family('F', '1', '1')
+                    family.child.person_id = sample
+                    report.export_data([var], family)
+        finally:
+            reporting.MERGE_FILES = default
+        
+        with pysam.TabixFile(path) as handle:
+            self.assertEqual(handle.header[-1].split('\t')[9:], samples)
+            lines = [ x.split('\t')[9:] for x in handle.fetch('X') ]
+        
+        self.assertEqual(len(lines), len(samples))
+        for i, line in enumerate(lines):
+            self.assertEqual(line[i], '0/1:50:deNovo:1,0,0')
+            self.assertEqual(line[:i] + line[i + 1:], ['.'] * (len(samples) - 1))
+    
     def test__write_vcf(self):
         ''' check that _write_vcf() works correctly
         '''
@@ -352,3 +629,7 @@ class TestReportPy(unittest.TestCase):
             vcf = [ x.decode() for x in handle ]
             self.assertEqual(lines, vcf)
         
+        # the VCF is BGZF-compressed and tabix-indexed
+        with pysam.TabixFile(path.name) as handle:
+            self.assertEqual(list(handle.fetch('X', 149, 150)), [lines[-1].rstrip('\n')])
+
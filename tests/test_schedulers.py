@@ -0,0 +1,165 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+import unittest
+import tempfile
+import shutil
+import os
+
+from clinicalfilter.ped import Family, load_families
+from clinicalfilter.schedulers import Scheduler, LsfScheduler, SlurmScheduler, \
+    format_command, get_scheduler, submit_run
+
+class RecordingScheduler(Scheduler):
+    """ scheduler which records the jobs, rather than submitting them
+    """
+    
+    index_variable = "TASK_ID"
+    
+    def __init__(self, queue=None, memory=None):
+        super(RecordingScheduler, self).__init__(queue, memory)
+        self.submitted = []
+    
+    def get_array_args(self, name, command, count, log_path):
+        return ["array", name, command, count, log_path]
+    
+    def get_dependent_args(self, name, command, dependency, log_path):
+        return ["dependent", name, command, dependency, log_path]
+    
+    def submit(self, args, name):
+        self.submitted.append(args)
+        return "job{}".format(len(self.submitted))
+
+class TestSchedulersPy(unittest.TestCase):
+    """ test submitting runs to cluster schedulers
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def test_format_command(self):
+        """ check that commands are quoted, with the array index substituted
+        """
+        
+        command = ['python', 'a b.py', '--ped', '/tmp/{index}.ped', '']
+        self.assertEqual(format_command(command),
+            "python 'a b.py' --ped '/tmp/{index}.ped' ''")
+        self.assertEqual(format_command(command, 'LSB_JOBINDEX'),
+            'python \'a b.py\' --ped /tmp/"$LSB_JOBINDEX".ped \'\'')
+    
+    def test_lsf_scheduler(self):
+        """ check the bsub arguments
+        """
+        
+        scheduler = LsfScheduler('normal', 150)
+        args = scheduler.get_array_args('run', ['python', '{index}.ped'], 3,
+            '/tmp/{index}.job')
+        self.assertEqual(args, ['bsub', '-J', 'run[1-3]', '-o', '/tmp/%I.job',
+            '-q', 'normal', '-R', 'select[mem>150] rusage[mem=150]', '-M', '150',
+            'python "$LSB_JOBINDEX".ped'])
+        
+        args = LsfScheduler().get_dependent_args('merge', ['rm', 'x'], '1234',
+            '/tmp/merge.job')
+        self.assertEqual(args, ['bsub', '-J', 'merge', '-o', '/tmp/merge.job',
+            '-w', 'done(1234)', 'rm x'])
+        
+        self.assertEqual(scheduler.get_job_id('Job <1234> is submitted to '
+            'queue <normal>.\n', 'run'), '1234')
+        self.assertEqual(scheduler.get_job_id('', 'run'), 'run')
+    
+    def test_slurm_scheduler(self):
+        """ check the sbatch arguments
+        """
+        
+        scheduler = SlurmScheduler('short', 150)
+        args = scheduler.get_array_args('run', ['python', '{index}.ped'], 3,
+            '/tmp/{index}.job')
+        self.assertEqual(args, ['sbatch', '--parsable', '--job-name', 'run',
+            '--output', '/tmp/%a.job', '--partition', 'short', '--mem', '150M',
+            '--array', '1-3', '--wrap', 'python "$SLURM_ARRAY_TASK_ID".ped'])
+        
+        args = SlurmScheduler().get_dependent_args('merge', ['rm', 'x'], '1234',
+            '/tmp/merge.job')
+        self.assertEqual(args, ['sbatch', '--parsable', '--job-name', 'merge',
+            '--output', '/tmp/merge.job', '--dependency', 'afterok:1234',
+            '--wrap', 'rm x'])
+        
+        self.assertEqual(scheduler.get_job_id('1234;cluster\n', 'run'), '1234')
+    
+    def test_get_scheduler(self):
+        """ check that schedulers can be named, or given as plugins
+        """
+        
+        scheduler = get_scheduler('lsf', 'normal', 100)
+        self.assertEqual(type(scheduler), LsfScheduler)
+        self.assertEqual(scheduler.queue, 'normal')
+        self.assertEqual(scheduler.memory, 100)
+        
+        self.assertEqual(type(get_scheduler('slurm')), SlurmScheduler)
+        
+        plugin = get_scheduler('tests.test_schedulers:RecordingScheduler')
+        self.assertEqual(type(plugin).__name__, 'RecordingScheduler')
+        
+        with self.assertRaises(ValueError):
+            get_scheduler('pbs')
+    
+    def test_submit_run(self):
+        """ check that a run is split into shards, with a job to merge them
+        """
+        
+        families = []
+        for i in range(3):
+            family = Family('fam{}'.format(i))
+            family.add_child('child{}'.format(i), '0', '0', 'F', '2',
+                '/path/to/child{}.vcf'.format(i))
+            families.append(family)
+        
+        scheduler = RecordingScheduler()
+        tempdir = os.path.join(self.temp_dir, 'shards')
+        output = os.path.join(self.temp_dir, 'output.txt')
+        job_id = submit_run(scheduler, ['clinical-filter'], families,
+            ['--workers', '2'], output, tempdir, 2)
+        
+        self.assertEqual(job_id, 'job2')
+        
+        # the families are split across the PED files for the shards
+        peds = [ os.path.join(tempdir, '{}.ped'.format(x)) for x in [1, 2] ]
+        loaded = [ x.family_id for y in peds for x in load_families(y) ]
+        self.assertEqual(sorted(loaded), ['fam0', 'fam1', 'fam2'])
+        
+        array, merge = scheduler.submitted
+        self.assertEqual(array, ['array', 'shards', ['clinical-filter', 'run',
+            '--ped', os.path.join(tempdir, '{index}.ped'), '--output',
+            os.path.join(tempdir, '{index}.output.txt'), '--workers', '2'], 2,
+            os.path.join(tempdir, '{index}.job')])
+        
+        # the merge waits for the array, and merges the outputs in order
+        self.assertEqual(merge[:2], ['dependent', 'merge_shards'])
+        self.assertEqual(merge[3], 'job1')
+        command = merge[2]
+        self.assertEqual(command[:6], ['clinical-filter', 'merge', '--output',
+            output, '--cleanup', tempdir])
+        self.assertEqual(command[-3:], ['--',
+            os.path.join(tempdir, '1.output.txt'),
+            os.path.join(tempdir, '2.output.txt')])
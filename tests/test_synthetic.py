@@ -0,0 +1,99 @@
+'''
+Copyright (c) 2016 Genome Research Ltd.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+of the Software, and to permit persons to whom the Software is furnished to do
+so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+
+import unittest
+import tempfile
+import shutil
+import gzip
+import os
+
+from clinicalfilter.ped import load_families
+from clinicalfilter.load_vcfs import load_variants
+from clinicalfilter.load_files import open_known_genes
+
+from benchmarks.synthetic import POPULATIONS, generate_trio
+from benchmarks.run_benchmarks import find_regressions
+
+class TestSyntheticPy(unittest.TestCase):
+    """ test the synthetic trio generator
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def read_lines(self, path):
+        with gzip.open(path, "rt") as handle:
+            return handle.readlines()
+    
+    def test_generate_trio_deterministic(self):
+        ''' check that the same seed generates the same VCFs
+        '''
+        
+        first = generate_trio(os.path.join(self.temp_dir, "a"), 200, seed=1)
+        second = generate_trio(os.path.join(self.temp_dir, "b"), 200, seed=1)
+        other = generate_trio(os.path.join(self.temp_dir, "c"), 200, seed=2)
+        
+        for member in ["child", "mother", "father"]:
+            self.assertEqual(self.read_lines(first[member]),
+                self.read_lines(second[member]))
+        
+        self.assertNotEqual(self.read_lines(first["child"]),
+            self.read_lines(other["child"]))
+    
+    def test_generate_trio_counts(self):
+        ''' check that the child VCF has the requested number of variants
+        '''
+        
+        paths = generate_trio(self.temp_dir, 300)
+        lines = [ x for x in self.read_lines(paths["child"])
+            if not x.startswith("#") ]
+        
+        self.assertEqual(len(lines), 300)
+        self.assertTrue(os.path.exists(paths["child"] + ".tbi"))
+    
+    def test_generate_trio_loads(self):
+        ''' check that the generated trio loads through the standard pipeline
+        '''
+        
+        paths = generate_trio(self.temp_dir, 500)
+        family = load_families(paths["ped"])[0]
+        family.set_child()
+        
+        known_genes = open_known_genes(paths["known_genes"])
+        variants = load_variants(family, 0.9, POPULATIONS, known_genes, set(), {})
+        
+        self.assertTrue(len(variants) > 0)
+    
+    def test_find_regressions(self):
+        ''' check that stages slower than their baseline are flagged
+        '''
+        
+        timings = {"a": 1.0, "b": 2.0, "c": 5.0}
+        baselines = {"a": 1.0, "b": 1.0}
+        
+        self.assertEqual(find_regressions(timings, baselines, 0.5),
+            [("b", 2.0, 1.0)])
+        self.assertEqual(find_regressions(timings, baselines, 1.5), [])
@@ -118,6 +118,24 @@ class TestTrioGenotypesPy(unittest.TestCase):
         del self.var.child.format["PP_DNM"]
         self.assertTrue(self.var.passes_de_novo_checks(pp_filter=0.9))
     
+    def test_check_de_novo(self):
+        """ test that check_de_novo() gives the filter which failed
+        """
+        
+        self.assertEqual(self.var.check_de_novo(pp_filter=0.9), (True, "passed all"))
+        
+        self.var.child.format["PP_DNM"] = 0.0099
+        self.assertEqual(self.var.check_de_novo(pp_filter=0.9), (False, "PP_DNM"))
+        
+        del self.var.child.info["DENOVO-SNP"]
+        self.assertEqual(self.var.check_de_novo(pp_filter=0.9), (False, "DENOVO"))
+        
+        # inherited variants aren't checked by the de novo filters
+        var = self.create_var(chrom='1')
+        var.mother = create_snv("F", "0/1")
+        del var.child.info["DENOVO-SNP"]
+        self.assertEqual(var.check_de_novo(pp_filter=0.9), (True, "not de novo"))
+    
     def test_passes_de_novo_checks_X_chrom(self):
         """ test that passes_de_novo_checks() works on the X chromosome
         """
@@ -169,6 +187,23 @@ class TestTrioGenotypesPy(unittest.TestCase):
         self.var.father = None
         self.assertEqual(self.var.get_trio_genotype(), (1, None, None))
     
+    def test_sort_key(self):
+        """ test that the sort key orders variants by chromosome and position
+        """
+        
+        var = self.create_var('1', '150')
+        self.assertEqual(var.sort_key, self.create_var('1', 150).sort_key)
+        self.assertLess(var, self.create_var('1', '151'))
+        self.assertLess(var, self.create_var('2', '1'))
+        self.assertLess(self.create_var('9', '150'), self.create_var('10', '1'))
+        self.assertLess(self.create_var('22', '150'), self.create_var('X', '1'))
+        self.assertFalse(var < self.create_var('1', '150'))
+        
+        variants = [ self.create_var(*x) for x in [('X', '5'), ('2', '5'),
+            ('10', '1'), ('2', '3')] ]
+        self.assertEqual([ (x.get_chrom(), x.get_position()) for x in sorted(variants) ],
+            [('2', 3), ('2', 5), ('10', 1), ('X', 5)])
+    
     def test_chrom_to_int(self):
         """ test that chrom_to_int() works correctly
         """
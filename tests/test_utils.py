@@ -32,7 +32,8 @@ import tempfile
 from clinicalfilter.variant.snv import SNV
 from clinicalfilter.variant.cnv import CNV
 from clinicalfilter.utils import open_vcf, get_vcf_header, exclude_header, \
-    construct_variant, get_vcf_provenance
+    construct_variant, get_vcf_provenance, starts_in_region, get_vcf_checksum, \
+    CHECKSUMS
 from clinicalfilter.ped import Family, Person
 
 IS_PYTHON3 = sys.version_info.major == 3
@@ -128,6 +129,24 @@ class TestUtilsPy(unittest.TestCase):
             exclude_header(handler)
             self.assertEqual(handler.readline(), vcf[4])
     
+    def test_get_vcf_checksum(self):
+        """ check that checksums are cached until the file changes
+        """
+        
+        path = os.path.join(self.temp_dir, "temp.vcf")
+        vcf = make_minimal_vcf()
+        write_temp_vcf(path, vcf)
+        
+        checksum = get_vcf_checksum(path)
+        self.assertEqual(get_vcf_checksum(path), checksum)
+        self.assertEqual(len([ x for x in CHECKSUMS if x[0] == path ]), 1)
+        
+        # modifying the file gives the new checksum
+        write_temp_vcf(path, vcf[:-1])
+        with open(path, "rb") as handle:
+            self.assertEqual(get_vcf_checksum(path),
+                hashlib.sha1(handle.read()).hexdigest())
+    
     def test_get_vcf_provenance(self):
         """ test that get_vcf_provenance() works correctly
         """
@@ -202,3 +221,18 @@ class TestUtilsPy(unittest.TestCase):
         
         self.assertEqual(variant.get_key(), test_var.get_key())
         self.assertEqual(variant.format, {'GT': '0/1'})
+    
+    def test_starts_in_region(self):
+        """ test that starts_in_region() checks the variant start position
+        """
+        
+        line = ['1', '100', '.', 'GAAAA', 'G']
+        
+        self.assertTrue(starts_in_region(line, ('1', None, None)))
+        self.assertTrue(starts_in_region(line, ('1', 100, 200)))
+        self.assertTrue(starts_in_region(line, ('1', 1, 100)))
+        self.assertTrue(starts_in_region(line, ('1', 50, None)))
+        
+        # a deletion overlapping the start of a region does not start in it
+        self.assertFalse(starts_in_region(line, ('1', 101, 200)))
+        self.assertFalse(starts_in_region(line, ('1', 1, 99)))
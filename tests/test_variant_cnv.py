@@ -112,7 +112,7 @@ class TestVariantCnvPy(unittest.TestCase):
         """ test that fix_gene_IDs() works correctly
         """
         
-        self.var.known_genes = {"TEST": {"start": 1000, "end": 2000, "chrom": "5"}}
+        self.var.known_genes = {"TEST": {"start": 1000, "end": 2000, "chrom": "1"}}
         
         # make a CNV that will overlap with the known gene set
         self.var.info.symbols = [Symbols(info={'HGNC_ID': 'TEST'}, idx=0)]
@@ -143,6 +143,39 @@ class TestVariantCnvPy(unittest.TestCase):
         self.var.fix_gene_IDs()
         self.assertEqual(self.var.info.get_genes(), [['TEST', 'TEST2']])
     
+    def test_fix_gene_IDs_missing_gene(self):
+        """ test that fix_gene_IDs() adds known genes that VEP missed
+        """
+        
+        self.var.known_genes = {"TEST": {"start": 1000, "end": 2000, "chrom": "1"},
+            "TEST3": {"start": 1400, "end": 3000, "chrom": "1", "symbol": "SYM3"},
+            "TEST4": {"start": 1400, "end": 3000, "chrom": "2", "symbol": "SYM4"}}
+        
+        self.var.info.symbols = [Symbols(info={'HGNC_ID': 'TEST'}, idx=0)]
+        self.var.info.consequence = [['transcript_amplification']]
+        self.var.position = 1000
+        self.var.info["END"] = "1500"
+        
+        # the CNV overlaps TEST3, which is added, but TEST4 is on a different
+        # chromosome, so is not added
+        self.var.fix_gene_IDs()
+        self.assertEqual(self.var.info.get_genes(), [['TEST', 'TEST3']])
+        self.assertEqual(self.var.info.symbols[0].get('TEST3', 'HGNC'), 'SYM3')
+        self.assertEqual(self.var.info.get_per_gene_consequence('TEST3'),
+            ['transcript_amplification'])
+        self.assertEqual(self.var.known_gene_ranges,
+            {'TEST': (1000, 2000), 'TEST3': (1400, 3000)})
+        
+        # deletions which overlap a missing gene get an ablation consequence
+        self.var.alt_alleles = ('<DEL>', )
+        self.var.info.symbols = [Symbols(info={}, idx=0)]
+        self.var.info.consequence = [[]]
+        self.var.position = 2500
+        self.var.info["END"] = "2600"
+        self.var.fix_gene_IDs()
+        self.assertEqual(self.var.info.get_genes(), [['TEST3']])
+        self.assertTrue(self.var.is_lof('TEST3'))
+    
     def test_set_gene_from_info_cnv(self):
         """ test that set_add_gene_from_info() works correctly
         """
@@ -38,6 +38,19 @@ class TestAcghCnvPy(unittest.TestCase):
         
         self.var = ACGH_CNV(cnv)
     
+    def test_check_cnv(self):
+        """ test that check_cnv() gives the filter which failed
+        """
+        
+        self.var.cnv.info["WSCORE"] = "0.3"
+        self.assertEqual(self.var.check_cnv(), (False, "WSCORE"))
+        self.assertEqual(self.var.cnv.get_filter_value("WSCORE"), "0.3")
+        
+        # the MAD ratio is checked before the wscore
+        self.var.cnv.info["MEANLR2"] = "0.29"
+        self.var.cnv.info["MADL2R"] = "0.03"
+        self.assertEqual(self.var.check_cnv(), (False, "MADL2R"))
+    
     def test_fails_mad_ratio(self):
         """ test that fails_mad_ratio() works correctly.
         """